@@ -0,0 +1,103 @@
+import threading
+import time
+
+from django.core.cache import cache
+
+
+def get_version(key):
+    """
+    Returns the current value of a version counter kept in the cache,
+    starting it at 1 if it does not exist yet.
+
+    Version counters are shared by every process using the same cache, and
+    are used either as part of other cache keys (bumping the version makes
+    all of them stale at once) or to tell processes that their in-memory
+    data is out of date.
+    """
+    version = cache.get(key)
+    if version is None:
+        # `add` so that two processes starting at once agree on the version.
+        cache.add(key, 1, timeout=None)
+        version = cache.get(key, 1)
+    return version
+
+
+def bump_version(key):
+    """
+    Atomically increments a version counter and returns the new value.
+    """
+    try:
+        return cache.incr(key)
+    except ValueError:
+        cache.set(key, 1, timeout=None)
+        return 1
+
+
+class LocalReplica:
+    """
+    Keeps an in-memory structure built from the database (an index, a
+    lookup table...) in step across processes.
+
+    The structure is built on first use by calling `load`. Changes made in
+    this process are applied in place through `apply`, which also bumps a
+    shared version counter. Other processes notice the version moving,
+    checking at most once every `check_interval` seconds, and rebuild their
+    copy.
+    """
+    def __init__(self, version_key, load, check_interval=1):
+        self.version_key = version_key
+        self.check_interval = check_interval
+        self._load = load
+        self._lock = threading.RLock()
+        self.value = None
+        self.version = None
+        self.checked_at = 0.0
+
+    def rebuild(self):
+        with self._lock:
+            version = get_version(self.version_key)
+            self.value = self._load()
+            self.version = version
+            self.checked_at = time.monotonic()
+            return self.value
+
+    def get(self):
+        with self._lock:
+            if self.version is None:
+                return self.rebuild()
+
+            now = time.monotonic()
+            if now - self.checked_at >= self.check_interval:
+                self.checked_at = now
+                if get_version(self.version_key) != self.version:
+                    return self.rebuild()
+
+            return self.value
+
+    def invalidate(self):
+        """
+        Marks every copy, including this process's, as stale. For changes
+        that were made without going through `apply`, such as bulk inserts.
+        """
+        with self._lock:
+            bump_version(self.version_key)
+            self.version = None
+            self.value = None
+
+    def apply(self, change):
+        """
+        Calls `change(value)` to update the local copy, and tells the other
+        processes to rebuild theirs.
+        """
+        with self._lock:
+            version = bump_version(self.version_key)
+            if self.version is None:
+                # Not loaded in this process yet; `get` will load it.
+                return
+
+            change(self.value)
+            # Only move forward if ours was the sole change since the last
+            # check. Otherwise the version stays stale, so that the next
+            # `get` rebuilds and picks up the other processes' changes too.
+            if version == self.version + 1:
+                self.version = version
@@ -0,0 +1,119 @@
+import logging
+import time
+
+from django.core.cache import cache
+
+logger = logging.getLogger(__name__)
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half-open"
+
+
+class CircuitOpen(Exception):
+    """
+    Raised instead of calling a service whose circuit breaker is open.
+    """
+
+
+class CircuitBreaker:
+    """
+    Stops calling a failing service for a while, so that callers fail fast
+    instead of each waiting for a timeout.
+
+    The breaker trips (opens) once `failure_threshold` calls failed within
+    `window` seconds; calls slower than `slow_call` seconds count as
+    failures even if they succeed. While open, `guard` raises `CircuitOpen`.
+    After `recovery_timeout` seconds the breaker is half-open: a single
+    probe call is let through, closing the breaker if it succeeds and
+    opening it again if it fails.
+
+    The state lives in the cache, so it is shared by every process. State
+    transitions are logged and counted, see `metrics`.
+    """
+    def __init__(self, name, failure_threshold, window, slow_call,
+                 recovery_timeout):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.window = window
+        self.slow_call = slow_call
+        self.recovery_timeout = recovery_timeout
+
+    def _key(self, *parts):
+        return ":".join(("circuit", self.name) + parts)
+
+    def _count(self, key, timeout=None):
+        cache.add(key, 0, timeout=timeout)
+        try:
+            return cache.incr(key)
+        except ValueError:
+            # Expired between `add` and `incr`.
+            cache.set(key, 1, timeout=timeout)
+            return 1
+
+    def _transition(self, state):
+        self._count(self._key("transitions", state))
+        logger.warning("Circuit breaker %s is now %s.", self.name, state)
+
+    @property
+    def state(self):
+        opened_at = cache.get(self._key("opened_at"))
+        if opened_at is None:
+            return CLOSED
+        if time.time() - opened_at < self.recovery_timeout:
+            return OPEN
+        return HALF_OPEN
+
+    def guard(self):
+        """
+        Raises `CircuitOpen` unless a call may go through now. Returns True
+        if the call is the half-open probe.
+        """
+        state = self.state
+        if state == CLOSED:
+            return False
+        # Only one process gets to probe; the lock expires in case the
+        # probe never reports back.
+        if state == HALF_OPEN and cache.add(self._key("probe"), 1,
+                timeout=self.recovery_timeout):
+            self._transition(HALF_OPEN)
+            return True
+
+        self._count(self._key("rejected"))
+        raise CircuitOpen("{0} is temporarily unavailable.".format(
+            self.name))
+
+    def record(self, success, duration, probe=False):
+        """
+        Reports the outcome of a call that `guard` let through.
+        """
+        failed = not success or duration > self.slow_call
+
+        if probe:
+            if failed:
+                cache.set(self._key("opened_at"), time.time(), timeout=None)
+                self._transition(OPEN)
+            else:
+                cache.delete_many([self._key("opened_at"),
+                    self._key("failures")])
+                self._transition(CLOSED)
+            cache.delete(self._key("probe"))
+            return
+
+        if failed and self._count(self._key("failures"),
+                timeout=self.window) >= self.failure_threshold:
+            # `add` so that only one process reports the transition.
+            if cache.add(self._key("opened_at"), time.time(), timeout=None):
+                self._transition(OPEN)
+
+    def metrics(self):
+        keys = [self._key("transitions", state)
+                for state in (OPEN, HALF_OPEN, CLOSED)]
+        values = cache.get_many(keys + [self._key("rejected")])
+        return {
+            "state": self.state,
+            "opened": values.get(keys[0], 0),
+            "half_opened": values.get(keys[1], 0),
+            "closed": values.get(keys[2], 0),
+            "rejected": values.get(self._key("rejected"), 0),
+        }
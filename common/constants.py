@@ -11,3 +11,145 @@ PICTURE_QUALITY = 60
 PICTURE_FORMAT = 'JPEG'
 
 REQUIRED_MESSAGE = "This field is required."
+
+DOCTOR_DIRECTORY_PAGE_SIZE = 20
+
+DOCTOR_DIRECTORY_MAX_PAGE_SIZE = 100
+
+DOCTOR_DIRECTORY_CACHE_TIMEOUT = 60 * 5
+
+PROVIDER_AUTOCOMPLETE_LIMIT = 10
+
+PROVIDER_AUTOCOMPLETE_MAX_LIMIT = 25
+
+ESTIMATED_COUNT_THRESHOLD = 10000
+
+TRIGRAM_MIN_SEARCH_LENGTH = 3
+
+OUTBOX_BATCH_SIZE = 100
+
+OUTBOX_MAX_ATTEMPTS = 8
+
+OUTBOX_RETRY_DELAY = 60
+
+OUTBOX_MAX_RETRY_DELAY = 60 * 60
+
+JOB_BATCH_SIZE = 50
+
+JOB_MAX_ATTEMPTS = 5
+
+JOB_RETRY_DELAY = 10
+
+JOB_MAX_RETRY_DELAY = 60 * 60
+
+JOB_LOCK_TIMEOUT = 15 * 60
+
+STRIPE_TIMEOUT = 20
+
+STRIPE_BREAKER_FAILURE_THRESHOLD = 5
+
+STRIPE_BREAKER_WINDOW = 60
+
+STRIPE_BREAKER_SLOW_CALL = 5
+
+STRIPE_BREAKER_RECOVERY_TIMEOUT = 30
+
+# Bulk refunds: Stripe calls in flight at once, and calls per second across
+# every process (Stripe allows 100 in live mode, shared with checkout).
+REFUND_WORKERS = 8
+
+REFUND_RATE_LIMIT = 20
+
+REFUND_CHUNK_SIZE = 100
+
+# Retries of a refund that Stripe rate limited (429) before giving up.
+REFUND_MAX_RETRIES = 3
+
+# Receipts never change once rendered: their URL holds the digest of their
+# content.
+RECEIPT_CACHE_MAX_AGE = 60 * 60 * 24 * 365
+
+RECEIPT_BACKFILL_CHUNK_SIZE = 200
+
+# Days from a failed subscription payment to each retry. Once the last one
+# fails, retrying stops and the subscription is left to Stripe's settings.
+DUNNING_RETRY_DAYS = (3, 5, 7)
+
+DUNNING_BATCH_SIZE = 500
+
+DUNNING_WORKERS = 8
+
+DUNNING_RATE_LIMIT = 20
+
+# How long a claimed retry is hidden from other schedulers; one whose
+# scheduler died is picked up again after that.
+DUNNING_LEASE = 10 * 60
+
+# (requests, seconds): each user may make this many payment requests in a
+# burst, and then gets one back every seconds / requests.
+PAYMENT_RATE_LIMIT_PER_USER = (5, 60)
+
+# Per client IP address, for anonymous requests, and a higher limit for
+# signed in users, who have their own limit but may share an address with
+# many others (an office, a carrier's NAT).
+PAYMENT_RATE_LIMIT_PER_IP = (20, 60)
+PAYMENT_RATE_LIMIT_PER_USER_IP = (200, 60)
+
+SCHEDULING_SLOT_MINUTES = 30
+
+SCHEDULING_HORIZON_DAYS = 28
+
+SCHEDULING_NEXT_SLOTS_LIMIT = 10
+
+SCHEDULING_NEXT_SLOTS_MAX_LIMIT = 50
+
+# Patients a medical professional takes at once unless they set otherwise.
+DISPATCH_DEFAULT_CAPACITY = 3
+
+DISPATCH_MAX_CAPACITY = 20
+
+DISPATCH_BATCH_SIZE = 100
+
+# Reasons for visit whose emergency terms weigh this much in total are
+# dispatched before everyone else, see medico.dispatch.triage.
+TRIAGE_URGENT_SCORE = 10
+
+# Seconds between keep-alive comments on idle dashboard event streams.
+DISPATCH_EVENTS_HEARTBEAT = 15
+
+# Seconds browsers wait before reconnecting a dropped event stream.
+DISPATCH_EVENTS_RETRY = 5
+
+CONSULTATION_HISTORY_PAGE_SIZE = 20
+
+CONSULTATION_HISTORY_MAX_PAGE_SIZE = 100
+
+CONSULTATION_SEARCH_PAGE_SIZE = 20
+
+CONSULTATION_SEARCH_MAX_PAGE_SIZE = 100
+
+CONSULTATION_SEARCH_MAX_QUERY_LENGTH = 200
+
+# Rows fetched from the database, and written out, at a time by checkout
+# exports.
+CHECKOUT_EXPORT_CHUNK_SIZE = 2000
+
+# Rows fetched from the database, and turned into an Arrow record batch, at
+# a time by analytics snapshots.
+SNAPSHOT_CHUNK_SIZE = 10000
+
+# Snapshots leave out rows changed in the last this many seconds: a
+# transaction still in flight may yet commit a change stamped earlier than
+# the newest rows, which the next snapshot would then skip.
+SNAPSHOT_SETTLE_SECONDS = 300
+
+# Days shown on the staff analytics dashboard.
+ANALYTICS_DASHBOARD_DAYS = 30
+
+# Months of subscription metrics shown by default, and at most.
+SUBSCRIPTION_METRICS_MONTHS = 12
+
+SUBSCRIPTION_METRICS_MAX_MONTHS = 60
+
+# Seconds subscription metrics are cached for by the staff view.
+SUBSCRIPTION_METRICS_CACHE_TIMEOUT = 60 * 60
@@ -0,0 +1,23 @@
+from django.db import IntegrityError, transaction
+from django.db.models import F
+
+
+def increment(model, key, **deltas):
+    """
+    Adds `deltas` to the counter fields of the `model` row matching `key`,
+    creating the row if there is none yet. `key` must be covered by a
+    unique constraint, which settles concurrent creations. The update is a
+    single `F()` expression, so concurrent increments never lose one
+    another.
+    """
+    if not any(deltas.values()):
+        return
+    increments = {name: F(name) + delta for name, delta in deltas.items()}
+    if model.objects.filter(**key).update(**increments):
+        return
+    try:
+        with transaction.atomic():
+            model.objects.create(**key, **deltas)
+    except IntegrityError:
+        # Created concurrently in the meantime.
+        model.objects.filter(**key).update(**increments)
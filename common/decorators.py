@@ -1,6 +1,16 @@
+import logging
+import math
+from functools import wraps
+
+from django.conf import settings
 from django.contrib.auth.decorators import user_passes_test
+from django.http import JsonResponse
 from django.shortcuts import redirect, reverse
 
+import common.rate_limit
+
+logger = logging.getLogger(__name__)
+
 
 def medical_pro_only(view):
     """
@@ -30,3 +40,73 @@ def customer_only(view):
         return view(request, *args, **kwargs)
 
     return as_view
+
+
+def client_ip(request):
+    """
+    The IP address of the client that made `request`: the address the
+    outermost of the TRUSTED_PROXY_HOPS proxies appended to X-Forwarded-For.
+    Entries left of it were sent by the client, and could be anything.
+    """
+    hops = settings.TRUSTED_PROXY_HOPS
+    if hops:
+        forwarded = [address.strip() for address in
+                     request.META.get('HTTP_X_FORWARDED_FOR', '').split(',')]
+        if len(forwarded) >= hops and forwarded[-hops]:
+            return forwarded[-hops]
+    return request.META.get('REMOTE_ADDR')
+
+
+def rate_limit(name, per_user, per_ip, per_user_ip=None,
+               methods=('POST',)):
+    """
+    View decorator that limits how often a user, and a client IP address
+    (see `client_ip`), may call a view, using token buckets (see
+    `common.rate_limit`).
+
+    `per_user`, `per_ip` and `per_user_ip` are `(requests, seconds)` pairs:
+    a burst of `requests` is allowed, refilling over `seconds`. Anonymous
+    requests count against their address's `per_ip` bucket. Requests of
+    signed in users count against their own `per_user` bucket and, if given,
+    a separate `per_user_ip` bucket of their address. Only requests with one
+    of `methods` are counted. Rejected requests get a 429 response with a
+    Retry-After header, and are counted under `name`.
+    """
+    def decorator(view):
+        @wraps(view)
+        def as_view(request, *args, **kwargs):
+            if request.method not in methods:
+                return view(request, *args, **kwargs)
+
+            if request.user.is_authenticated:
+                buckets = [("user", request.user.pk, per_user)]
+                if per_user_ip:
+                    buckets.append(("user-ip", client_ip(request),
+                        per_user_ip))
+            else:
+                buckets = [("ip", client_ip(request), per_ip)]
+
+            for kind, identity, (requests, period) in buckets:
+                allowed, retry_after = common.rate_limit.take(
+                    "rate-limit:{0}:{1}:{2}".format(name, kind, identity),
+                    requests, period)
+                if not allowed:
+                    common.rate_limit.count_rejection(name)
+                    logger.info("Rate limited %s %s on %s.", kind, identity,
+                        name)
+                    retry_after = math.ceil(retry_after)
+                    response = JsonResponse({
+                        "error": {
+                            'message': 'Too many requests. Please try again '
+                                       'in {0} seconds.'.format(retry_after),
+                            'type': 'RateLimitError'
+                        }
+                    }, status=429)
+                    response['Retry-After'] = retry_after
+                    return response
+
+            return view(request, *args, **kwargs)
+
+        return as_view
+
+    return decorator
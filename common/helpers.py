@@ -17,3 +17,43 @@ def subscription_serialize(subscription):
         "ends_at": subscription.current_period_end.strftime("%A, %b %d"),
         "human_readable_price": subscription.plan.human_readable_price
     }
+
+
+def medical_pro_serialize(medical_pro):
+    """
+    Serializes a MedicalProfessional object for the doctor directory. The
+    related user should already be loaded with `select_related`, otherwise
+    every row costs an extra query.
+    """
+    return {
+        "id": medical_pro.id,
+        "name": medical_pro.name_with_title,
+        "staff_type": medical_pro.get_staff_type_display(),
+        "state_of_license": medical_pro.state_of_license,
+        "doctor_specialty": (medical_pro.doctor_specialty is not None and
+                             medical_pro.get_doctor_specialty_display() or
+                             None),
+        "other_specialty": (medical_pro.other_specialty is not None and
+                            medical_pro.get_other_specialty_display() or
+                            None),
+        "thumbnail_url": (medical_pro.profile_picture and
+                          medical_pro.profile_thumbnail.url or None)
+    }
+
+
+def parse_limit(params, default, maximum, error=ValueError):
+    """
+    The page size asked for by the `limit` query parameter in `params`, or
+    `default` without one. Raises `error` unless it is a whole number from
+    1 to `maximum`.
+    """
+    limit = params.get("limit")
+    if limit in (None, ""):
+        return default
+    try:
+        limit = int(limit)
+    except ValueError:
+        raise error("Invalid value for limit.")
+    if not 0 < limit <= maximum:
+        raise error("Invalid value for limit.")
+    return limit
@@ -0,0 +1,47 @@
+from django.contrib.postgres import operations as postgres_operations
+from django.db import migrations
+
+
+class RunPostgresSQL(migrations.RunSQL):
+    """
+    A RunSQL operation that only runs on PostgreSQL, for indexes and other
+    database features that have no equivalent elsewhere. On other databases
+    (SQLite in local runs) it is a no-op in both directions.
+    """
+    def database_forwards(self, app_label, schema_editor, from_state,
+                          to_state):
+        if schema_editor.connection.vendor == 'postgresql':
+            super().database_forwards(app_label, schema_editor, from_state,
+                to_state)
+
+    def database_backwards(self, app_label, schema_editor, from_state,
+                           to_state):
+        if schema_editor.connection.vendor == 'postgresql':
+            super().database_backwards(app_label, schema_editor, from_state,
+                to_state)
+
+
+class AddIndexConcurrently(postgres_operations.AddIndexConcurrently):
+    """
+    Adds a model index with CREATE INDEX CONCURRENTLY on PostgreSQL, so
+    that building it does not lock the table against writes. Migrations
+    using it must set `atomic = False`. On other databases it is a plain
+    AddIndex.
+    """
+    def database_forwards(self, app_label, schema_editor, from_state,
+                          to_state):
+        if schema_editor.connection.vendor == 'postgresql':
+            super().database_forwards(app_label, schema_editor, from_state,
+                to_state)
+        else:
+            migrations.AddIndex.database_forwards(self, app_label,
+                schema_editor, from_state, to_state)
+
+    def database_backwards(self, app_label, schema_editor, from_state,
+                           to_state):
+        if schema_editor.connection.vendor == 'postgresql':
+            super().database_backwards(app_label, schema_editor, from_state,
+                to_state)
+        else:
+            migrations.AddIndex.database_backwards(self, app_label,
+                schema_editor, from_state, to_state)
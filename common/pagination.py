@@ -0,0 +1,193 @@
+import base64
+import binascii
+import datetime
+import json
+
+from django.core.paginator import Paginator
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import connections
+from django.db.models import Q
+from django.utils.functional import cached_property
+
+import common.constants
+
+
+class InvalidCursor(ValueError):
+    """
+    Raised when a client sends a cursor that cannot be decoded or does not
+    match the ordering of the paginated queryset.
+    """
+
+
+class CursorEncoder(DjangoJSONEncoder):
+    """
+    DjangoJSONEncoder, but keeping the microseconds it drops from times:
+    a truncated timestamp would make the next page skip rows.
+    """
+    def default(self, o):
+        if isinstance(o, (datetime.datetime, datetime.time)):
+            return o.isoformat()
+        return super().default(o)
+
+
+def encode_cursor(values):
+    """
+    Encodes the ordering values of the last row of a page into an opaque,
+    URL-safe cursor string.
+    """
+    raw = json.dumps(values, cls=CursorEncoder, separators=(',', ':'))
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+
+def decode_cursor(cursor):
+    """
+    Reverses `encode_cursor`. Raises `InvalidCursor` for anything that was
+    not produced by it.
+    """
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+    except (binascii.Error, UnicodeError, ValueError):
+        raise InvalidCursor("Malformed cursor.")
+
+    if not isinstance(values, list):
+        raise InvalidCursor("Malformed cursor.")
+
+    return values
+
+
+class KeysetPage:
+    """
+    A single page of results produced by `KeysetPaginator`.
+    """
+    def __init__(self, object_list, next_cursor):
+        self.object_list = object_list
+        self.next_cursor = next_cursor
+
+    @property
+    def has_next(self):
+        return self.next_cursor is not None
+
+
+class KeysetPaginator:
+    """
+    Paginates a queryset by seeking past the last row of the previous page
+    ("keyset" or "cursor" pagination) instead of using OFFSET.
+
+    OFFSET makes the database read and throw away every row before the
+    requested page, so deep pages get slower as the table grows. Seeking on
+    an indexed ordering keeps every page as cheap as the first one.
+
+    The ordering must be made unique by ending it with the primary key, e.g.
+    `("-created", "-id")`, and should match an index on the table. It may
+    also start with annotations, such as a search rank.
+    """
+    def __init__(self, queryset, ordering, per_page):
+        self.queryset = queryset
+        self.ordering = tuple(ordering)
+        self.per_page = per_page
+        self._fields = [(name.lstrip('-'), name.startswith('-'))
+                        for name in self.ordering]
+
+    def _key(self, obj):
+        return [getattr(obj, name) for name, _ in self._fields]
+
+    def _field(self, name):
+        annotation = self.queryset.query.annotations.get(name)
+        if annotation is not None:
+            return annotation.output_field
+        return self.queryset.model._meta.get_field(name)
+
+    def _seek(self, values):
+        """
+        Builds the row-value comparison `(a, b, c) > (x, y, z)` as a chain of
+        ORs, honouring the direction of every field in the ordering.
+        """
+        if len(values) != len(self._fields):
+            raise InvalidCursor("Cursor does not match the ordering.")
+
+        try:
+            values = [self._field(name).to_python(value)
+                      for (name, _), value in zip(self._fields, values)]
+        except Exception:
+            raise InvalidCursor("Cursor does not match the ordering.")
+
+        condition = Q()
+        for i, (name, descending) in enumerate(self._fields):
+            lookup = "{0}__{1}".format(name, 'lt' if descending else 'gt')
+            step = Q(**{lookup: values[i]})
+            for j in range(i):
+                step &= Q(**{self._fields[j][0]: values[j]})
+            condition |= step
+
+        # Implied by the ORs, but unlike them a plain range on the leading
+        # field, so the database can start the index scan at the cursor
+        # instead of filtering every row before it.
+        name, descending = self._fields[0]
+        bound = Q(**{"{0}__{1}".format(name, 'lte' if descending else 'gte'):
+                     values[0]})
+        return bound & condition
+
+    def page(self, cursor=None):
+        queryset = self.queryset.order_by(*self.ordering)
+        if cursor:
+            queryset = queryset.filter(self._seek(decode_cursor(cursor)))
+
+        # Fetch one extra row to find out whether there is a next page
+        # without issuing a COUNT.
+        rows = list(queryset[:self.per_page + 1])
+        next_cursor = None
+        if len(rows) > self.per_page:
+            rows = rows[:self.per_page]
+            next_cursor = encode_cursor(self._key(rows[-1]))
+
+        return KeysetPage(rows, next_cursor)
+
+
+def estimate_count(queryset):
+    """
+    Returns the PostgreSQL planner's estimate of the number of rows in
+    `queryset`, or None when there is no estimate (other databases, or a
+    table that has never been analyzed).
+
+    Unfiltered querysets use the table statistics in `pg_class`; filtered
+    ones use the row estimate of the top plan node from EXPLAIN.
+    """
+    connection = connections[queryset.db]
+    if connection.vendor != 'postgresql':
+        return None
+
+    with connection.cursor() as cursor:
+        if not queryset.query.where:
+            table = connection.ops.quote_name(queryset.model._meta.db_table)
+            cursor.execute("SELECT reltuples FROM pg_class"
+                " WHERE oid = %s::regclass", [table])
+            row = cursor.fetchone()
+            estimate = row and row[0]
+        else:
+            sql, params = queryset.query.sql_with_params()
+            cursor.execute("EXPLAIN (FORMAT JSON) " + sql, params)
+            plan = cursor.fetchone()[0]
+            if isinstance(plan, str):
+                plan = json.loads(plan)
+            estimate = plan[0]["Plan"]["Plan Rows"]
+
+    if estimate is None or estimate < 0:
+        return None
+    return int(estimate)
+
+
+class EstimatedCountPaginator(Paginator):
+    """
+    Paginator for admin change lists over large tables. An exact COUNT(*)
+    has to visit every matching row, so above `threshold` rows the planner's
+    estimate is used instead; page numbers past the real end just come back
+    empty.
+    """
+    threshold = common.constants.ESTIMATED_COUNT_THRESHOLD
+
+    @cached_property
+    def count(self):
+        estimate = estimate_count(self.object_list)
+        if estimate is not None and estimate > self.threshold:
+            return estimate
+        return super().count
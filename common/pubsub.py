@@ -0,0 +1,139 @@
+"""
+Publish/subscribe fan-out, used to push server-sent events (see
+`medico.dispatch.events`).
+
+With django-redis as the default cache (production), messages go through
+Redis pub/sub: every process runs a single listener thread, subscribed to
+all channels, that hands each message to the subscribers it serves. Open
+connections cost no Redis connection or thread of their own. Otherwise
+messages only reach subscribers in the publishing process, which is enough
+for development and tests.
+"""
+import logging
+import threading
+import time
+from collections import defaultdict
+
+logger = logging.getLogger(__name__)
+
+CHANNEL_PREFIX = "pubsub:"
+
+
+class LocalBroker:
+    """
+    In-process fan-out. Subscribers are callables taking the message; they
+    are called from the publishing (or listener) thread, so they must not
+    block.
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._subscribers = defaultdict(set)
+
+    def subscribe(self, channel, callback):
+        """
+        Calls `callback` with every message published on `channel`.
+        Returns a function that cancels the subscription.
+        """
+        with self._lock:
+            self._subscribers[channel].add(callback)
+
+        def unsubscribe():
+            with self._lock:
+                callbacks = self._subscribers.get(channel)
+                if callbacks is not None:
+                    callbacks.discard(callback)
+                    if not callbacks:
+                        del self._subscribers[channel]
+
+        return unsubscribe
+
+    def subscriber_count(self):
+        with self._lock:
+            return sum(len(callbacks)
+                       for callbacks in self._subscribers.values())
+
+    def deliver(self, channel, message):
+        with self._lock:
+            callbacks = list(self._subscribers.get(channel, ()))
+        for callback in callbacks:
+            try:
+                callback(message)
+            except Exception:
+                logger.exception("Subscriber of %s failed", channel)
+
+    def publish(self, channel, message):
+        self.deliver(channel, message)
+
+
+class RedisBroker(LocalBroker):
+    """
+    Fan-out across processes through Redis. The listener thread is started
+    by the first subscription, so processes that only publish (WSGI
+    workers, job workers) never hold a subscription.
+    """
+    def __init__(self, redis, reconnect_delay=1):
+        super().__init__()
+        self.redis = redis
+        self.reconnect_delay = reconnect_delay
+        self._listener = None
+
+    def subscribe(self, channel, callback):
+        with self._lock:
+            if self._listener is None:
+                self._listener = threading.Thread(target=self._listen,
+                    name="pubsub-listener", daemon=True)
+                self._listener.start()
+        return super().subscribe(channel, callback)
+
+    def publish(self, channel, message):
+        self.redis.publish(CHANNEL_PREFIX + channel, message)
+
+    def _listen(self):
+        while True:
+            try:
+                pubsub = self.redis.pubsub(ignore_subscribe_messages=True)
+                pubsub.psubscribe(CHANNEL_PREFIX + "*")
+                for item in pubsub.listen():
+                    channel = item["channel"]
+                    data = item["data"]
+                    if isinstance(channel, bytes):
+                        channel = channel.decode()
+                    if isinstance(data, bytes):
+                        data = data.decode()
+                    self.deliver(channel[len(CHANNEL_PREFIX):], data)
+            except Exception as e:
+                # Messages published while disconnected are lost; clients
+                # resynchronize when they reconnect.
+                logger.warning("Lost the pub/sub connection to Redis: %s", e)
+                time.sleep(self.reconnect_delay)
+
+
+local_broker = LocalBroker()
+_broker = None
+
+
+def get_broker():
+    global _broker
+    if _broker is None:
+        try:
+            from django_redis import get_redis_connection
+            _broker = RedisBroker(get_redis_connection("default"))
+        except (ImportError, NotImplementedError):
+            _broker = local_broker
+    return _broker
+
+
+def publish(channel, message):
+    """
+    Publishes the string `message` on `channel`. Failures are logged rather
+    than raised, since nothing should fail because a live update could not
+    be sent.
+    """
+    try:
+        get_broker().publish(channel, message)
+    except Exception as e:
+        logger.warning("Could not publish on %s: %s", channel, e)
+
+
+def subscribe(channel, callback):
+    return get_broker().subscribe(channel, callback)
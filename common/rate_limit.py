@@ -0,0 +1,145 @@
+"""
+Token buckets for rate limiting, see `common.decorators.rate_limit`.
+
+With django-redis as the default cache (production), buckets live in Redis
+and are updated atomically by a Lua script, so limits hold across every
+worker. Otherwise each process keeps its own buckets in memory.
+"""
+import logging
+import threading
+import time
+
+from django.core.cache import cache
+
+logger = logging.getLogger(__name__)
+
+# KEYS[1]: bucket; ARGV: refill rate (tokens per second), capacity, now.
+# Returns {allowed, seconds until a token is available}.
+TOKEN_BUCKET_SCRIPT = """
+local rate = tonumber(ARGV[1])
+local capacity = tonumber(ARGV[2])
+local now = tonumber(ARGV[3])
+local bucket = redis.call('HMGET', KEYS[1], 'tokens', 'updated')
+local tokens = tonumber(bucket[1]) or capacity
+local updated = tonumber(bucket[2]) or now
+tokens = math.min(capacity, tokens + math.max(0, now - updated) * rate)
+local allowed = 0
+local retry_after = 0
+if tokens >= 1 then
+    tokens = tokens - 1
+    allowed = 1
+else
+    retry_after = (1 - tokens) / rate
+end
+redis.call('HMSET', KEYS[1], 'tokens', tokens, 'updated', now)
+redis.call('EXPIRE', KEYS[1], math.ceil(capacity / rate) + 1)
+return {allowed, tostring(retry_after)}
+"""
+
+
+class LocalBuckets:
+    """
+    In-memory token buckets, for development, tests and caches other than
+    Redis. Limits are per process.
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._buckets = {}
+
+    def clear(self):
+        with self._lock:
+            self._buckets.clear()
+
+    def take(self, key, rate, capacity):
+        now = time.monotonic()
+        with self._lock:
+            tokens, updated = self._buckets.get(key, (capacity, now))
+            tokens = min(capacity, tokens + (now - updated) * rate)
+            if tokens >= 1:
+                self._buckets[key] = (tokens - 1, now)
+                return True, 0
+            self._buckets[key] = (tokens, now)
+            if len(self._buckets) > 10000:
+                self._prune(now)
+            return False, (1 - tokens) / rate
+
+    def _prune(self, now):
+        # Buckets idle long enough to have refilled behave like new ones.
+        self._buckets = {key: (tokens, updated) for key, (tokens, updated)
+                         in self._buckets.items() if now - updated < 3600}
+
+
+class RedisBuckets:
+    """
+    Token buckets kept in Redis, shared by every process.
+    """
+    def __init__(self, connection):
+        self.script = connection.register_script(TOKEN_BUCKET_SCRIPT)
+
+    def take(self, key, rate, capacity):
+        allowed, retry_after = self.script(keys=[key],
+            args=[rate, capacity, time.time()])
+        return bool(allowed), float(retry_after)
+
+
+local_buckets = LocalBuckets()
+_buckets = None
+
+
+def get_buckets():
+    global _buckets
+    if _buckets is None:
+        try:
+            from django_redis import get_redis_connection
+            _buckets = RedisBuckets(get_redis_connection("default"))
+        except (ImportError, NotImplementedError):
+            _buckets = local_buckets
+    return _buckets
+
+
+def take(key, requests, period):
+    """
+    Takes a token from the bucket `key`, which holds up to `requests`
+    tokens and gets all of them back over `period` seconds.
+
+    Returns `(allowed, retry_after)`, where `retry_after` is the number of
+    seconds until the next token. If Redis is unavailable, requests are
+    allowed rather than failing.
+    """
+    buckets = get_buckets()
+    try:
+        return buckets.take(key, requests / period, requests)
+    except Exception as e:
+        if buckets is local_buckets:
+            raise
+        logger.warning("Rate limiting unavailable: %s", e)
+        return True, 0
+
+
+def wait(key, requests, period):
+    """
+    Takes a token from the bucket `key` like `take`, sleeping until one is
+    available. For background work that must stay under a rate limit
+    rather than be turned away by it.
+    """
+    while True:
+        allowed, retry_after = take(key, requests, period)
+        if allowed:
+            return
+        time.sleep(retry_after)
+
+
+def count_rejection(name):
+    key = "rate-limit:{0}:rejected".format(name)
+    cache.add(key, 0, timeout=None)
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.set(key, 1, timeout=None)
+
+
+def rejections(name):
+    """
+    Returns how many requests the rate limit `name` has rejected.
+    """
+    return cache.get("rate-limit:{0}:rejected".format(name), 0)
@@ -0,0 +1,43 @@
+"""
+ASGI config for medico project.
+
+It exposes the ASGI callable as a module-level variable named ``application``,
+to be served by an ASGI server, e.g.:
+
+    gunicorn config.asgi -k uvicorn.workers.UvicornWorker
+
+Django 3.0 runs every view in a thread pool under ASGI, so the number of
+requests a worker process handles at once (for instance checkouts waiting
+on Stripe) is the size of that pool. Set it with the ASGI_THREADS
+environment variable; every thread may hold a database connection, so keep
+ASGI_THREADS times the number of workers within the database's connection
+limit.
+
+The provider dashboard's event stream (medico.dispatch.events) does not go
+through Django: it runs on the event loop, so open dashboards do not take
+threads from that pool.
+
+"""
+import os
+import sys
+from pathlib import Path
+
+from django.core.asgi import get_asgi_application
+
+# This allows easy placement of apps within the interior
+# medico directory.
+ROOT_DIR = Path(__file__).resolve(strict=True).parent.parent
+sys.path.append(str(ROOT_DIR / "medico"))
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "config.settings.production")
+
+django_application = get_asgi_application()
+
+# Imported once Django is set up.
+from medico.dispatch import events  # noqa E402
+
+
+async def application(scope, receive, send):
+    if scope["type"] == "http" and scope["path"] == events.PATH:
+        await events.application(scope, receive, send)
+    else:
+        await django_application(scope, receive, send)
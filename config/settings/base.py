@@ -52,6 +52,7 @@ DATABASES["default"]["ATOMIC_REQUESTS"] = True
 ROOT_URLCONF = "config.urls"
 # https://docs.djangoproject.com/en/dev/ref/settings/#wsgi-application
 WSGI_APPLICATION = "config.wsgi.application"
+ASGI_APPLICATION = "config.asgi.application"
 
 # APPS
 # ------------------------------------------------------------------------------
@@ -64,6 +65,7 @@ DJANGO_APPS = [
     "django.contrib.staticfiles",
     # "django.contrib.humanize", # Handy template tags
     "django.contrib.admin",
+    "django.contrib.postgres",
     "django.forms",
 ]
 THIRD_PARTY_APPS = [
@@ -77,6 +79,12 @@ THIRD_PARTY_APPS = [
 LOCAL_APPS = [
     "medico.users.apps.UsersConfig",
     "medico.payments.apps.PaymentsConfig",
+    "medico.outbox.apps.OutboxConfig",
+    "medico.jobs.apps.JobsConfig",
+    "medico.scheduling.apps.SchedulingConfig",
+    "medico.dispatch.apps.DispatchConfig",
+    "medico.analytics.apps.AnalyticsConfig",
+    "medico.ledger.apps.LedgerConfig",
 ]
 # https://docs.djangoproject.com/en/dev/ref/settings/#installed-apps
 INSTALLED_APPS = DJANGO_APPS + THIRD_PARTY_APPS + LOCAL_APPS
@@ -215,7 +223,11 @@ X_FRAME_OPTIONS = "DENY"
 # EMAIL
 # ------------------------------------------------------------------------------
 # https://docs.djangoproject.com/en/dev/ref/settings/#email-backend
-EMAIL_BACKEND = env(
+# E-mails are written to the outbox table and delivered by
+# `manage.py send_outbox`, see medico.outbox.
+EMAIL_BACKEND = "medico.outbox.backends.OutboxBackend"
+# The backend `send_outbox` delivers through.
+OUTBOX_DELIVERY_BACKEND = env(
     "DJANGO_EMAIL_BACKEND", default="django.core.mail.backends.smtp.EmailBackend"
 )
 # https://docs.djangoproject.com/en/dev/ref/settings/#email-timeout
@@ -278,3 +290,18 @@ SOCIALACCOUNT_ADAPTER = "medico.users.adapters.SocialAccountAdapter"
 STRIPE_LIVE_MODE = False
 DJSTRIPE_FOREIGN_KEY_TO_FIELD = "id"
 DJSTRIPE_WEBHOOK_SECRET = "whsec_xxx" # not used
+
+# Weighted emergency terms that checkouts are triaged against, see
+# medico.dispatch.triage.
+TRIAGE_VOCABULARY = env("TRIAGE_VOCABULARY",
+    default=str(APPS_DIR / "dispatch" / "emergency_terms.txt"))
+
+# Where `manage.py export_snapshots` writes the Parquet snapshots analytics
+# read, see medico.analytics.snapshots.
+ANALYTICS_SNAPSHOT_DIR = env("ANALYTICS_SNAPSHOT_DIR",
+    default=str(ROOT_DIR / "snapshots"))
+
+# How many reverse proxies in front of Django append to X-Forwarded-For.
+# The client IP address is the entry the outermost of them added; with no
+# trusted proxies it is REMOTE_ADDR. See common.decorators.client_ip.
+TRUSTED_PROXY_HOPS = env.int("DJANGO_TRUSTED_PROXY_HOPS", default=0)
@@ -22,6 +22,11 @@ urlpatterns = [
     path("accounts/", include("allauth.urls")),
     path("users/", include("medico.users.urls", namespace="users")),
     path("consult/", include("medico.payments.urls", namespace="payments")),
+    path("schedule/", include("medico.scheduling.urls",
+        namespace="scheduling")),
+    path("dispatch/", include("medico.dispatch.urls", namespace="dispatch")),
+    path("analytics/", include("medico.analytics.urls",
+        namespace="analytics")),
     # Your stuff: custom urls includes go here
 ] + static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
 
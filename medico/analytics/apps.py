@@ -0,0 +1,12 @@
+from django.apps import AppConfig
+
+
+class AnalyticsConfig(AppConfig):
+    name = "medico.analytics"
+    verbose_name = "Analytics"
+
+    def ready(self):
+        try:
+            import medico.analytics.signals  # noqa F401
+        except ImportError:
+            pass
@@ -0,0 +1,119 @@
+import datetime
+import statistics
+import time
+
+import numpy
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+from djstripe.models import Customer as StripeCustomer, Plan, Subscription
+
+from medico.analytics import subscriptions
+
+BATCH_SIZE = 500
+
+
+class Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = ("Times subscription metrics over --months months for synthetic "
+            "subscriptions of growing --sizes, against a loop over the "
+            "subscriptions in Python, then times reading --load "
+            "subscriptions from the database. The subscriptions written are "
+            "rolled back afterwards.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', default="10000,100000,1000000",
+            help="Comma separated numbers of subscriptions.")
+        parser.add_argument('--months', type=int, default=24)
+        parser.add_argument('--repeat', type=int, default=5)
+        parser.add_argument('--loop-max', type=int, default=100000,
+            help="Largest size to time the Python loop at.")
+        parser.add_argument('--load', type=int, default=100000,
+            help="Subscriptions to write to the database; 0 to skip.")
+        parser.add_argument('--seed', type=int, default=0)
+
+    def _intervals(self, size, last, random):
+        # Starts over the past three years, with about a twentieth of the
+        # subscriptions ending each month.
+        start = last - random.integers(0, 36, size)
+        lasted = random.geometric(0.05, size)
+        end = numpy.where(start + lasted > last, subscriptions.NO_END,
+                          start + lasted)
+        mrr = random.choice([900, 2900, 9900], size).astype(numpy.float64)
+        return subscriptions.Intervals(start, end, mrr)
+
+    def _loop(self, intervals, first, last):
+        width = last - first + 1
+        active, mrr = [0] * width, [0.0] * width
+        for start, end, amount in zip(intervals.start.tolist(),
+                intervals.end.tolist(), intervals.mrr.tolist()):
+            for month in range(max(start - first, 0),
+                               min(end - first, width)):
+                active[month] += 1
+                mrr[month] += amount
+        return active, mrr
+
+    def _time(self, function, repeat):
+        latencies = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            result = function()
+            latencies.append((time.perf_counter() - started) * 1000)
+        return statistics.median(latencies), result
+
+    def handle(self, *args, **options):
+        random = numpy.random.default_rng(options['seed'])
+        last = subscriptions.month_number(timezone.localdate())
+        first = last - options['months'] + 1
+
+        for size in [int(s) for s in options['sizes'].split(',')]:
+            intervals = self._intervals(size, last, random)
+            vectorized, result = self._time(
+                lambda: subscriptions.compute(intervals, first, last),
+                options['repeat'])
+            line = "{0} subscriptions: {1:.1f}ms vectorized".format(size,
+                vectorized)
+            if size <= options['loop_max']:
+                looped, (active, mrr) = self._time(
+                    lambda: self._loop(intervals, first, last), 1)
+                assert list(result["active"]) == active
+                assert numpy.allclose(result["mrr"], mrr)
+                line += ", {0:.1f}ms looping in Python".format(looped)
+            self.stdout.write(line)
+
+        if options['load']:
+            try:
+                with transaction.atomic():
+                    self._load(options['load'], options['months'])
+                    raise Rollback
+            except Rollback:
+                pass
+
+    def _load(self, size, months):
+        customer = StripeCustomer.objects.create(
+            id="cus_metrics_benchmark", livemode=False)
+        plan = Plan.objects.create(id="plan_metrics_benchmark", active=True,
+            amount=29, currency="usd", interval="month", interval_count=1,
+            livemode=False)
+        now = timezone.now()
+        for offset in range(0, size, BATCH_SIZE * 20):
+            Subscription.objects.bulk_create([
+                Subscription(id="sub_metrics_benchmark_{0}".format(n),
+                    customer=customer, plan=plan, quantity=1,
+                    status="active", livemode=False,
+                    cancel_at_period_end=False,
+                    start_date=now - datetime.timedelta(days=n % 1000),
+                    ended_at=now - datetime.timedelta(days=n % 300)
+                        if n % 3 == 0 else None,
+                    current_period_start=now, current_period_end=now)
+                for n in range(offset, min(offset + BATCH_SIZE * 20, size))],
+                batch_size=BATCH_SIZE)
+
+        loaded, _ = self._time(subscriptions.load, 3)
+        total, _ = self._time(lambda: subscriptions.metrics(months=months),
+            3)
+        self.stdout.write("{0} subscriptions in the database: read in "
+            "{1:.0f}ms, metrics in {2:.0f}ms".format(size, loaded, total))
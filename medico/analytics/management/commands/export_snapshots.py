@@ -0,0 +1,37 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from medico.analytics import snapshots
+
+
+class Command(BaseCommand):
+    help = ("Appends the users, customers, providers, checkouts and "
+            "payments changed since the last run to partitioned Parquet "
+            "files for analytics. Needs pyarrow.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--output', default=settings.ANALYTICS_SNAPSHOT_DIR,
+            help="Directory to write to; ANALYTICS_SNAPSHOT_DIR by default.")
+        parser.add_argument('--tables',
+            help="Comma separated tables to snapshot, out of {0}; all of "
+                 "them by default.".format(", ".join(
+                     snapshots.TABLES_BY_NAME)))
+        parser.add_argument('--database', default='default',
+            help="Database to read from, such as a replica's alias.")
+        parser.add_argument('--chunk-size', type=int)
+
+    def handle(self, *args, **options):
+        tables = None
+        if options['tables']:
+            try:
+                tables = [snapshots.TABLES_BY_NAME[name.strip()]
+                          for name in options['tables'].split(',')]
+            except KeyError as e:
+                raise CommandError("Unknown table {0}.".format(e))
+
+        try:
+            for name, count in snapshots.run(options['output'], tables,
+                    options['database'], options['chunk_size']):
+                self.stdout.write("{0}: {1} rows".format(name, count))
+        except snapshots.SnapshotError as e:
+            raise CommandError(str(e))
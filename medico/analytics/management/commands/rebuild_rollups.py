@@ -0,0 +1,35 @@
+import argparse
+
+from django.core.management.base import BaseCommand
+from django.utils.dateparse import parse_date
+
+from medico.analytics import rollups
+
+
+def day(value):
+    try:
+        parsed = parse_date(value)
+    except ValueError:
+        parsed = None
+    if parsed is None:
+        raise argparse.ArgumentTypeError("expected YYYY-MM-DD")
+    return parsed
+
+
+class Command(BaseCommand):
+    help = ("Recomputes the daily checkout and revenue rollups from the "
+            "checkouts and payment intents, for backfills and for rows "
+            "written without signals. Checkouts saved while it runs may be "
+            "counted twice, so run it when traffic is low.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--since', type=day,
+            help="First day, as YYYY-MM-DD.")
+        parser.add_argument('--until', type=day,
+            help="Last day, as YYYY-MM-DD.")
+
+    def handle(self, *args, **options):
+        checkouts, revenue = rollups.rebuild(options['since'],
+            options['until'])
+        self.stdout.write("{0} checkout rollups, {1} revenue rollups".format(
+            checkouts, revenue))
@@ -0,0 +1,49 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from medico.analytics import subscriptions
+
+
+def percent(value):
+    return "-" if value is None else "{0:.1f}%".format(value * 100)
+
+
+class Command(BaseCommand):
+    help = ("Prints the monthly recurring revenue, churn and cohort "
+            "retention of subscriptions over the last --months months.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--months', default="")
+        parser.add_argument('--currency', default="usd")
+        parser.add_argument('--json', action='store_true',
+            help="Print the metrics as JSON instead of tables.")
+
+    def handle(self, *args, **options):
+        try:
+            months = subscriptions.parse_months(options)
+            currency = subscriptions.parse_currency(options)
+        except subscriptions.MetricsError as e:
+            raise CommandError(str(e))
+
+        data = subscriptions.metrics(currency, months)
+        if options['json']:
+            self.stdout.write(json.dumps(data, indent=2))
+            return
+
+        self.stdout.write("{0:<8} {1:>8} {2:>14} {3:>6} {4:>8} {5:>7} "
+            "{6:>10}".format("Month", "Active", "MRR (" + currency + ")",
+                "New", "Churned", "Churn", "MRR churn"))
+        for n, month in enumerate(data["months"]):
+            self.stdout.write("{0:<8} {1:>8} {2:>14.2f} {3:>6} {4:>8} "
+                "{5:>7} {6:>10}".format(month, data["active"][n],
+                    data["mrr"][n] / 100, data["new"][n],
+                    data["churned"][n], percent(data["churn"][n]),
+                    percent(data["mrr_churn"][n])))
+
+        self.stdout.write("\nRetention by cohort, months after the first:")
+        for month, cohort in zip(data["months"], data["cohorts"]):
+            if cohort["size"]:
+                self.stdout.write("{0:<8} {1:>6}  {2}".format(month,
+                    cohort["size"], " ".join(percent(value) for value
+                        in cohort["retention"] if value is not None)))
@@ -0,0 +1,41 @@
+# Generated by Django 3.0.12 on 2026-10-19 12:45
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CheckoutRollup',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('plan', models.CharField(blank=True, max_length=255)),
+                ('checkouts', models.IntegerField(default=0)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='RevenueRollup',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('currency', models.CharField(max_length=3)),
+                ('payments', models.IntegerField(default=0)),
+                ('revenue', models.BigIntegerField(default=0)),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='revenuerollup',
+            constraint=models.UniqueConstraint(fields=('day', 'currency'), name='revenue_rollup_key'),
+        ),
+        migrations.AddConstraint(
+            model_name='checkoutrollup',
+            constraint=models.UniqueConstraint(fields=('day', 'plan'), name='checkout_rollup_key'),
+        ),
+    ]
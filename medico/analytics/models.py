@@ -0,0 +1,45 @@
+from django.db import models
+
+
+class CheckoutRollup(models.Model):
+    """
+    The number of checkouts started per day and plan. Kept up to date as
+    checkouts are saved, see medico.analytics.rollups.
+    """
+    day = models.DateField()
+    # The Stripe price of the subscription started, blank for one-time
+    # checkouts.
+    plan = models.CharField(max_length=255, blank=True)
+    checkouts = models.IntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['day', 'plan'],
+                name='checkout_rollup_key'),
+        ]
+
+    def __str__(self):
+        return "{0} {1}: {2} checkouts".format(self.day,
+            self.plan or "one-time", self.checkouts)
+
+
+class RevenueRollup(models.Model):
+    """
+    Succeeded payments and the amount received per day and currency. Kept
+    up to date as payment intents are synced from Stripe.
+    """
+    day = models.DateField()
+    currency = models.CharField(max_length=3)
+    payments = models.IntegerField(default=0)
+    # In the smallest unit of the currency, as Stripe reports amounts.
+    revenue = models.BigIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['day', 'currency'],
+                name='revenue_rollup_key'),
+        ]
+
+    def __str__(self):
+        return "{0} {1}: {2} payments".format(self.day, self.currency,
+            self.payments)
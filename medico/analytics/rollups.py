@@ -0,0 +1,173 @@
+"""
+Daily rollups of checkout volume and revenue, for reporting without
+aggregating over checkouts and payment intents.
+
+The rollups are kept up to date incrementally: every checkout saved or
+deleted, and every payment intent synced from Stripe, adds its difference
+to the row of its day with an `F()` update (see `medico.analytics.signals`).
+Differences are applied once the change commits, so that the row of the
+day, which every checkout of that day updates, is only locked for the
+update itself rather than for the rest of the request.
+
+Rows written without signals, such as by `bulk_create` or
+`QuerySet.update`, are not counted; `manage.py rebuild_rollups`
+recomputes the rollups of a range of days from scratch.
+"""
+import datetime
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Count, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+from djstripe.enums import PaymentIntentStatus
+from djstripe.models import PaymentIntent
+
+import common.constants
+from common.counters import increment
+from medico.analytics.models import CheckoutRollup, RevenueRollup
+from medico.payments.models import CheckoutInformation
+
+
+def checkout_key(checkout):
+    return {"day": timezone.localdate(checkout.created),
+            "plan": checkout.plan}
+
+
+def checkout_counted(checkout, sign):
+    """
+    Counts `checkout` in, or with a `sign` of -1 out of, its rollup once
+    the transaction commits.
+    """
+    key = checkout_key(checkout)
+    transaction.on_commit(lambda: increment(CheckoutRollup, key,
+        checkouts=sign))
+
+
+def intent_contribution(values):
+    """
+    The rollup key of a payment intent and what it adds to the row, given
+    its `status`, `amount_received`, `currency` and `created`, or None for
+    an intent that has not succeeded.
+    """
+    if values is None or values["created"] is None or \
+            values["status"] != PaymentIntentStatus.succeeded:
+        return None
+    return ({"day": timezone.localdate(values["created"]),
+             "currency": values["currency"]},
+            {"payments": 1, "revenue": values["amount_received"] or 0})
+
+
+INTENT_FIELDS = ["status", "amount_received", "currency", "created"]
+
+
+def intent_stored(intent):
+    """
+    What the stored version of `intent` contributes to the rollups, to be
+    read before it is saved over.
+    """
+    if intent.pk is None:
+        return None
+    return intent_contribution(PaymentIntent.objects.filter(pk=intent.pk)
+        .values(*INTENT_FIELDS).first())
+
+
+def intent_changed(before, after):
+    """
+    Moves the contribution of a payment intent from `before` to `after`
+    once the transaction commits. Either may be None.
+    """
+    if before == after:
+        return
+
+    def apply():
+        if before:
+            key, deltas = before
+            increment(RevenueRollup, key,
+                **{name: -delta for name, delta in deltas.items()})
+        if after:
+            key, deltas = after
+            increment(RevenueRollup, key, **deltas)
+
+    transaction.on_commit(apply)
+
+
+def intent_values(intent):
+    return {name: getattr(intent, name) for name in INTENT_FIELDS}
+
+
+def _day_range(queryset, field, since, until):
+    if since:
+        queryset = queryset.filter(**{field + "__gte": timezone.make_aware(
+            datetime.datetime.combine(since, datetime.time.min))})
+    if until:
+        queryset = queryset.filter(**{field + "__lt": timezone.make_aware(
+            datetime.datetime.combine(until + datetime.timedelta(days=1),
+                                      datetime.time.min))})
+    return queryset
+
+
+def rebuild(since=None, until=None):
+    """
+    Recomputes the rollups of the days from `since` to `until` (both
+    optional) from the checkouts and payment intents. Returns the number of
+    rows of each rollup written.
+    """
+    rollups = [CheckoutRollup.objects.all(), RevenueRollup.objects.all()]
+    if since:
+        rollups = [rows.filter(day__gte=since) for rows in rollups]
+    if until:
+        rollups = [rows.filter(day__lte=until) for rows in rollups]
+
+    checkouts = _day_range(CheckoutInformation.objects.all(), "created",
+        since, until).annotate(day=TruncDate("created"))\
+        .values("day", "plan").annotate(checkouts=Count("id")).order_by()
+    intents = _day_range(PaymentIntent.objects.filter(
+        status=PaymentIntentStatus.succeeded), "created", since, until)\
+        .annotate(day=TruncDate("created")).values("day", "currency")\
+        .annotate(payments=Count("djstripe_id"),
+                  revenue=Sum("amount_received")).order_by()
+
+    with transaction.atomic():
+        for rows in rollups:
+            rows.delete()
+        checkout_rows = CheckoutRollup.objects.bulk_create(
+            [CheckoutRollup(**row) for row in checkouts], batch_size=500)
+        revenue_rows = RevenueRollup.objects.bulk_create(
+            [RevenueRollup(**row) for row in intents], batch_size=500)
+    return len(checkout_rows), len(revenue_rows)
+
+
+def dashboard(days=None, today=None):
+    """
+    Checkout volume and revenue per day over the last `days` days, newest
+    first, and checkouts per plan over the whole period. Only reads the
+    rollups: two queries, however many checkouts there are.
+    """
+    days = days or common.constants.ANALYTICS_DASHBOARD_DAYS
+    today = today or timezone.localdate()
+    since = today - datetime.timedelta(days=days - 1)
+
+    per_day = {since + datetime.timedelta(days=n): {
+        "one_time": 0, "subscriptions": 0, "payments": 0, "revenue": {}}
+        for n in range(days)}
+    plans = {}
+    for rollup in CheckoutRollup.objects.filter(day__gte=since,
+                                                day__lte=today):
+        row = per_day[rollup.day]
+        row["subscriptions" if rollup.plan else "one_time"] += \
+            rollup.checkouts
+        plans[rollup.plan] = plans.get(rollup.plan, 0) + rollup.checkouts
+    for rollup in RevenueRollup.objects.filter(day__gte=since,
+                                               day__lte=today):
+        row = per_day[rollup.day]
+        row["payments"] += rollup.payments
+        # Checkouts are charged in currencies with two decimals.
+        row["revenue"][rollup.currency] = Decimal(rollup.revenue) / 100
+
+    return {
+        "days": [dict(row, day=day, checkouts=row["one_time"] +
+                      row["subscriptions"])
+                 for day, row in sorted(per_day.items(), reverse=True)],
+        "plans": sorted(plans.items(), key=lambda plan: -plan[1]),
+    }
@@ -0,0 +1,36 @@
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+from djstripe.models import PaymentIntent
+
+from medico.analytics import rollups
+from medico.payments.models import CheckoutInformation
+
+
+@receiver(post_save, sender=CheckoutInformation)
+def checkout_saved(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        rollups.checkout_counted(instance, 1)
+
+
+@receiver(post_delete, sender=CheckoutInformation)
+def checkout_deleted(sender, instance, **kwargs):
+    rollups.checkout_counted(instance, -1)
+
+
+@receiver(pre_save, sender=PaymentIntent)
+def intent_saving(sender, instance, raw=False, **kwargs):
+    if not raw:
+        instance._rollup_before = rollups.intent_stored(instance)
+
+
+@receiver(post_save, sender=PaymentIntent)
+def intent_saved(sender, instance, raw=False, **kwargs):
+    if not raw:
+        rollups.intent_changed(getattr(instance, '_rollup_before', None),
+            rollups.intent_contribution(rollups.intent_values(instance)))
+
+
+@receiver(post_delete, sender=PaymentIntent)
+def intent_deleted(sender, instance, **kwargs):
+    rollups.intent_changed(
+        rollups.intent_contribution(rollups.intent_values(instance)), None)
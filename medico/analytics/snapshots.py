@@ -0,0 +1,276 @@
+"""
+Columnar snapshots of the tables analysts work from, as Parquet files, so
+that analytics queries run against files rather than the live database.
+
+Each table is written under `<directory>/<table>/`, partitioned Hive-style
+by the day its rows last changed (`updated_date=YYYY-MM-DD/`), which Arrow,
+pandas, DuckDB and Spark all read back as a column and can prune on.
+
+Runs are incremental. Tables are read in order of the time rows last
+changed and their id, both indexed, and the last pair read is kept as the
+table's watermark in `<directory>/_watermarks.json`; the next run only
+appends the rows after it. A row that changed again since shows up once
+more, so readers keep the latest version of each id.
+
+Rows are read with `QuerySet.iterator`, a server-side cursor on PostgreSQL,
+and turned into one Arrow record batch per chunk, so memory use does not
+depend on the size of a table. Point the reads at a replica with `using`.
+
+Columns that identify people (names, e-mail addresses, phone numbers,
+dates of birth) and reasons for visit are left out.
+
+pyarrow is only needed here and is not part of the base requirements.
+"""
+import datetime
+import itertools
+import json
+import os
+
+from django.contrib.auth import get_user_model
+from django.db.models import Q
+from django.db.models.functions import ExtractYear
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from djstripe.models import PaymentIntent
+
+import common.constants
+from medico.payments.models import CheckoutInformation
+from medico.users.models import Customer, MedicalProfessional
+
+try:
+    import pyarrow
+    import pyarrow.parquet
+except ImportError:
+    pyarrow = None
+
+WATERMARKS = "_watermarks.json"
+
+
+class SnapshotError(Exception):
+    pass
+
+
+class Table:
+    """
+    A table to snapshot. `columns` are (name, field or expression, type)
+    triples, the type being a key of `arrow_types()`. Changes are read in
+    order of the `watermark` and `key` fields, which should be indexed
+    together.
+    """
+    def __init__(self, name, model, columns, watermark="updated", key="id"):
+        self.name = name
+        self.model = model
+        self.columns = columns
+        self.watermark = watermark
+        self.key = key
+
+    def __repr__(self):
+        return "<Table {0}>".format(self.name)
+
+
+TABLES = [
+    # Without last_login: Django saves it on every login without touching
+    # `updated`, so snapshots could not pick it up.
+    Table("users", get_user_model(), [
+        ("id", "id", "int"),
+        ("date_joined", "date_joined", "timestamp"),
+        ("is_active", "is_active", "bool"),
+        ("is_staff", "is_staff", "bool"),
+        ("gender", "gender", "int"),
+        ("updated", "updated", "timestamp"),
+    ]),
+    Table("customers", Customer, [
+        ("id", "id", "int"),
+        ("user_id", "user_id", "int"),
+        ("birth_year", ExtractYear("dob"), "int"),
+        ("updated", "updated", "timestamp"),
+    ]),
+    Table("providers", MedicalProfessional, [
+        ("id", "id", "int"),
+        ("user_id", "user_id", "int"),
+        ("staff_type", "staff_type", "int"),
+        ("state_of_license", "state_of_license", "string"),
+        ("is_verified", "is_verified", "bool"),
+        ("is_rejected", "is_rejected", "bool"),
+        ("doctor_specialty", "doctor_specialty", "int"),
+        ("other_specialty", "other_specialty", "int"),
+        ("updated", "updated", "timestamp"),
+    ]),
+    Table("checkouts", CheckoutInformation, [
+        ("id", "id", "int"),
+        ("created", "created", "timestamp"),
+        ("state", "state", "string"),
+        ("doctor_specialty", "doctor_specialty", "int"),
+        ("plan", "plan", "string"),
+        ("customer_id", "stripe_customer__id", "string"),
+        ("payment_intent_id", "stripe_payment_intent__id", "string"),
+        ("updated", "updated", "timestamp"),
+    ]),
+    # Amounts are in the smallest unit of the currency, as Stripe reports
+    # them.
+    Table("payments", PaymentIntent, [
+        ("id", "id", "string"),
+        ("customer_id", "customer__id", "string"),
+        ("amount", "amount", "int"),
+        ("amount_received", "amount_received", "int"),
+        ("currency", "currency", "string"),
+        ("status", "status", "string"),
+        ("livemode", "livemode", "bool"),
+        ("created", "created", "timestamp"),
+        ("updated", "djstripe_updated", "timestamp"),
+    ], watermark="djstripe_updated", key="djstripe_id"),
+]
+
+TABLES_BY_NAME = {table.name: table for table in TABLES}
+
+
+def arrow_types():
+    return {
+        "int": pyarrow.int64(),
+        "string": pyarrow.string(),
+        "bool": pyarrow.bool_(),
+        "timestamp": pyarrow.timestamp("us", tz="UTC"),
+    }
+
+
+def schema(table):
+    types = arrow_types()
+    return pyarrow.schema([(name, types[type_name])
+                           for name, _, type_name in table.columns])
+
+
+def changes(table, since=None, until=None, using="default"):
+    """
+    The rows of `table` changed after the watermark `since`, an (updated,
+    key) pair, and before `until`, oldest change first. Each row starts
+    with its watermark, followed by the table's columns.
+    """
+    queryset = table.model._default_manager.using(using)
+    if since:
+        updated, key = since
+        # The leading bound lets the database seek straight to `updated` in
+        # the (watermark, key) index, which the OR alone would not.
+        queryset = queryset.filter(
+            Q(**{table.watermark + "__gt": updated}) |
+            Q(**{table.watermark: updated, table.key + "__gt": key}),
+            **{table.watermark + "__gte": updated})
+    if until:
+        queryset = queryset.filter(**{table.watermark + "__lt": until})
+    return queryset.order_by(table.watermark, table.key).values_list(
+        table.watermark, table.key,
+        *[expression for _, expression, _ in table.columns])
+
+
+def record_batch(rows, arrow_schema):
+    """
+    Builds an Arrow record batch from rows as returned by `changes`.
+    """
+    columns = zip(*(row[2:] for row in rows))
+    return pyarrow.RecordBatch.from_arrays(
+        [pyarrow.array(values, type=field.type)
+         for values, field in zip(columns, arrow_schema)],
+        schema=arrow_schema)
+
+
+def _day(value):
+    return value.astimezone(datetime.timezone.utc).date()
+
+
+def partition(directory, table, day, run):
+    return os.path.join(directory, table.name,
+        "updated_date={0}".format(day.isoformat()),
+        "part-{0}.parquet".format(run))
+
+
+def snapshot(table, directory, run, since=None, until=None, using="default",
+             chunk_size=None):
+    """
+    Appends the rows of `table` changed between the watermark `since` and
+    `until` to one Parquet file per day of change, named after `run`.
+    Files only appear once complete. Returns the number of rows written and
+    the new watermark, which is `since` when nothing changed.
+    """
+    chunk_size = chunk_size or common.constants.SNAPSHOT_CHUNK_SIZE
+    arrow_schema = schema(table)
+    rows = changes(table, since, until, using).iterator(chunk_size=chunk_size)
+    paths, writer, day, count, watermark = [], None, None, 0, since
+
+    try:
+        while True:
+            chunk = list(itertools.islice(rows, chunk_size))
+            if not chunk:
+                break
+            # Rows come in order of change, so each day's rows are
+            # contiguous and only one file is open at a time.
+            for row_day, day_rows in itertools.groupby(
+                    chunk, key=lambda row: _day(row[0])):
+                if row_day != day:
+                    if writer:
+                        writer.close()
+                    day = row_day
+                    paths.append(partition(directory, table, day, run))
+                    os.makedirs(os.path.dirname(paths[-1]), exist_ok=True)
+                    writer = pyarrow.parquet.ParquetWriter(
+                        paths[-1] + ".tmp", arrow_schema)
+                writer.write_batch(record_batch(list(day_rows),
+                                                arrow_schema))
+            count += len(chunk)
+            watermark = tuple(chunk[-1][:2])
+        if writer:
+            writer.close()
+    except BaseException:
+        if writer:
+            writer.close()
+        for path in paths:
+            if os.path.exists(path + ".tmp"):
+                os.remove(path + ".tmp")
+        raise
+
+    for path in paths:
+        os.replace(path + ".tmp", path)
+    return count, watermark
+
+
+def read_watermarks(directory):
+    try:
+        with open(os.path.join(directory, WATERMARKS)) as f:
+            stored = json.load(f)
+    except FileNotFoundError:
+        return {}
+    return {name: (parse_datetime(value["updated"]), value["key"])
+            for name, value in stored.items()}
+
+
+def write_watermarks(directory, watermarks):
+    path = os.path.join(directory, WATERMARKS)
+    with open(path + ".tmp", "w") as f:
+        json.dump({name: {"updated": updated.isoformat(), "key": key}
+                   for name, (updated, key) in watermarks.items()},
+                  f, indent=2, sort_keys=True)
+    os.replace(path + ".tmp", path)
+
+
+def run(directory, tables=None, using="default", chunk_size=None):
+    """
+    Snapshots `tables` (all of them by default) into `directory`, saving
+    each table's watermark as soon as its files are written. Yields the
+    name of each table and the number of rows written.
+    """
+    if pyarrow is None:
+        raise SnapshotError("Snapshots need pyarrow, which is not "
+            "installed: pip install pyarrow.")
+
+    now = timezone.now()
+    run_id = now.strftime("%Y%m%dT%H%M%S%fZ")
+    until = now - datetime.timedelta(
+        seconds=common.constants.SNAPSHOT_SETTLE_SECONDS)
+    os.makedirs(directory, exist_ok=True)
+    watermarks = read_watermarks(directory)
+
+    for table in tables or TABLES:
+        count, watermark = snapshot(table, directory, run_id,
+            watermarks.get(table.name), until, using, chunk_size)
+        if count:
+            watermarks[table.name] = watermark
+            write_watermarks(directory, watermarks)
+        yield table.name, count
@@ -0,0 +1,224 @@
+"""
+Monthly recurring revenue, churn and cohort retention of subscriptions.
+
+Subscriptions are read in one query as columns of month numbers (months
+since year 0) and monthly amounts, and everything else is computed on
+NumPy arrays, without a loop over subscriptions in Python. A subscription
+counts as active at the end of every month from the one its first paid
+period started in (after any trial) up to, but not including, the one it
+ended in. Over a window of months, each series is then the running sum of
+what subscriptions add in the month they start and take away in the month
+they end: two `bincount`s and a `cumsum`, whatever the number of
+subscriptions.
+
+Churn is the share of the subscriptions, or of the MRR, active at the end
+of the previous month that ended during the month. Cohorts group
+subscriptions by the month they started; the retention matrix holds the
+share of each cohort still active at the end of each month after.
+Subscriptions that never started (incomplete ones) and multi-plan
+subscriptions are left out.
+"""
+import datetime
+
+import numpy
+from django.db.models import F, Value
+from django.db.models.functions import (
+    Coalesce,
+    ExtractMonth,
+    ExtractYear,
+    Greatest,
+)
+from django.utils import timezone
+from djstripe.enums import PlanInterval, SubscriptionStatus
+from djstripe.models import Subscription
+
+import common.constants
+
+# Months per billing interval.
+INTERVAL_MONTHS = {
+    PlanInterval.day: 12 / 365,
+    PlanInterval.week: 12 / 52,
+    PlanInterval.month: 1,
+    PlanInterval.year: 12,
+}
+
+# The end month of subscriptions that have not ended.
+NO_END = 10 ** 6
+
+
+class MetricsError(ValueError):
+    pass
+
+
+def parse_months(params):
+    months = params.get("months")
+    if months in (None, ""):
+        return common.constants.SUBSCRIPTION_METRICS_MONTHS
+    try:
+        months = int(months)
+    except ValueError:
+        raise MetricsError("Invalid value for months.")
+    if not 0 < months <= common.constants.SUBSCRIPTION_METRICS_MAX_MONTHS:
+        raise MetricsError("Invalid value for months.")
+    return months
+
+
+def parse_currency(params):
+    currency = (params.get("currency") or "usd").lower()
+    if len(currency) != 3 or not currency.isalpha():
+        raise MetricsError("Invalid value for currency.")
+    return currency
+
+
+def month_number(day):
+    return day.year * 12 + day.month - 1
+
+
+def month_start(number):
+    return datetime.date(number // 12, number % 12 + 1, 1)
+
+
+def _month_of(expression):
+    return ExtractYear(expression) * 12 + ExtractMonth(expression) - 1
+
+
+class Intervals:
+    """
+    Subscriptions as columns: the month each started and ended in (NO_END
+    if it has not) and its recurring revenue per month, in cents.
+    """
+    def __init__(self, start, end, mrr):
+        self.start = numpy.asarray(start, dtype=numpy.int64)
+        self.end = numpy.asarray(end, dtype=numpy.int64)
+        self.mrr = numpy.asarray(mrr, dtype=numpy.float64)
+
+    def __len__(self):
+        return len(self.start)
+
+
+def load(currency="usd", using="default"):
+    """
+    Reads the Intervals of the subscriptions billed in `currency` in a
+    single query, leaving the month arithmetic to the database.
+    """
+    started = Coalesce("start_date", "created")
+    subscriptions = Subscription.objects.using(using)\
+        .filter(plan__isnull=False, plan__currency=currency)\
+        .exclude(status__in=[SubscriptionStatus.incomplete,
+                             SubscriptionStatus.incomplete_expired])
+    rows = list(subscriptions.values_list(
+        _month_of(Greatest(started, Coalesce("trial_end", started))),
+        Coalesce(_month_of("ended_at"), Value(NO_END)),
+        Coalesce("quantity", Value(1)), F("plan__amount"), "plan__interval",
+        Coalesce("plan__interval_count", Value(1))).order_by())
+
+    start, end, quantity, amount, interval, count = \
+        zip(*rows) if rows else ([],) * 6
+    interval = numpy.array(interval, dtype=object)
+    months = numpy.ones(len(interval))
+    for name, length in INTERVAL_MONTHS.items():
+        months[interval == name] = length
+    # Plan amounts are in currency units.
+    mrr = numpy.array(amount, dtype=numpy.float64) * 100 * \
+        numpy.array(quantity, dtype=numpy.float64) / \
+        (months * numpy.array(count, dtype=numpy.float64))
+    return Intervals(start, end, numpy.nan_to_num(mrr))
+
+
+def compute(intervals, first, last):
+    """
+    MRR, churn and cohort retention for the months numbered `first` to
+    `last`, as arrays indexed by month from `first`.
+    """
+    width = last - first + 1
+    # Positions in the window; subscriptions that started before it count
+    # from its first month and those still going to its end.
+    start = numpy.clip(intervals.start - first, 0, width)
+    end = numpy.clip(intervals.end - first, 0, width)
+    alive = start < end
+
+    def running(weights=None):
+        return numpy.cumsum(
+            numpy.bincount(start[alive], weights=None if weights is None
+                           else weights[alive], minlength=width + 1) -
+            numpy.bincount(end[alive], weights=None if weights is None
+                           else weights[alive], minlength=width + 1))[:width]
+
+    def per_month(positions, mask, weights=None):
+        return numpy.bincount(positions[mask], minlength=width + 1,
+            weights=None if weights is None else weights[mask])[:width]
+
+    active = running()
+    mrr = running(intervals.mrr)
+    # Subscriptions that started within the window and were still active
+    # at the end of their first month.
+    began = alive & (intervals.start >= first)
+    new = per_month(start, began)
+    new_mrr = per_month(start, began, intervals.mrr)
+    ended = alive & (end < width)
+    churned = per_month(end, ended)
+    churned_mrr = per_month(end, ended, intervals.mrr)
+
+    with numpy.errstate(divide='ignore', invalid='ignore'):
+        churn = numpy.concatenate([[numpy.nan], churned[1:] / active[:-1]])
+        mrr_churn = numpy.concatenate([[numpy.nan],
+                                       churned_mrr[1:] / mrr[:-1]])
+
+    # Cohorts: how many months past its first each subscription lasted,
+    # counted per cohort, then summed from the longest down so that each
+    # cell holds those that lasted at least that long.
+    joined = (intervals.start >= first) & (intervals.start <= last)
+    cohort = intervals.start[joined] - first
+    lasted = numpy.minimum(intervals.end[joined], last + 1) - \
+        intervals.start[joined]
+    lasted = numpy.clip(lasted, 0, width)
+    counts = numpy.bincount(cohort * (width + 1) + lasted,
+        minlength=width * (width + 1)).reshape(width, width + 1)
+    sizes = counts.sum(axis=1)
+    surviving = numpy.cumsum(counts[:, ::-1], axis=1)[:, ::-1][:, 1:]
+    with numpy.errstate(divide='ignore', invalid='ignore'):
+        retention = surviving / sizes[:, None]
+    # Months after `last` have not happened yet.
+    offsets = numpy.arange(width)
+    retention[offsets[:, None] + offsets[None, :] >= width] = numpy.nan
+
+    return {
+        "active": active, "mrr": mrr, "new": new, "new_mrr": new_mrr,
+        "churned": churned, "churned_mrr": churned_mrr, "churn": churn,
+        "mrr_churn": mrr_churn, "cohort_sizes": sizes, "retention": retention,
+    }
+
+
+def _numbers(values, digits=None):
+    return [None if numpy.isnan(value) else
+            (round(float(value), digits) if digits else int(round(value)))
+            for value in values]
+
+
+def metrics(currency="usd", months=None, today=None, using="default"):
+    """
+    The metrics of the subscriptions billed in `currency` over the last
+    `months` months, the current one included, ready to serialize. Amounts
+    are in cents and rates between 0 and 1.
+    """
+    months = months or common.constants.SUBSCRIPTION_METRICS_MONTHS
+    last = month_number(today or timezone.localdate())
+    first = last - months + 1
+    result = compute(load(currency, using), first, last)
+
+    return {
+        "currency": currency,
+        "months": [month_start(number).strftime("%Y-%m")
+                   for number in range(first, last + 1)],
+        "active": _numbers(result["active"]),
+        "mrr": _numbers(result["mrr"]),
+        "new": _numbers(result["new"]),
+        "new_mrr": _numbers(result["new_mrr"]),
+        "churned": _numbers(result["churned"]),
+        "churned_mrr": _numbers(result["churned_mrr"]),
+        "churn": _numbers(result["churn"], 4),
+        "mrr_churn": _numbers(result["mrr_churn"], 4),
+        "cohorts": [{"size": size, "retention": _numbers(row, 4)}
+                    for size, row in zip(_numbers(result["cohort_sizes"]),
+                                         result["retention"])],
+    }
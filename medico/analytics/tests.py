@@ -0,0 +1,298 @@
+import datetime
+import io
+
+import numpy
+import pytest
+from django.core.cache import cache
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.utils import timezone
+from djstripe.models import (
+    Customer as StripeCustomer,
+    PaymentIntent,
+    Plan,
+    Subscription,
+)
+
+from django.urls import reverse
+
+from medico.analytics import rollups, snapshots, subscriptions
+from medico.analytics.models import CheckoutRollup, RevenueRollup
+from medico.payments.models import CheckoutInformation
+
+try:
+    import pyarrow.parquet
+except ImportError:
+    pyarrow = None
+
+pytestmark = pytest.mark.django_db
+
+
+def aware(*args):
+    return timezone.make_aware(datetime.datetime(*args))
+
+
+def payment_intent(**kwargs):
+    return PaymentIntent.objects.create(**dict({"id": "pi_test",
+        "amount": 5000, "amount_capturable": 0, "amount_received": 5000,
+        "currency": "usd", "capture_method": "automatic",
+        "confirmation_method": "automatic", "payment_method_types": ["card"],
+        "status": "succeeded", "livemode": False}, **kwargs))
+
+
+@pytest.mark.skipif(pyarrow is None, reason="pyarrow is not installed")
+class TestSnapshots:
+
+    @pytest.fixture
+    def checkouts(self):
+        checkouts = [CheckoutInformation.objects.create(state=state)
+                     for state in ("CA", "NY", "TX")]
+        # Changes are only picked up once settled.
+        for checkout, updated in zip(checkouts, [aware(2021, 3, 1, 12),
+                aware(2021, 3, 1, 12), aware(2021, 3, 2, 8)]):
+            CheckoutInformation.objects.filter(id=checkout.id)\
+                .update(updated=updated)
+        return checkouts
+
+    def read(self, path):
+        return pyarrow.parquet.read_table(str(path)).to_pydict()
+
+    def test_partitioned_by_day(self, checkouts, tmp_path):
+        call_command("export_snapshots", output=str(tmp_path),
+            tables="checkouts", chunk_size=2)
+
+        assert sorted(p.name for p in (tmp_path / "checkouts").iterdir()) \
+            == ["updated_date=2021-03-01", "updated_date=2021-03-02"]
+        rows = self.read(tmp_path / "checkouts")
+        assert sorted(rows["id"]) == [checkout.id for checkout in checkouts]
+        assert sorted(rows["state"]) == ["CA", "NY", "TX"]
+        assert not list(tmp_path.glob("**/*.tmp"))
+
+    def test_appends_changes_only(self, checkouts, tmp_path):
+        call_command("export_snapshots", output=str(tmp_path),
+            tables="checkouts")
+        CheckoutInformation.objects.filter(id=checkouts[0].id)\
+            .update(state="WA", updated=aware(2021, 3, 3))
+        # Too recent to be picked up yet.
+        CheckoutInformation.objects.create(state="OR")
+
+        call_command("export_snapshots", output=str(tmp_path),
+            tables="checkouts")
+
+        rows = self.read(tmp_path / "checkouts" / "updated_date=2021-03-03")
+        assert (rows["id"], rows["state"]) == ([checkouts[0].id], ["WA"])
+        assert len(self.read(tmp_path / "checkouts")["id"]) == 4
+        assert snapshots.read_watermarks(str(tmp_path))["checkouts"] == \
+            (aware(2021, 3, 3), checkouts[0].id)
+
+    def test_tables(self, user, tmp_path):
+        user.__class__.objects.filter(id=user.id)\
+            .update(updated=aware(2021, 3, 1))
+        payment_intent()
+        PaymentIntent.objects.update(djstripe_updated=aware(2021, 3, 1))
+
+        call_command("export_snapshots", output=str(tmp_path))
+
+        rows = self.read(tmp_path / "users")
+        assert rows["id"] == [user.id]
+        assert "email" not in rows
+        payments = self.read(tmp_path / "payments")
+        assert (payments["id"], payments["amount"]) == (["pi_test"], [5000])
+        assert set(snapshots.read_watermarks(str(tmp_path))) == \
+            {"users", "payments"}
+
+    def test_unknown_table(self, tmp_path):
+        with pytest.raises(CommandError):
+            call_command("export_snapshots", output=str(tmp_path),
+                tables="passwords")
+
+    def test_without_pyarrow(self, monkeypatch, tmp_path):
+        monkeypatch.setattr(snapshots, "pyarrow", None)
+
+        with pytest.raises(CommandError):
+            call_command("export_snapshots", output=str(tmp_path))
+
+
+@pytest.mark.django_db(transaction=True)
+class TestRollups:
+
+    def checkouts(self):
+        return {(rollup.day, rollup.plan): rollup.checkouts
+                for rollup in CheckoutRollup.objects.all()}
+
+    def test_checkouts(self):
+        day = aware(2021, 3, 1, 12)
+        CheckoutInformation.objects.create(state="CA", created=day)
+        CheckoutInformation.objects.create(state="CA", created=day,
+            plan="price_monthly")
+        deleted = CheckoutInformation.objects.create(state="NY",
+            created=day)
+        deleted.save()
+        assert self.checkouts() == {(day.date(), ""): 2,
+                                    (day.date(), "price_monthly"): 1}
+
+        deleted.delete()
+
+        assert self.checkouts()[(day.date(), "")] == 1
+
+    def test_revenue_follows_status(self):
+        intent = payment_intent(status="processing", amount_received=0,
+            created=aware(2021, 3, 1, 12))
+        assert not RevenueRollup.objects.exists()
+
+        intent.status, intent.amount_received = "succeeded", 5000
+        intent.save()
+        # Syncing the same intent again changes nothing.
+        intent.save()
+
+        rollup = RevenueRollup.objects.get()
+        assert (rollup.day, rollup.currency, rollup.payments,
+                rollup.revenue) == (datetime.date(2021, 3, 1), "usd", 1, 5000)
+
+    def test_rebuild(self):
+        CheckoutInformation.objects.bulk_create([
+            CheckoutInformation(state="CA", created=aware(2021, 3, 1)),
+            CheckoutInformation(state="CA", created=aware(2021, 3, 2)),
+            CheckoutInformation(state="CA", created=aware(2021, 3, 2),
+                                plan="price_monthly"),
+        ])
+        CheckoutRollup.objects.create(day=datetime.date(2021, 3, 1),
+            checkouts=7)
+
+        call_command("rebuild_rollups", "--since", "2021-03-02")
+
+        assert self.checkouts() == {
+            (datetime.date(2021, 3, 1), ""): 7,
+            (datetime.date(2021, 3, 2), ""): 1,
+            (datetime.date(2021, 3, 2), "price_monthly"): 1,
+        }
+
+    def test_dashboard(self, admin_client, django_assert_num_queries):
+        today = timezone.localdate()
+        for _ in range(3):
+            CheckoutInformation.objects.create(state="CA")
+        payment_intent(created=timezone.now())
+
+        with django_assert_num_queries(2):
+            data = rollups.dashboard(days=7)
+        assert len(data["days"]) == 7
+        assert data["days"][0]["day"] == today
+        assert (data["days"][0]["checkouts"], data["days"][0]["payments"]) \
+            == (3, 1)
+        assert data["plans"] == [("", 3)]
+
+        response = admin_client.get(reverse("analytics:dashboard"))
+        assert b"50.00 USD" in response.content
+
+    def test_staff_only(self, client, user):
+        client.force_login(user)
+
+        response = client.get(reverse("analytics:dashboard"))
+
+        assert response.status_code == 403
+
+
+class TestSubscriptionMetrics:
+
+    @pytest.fixture(autouse=True)
+    def clear_cache(self):
+        cache.clear()
+
+    @pytest.fixture
+    def customer(self):
+        return StripeCustomer.objects.create(id="cus_test", livemode=False)
+
+    def plan(self, id, amount, interval="month"):
+        return Plan.objects.create(id=id, active=True, amount=amount,
+            currency="usd", interval=interval, interval_count=1,
+            livemode=False)
+
+    def subscribe(self, customer, plan, start, ended=None, **kwargs):
+        return Subscription.objects.create(**dict({
+            "id": "sub_{0}".format(Subscription.objects.count()),
+            "customer": customer, "plan": plan, "quantity": 1,
+            "status": "canceled" if ended else "active",
+            "start_date": start, "ended_at": ended, "livemode": False,
+            "cancel_at_period_end": False, "current_period_start": start,
+            "current_period_end": start}, **kwargs))
+
+    def test_compute(self):
+        month = subscriptions.month_number(datetime.date(2021, 1, 1))
+        intervals = subscriptions.Intervals(
+            start=[month + 2, month + 3, month - 3, month + 4],
+            end=[month + 5, subscriptions.NO_END, month + 4, month + 4],
+            mrr=[1000, 2000, 500, 700])
+
+        result = subscriptions.compute(intervals, month, month + 6)
+
+        assert list(result["active"]) == [1, 1, 2, 3, 2, 1, 1]
+        assert list(result["mrr"]) == \
+            [500, 500, 1500, 3500, 3000, 2000, 2000]
+        assert list(result["new"]) == [0, 0, 1, 1, 0, 0, 0]
+        assert list(result["churned"]) == [0, 0, 0, 0, 1, 1, 0]
+        assert result["churn"][4] == pytest.approx(1 / 3)
+        assert result["mrr_churn"][4] == pytest.approx(500 / 3500)
+        # Started in the third month and ended in the sixth.
+        assert list(result["retention"][2][:5]) == [1, 1, 1, 0, 0]
+        assert numpy.isnan(result["retention"][2][5])
+
+    def test_metrics(self, customer):
+        monthly = self.plan("plan_monthly", 29)
+        yearly = self.plan("plan_yearly", 120, interval="year")
+        self.subscribe(customer, monthly, aware(2021, 1, 10), quantity=2)
+        self.subscribe(customer, yearly, aware(2021, 2, 1),
+            ended=aware(2021, 4, 20))
+        # Paid from the end of its trial.
+        self.subscribe(customer, monthly, aware(2021, 2, 1),
+            trial_end=aware(2021, 3, 1))
+        self.subscribe(customer, monthly, aware(2021, 2, 1),
+            status="incomplete_expired")
+
+        data = subscriptions.metrics(months=4,
+            today=datetime.date(2021, 4, 30))
+
+        assert data["months"] == ["2021-01", "2021-02", "2021-03", "2021-04"]
+        assert data["active"] == [1, 2, 3, 2]
+        assert data["mrr"] == [5800, 6800, 9700, 8700]
+        assert data["churn"] == [None, 0, 0, round(1 / 3, 4)]
+        assert [cohort["size"] for cohort in data["cohorts"]] == [1, 1, 1, 0]
+        assert data["cohorts"][1]["retention"] == [1, 1, 0, None]
+
+    def test_view(self, admin_client, customer, monkeypatch):
+        self.subscribe(customer, self.plan("plan_monthly", 29),
+            timezone.now())
+        computed = []
+        metrics = subscriptions.metrics
+        monkeypatch.setattr(subscriptions, "metrics",
+            lambda *args: computed.append(args) or metrics(*args))
+
+        first = admin_client.get(reverse("analytics:subscriptions"),
+            {"months": 3}).json()
+        second = admin_client.get(reverse("analytics:subscriptions"),
+            {"months": 3}).json()
+
+        assert first == second
+        assert first["mrr"][-1] == 2900
+        assert len(computed) == 1
+
+    def test_command(self, customer):
+        self.subscribe(customer, self.plan("plan_monthly", 29),
+            timezone.now())
+        out = io.StringIO()
+
+        call_command("subscription_metrics", "--months", "2", stdout=out)
+
+        assert "29.00" in out.getvalue()
+
+    def test_invalid_months(self, admin_client):
+        response = admin_client.get(reverse("analytics:subscriptions"),
+            {"months": 1000})
+
+        assert response.status_code == 400
+
+    def test_staff_only(self, client, user):
+        client.force_login(user)
+
+        response = client.get(reverse("analytics:subscriptions"))
+
+        assert response.status_code == 403
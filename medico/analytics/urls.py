@@ -0,0 +1,10 @@
+from django.urls import path
+
+from medico.analytics.views import dashboard, subscription_metrics
+
+app_name = "analytics"
+urlpatterns = [
+    path("", view=dashboard, name="dashboard"),
+    path("subscriptions/", view=subscription_metrics,
+        name="subscriptions"),
+]
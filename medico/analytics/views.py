@@ -0,0 +1,62 @@
+from django.contrib.auth.decorators import login_required
+from django.core.cache import cache
+from django.core.exceptions import PermissionDenied
+from django.http import HttpResponse, JsonResponse
+from django.shortcuts import render
+from django.utils import timezone
+
+import common.constants
+from medico.analytics import rollups, subscriptions
+
+
+@login_required
+def dashboard(request):
+    """
+    Checkout volume, the split between one-time checkouts and
+    subscriptions, and revenue per day, for staff. Reads the rollups only.
+    """
+    if not request.user.is_staff:
+        raise PermissionDenied
+
+    return render(request, "analytics/dashboard.html",
+        rollups.dashboard())
+
+
+@login_required
+def subscription_metrics(request):
+    """
+    JSON of the monthly recurring revenue, churn and cohort retention of
+    subscriptions, for staff. Takes a number of `months` and a `currency`.
+    Results are cached for SUBSCRIPTION_METRICS_CACHE_TIMEOUT seconds.
+    """
+    if request.method != 'GET':
+        return HttpResponse('Method not allowed')
+
+    if not request.user.is_staff:
+        return JsonResponse({
+            "error": {
+                'message': 'Only staff may see subscription metrics.',
+                'type': 'PermissionError'
+            }
+        }, status=403)
+
+    try:
+        months = subscriptions.parse_months(request.GET)
+        currency = subscriptions.parse_currency(request.GET)
+    except subscriptions.MetricsError as e:
+        return JsonResponse({
+            "error": {
+                'message': str(e),
+                'type': 'RequestError'
+            }
+        }, status=400)
+
+    # A new month starts a new window.
+    key = "analytics:subscriptions:{0}:{1}:{2}".format(currency, months,
+        timezone.localdate().strftime("%Y-%m"))
+    data = cache.get(key)
+    if data is None:
+        data = subscriptions.metrics(currency, months)
+        cache.set(key, data,
+            common.constants.SUBSCRIPTION_METRICS_CACHE_TIMEOUT)
+    return JsonResponse(data)
@@ -1,5 +1,6 @@
 import pytest
 
+import common.rate_limit
 from medico.users.models import User
 from medico.users.tests.factories import UserFactory
 
@@ -9,6 +10,12 @@ def media_storage(settings, tmpdir):
     settings.MEDIA_ROOT = tmpdir.strpath
 
 
+@pytest.fixture(autouse=True)
+def rate_limits():
+    # In-memory rate limit buckets outlive each test otherwise.
+    common.rate_limit.local_buckets.clear()
+
+
 @pytest.fixture
 def user() -> User:
     return UserFactory()
@@ -0,0 +1,31 @@
+from django.contrib import admin
+
+import medico.dispatch.models
+from common.admin import LargeTableAdminMixin
+
+
+@admin.register(medico.dispatch.models.ProviderQueue)
+class ProviderQueueAdmin(admin.ModelAdmin):
+
+    list_display = ["medical_pro", "state_of_license", "accepting", "depth",
+        "capacity"]
+    list_filter = ["accepting", "state_of_license"]
+    list_select_related = ["medical_pro__user"]
+    raw_id_fields = ["medical_pro"]
+    # Maintained by the dispatcher.
+    readonly_fields = ["state_of_license", "doctor_specialty", "depth",
+        "last_assigned"]
+
+
+@admin.register(medico.dispatch.models.Assignment)
+class AssignmentAdmin(LargeTableAdminMixin, admin.ModelAdmin):
+
+    list_display = ["checkout", "customer", "state", "medical_pro", "status",
+        "priority", "created", "assigned_at"]
+    list_filter = ["status", "priority"]
+    list_select_related = ["customer__user", "medical_pro__user",
+        "checkout__stripe_customer"]
+    raw_id_fields = ["checkout", "customer", "medical_pro"]
+    # Changing an assignment here would not update the queue depths.
+    readonly_fields = ["medical_pro", "status", "assigned_at",
+        "completed_at", "triage_score", "triage_terms"]
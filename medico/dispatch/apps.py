@@ -0,0 +1,12 @@
+from django.apps import AppConfig
+
+
+class DispatchConfig(AppConfig):
+    name = "medico.dispatch"
+    verbose_name = "Dispatch"
+
+    def ready(self):
+        try:
+            import medico.dispatch.signals  # noqa F401
+        except ImportError:
+            pass
@@ -0,0 +1,235 @@
+"""
+Assigns paid consultations to medical professionals.
+
+Every checkout creates a waiting Assignment for the patient's state, and
+for a specialty if they asked for one. It goes to the medical professional
+licensed in that state who is accepting patients, is below their capacity
+and has the fewest patients waiting on them (`ProviderQueue.depth`); ties
+go to whoever got a patient least recently. Patients nobody can take yet
+wait until a professional completes a consultation or starts accepting
+patients: those triaged as urgent first (see medico.dispatch.triage),
+then first come first served.
+
+The priority queue of professionals is the ProviderQueue table rather than
+a heap in memory, so that every web and worker process shares it. Its
+partial indexes are ordered by (state, specialty, depth), so finding the
+least loaded professional reads a single index entry. On PostgreSQL both
+waiting patients and professionals are locked with FOR UPDATE SKIP LOCKED,
+so concurrent dispatchers spread over different rows instead of queueing on
+the same lock. Capacity is enforced by a conditional UPDATE, which keeps
+backends without SKIP LOCKED (SQLite in tests) correct as well.
+"""
+import logging
+
+from django.db import DatabaseError, connection, transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+import common.constants
+from medico.dispatch import events, triage
+from medico.dispatch.models import Assignment, ProviderQueue
+from medico.jobs.queue import enqueue
+
+logger = logging.getLogger(__name__)
+
+# How often to look for another professional when the one found was filled
+# up by a concurrent dispatcher.
+RESERVE_ATTEMPTS = 3
+
+
+def _skip_locked(queryset):
+    if connection.features.has_select_for_update_skip_locked:
+        return queryset.select_for_update(skip_locked=True)
+    return queryset
+
+
+def available_providers(state, doctor_specialty=None):
+    """
+    Professionals who can take a patient from `state`, least loaded first.
+    """
+    queryset = ProviderQueue.objects.filter(accepting=True,
+        state_of_license=state, depth__lt=F('capacity'))
+    if doctor_specialty is not None:
+        queryset = queryset.filter(doctor_specialty=doctor_specialty)
+    return queryset.order_by('depth', 'last_assigned', 'medical_pro_id')
+
+
+def _reserve(state, doctor_specialty, now):
+    """
+    Takes a place in the queue of the least loaded professional who can
+    take the patient. Returns their ID, or None if nobody can. Must be
+    called in a transaction.
+    """
+    queryset = _skip_locked(available_providers(state, doctor_specialty))
+    for _ in range(RESERVE_ATTEMPTS):
+        medical_pro_id = queryset.values_list('medical_pro_id', flat=True)\
+            .first()
+        if medical_pro_id is None:
+            return None
+        if ProviderQueue.objects.filter(medical_pro_id=medical_pro_id,
+                accepting=True, depth__lt=F('capacity'))\
+                .update(depth=F('depth') + 1, last_assigned=now):
+            return medical_pro_id
+    return None
+
+
+def _assign(assignment_id, state, doctor_specialty, now):
+    """
+    Gives a waiting assignment to a professional. Returns None if nobody
+    can take it right now, and False if another dispatcher assigned it
+    first.
+    """
+    medical_pro_id = _reserve(state, doctor_specialty, now)
+    if medical_pro_id is None:
+        return None
+
+    if not Assignment.objects.filter(id=assignment_id,
+            status=Assignment.Status.WAITING).update(
+                status=Assignment.Status.ASSIGNED,
+                medical_pro_id=medical_pro_id, assigned_at=now):
+        # Another dispatcher got to it first; give the place back.
+        ProviderQueue.objects.filter(medical_pro_id=medical_pro_id)\
+            .update(depth=F('depth') - 1)
+        return False
+
+    events.publish(medical_pro_id, "assignment", {"id": assignment_id,
+        "status": Assignment.Status.ASSIGNED.label, "assigned_at": now})
+    return True
+
+
+def dispatch_waiting(state=None, batch_size=None):
+    """
+    Assigns waiting patients, urgent ones first and then oldest first,
+    until everyone is assigned or nobody else can be. Returns the number of
+    patients assigned.
+
+    Batches start small and double up to `batch_size`, since dispatching
+    after a completed consultation usually fills a single place.
+    """
+    batch_size = batch_size or common.constants.DISPATCH_BATCH_SIZE
+    waiting = Assignment.objects.filter(status=Assignment.Status.WAITING)\
+        .order_by('-priority', 'created', 'id')
+    if state:
+        waiting = waiting.filter(state=state)
+
+    # (state, specialty) pairs nobody can take; a None specialty means
+    # nobody in that state can take anyone.
+    full = set()
+    full_states = set()
+    assigned = 0
+    last = None
+    size = 1
+    while True:
+        with transaction.atomic():
+            queryset = waiting.exclude(state__in=full_states)
+            if last:
+                queryset = queryset.filter(_after(*last))
+            batch = list(_skip_locked(queryset).values_list('id', 'state',
+                'doctor_specialty', 'priority', 'created')[:size])
+
+            now = timezone.now()
+            for assignment_id, where, doctor_specialty, _, _ in batch:
+                if where in full_states or (where, doctor_specialty) in full:
+                    continue
+                result = _assign(assignment_id, where, doctor_specialty, now)
+                if result is not None:
+                    assigned += result
+                elif doctor_specialty is None:
+                    full_states.add(where)
+                else:
+                    full.add((where, doctor_specialty))
+
+        if len(batch) < size or state in full_states:
+            return assigned
+        assignment_id, _, _, priority, created = batch[-1]
+        last = (priority, created, assignment_id)
+        size = min(size * 2, batch_size)
+
+
+def _after(priority, created, assignment_id):
+    """
+    Waiting assignments behind the given one in line.
+    """
+    return Q(priority__lt=priority) | Q(priority=priority,
+        created__gt=created) | Q(priority=priority, created=created,
+        id__gt=assignment_id)
+
+
+def _dispatch_on_commit(state):
+    def dispatch():
+        try:
+            dispatch_waiting(state)
+        except DatabaseError:
+            logger.exception("Could not dispatch patients in %s", state)
+            enqueue("dispatch.dispatch_waiting", state=state)
+
+    transaction.on_commit(dispatch)
+
+
+def submit(checkout, customer):
+    """
+    Puts a paid checkout in line for a medical professional, ahead of
+    everyone who is not urgent if triage finds its reason for visit urgent.
+    It is dispatched as soon as the surrounding transaction commits.
+    """
+    result = triage.score(checkout.reason_for_visit)
+    assignment = Assignment.objects.create(checkout=checkout,
+        customer=customer, state=checkout.state,
+        doctor_specialty=checkout.doctor_specialty,
+        priority=Assignment.Priority.URGENT if result.urgent else
+            Assignment.Priority.ROUTINE,
+        triage_score=result.score,
+        triage_terms=", ".join(result.terms)[:255])
+    _dispatch_on_commit(assignment.state)
+    return assignment
+
+
+def complete(assignment):
+    """
+    Marks an assigned consultation as done, which frees a place in the
+    professional's queue for the next waiting patient.
+    """
+    with transaction.atomic():
+        if not Assignment.objects.filter(id=assignment.id,
+                status=Assignment.Status.ASSIGNED).update(
+                    status=Assignment.Status.COMPLETED,
+                    completed_at=timezone.now()):
+            return False
+        ProviderQueue.objects.filter(medical_pro_id=assignment.medical_pro_id,
+            depth__gt=0).update(depth=F('depth') - 1)
+        events.publish(assignment.medical_pro_id, "assignment",
+            {"id": assignment.id,
+             "status": Assignment.Status.COMPLETED.label})
+        # The professional is licensed where the patient is.
+        _dispatch_on_commit(assignment.state)
+    return True
+
+
+def set_accepting(medical_pro, accepting, capacity=None):
+    """
+    Starts or stops sending patients to a verified medical professional.
+    """
+    defaults = {"accepting": accepting and medical_pro.is_verified,
+                "state_of_license": medical_pro.state_of_license,
+                "doctor_specialty": medical_pro.doctor_specialty}
+    if capacity is not None:
+        defaults["capacity"] = capacity
+
+    queue, _ = ProviderQueue.objects.update_or_create(
+        medical_pro=medical_pro, defaults=defaults)
+    events.publish(medical_pro.id, "queue", {"accepting": queue.accepting,
+        "capacity": queue.capacity})
+    if queue.accepting:
+        _dispatch_on_commit(queue.state_of_license)
+    return queue
+
+
+def queue_position(assignment):
+    """
+    How many patients are ahead of a waiting assignment in its state.
+    """
+    return Assignment.objects.filter(Q(priority__gt=assignment.priority) |
+        Q(priority=assignment.priority, created__lt=assignment.created) |
+        Q(priority=assignment.priority, created=assignment.created,
+          id__lt=assignment.id),
+        status=Assignment.Status.WAITING, state=assignment.state).count()
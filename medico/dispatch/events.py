@@ -0,0 +1,134 @@
+"""
+Live updates for the provider dashboard, as server-sent events.
+
+The stream is a plain ASGI application mounted next to Django at PATH (see
+config/asgi.py) rather than a view. Django 3.0 runs every view in a
+thread, so a streaming view would pin a thread, and with it a database
+connection, for as long as a dashboard stays open. Here an idle connection
+is a coroutine waiting on a queue: a thread is only borrowed to
+authenticate the request, and events arrive through `common.pubsub`.
+
+Events are hints, not a log: a dashboard that (re)connects loads the
+current queue from `dispatch:queue` and then applies events on top.
+"""
+import asyncio
+import json
+from importlib import import_module
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth import get_user
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import close_old_connections, transaction
+from django.http import HttpRequest
+from django.http.cookie import parse_cookie
+
+import common.constants
+import common.pubsub
+from medico.users.models import MedicalProfessional
+
+PATH = "/dispatch/events/"
+
+
+def provider_channel(medical_pro_id):
+    return "dispatch:provider:{0}".format(medical_pro_id)
+
+
+def publish(medical_pro_id, event, data):
+    """
+    Sends `event` to the dashboards of a medical professional once the
+    current transaction commits.
+    """
+    message = json.dumps({"event": event, "data": data},
+        cls=DjangoJSONEncoder)
+    transaction.on_commit(lambda: common.pubsub.publish(
+        provider_channel(medical_pro_id), message))
+
+
+def format_event(event, data):
+    return "event: {0}\ndata: {1}\n\n".format(event, data).encode()
+
+
+@sync_to_async
+def authenticate(scope):
+    """
+    Returns the ID of the medical professional logged in with the session
+    cookie of the request, or None.
+    """
+    close_old_connections()
+    try:
+        request = HttpRequest()
+        for name, value in scope.get("headers", []):
+            if name == b"cookie":
+                request.COOKIES = parse_cookie(value.decode("latin-1"))
+        engine = import_module(settings.SESSION_ENGINE)
+        request.session = engine.SessionStore(
+            request.COOKIES.get(settings.SESSION_COOKIE_NAME))
+        user = get_user(request)
+        if not user.is_authenticated:
+            return None
+        return MedicalProfessional.objects.filter(user=user)\
+            .values_list('id', flat=True).first()
+    finally:
+        close_old_connections()
+
+
+async def send_response(send, status, body=b""):
+    await send({"type": "http.response.start", "status": status,
+                "headers": [(b"content-type", b"text/plain")]})
+    await send({"type": "http.response.body", "body": body})
+
+
+async def wait_for_disconnect(receive):
+    while (await receive())["type"] != "http.disconnect":
+        pass
+
+
+async def application(scope, receive, send):
+    """
+    Streams the events of the logged in medical professional until the
+    client goes away, with a comment every DISPATCH_EVENTS_HEARTBEAT
+    seconds so that proxies do not close an idle connection.
+    """
+    if scope["method"] != "GET":
+        return await send_response(send, 405, b"Method not allowed")
+    medical_pro_id = await authenticate(scope)
+    if medical_pro_id is None:
+        return await send_response(send, 403, b"Forbidden")
+
+    loop = asyncio.get_event_loop()
+    messages = asyncio.Queue()
+    unsubscribe = common.pubsub.subscribe(provider_channel(medical_pro_id),
+        lambda message: loop.call_soon_threadsafe(messages.put_nowait,
+            message))
+    disconnected = asyncio.ensure_future(wait_for_disconnect(receive))
+    try:
+        await send({"type": "http.response.start", "status": 200,
+            "headers": [(b"content-type", b"text/event-stream"),
+                        (b"cache-control", b"no-cache"),
+                        # Stop nginx from buffering the stream.
+                        (b"x-accel-buffering", b"no")]})
+        await send({"type": "http.response.body", "more_body": True,
+            "body": "retry: {0}\n\n".format(
+                common.constants.DISPATCH_EVENTS_RETRY * 1000).encode()})
+
+        while True:
+            message = asyncio.ensure_future(messages.get())
+            done, _ = await asyncio.wait([message, disconnected],
+                timeout=common.constants.DISPATCH_EVENTS_HEARTBEAT,
+                return_when=asyncio.FIRST_COMPLETED)
+            if disconnected in done:
+                message.cancel()
+                break
+            if message in done:
+                payload = json.loads(message.result())
+                body = format_event(payload["event"],
+                    json.dumps(payload["data"]))
+            else:
+                message.cancel()
+                body = b": heartbeat\n\n"
+            await send({"type": "http.response.body", "body": body,
+                        "more_body": True})
+    finally:
+        unsubscribe()
+        disconnected.cancel()
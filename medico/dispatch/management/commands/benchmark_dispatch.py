@@ -0,0 +1,131 @@
+import random
+import statistics
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from medico.dispatch import dispatcher
+from medico.dispatch.models import Assignment, ProviderQueue
+from medico.payments.models import CheckoutInformation
+from medico.users.models import Customer, MedicalProfessional, User
+
+BATCH_SIZE = 500
+
+STATES = ["CA", "NY", "TX", "FL", "IL", "PA", "OH", "GA", "NC", "MI"]
+
+
+class Rollback(Exception):
+    pass
+
+
+def percentile(values, fraction):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+
+class Command(BaseCommand):
+    help = ("Simulates the dispatch queue: --providers medical "
+            "professionals spread over --states states, and --patients "
+            "paid consultations waiting for them. Measures dispatching the "
+            "backlog, then the latency of assigning the next waiting "
+            "patient each time a consultation completes. Everything is "
+            "rolled back afterwards.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--providers', type=int, default=500)
+        parser.add_argument('--patients', type=int, default=5000)
+        parser.add_argument('--states', type=int, default=len(STATES),
+            choices=range(1, len(STATES) + 1))
+        parser.add_argument('--capacity', type=int, default=3)
+        parser.add_argument('--completions', type=int, default=1000)
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        random.seed(options['seed'])
+        try:
+            with transaction.atomic():
+                self._run(options)
+                raise Rollback
+        except Rollback:
+            pass
+
+    def _create(self, providers, patients, states, capacity):
+        users = [User(username="dispatch-benchmark-{0}".format(n))
+                 for n in range(providers + 1)]
+        User.objects.bulk_create(users, batch_size=BATCH_SIZE)
+        user_ids = list(User.objects.filter(
+            username__startswith="dispatch-benchmark-")
+            .order_by('id').values_list('id', flat=True))
+
+        customer = Customer.objects.create(user_id=user_ids.pop())
+        specialties = MedicalProfessional.DoctorMedicalSpecialty.values
+        MedicalProfessional.objects.bulk_create([
+            MedicalProfessional(user_id=user_id, is_verified=True,
+                state_of_license=random.choice(states),
+                doctor_specialty=random.choice(specialties))
+            for user_id in user_ids], batch_size=BATCH_SIZE)
+        ProviderQueue.objects.bulk_create([
+            ProviderQueue(medical_pro_id=medical_pro_id, accepting=True,
+                state_of_license=state, doctor_specialty=specialty,
+                capacity=capacity)
+            for medical_pro_id, state, specialty in MedicalProfessional
+            .objects.filter(user_id__in=user_ids).values_list('id',
+                'state_of_license', 'doctor_specialty')],
+            batch_size=BATCH_SIZE)
+
+        # One in ten patients asks for a specialty.
+        checkouts = [CheckoutInformation(reason_for_visit="Benchmark",
+                         state=random.choice(states),
+                         doctor_specialty=random.choice(specialties)
+                             if random.random() < 0.1 else None)
+                     for _ in range(patients)]
+        CheckoutInformation.objects.bulk_create(checkouts,
+            batch_size=BATCH_SIZE)
+        Assignment.objects.bulk_create([
+            Assignment(checkout_id=checkout_id, customer=customer,
+                state=state, doctor_specialty=specialty)
+            for checkout_id, state, specialty in CheckoutInformation.objects
+            .filter(reason_for_visit="Benchmark", assignment=None)
+            .values_list('id', 'state', 'doctor_specialty')],
+            batch_size=BATCH_SIZE)
+
+    def _run(self, options):
+        self._create(options['providers'], options['patients'],
+            STATES[:options['states']], options['capacity'])
+
+        started = time.perf_counter()
+        assigned = dispatcher.dispatch_waiting()
+        elapsed = time.perf_counter() - started
+        waiting = Assignment.objects.filter(
+            status=Assignment.Status.WAITING).count()
+        self.stdout.write("Dispatched a backlog of {0} patients: {1} "
+            "assigned in {2:.2f}s ({3:.0f}/s), {4} left waiting".format(
+                options['patients'], assigned, elapsed,
+                assigned / elapsed if elapsed else 0, waiting))
+
+        latencies, assigned = [], 0
+        active = {assignment.id: assignment for assignment in
+            Assignment.objects.filter(status=Assignment.Status.ASSIGNED)}
+        for _ in range(options['completions']):
+            if not active:
+                break
+            assignment = active.pop(random.choice(list(active)))
+            started = time.perf_counter()
+            state = assignment.state
+            dispatcher.complete(assignment)
+            # Runs on commit in production; there is no commit here.
+            assigned += dispatcher.dispatch_waiting(state)
+            latencies.append((time.perf_counter() - started) * 1000)
+            for new in Assignment.objects.filter(
+                    status=Assignment.Status.ASSIGNED,
+                    medical_pro__dispatch_queue__state_of_license=state):
+                active.setdefault(new.id, new)
+
+        if latencies:
+            self.stdout.write("{0} completions with {1}+ patients waiting: "
+                "{2} reassigned; latency p50 {3:.2f}ms, p95 {4:.2f}ms, "
+                "p99 {5:.2f}ms, mean {6:.2f}ms".format(len(latencies),
+                    waiting - assigned, assigned,
+                    percentile(latencies, 0.5), percentile(latencies, 0.95),
+                    percentile(latencies, 0.99), statistics.mean(latencies)))
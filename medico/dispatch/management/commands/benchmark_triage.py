@@ -0,0 +1,67 @@
+import random
+import statistics
+import string
+import time
+
+from django.core.management.base import BaseCommand
+
+import common.constants
+from medico.dispatch import triage
+
+
+def word():
+    return ''.join(random.choices(string.ascii_lowercase,
+                                  k=random.randint(3, 9)))
+
+
+class Command(BaseCommand):
+    help = ("Times triage scoring of --texts reasons for visit against "
+            "synthetic vocabularies of growing --sizes, using the compiled "
+            "matcher and, for comparison, a scan that looks for each term "
+            "in turn.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', default="100,1000,10000,100000",
+            help="Comma separated vocabulary sizes.")
+        parser.add_argument('--texts', type=int, default=200)
+        parser.add_argument('--seed', type=int, default=0)
+
+    def _text(self, terms):
+        # A full-length reason for visit with a few terms in it.
+        words = [word() for _ in range(150)]
+        for term in random.sample(terms, 3):
+            words.insert(random.randrange(len(words)), term)
+        return ' '.join(words)[:common.constants.TEXTFIELD_MAX_LENGTH]
+
+    def _time(self, function, texts):
+        latencies = []
+        for text in texts:
+            started = time.perf_counter()
+            function(text)
+            latencies.append((time.perf_counter() - started) * 1e6)
+        return statistics.median(latencies)
+
+    def handle(self, *args, **options):
+        random.seed(options['seed'])
+        for size in [int(s) for s in options['sizes'].split(',')]:
+            weights = {}
+            while len(weights) < size:
+                weights[' '.join(word() for _ in range(
+                    random.randint(1, 3)))] = random.randint(1, 10)
+            terms = list(weights)
+            texts = [self._text(terms) for _ in range(options['texts'])]
+
+            started = time.perf_counter()
+            vocabulary = triage.Vocabulary(weights)
+            built = time.perf_counter() - started
+
+            def scan(text):
+                text = triage.normalize(text)
+                return sum(weight for term, weight in weights.items()
+                           if ' {0} '.format(term) in text)
+
+            self.stdout.write("{0} terms: compiled in {1:.2f}s; scoring "
+                "p50 {2:.0f}us with the matcher, {3:.0f}us scanning term "
+                "by term".format(size, built,
+                    self._time(vocabulary.score, texts),
+                    self._time(scan, texts)))
@@ -0,0 +1,78 @@
+# Generated by Django 3.0.12 on 2026-10-19 11:41
+
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+import localflavor.us.models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+        ('users', '0009_provider_review_queue'),
+        ('payments', '0003_checkout_state'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Assignment',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('state', localflavor.us.models.USStateField(max_length=2)),
+                ('doctor_specialty', models.IntegerField(blank=True, choices=[(0, 'Family Medicine'), (1, 'Internal Medicine'), (2, 'Emergency Medicine'), (3, 'Pediatrics')], null=True)),
+                ('status', models.IntegerField(choices=[(0, 'Waiting'), (1, 'Assigned'), (2, 'Completed')], default=0)),
+                ('created', models.DateTimeField(default=django.utils.timezone.now)),
+                ('assigned_at', models.DateTimeField(blank=True, null=True)),
+                ('completed_at', models.DateTimeField(blank=True, null=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='ProviderQueue',
+            fields=[
+                ('medical_pro', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='dispatch_queue', serialize=False, to='users.MedicalProfessional')),
+                ('state_of_license', localflavor.us.models.USStateField(max_length=2)),
+                ('doctor_specialty', models.IntegerField(blank=True, choices=[(0, 'Family Medicine'), (1, 'Internal Medicine'), (2, 'Emergency Medicine'), (3, 'Pediatrics')], null=True)),
+                ('accepting', models.BooleanField(default=False)),
+                ('capacity', models.PositiveSmallIntegerField(default=3)),
+                ('depth', models.PositiveIntegerField(default=0)),
+                ('last_assigned', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='providerqueue',
+            index=models.Index(condition=models.Q(accepting=True), fields=['state_of_license', 'depth', 'last_assigned', 'medical_pro'], name='dispatch_provider_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='providerqueue',
+            index=models.Index(condition=models.Q(accepting=True), fields=['state_of_license', 'doctor_specialty', 'depth', 'last_assigned', 'medical_pro'], name='dispatch_specialty_idx'),
+        ),
+        migrations.AddField(
+            model_name='assignment',
+            name='checkout',
+            field=models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='assignment', to='payments.CheckoutInformation'),
+        ),
+        migrations.AddField(
+            model_name='assignment',
+            name='customer',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='assignments', to='users.Customer'),
+        ),
+        migrations.AddField(
+            model_name='assignment',
+            name='medical_pro',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='assignments', to='users.MedicalProfessional'),
+        ),
+        migrations.AddIndex(
+            model_name='assignment',
+            index=models.Index(condition=models.Q(status=0), fields=['state', 'created', 'id'], name='assignment_waiting_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='assignment',
+            index=models.Index(fields=['medical_pro', 'status'], name='assignment_provider_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='assignment',
+            index=models.Index(fields=['customer', '-created'], name='assignment_customer_idx'),
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 3.0.12 on 2026-10-19 11:52
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dispatch', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='assignment',
+            index=models.Index(fields=['medical_pro', '-created', '-id'], name='assignment_history_idx'),
+        ),
+    ]
@@ -0,0 +1,36 @@
+# Generated by Django 3.0.12 on 2026-10-19 12:23
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dispatch', '0002_assignment_history_idx'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='assignment',
+            name='assignment_waiting_idx',
+        ),
+        migrations.AddField(
+            model_name='assignment',
+            name='priority',
+            field=models.IntegerField(choices=[(0, 'Routine'), (1, 'Urgent')], default=0),
+        ),
+        migrations.AddField(
+            model_name='assignment',
+            name='triage_score',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='assignment',
+            name='triage_terms',
+            field=models.CharField(blank=True, max_length=255),
+        ),
+        migrations.AddIndex(
+            model_name='assignment',
+            index=models.Index(condition=models.Q(status=0), fields=['state', '-priority', 'created', 'id'], name='assignment_waiting_idx'),
+        ),
+    ]
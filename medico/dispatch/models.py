@@ -0,0 +1,95 @@
+import localflavor.us.models
+from django.db import models
+from django.utils import timezone
+
+import common.constants
+from medico.users.models import MedicalProfessional
+
+
+class ProviderQueue(models.Model):
+    """
+    A medical professional's place in the dispatch queue. The state and
+    specialty are copied from their profile so that the least loaded
+    professional who can take a patient is the first entry of one index.
+    """
+    medical_pro = models.OneToOneField("users.MedicalProfessional",
+        on_delete=models.CASCADE, primary_key=True,
+        related_name="dispatch_queue")
+    state_of_license = localflavor.us.models.USStateField()
+    doctor_specialty = models.IntegerField(null=True, blank=True,
+        choices=MedicalProfessional.DoctorMedicalSpecialty.choices)
+    accepting = models.BooleanField(default=False)
+    capacity = models.PositiveSmallIntegerField(
+        default=common.constants.DISPATCH_DEFAULT_CAPACITY)
+    # Patients assigned and not yet seen.
+    depth = models.PositiveIntegerField(default=0)
+    # Breaks ties between equally loaded professionals in turn.
+    last_assigned = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['state_of_license', 'depth',
+                'last_assigned', 'medical_pro'], name='dispatch_provider_idx',
+                condition=models.Q(accepting=True)),
+            models.Index(fields=['state_of_license', 'doctor_specialty',
+                'depth', 'last_assigned', 'medical_pro'],
+                name='dispatch_specialty_idx',
+                condition=models.Q(accepting=True)),
+        ]
+
+    def __str__(self):
+        return "Queue of {0}".format(self.medical_pro)
+
+
+class Assignment(models.Model):
+    """
+    A paid consultation and the medical professional it was given to.
+    """
+    class Status(models.IntegerChoices):
+        WAITING = 0, 'Waiting'
+        ASSIGNED = 1, 'Assigned'
+        COMPLETED = 2, 'Completed'
+
+    class Priority(models.IntegerChoices):
+        ROUTINE = 0, 'Routine'
+        URGENT = 1, 'Urgent'
+
+    checkout = models.OneToOneField("payments.CheckoutInformation",
+        on_delete=models.CASCADE, related_name="assignment")
+    customer = models.ForeignKey("users.Customer", on_delete=models.CASCADE,
+        related_name="assignments")
+    state = localflavor.us.models.USStateField()
+    doctor_specialty = models.IntegerField(null=True, blank=True,
+        choices=MedicalProfessional.DoctorMedicalSpecialty.choices)
+    medical_pro = models.ForeignKey("users.MedicalProfessional", null=True,
+        blank=True, on_delete=models.SET_NULL, related_name="assignments")
+    status = models.IntegerField(choices=Status.choices,
+        default=Status.WAITING)
+    # Set by triage of the reason for visit; urgent patients are dispatched
+    # first. See medico.dispatch.triage.
+    priority = models.IntegerField(choices=Priority.choices,
+        default=Priority.ROUTINE)
+    triage_score = models.PositiveIntegerField(default=0)
+    triage_terms = models.CharField(max_length=255, blank=True)
+    created = models.DateTimeField(default=timezone.now)
+    assigned_at = models.DateTimeField(null=True, blank=True)
+    completed_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            # The waiting line: urgent patients first, then first come
+            # first served.
+            models.Index(fields=['state', '-priority', 'created', 'id'],
+                name='assignment_waiting_idx',
+                condition=models.Q(status=0)),
+            models.Index(fields=['medical_pro', 'status'],
+                name='assignment_provider_idx'),
+            # A medical professional's history, newest first.
+            models.Index(fields=['medical_pro', '-created', '-id'],
+                name='assignment_history_idx'),
+            models.Index(fields=['customer', '-created'],
+                name='assignment_customer_idx'),
+        ]
+
+    def __str__(self):
+        return "Assignment of checkout {0}".format(self.checkout_id)
@@ -0,0 +1,18 @@
+from django.db.models.signals import post_save
+from django.dispatch import receiver
+
+from medico.dispatch.models import ProviderQueue
+from medico.users.models import MedicalProfessional
+
+
+@receiver(post_save, sender=MedicalProfessional)
+def medical_pro_saved(sender, instance, created, **kwargs):
+    # Keep the copied profile fields current; professionals who lose their
+    # verification stop getting patients.
+    if created:
+        return
+    changes = {"state_of_license": instance.state_of_license,
+               "doctor_specialty": instance.doctor_specialty}
+    if not instance.is_verified:
+        changes["accepting"] = False
+    ProviderQueue.objects.filter(medical_pro=instance).update(**changes)
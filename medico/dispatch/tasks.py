@@ -0,0 +1,11 @@
+from medico.dispatch import dispatcher
+from medico.jobs.queue import task
+
+
+@task(name="dispatch.dispatch_waiting", priority=-5)
+def dispatch_waiting(state=None):
+    """
+    Assigns waiting patients. Queued when dispatching right after a
+    checkout or a completed consultation failed.
+    """
+    dispatcher.dispatch_waiting(state)
@@ -0,0 +1,305 @@
+import json
+
+import pytest
+from asgiref.sync import async_to_sync
+from asgiref.testing import ApplicationCommunicator
+from django.conf import settings
+from django.urls import reverse
+
+import common.pubsub
+from medico.dispatch import dispatcher, events, triage
+from medico.dispatch.models import Assignment, ProviderQueue
+from medico.payments.models import CheckoutInformation
+from medico.users.models import Customer, MedicalProfessional
+from medico.users.tests.factories import MedicalProfessionalFactory
+
+pytestmark = pytest.mark.django_db(transaction=True)
+
+PEDIATRICS = MedicalProfessional.DoctorMedicalSpecialty.PEDIATRICS
+
+
+@pytest.fixture
+def customer(user):
+    return Customer.objects.create(user=user)
+
+
+def accepting(capacity=3, **kwargs):
+    medical_pro = MedicalProfessionalFactory(**kwargs)
+    dispatcher.set_accepting(medical_pro, True, capacity)
+    return medical_pro
+
+
+def submit(customer, state="CA", doctor_specialty=None,
+           reason_for_visit="Cough"):
+    checkout = CheckoutInformation.objects.create(
+        reason_for_visit=reason_for_visit, state=state,
+        doctor_specialty=doctor_specialty)
+    assignment = dispatcher.submit(checkout, customer)
+    assignment.refresh_from_db()
+    return assignment
+
+
+class TestDispatcher:
+
+    def test_least_loaded_first(self, customer):
+        first, second = accepting(), accepting()
+
+        assignments = [submit(customer) for _ in range(3)]
+
+        assert [a.medical_pro_id for a in assignments] == \
+            [first.id, second.id, first.id]
+        assert ProviderQueue.objects.get(medical_pro=first).depth == 2
+        assert ProviderQueue.objects.get(medical_pro=second).depth == 1
+
+    def test_state_and_specialty(self, customer):
+        accepting(state_of_license="NY")
+        pediatrician = accepting(doctor_specialty=PEDIATRICS)
+
+        assert submit(customer, doctor_specialty=PEDIATRICS).medical_pro_id \
+            == pediatrician.id
+        assert submit(customer, "NY").medical_pro.state_of_license == "NY"
+        waiting = submit(customer, doctor_specialty=MedicalProfessional
+            .DoctorMedicalSpecialty.FAMILY_MEDICINE)
+        assert waiting.status == Assignment.Status.WAITING
+
+    def test_waiting_patients_first_come_first_served(self, customer):
+        medical_pro = accepting(capacity=1)
+        current = submit(customer)
+        first, second = submit(customer), submit(customer)
+
+        assert first.status == second.status == Assignment.Status.WAITING
+        assert dispatcher.queue_position(second) == 1
+
+        assert dispatcher.complete(current)
+
+        first.refresh_from_db()
+        assert first.medical_pro_id == medical_pro.id
+        assert Assignment.objects.get(id=second.id).status == \
+            Assignment.Status.WAITING
+        assert not dispatcher.complete(current)
+
+    def test_urgent_patients_first(self, customer):
+        medical_pro = accepting(capacity=1)
+        current = submit(customer)
+        routine = submit(customer)
+        urgent = submit(customer, reason_for_visit="Crushing chest pain, "
+                                                   "sweating")
+
+        assert urgent.priority == Assignment.Priority.URGENT
+        assert urgent.triage_terms == "crushing chest, sweating"
+        assert dispatcher.queue_position(urgent) == 0
+        assert dispatcher.queue_position(routine) == 1
+
+        dispatcher.complete(current)
+
+        urgent.refresh_from_db()
+        assert urgent.medical_pro_id == medical_pro.id
+        assert Assignment.objects.get(id=routine.id).status == \
+            Assignment.Status.WAITING
+
+    def test_dispatch_waiting_skips_full_states(self, customer):
+        for _ in range(3):
+            submit(customer, "NY")
+        nevada = submit(customer, "NV")
+        accepting(capacity=2, state_of_license="NY")
+        accepting(state_of_license="NV")
+
+        assert Assignment.objects.filter(
+            status=Assignment.Status.ASSIGNED).count() == 3
+        nevada.refresh_from_db()
+        assert nevada.status == Assignment.Status.ASSIGNED
+
+        # Nothing left that anyone can take.
+        assert dispatcher.dispatch_waiting(batch_size=1) == 0
+
+    def test_unverified_stop_accepting(self, customer):
+        medical_pro = accepting()
+        medical_pro.is_verified = False
+        medical_pro.save()
+
+        assert submit(customer).status == Assignment.Status.WAITING
+
+
+class TestTriage:
+
+    @pytest.fixture
+    def vocabulary(self):
+        return triage.Vocabulary({"chest pain": 10, "chest": 1,
+            "pain": 2, "can't breathe": 10, "stiff neck": 5, "fever": 5,
+            "suicidal": 10})
+
+    def test_matcher_finds_overlapping_patterns(self):
+        matcher = triage.Matcher(["he", "she", "his", "hers"])
+
+        assert sorted((start, end, matcher.patterns[index]) for
+                      start, end, index in matcher.finditer("ushers")) == \
+            [(1, 4, "she"), (2, 4, "he"), (2, 6, "hers")]
+
+    @pytest.mark.parametrize("text, score, terms", [
+        ("Chest pain since this morning", 10, ["chest pain"]),
+        ("My chest hurts, and pain in my back", 3, ["chest", "pain"]),
+        ("I CAN'T breathe!!", 10, ["can t breathe"]),
+        ("Suicídal thoughts", 10, ["suicidal"]),
+        ("Fever and stiff neck", 10, ["fever", "stiff neck"]),
+        ("Fever, fever, fever", 5, ["fever"]),
+        ("No chest pain, just a cough", 0, []),
+        ("Denies any fever but stiff neck", 5, ["stiff neck"]),
+        ("No cough. Chest pain at night", 10, ["chest pain"]),
+        ("Feverish and painful", 0, []),
+    ])
+    def test_score(self, vocabulary, text, score, terms):
+        result = vocabulary.score(text)
+
+        assert (result.score, result.terms) == (score, terms)
+        assert result.urgent == (score >= 10)
+
+    def test_vocabulary_from_settings(self, settings, tmp_path):
+        path = tmp_path / "terms.txt"
+        path.write_text("# Comment\n\n10 sudden weakness\n4 dizzy\n")
+        settings.TRIAGE_VOCABULARY = str(path)
+
+        assert len(triage.get_vocabulary()) == 2
+        assert triage.score("Dizzy, with sudden weakness").score == 14
+
+    def test_default_vocabulary_loads(self):
+        assert len(triage.get_vocabulary()) > 100
+
+
+class TestViews:
+
+    def test_provider_queue(self, client, customer):
+        medical_pro = MedicalProfessionalFactory()
+        assignment = submit(customer)
+        client.force_login(medical_pro.user)
+        url = reverse("dispatch:queue")
+
+        response = client.post(url, json.dumps({"accepting": True,
+            "capacity": 2}), content_type="application/json")
+
+        assert response.status_code == 200
+        assert response.json()["capacity"] == 2
+        # Waiting patients are dispatched once the request commits.
+        assert [a["id"] for a in client.get(url).json()["assignments"]] == \
+            [assignment.id]
+
+        response = client.post(reverse("dispatch:complete",
+            args=[assignment.id]))
+        assert response.json()["assignment"]["status"] == "Completed"
+        assert client.get(url).json()["assignments"] == []
+
+    def test_history(self, client, customer):
+        medical_pro = accepting()
+        first, second = submit(customer), submit(customer)
+        dispatcher.complete(first)
+        client.force_login(medical_pro.user)
+
+        page = client.get(reverse("dispatch:history"), {"limit": 1}).json()
+        assert [row["id"] for row in page["results"]] == [second.id]
+
+        page = client.get(reverse("dispatch:history"),
+            {"cursor": page["next_cursor"]}).json()
+        assert [(row["id"], row["status"]) for row in page["results"]] == \
+            [(first.id, "Completed")]
+        assert page["next_cursor"] is None
+
+    def test_dashboard(self, client):
+        medical_pro = MedicalProfessionalFactory()
+        client.force_login(medical_pro.user)
+
+        response = client.get(reverse("dispatch:dashboard"))
+
+        assert response.status_code == 200
+        assert events.PATH in response.content.decode()
+
+    def test_unverified_cannot_accept(self, client):
+        medical_pro = MedicalProfessionalFactory(is_verified=False)
+        client.force_login(medical_pro.user)
+
+        response = client.post(reverse("dispatch:queue"),
+            json.dumps({"accepting": True}), content_type="application/json")
+
+        assert response.status_code == 400
+        assert not ProviderQueue.objects.exists()
+
+    def test_assignment_status(self, client, user, customer):
+        client.force_login(user)
+        submit(customer)
+        submit(customer)
+
+        data = client.get(reverse("dispatch:assignment")).json()["assignment"]
+        assert data["status"] == "Waiting"
+        assert data["patients_ahead"] == 1
+
+        medical_pro = accepting()
+
+        data = client.get(reverse("dispatch:assignment")).json()["assignment"]
+        assert data["status"] == "Assigned"
+        assert data["medical_pro"]["id"] == medical_pro.id
+
+
+class TestEvents:
+
+    def scope(self, cookie=b""):
+        return {"type": "http", "method": "GET", "path": events.PATH,
+                "headers": [(b"cookie", cookie)] if cookie else []}
+
+    def test_dispatch_publishes_on_commit(self, customer):
+        medical_pro = MedicalProfessionalFactory()
+        received = []
+        unsubscribe = common.pubsub.subscribe(
+            events.provider_channel(medical_pro.id), received.append)
+        try:
+            dispatcher.set_accepting(medical_pro, True)
+            assignment = submit(customer)
+            dispatcher.complete(assignment)
+        finally:
+            unsubscribe()
+
+        assert [(m["event"], m["data"].get("status")) for m in
+                map(json.loads, received)] == [("queue", None),
+                    ("assignment", "Assigned"), ("assignment", "Completed")]
+        assert common.pubsub.local_broker.subscriber_count() == 0
+
+    def test_stream(self, client):
+        medical_pro = MedicalProfessionalFactory()
+        client.force_login(medical_pro.user)
+        cookie = "{0}={1}".format(settings.SESSION_COOKIE_NAME,
+            client.cookies[settings.SESSION_COOKIE_NAME].value).encode()
+
+        @async_to_sync
+        async def stream():
+            communicator = ApplicationCommunicator(events.application,
+                self.scope(cookie))
+            await communicator.send_input({"type": "http.request"})
+            start = await communicator.receive_output(5)
+            retry = await communicator.receive_output(5)
+
+            common.pubsub.publish(events.provider_channel(medical_pro.id),
+                json.dumps({"event": "assignment", "data": {"id": 1}}))
+            event = await communicator.receive_output(5)
+
+            await communicator.send_input({"type": "http.disconnect"})
+            await communicator.wait(5)
+            return start, retry, event
+
+        start, retry, event = stream()
+
+        assert start["status"] == 200
+        assert (b"content-type", b"text/event-stream") in start["headers"]
+        assert retry["body"].startswith(b"retry: ")
+        assert event["body"] == b'event: assignment\ndata: {"id": 1}\n\n'
+        assert common.pubsub.local_broker.subscriber_count() == 0
+
+    def test_stream_requires_medical_pro(self, client, user):
+        client.force_login(user)
+        cookie = "{0}={1}".format(settings.SESSION_COOKIE_NAME,
+            client.cookies[settings.SESSION_COOKIE_NAME].value).encode()
+
+        @async_to_sync
+        async def stream(scope):
+            communicator = ApplicationCommunicator(events.application, scope)
+            await communicator.send_input({"type": "http.request"})
+            return await communicator.receive_output(5)
+
+        assert stream(self.scope())["status"] == 403
+        assert stream(self.scope(cookie))["status"] == 403
@@ -0,0 +1,215 @@
+"""
+Triage of the reasons patients give for their visits.
+
+The text is checked against a vocabulary of weighted emergency terms
+(`settings.TRIAGE_VOCABULARY`). All terms are compiled into one
+Aho-Corasick automaton: a trie of the terms whose nodes also link to the
+longest suffix that is itself a prefix of some term. Scanning a text is a
+single pass that follows one link per character, and finds every term at
+once, so the cost depends on the length of the text and the number of
+matches, not on the size of the vocabulary.
+
+Terms and texts are normalized the same way: case and accents are dropped,
+words are separated by single spaces and punctuation becomes a "." token.
+Both are padded with spaces, so terms only ever match whole words.
+"""
+import collections
+import functools
+import re
+import unicodedata
+
+from django.conf import settings
+
+import common.constants
+
+# Words that, shortly before a term, mean the patient does not have it.
+NEGATIONS = {"no", "not", "denies", "denied", "without", "never",
+             "negative"}
+
+# Words ending the scope of a negation, besides punctuation.
+NEGATION_BREAKS = {".", "but", "and", "however", "except"}
+
+# How many words before a term a negation applies to.
+NEGATION_WINDOW = 2
+
+_PUNCTUATION = re.compile(r'[.,;:!?\n]+')
+_NON_WORD = re.compile(r'[^\w.]+')
+
+
+def normalize(text):
+    """
+    Lower-cases `text`, strips accents and reduces it to words separated
+    by single spaces, with a "." for every run of punctuation, padded with
+    a space at both ends.
+    """
+    decomposed = unicodedata.normalize('NFKD', text)
+    stripped = ''.join(c for c in decomposed if not unicodedata.combining(c))
+    text = _PUNCTUATION.sub(' . ', stripped.casefold())
+    return ' {0} '.format(' '.join(_NON_WORD.sub(' ', text).split()))
+
+
+class Matcher:
+    """
+    Aho-Corasick automaton over a fixed list of patterns.
+    """
+    def __init__(self, patterns):
+        self.patterns = list(patterns)
+        self._lengths = [len(pattern) for pattern in self.patterns]
+        goto, fail, output = [{}], [0], [()]
+
+        for index, pattern in enumerate(self.patterns):
+            state = 0
+            for char in pattern:
+                following = goto[state].get(char)
+                if following is None:
+                    following = len(goto)
+                    goto[state][char] = following
+                    goto.append({})
+                    fail.append(0)
+                    output.append(())
+                state = following
+            output[state] += (index,)
+
+        # Breadth first, so that the failure link of every shallower node
+        # is known before it is needed.
+        queue = collections.deque(goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for char, following in goto[state].items():
+                queue.append(following)
+                link = fail[state]
+                while link and char not in goto[link]:
+                    link = fail[link]
+                fail[following] = goto[link].get(char, 0)
+                output[following] += output[fail[following]]
+
+        self._goto, self._fail, self._output = goto, fail, output
+
+    def __len__(self):
+        return len(self.patterns)
+
+    def finditer(self, text):
+        """
+        Yields `(start, end, pattern index)` for every occurrence of every
+        pattern in `text`, overlapping ones included, in order of `end`.
+        """
+        goto, fail, output = self._goto, self._fail, self._output
+        lengths = self._lengths
+        state = 0
+        for end, char in enumerate(text, 1):
+            while state and char not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(char, 0)
+            for index in output[state]:
+                yield end - lengths[index], end, index
+
+
+class Triage:
+    """
+    The outcome of scoring a text: its score and the terms found.
+    """
+    def __init__(self, score, terms):
+        self.score = score
+        self.terms = terms
+
+    @property
+    def urgent(self):
+        return self.score >= common.constants.TRIAGE_URGENT_SCORE
+
+    def __repr__(self):
+        return "<Triage {0} {1}>".format(self.score, self.terms)
+
+
+class Vocabulary:
+    """
+    Weighted emergency terms, compiled into a Matcher.
+    """
+    def __init__(self, weights):
+        """
+        `weights` maps terms to their weights. Terms that normalize to the
+        same text keep the highest weight.
+        """
+        normalized = {}
+        for term, weight in weights.items():
+            key = normalize(term)
+            if key.strip(' .'):
+                normalized[key] = max(weight, normalized.get(key, weight))
+        self._terms = [(key.strip(), weight)
+                       for key, weight in normalized.items()]
+        self._matcher = Matcher(normalized)
+
+    def __len__(self):
+        return len(self._terms)
+
+    @classmethod
+    def from_file(cls, path):
+        """
+        Reads a vocabulary from lines of "<weight> <term>". Blank lines and
+        lines starting with # are ignored.
+        """
+        weights = {}
+        with open(path, encoding='utf-8') as f:
+            for number, line in enumerate(f, 1):
+                line = line.strip()
+                if not line or line.startswith('#'):
+                    continue
+                weight, _, term = line.partition(' ')
+                try:
+                    weights[term.strip()] = int(weight)
+                except ValueError:
+                    raise ValueError("{0}, line {1}: expected a weight and "
+                        "a term.".format(path, number))
+        return cls(weights)
+
+    def _negated(self, text, start):
+        # Only looks at a bounded stretch of text before the term, so that
+        # the cost per match stays constant.
+        before = text[max(0, start - 60):start].split()[-NEGATION_WINDOW:]
+        for word in reversed(before):
+            if word in NEGATION_BREAKS:
+                return False
+            if word in NEGATIONS:
+                return True
+        return False
+
+    def score(self, text):
+        """
+        Scores `text` by the sum of the weights of the distinct terms in
+        it. Where terms overlap, only the longest counts, and terms that
+        are negated ("no chest pain") do not count.
+        """
+        text = normalize(text)
+        # The padding spaces are shared by neighbouring words; leave them
+        # out of the spans so that adjacent terms do not overlap.
+        matches = sorted(((start + 1, end - 1, index) for start, end, index
+                          in self._matcher.finditer(text)),
+                         key=lambda match: (match[0], match[0] - match[1]))
+
+        found, covered = {}, 0
+        for start, end, index in matches:
+            if start < covered:
+                continue
+            covered = end
+            if not self._negated(text, start):
+                found.setdefault(index, None)
+
+        terms = [self._terms[index] for index in found]
+        return Triage(sum(weight for _, weight in terms),
+                      [term for term, _ in terms])
+
+
+@functools.lru_cache(maxsize=4)
+def _load(path):
+    return Vocabulary.from_file(path)
+
+
+def get_vocabulary():
+    """
+    The vocabulary configured by `settings.TRIAGE_VOCABULARY`, compiled
+    once per process.
+    """
+    return _load(str(settings.TRIAGE_VOCABULARY))
+
+
+def score(text):
+    return get_vocabulary().score(text)
@@ -0,0 +1,19 @@
+from django.urls import path
+
+from medico.dispatch.views import (
+    assignment_status,
+    complete_assignment,
+    consultation_history,
+    dashboard,
+    provider_queue,
+)
+
+app_name = "dispatch"
+urlpatterns = [
+    path("", view=dashboard, name="dashboard"),
+    path("queue/", view=provider_queue, name="queue"),
+    path("assignments/<int:assignment_id>/complete/",
+        view=complete_assignment, name="complete"),
+    path("assignment/", view=assignment_status, name="assignment"),
+    path("history/", view=consultation_history, name="history"),
+]
@@ -0,0 +1,158 @@
+import json
+
+from django.contrib.auth.decorators import login_required
+from django.http import HttpResponse, JsonResponse
+from django.shortcuts import render
+
+import common.constants
+import common.decorators
+import common.helpers
+from common.pagination import InvalidCursor
+from medico.dispatch import dispatcher, events
+from medico.dispatch.models import Assignment, ProviderQueue
+from medico.payments import history
+
+
+def request_error(message, status=400, type='RequestError'):
+    return JsonResponse({
+        "error": {
+            'message': message,
+            'type': type
+        }
+    }, status=status)
+
+
+def assignment_serialize(assignment):
+    return {
+        "id": assignment.id,
+        "status": assignment.get_status_display(),
+        "priority": assignment.get_priority_display(),
+        "triage_terms": assignment.triage_terms,
+        "state": assignment.state,
+        "reason_for_visit": assignment.checkout.reason_for_visit,
+        "created": assignment.created,
+        "assigned_at": assignment.assigned_at,
+    }
+
+
+@login_required
+@common.decorators.medical_pro_only
+def provider_queue(request):
+    """
+    A medical professional's dispatch settings and the patients assigned to
+    them. POST a JSON body with `accepting` and optionally `capacity` to
+    start or stop taking patients.
+    """
+    medical_pro = request.user.medical_pro
+
+    if request.method == 'POST':
+        try:
+            data = json.loads(request.body)
+            accepting = data['accepting']
+            capacity = data.get('capacity')
+            if not isinstance(accepting, bool):
+                raise ValueError
+            if capacity is not None:
+                capacity = int(capacity)
+        except (KeyError, TypeError, ValueError):
+            return request_error('Please provide accepting and, optionally, '
+                                 'capacity.')
+        if capacity is not None and not \
+                0 < capacity <= common.constants.DISPATCH_MAX_CAPACITY:
+            return request_error('Invalid value for capacity.')
+        if accepting and not medical_pro.is_verified:
+            return request_error('Your profile has not been verified yet.')
+
+        queue = dispatcher.set_accepting(medical_pro, accepting, capacity)
+
+    elif request.method == 'GET':
+        queue = ProviderQueue.objects.filter(medical_pro=medical_pro).first()
+
+    else:
+        return HttpResponse('Method not allowed')
+
+    assignments = Assignment.objects.filter(medical_pro=medical_pro,
+        status=Assignment.Status.ASSIGNED).select_related('checkout')\
+        .order_by('-priority', 'assigned_at')
+
+    return JsonResponse({
+        "accepting": bool(queue and queue.accepting),
+        "capacity": (queue.capacity if queue else
+                     common.constants.DISPATCH_DEFAULT_CAPACITY),
+        "assignments": [assignment_serialize(assignment)
+                        for assignment in assignments],
+    })
+
+
+@login_required
+@common.decorators.medical_pro_only
+def dashboard(request):
+    """
+    The page a medical professional keeps open while taking patients. It
+    loads `provider_queue` and follows the event stream for changes.
+    """
+    return render(request, "dispatch/dashboard.html", {
+        "events_url": events.PATH,
+        "max_capacity": common.constants.DISPATCH_MAX_CAPACITY,
+    })
+
+
+@login_required
+@common.decorators.medical_pro_only
+def complete_assignment(request, assignment_id):
+    if request.method != 'POST':
+        return HttpResponse('Method not allowed')
+
+    assignment = Assignment.objects.filter(id=assignment_id,
+        medical_pro=request.user.medical_pro,
+        status=Assignment.Status.ASSIGNED).select_related('checkout').first()
+    if assignment is None or not dispatcher.complete(assignment):
+        return request_error('No such assignment.', 404, 'NotFoundError')
+
+    assignment.refresh_from_db()
+    return JsonResponse({"assignment": assignment_serialize(assignment)})
+
+
+@login_required
+@common.decorators.medical_pro_only
+def consultation_history(request):
+    """
+    JSON timeline of the consultations assigned to the medical
+    professional, newest first. Paginated like the customers' history.
+    """
+    if request.method != 'GET':
+        return HttpResponse('Method not allowed')
+
+    try:
+        data = history.provider_page(request.user.medical_pro,
+            request.GET.get('cursor'), history.parse_limit(request.GET))
+    except (history.HistoryError, InvalidCursor) as e:
+        return request_error(str(e))
+
+    return JsonResponse(data)
+
+
+@login_required
+@common.decorators.customer_only
+def assignment_status(request):
+    """
+    The customer's latest consultation: who it was assigned to or, while
+    they wait, how many patients are ahead of them.
+    """
+    if request.method != 'GET':
+        return HttpResponse('Method not allowed')
+
+    assignment = Assignment.objects.filter(customer=request.user.customer)\
+        .select_related('checkout', 'medical_pro__user')\
+        .order_by('-created').first()
+    if assignment is None:
+        return request_error('No consultation was found.', 404,
+            'NotFoundError')
+
+    data = assignment_serialize(assignment)
+    if assignment.status == Assignment.Status.WAITING:
+        data["patients_ahead"] = dispatcher.queue_position(assignment)
+    if assignment.medical_pro:
+        data["medical_pro"] = common.helpers.medical_pro_serialize(
+            assignment.medical_pro)
+    return JsonResponse({"assignment": data})
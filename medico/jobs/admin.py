@@ -0,0 +1,24 @@
+from django.contrib import admin
+from django.utils import timezone
+
+import medico.jobs.models
+from common.admin import LargeTableAdminMixin
+
+
+@admin.register(medico.jobs.models.Job)
+class JobAdmin(LargeTableAdminMixin, admin.ModelAdmin):
+
+    list_display = ["task", "status", "priority", "run_at", "attempts",
+        "locked_by", "finished_at"]
+    list_filter = ["status"]
+    search_fields = ["task"]
+    readonly_fields = ["attempts", "last_error", "locked_by", "locked_at",
+        "created", "finished_at"]
+    actions = ["retry"]
+
+    def retry(self, request, queryset):
+        Status = medico.jobs.models.Job.Status
+        updated = queryset.exclude(status=Status.RUNNING).update(
+            status=Status.QUEUED, attempts=0, run_at=timezone.now())
+        self.message_user(request, "{0} jobs requeued.".format(updated))
+    retry.short_description = "Run selected jobs again"
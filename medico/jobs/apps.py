@@ -0,0 +1,11 @@
+from django.apps import AppConfig
+from django.utils.module_loading import autodiscover_modules
+
+
+class JobsConfig(AppConfig):
+    name = "medico.jobs"
+    verbose_name = "Jobs"
+
+    def ready(self):
+        # Tasks are registered by importing each app's `tasks` module.
+        autodiscover_modules('tasks')
@@ -0,0 +1,50 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from medico.jobs.models import Job
+from medico.jobs.queue import build_job
+from medico.jobs.tasks import noop
+from medico.jobs.worker import Worker
+
+BATCH_SIZE = 1000
+
+
+class Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = ("Measures job queue throughput of a single worker process: "
+            "enqueues --jobs no-op jobs and runs them. Everything is rolled "
+            "back afterwards.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--jobs', type=int, default=20000)
+        parser.add_argument('--batch-size', type=int, default=None,
+            help="Jobs claimed per query.")
+
+    def handle(self, *args, **options):
+        try:
+            with transaction.atomic():
+                self._run(options['jobs'], options['batch_size'])
+                raise Rollback
+        except Rollback:
+            pass
+
+    def _run(self, count, batch_size):
+        started = time.perf_counter()
+        for start in range(0, count, BATCH_SIZE):
+            Job.objects.bulk_create([build_job(noop, n=n) for n in
+                range(start, min(start + BATCH_SIZE, count))])
+        elapsed = time.perf_counter() - started
+        self.stdout.write("Enqueued {0} jobs: {1:.0f} jobs/s".format(count,
+            count / elapsed))
+
+        worker = Worker(batch_size=batch_size)
+        started = time.perf_counter()
+        ran = worker.drain()
+        elapsed = time.perf_counter() - started
+        self.stdout.write("Ran {0} jobs (batches of {1}): {2:.0f} jobs/s"
+            .format(ran, worker.batch_size, ran / elapsed))
@@ -0,0 +1,86 @@
+import multiprocessing
+import signal
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+
+from medico.jobs.worker import Worker
+
+
+def work(stop, batch_size, interval, burst):
+    worker = Worker(batch_size=batch_size, stop=stop)
+    last_requeue = 0
+    while not stop.is_set():
+        if time.monotonic() - last_requeue > 60:
+            worker.requeue_stale()
+            last_requeue = time.monotonic()
+        if worker.run_batch():
+            continue
+        if burst:
+            break
+        stop.wait(interval)
+
+
+def work_in_child(stop, batch_size, interval, burst):
+    # The parent handles signals and tells children to stop through `stop`,
+    # so that the job in progress is finished first.
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    signal.signal(signal.SIGTERM, signal.SIG_IGN)
+    try:
+        work(stop, batch_size, interval, burst)
+    finally:
+        connections.close_all()
+
+
+class Command(BaseCommand):
+    help = ("Runs background jobs. Each worker process polls the job table "
+            "and runs due jobs in priority order. SIGINT/SIGTERM stop the "
+            "workers after their current job.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--concurrency', type=int, default=1,
+            help="Number of worker processes.")
+        parser.add_argument('--batch-size', type=int, default=None,
+            help="Jobs claimed per query.")
+        parser.add_argument('--interval', type=float, default=1.0,
+            help="Seconds to wait between polls when the queue is empty.")
+        parser.add_argument('--burst', action='store_true',
+            help="Exit once no job is due.")
+
+    def handle(self, *args, **options):
+        if options['concurrency'] < 1:
+            raise CommandError("--concurrency must be at least 1.")
+
+        stop = multiprocessing.Event()
+
+        def shutdown(signum, frame):
+            self.stdout.write("Stopping workers after their current job...")
+            stop.set()
+
+        previous = {signum: signal.signal(signum, shutdown)
+                    for signum in (signal.SIGINT, signal.SIGTERM)}
+        try:
+            self._run(stop, options)
+        finally:
+            for signum, handler in previous.items():
+                signal.signal(signum, handler)
+
+    def _run(self, stop, options):
+        worker_args = (stop, options['batch_size'], options['interval'],
+            options['burst'])
+
+        if options['concurrency'] == 1:
+            work(*worker_args)
+            return
+
+        # Children must not share the parent's database connections.
+        connections.close_all()
+        processes = [multiprocessing.Process(target=work_in_child,
+                         args=worker_args, daemon=True)
+                     for _ in range(options['concurrency'])]
+        for process in processes:
+            process.start()
+        self.stdout.write("Started {0} workers.".format(len(processes)))
+        for process in processes:
+            process.join()
@@ -0,0 +1,45 @@
+from django.db import models
+from django.utils import timezone
+from jsonfield import JSONField
+
+
+class Job(models.Model):
+    """
+    A call to a registered task (see `medico.jobs.queue`), waiting to be
+    run by `manage.py run_workers`.
+    """
+    class Status(models.IntegerChoices):
+        QUEUED = 0, 'Queued'
+        RUNNING = 1, 'Running'
+        DONE = 2, 'Done'
+        FAILED = 3, 'Failed'
+
+    task = models.CharField(max_length=255)
+    kwargs = JSONField(default=dict)
+    # Lower numbers run first.
+    priority = models.SmallIntegerField(default=0)
+    run_at = models.DateTimeField(default=timezone.now)
+
+    status = models.IntegerField(choices=Status.choices,
+        default=Status.QUEUED)
+    attempts = models.PositiveIntegerField(default=0)
+    max_attempts = models.PositiveIntegerField()
+    last_error = models.TextField(blank=True)
+    locked_by = models.CharField(max_length=255, blank=True)
+    locked_at = models.DateTimeField(null=True, blank=True)
+    created = models.DateTimeField(auto_now_add=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            # Matches the ordering workers claim jobs in.
+            models.Index(fields=['priority', 'run_at', 'id'],
+                name='job_queued_idx',
+                condition=models.Q(status=0)),
+            models.Index(fields=['locked_at'],
+                name='job_running_idx',
+                condition=models.Q(status=1)),
+        ]
+
+    def __str__(self):
+        return "{0} #{1}".format(self.task, self.id)
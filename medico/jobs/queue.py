@@ -0,0 +1,81 @@
+"""
+Task registry and enqueueing.
+
+A task is a function decorated with `@task` in an app's `tasks` module. It
+is called by a worker with the keyword arguments it was enqueued with,
+which must be JSON serializable:
+
+    @task
+    def send_receipt(payment_id):
+        ...
+
+    send_receipt.enqueue(payment_id=payment.id)
+
+Jobs are rows in the database, so enqueueing inside a transaction only
+makes the job visible to workers once it commits. Tasks may run more than
+once (after a worker crash, or when retried), so they must be idempotent.
+"""
+from datetime import timedelta
+
+from django.utils import timezone
+
+import common.constants
+from medico.jobs.models import Job
+
+_tasks = {}
+
+
+class UnknownTask(LookupError):
+    pass
+
+
+def task(func=None, *, name=None, priority=0, max_attempts=None):
+    """
+    Registers `func` as a task under `name`, its dotted path by default,
+    and adds an `enqueue(**kwargs)` shortcut to it.
+    """
+    def register(func):
+        task_name = name or "{0}.{1}".format(func.__module__,
+            func.__qualname__)
+        func.task_name = task_name
+        func.priority = priority
+        func.max_attempts = max_attempts or \
+            common.constants.JOB_MAX_ATTEMPTS
+        func.enqueue = lambda **kwargs: enqueue(func, **kwargs)
+        _tasks[task_name] = func
+        return func
+
+    if func is not None:
+        return register(func)
+    return register
+
+
+def get_task(name):
+    try:
+        return _tasks[name]
+    except KeyError:
+        raise UnknownTask("No task named {0}.".format(name))
+
+
+def build_job(func, priority=None, run_at=None, delay=None, **kwargs):
+    """
+    Returns an unsaved Job calling `func` (a task or its name) with
+    `kwargs`, to be run at `run_at`, after `delay` seconds, or as soon as
+    possible.
+    """
+    if isinstance(func, str):
+        func = get_task(func)
+    if run_at is None:
+        run_at = timezone.now()
+        if delay:
+            run_at += timedelta(seconds=delay)
+
+    return Job(task=func.task_name, kwargs=kwargs,
+        priority=func.priority if priority is None else priority,
+        max_attempts=func.max_attempts, run_at=run_at)
+
+
+def enqueue(func, priority=None, run_at=None, delay=None, **kwargs):
+    job = build_job(func, priority, run_at, delay, **kwargs)
+    job.save()
+    return job
@@ -0,0 +1,9 @@
+from medico.jobs.queue import task
+
+
+@task(name="jobs.noop")
+def noop(**kwargs):
+    """
+    Does nothing. Used to benchmark the queue and to check that workers
+    are running.
+    """
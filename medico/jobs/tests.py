@@ -0,0 +1,196 @@
+import threading
+from datetime import timedelta
+
+import pytest
+from django.core import mail
+from django.core.mail import send_mail
+from django.core.management import call_command
+from django.utils import timezone
+
+import common.constants
+from medico.jobs.models import Job
+from medico.jobs.queue import enqueue, task
+from medico.jobs.worker import Worker
+from medico.outbox.models import OutboxEmail
+
+pytestmark = pytest.mark.django_db
+
+calls = []
+
+
+@task(name="tests.record")
+def record(value):
+    calls.append(value)
+
+
+@task(name="tests.explode", max_attempts=2)
+def explode():
+    raise ValueError("boom")
+
+
+@pytest.fixture(autouse=True)
+def clear_calls():
+    calls.clear()
+
+
+class TestWorker:
+
+    def test_runs_jobs_in_priority_order(self):
+        record.enqueue(value="low")
+        enqueue(record, priority=-1, value="high")
+        record.enqueue(value="low again")
+
+        assert Worker().drain() == 3
+
+        assert calls == ["high", "low", "low again"]
+        assert set(Job.objects.values_list('status', 'attempts')) == \
+            {(Job.Status.DONE, 1)}
+
+    def test_delayed_jobs_wait_until_due(self):
+        job = enqueue(record, delay=60, value="later")
+
+        assert Worker().drain() == 0
+
+        Job.objects.filter(id=job.id).update(run_at=timezone.now())
+        assert Worker().drain() == 1
+        assert calls == ["later"]
+
+    def test_failures_are_retried_with_backoff(self):
+        job = explode.enqueue()
+
+        Worker().run_batch()
+
+        job.refresh_from_db()
+        assert job.status == Job.Status.QUEUED
+        assert job.attempts == 1
+        assert job.last_error == "ValueError: boom"
+        assert job.run_at > timezone.now()
+
+        Job.objects.filter(id=job.id).update(run_at=timezone.now())
+        Worker().run_batch()
+
+        job.refresh_from_db()
+        assert job.status == Job.Status.FAILED
+        assert job.attempts == 2
+
+    def test_unknown_task_fails_immediately(self):
+        Job.objects.create(task="tests.missing", max_attempts=5)
+
+        Worker().run_batch()
+
+        job = Job.objects.get()
+        assert job.status == Job.Status.FAILED
+        assert job.last_error.startswith("UnknownTask")
+
+    def test_claimed_jobs_are_not_claimed_again(self):
+        record.enqueue(value=1)
+
+        assert len(Worker(name="a").claim()) == 1
+        assert Worker(name="b").claim() == []
+
+    def test_requeues_jobs_of_dead_workers(self):
+        record.enqueue(value=1)
+        Worker().claim()
+        Job.objects.update(locked_at=timezone.now() - timedelta(
+            seconds=common.constants.JOB_LOCK_TIMEOUT + 1))
+
+        assert Worker().requeue_stale() == 1
+        assert Worker().drain() == 1
+        assert calls == [1]
+
+    def test_fails_jobs_of_dead_workers_out_of_attempts(self):
+        job = explode.enqueue()
+        Job.objects.filter(id=job.id).update(attempts=1)
+        Worker().claim()
+        Job.objects.update(locked_at=timezone.now() - timedelta(
+            seconds=common.constants.JOB_LOCK_TIMEOUT + 1))
+
+        assert Worker().requeue_stale() == 0
+
+        job.refresh_from_db()
+        assert (job.status, job.attempts) == (Job.Status.FAILED, 2)
+
+    def test_saves_each_outcome_when_it_finishes(self):
+        record.enqueue(value=1)
+        record.enqueue(value=2)
+        worker = Worker()
+        statuses = []
+
+        def run(job):
+            statuses.append(list(Job.objects.order_by('id')
+                .values_list('status', flat=True)))
+            return True
+        worker.run = run
+
+        assert worker.drain() == 2
+
+        assert statuses == [[Job.Status.RUNNING, Job.Status.RUNNING],
+                            [Job.Status.DONE, Job.Status.RUNNING]]
+
+    def test_skips_jobs_requeued_during_the_batch(self):
+        first = record.enqueue(value=1)
+        second = record.enqueue(value=2)
+        worker = Worker(name="a")
+
+        def run(job):
+            # The batch outlived the lock of the job after this one.
+            Job.objects.exclude(id=first.id).update(locked_at=timezone.now()
+                - timedelta(seconds=common.constants.JOB_LOCK_TIMEOUT + 1))
+            assert Worker(name="b").requeue_stale() == 1
+            calls.append(job.kwargs["value"])
+            return True
+        worker.run = run
+
+        worker.run_batch()
+
+        assert calls == [1]
+        second.refresh_from_db()
+        assert second.status == Job.Status.QUEUED
+
+    def test_stops_between_jobs(self):
+        stop = threading.Event()
+        record.enqueue(value=1)
+        record.enqueue(value=2)
+        worker = Worker(stop=stop)
+        worker.run = lambda job: stop.set() or True
+
+        assert worker.drain() == 2
+
+        assert list(Job.objects.order_by('id').values_list('status',
+            'locked_by')) == [(Job.Status.DONE, worker.name),
+                              (Job.Status.QUEUED, '')]
+
+    def test_run_workers_burst(self):
+        record.enqueue(value=1)
+
+        call_command("run_workers", "--burst")
+
+        assert calls == [1]
+
+
+def test_outbox_delivery_job(settings):
+    settings.EMAIL_BACKEND = "medico.outbox.backends.OutboxBackend"
+    settings.OUTBOX_DELIVERY_BACKEND = \
+        "django.core.mail.backends.locmem.EmailBackend"
+
+    send_mail("Hello", "Body", "from@example.com", ["to@example.com"])
+    assert Job.objects.get().task == "outbox.deliver"
+
+    Worker().drain()
+
+    assert len(mail.outbox) == 1
+
+
+def test_outbox_delivery_job_retries(settings):
+    settings.EMAIL_BACKEND = "medico.outbox.backends.OutboxBackend"
+    settings.OUTBOX_DELIVERY_BACKEND = "medico.outbox.tests.FailingBackend"
+
+    send_mail("Hello", "Body", "from@example.com", ["to@example.com"])
+    send_mail("Hello again", "Body", "from@example.com", ["to@example.com"])
+    Worker().drain()
+
+    # A single delivery job, due when the e-mails are to be retried.
+    job = Job.objects.get(status=Job.Status.QUEUED)
+    assert job.task == "outbox.deliver"
+    assert job.run_at == OutboxEmail.objects.order_by('next_attempt_at')\
+        .first().next_attempt_at
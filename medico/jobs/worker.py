@@ -0,0 +1,173 @@
+"""
+Job workers. See the `run_workers` management command.
+"""
+import logging
+import os
+import socket
+from datetime import timedelta
+
+from django.db import connection, transaction
+from django.db.models import F
+from django.utils import timezone
+
+import common.constants
+from medico.jobs import queue
+from medico.jobs.models import Job
+
+logger = logging.getLogger(__name__)
+
+
+def retry_delay(attempts):
+    """
+    Exponential backoff after the given number of failed attempts, capped
+    at JOB_MAX_RETRY_DELAY.
+    """
+    delay = common.constants.JOB_RETRY_DELAY * 2 ** (attempts - 1)
+    return timedelta(seconds=min(delay,
+        common.constants.JOB_MAX_RETRY_DELAY))
+
+
+class Worker:
+    """
+    Claims due jobs in batches and runs them.
+
+    On PostgreSQL jobs are claimed with SELECT ... FOR UPDATE SKIP LOCKED,
+    so any number of workers can poll the same table without blocking each
+    other or taking the same job. Backends without SKIP LOCKED (SQLite in
+    tests) fall back to a conditional UPDATE, which is equally safe but
+    serializes the workers.
+
+    Claimed jobs are marked as running and the claim is committed before
+    they run, so jobs are not run inside a long transaction. Each job's lock
+    is renewed when it starts and its outcome saved as soon as it finishes,
+    so only the job running holds a lock that can go stale. Jobs of a
+    worker that died are requeued once their lock is older than
+    JOB_LOCK_TIMEOUT, which must be longer than any job runs.
+
+    `stop` is an optional event checked before each job: once it is set,
+    the jobs of the batch not started yet are put back in the queue.
+    """
+    def __init__(self, name=None, batch_size=None, stop=None):
+        self.name = name or "{0}:{1}".format(socket.gethostname(),
+            os.getpid())
+        self.batch_size = batch_size or common.constants.JOB_BATCH_SIZE
+        self.stop = stop
+
+    @property
+    def stopped(self):
+        return self.stop is not None and self.stop.is_set()
+
+    def claim(self):
+        now = timezone.now()
+        queryset = Job.objects.filter(status=Job.Status.QUEUED,
+            run_at__lte=now).order_by('priority', 'run_at', 'id')
+
+        with transaction.atomic():
+            if connection.features.has_select_for_update_skip_locked:
+                jobs = list(queryset.select_for_update(skip_locked=True)
+                    [:self.batch_size])
+                Job.objects.filter(id__in=[job.id for job in jobs])\
+                    .update(status=Job.Status.RUNNING, locked_by=self.name,
+                        locked_at=now)
+            else:
+                ids = list(queryset.values_list('id', flat=True)
+                    [:self.batch_size])
+                Job.objects.filter(id__in=ids, status=Job.Status.QUEUED)\
+                    .update(status=Job.Status.RUNNING, locked_by=self.name,
+                        locked_at=now)
+                # Another worker may have taken some of them in between.
+                jobs = list(Job.objects.filter(id__in=ids,
+                    locked_by=self.name, locked_at=now).order_by(
+                        'priority', 'run_at', 'id'))
+
+        return jobs
+
+    def run_batch(self):
+        """
+        Claims and runs up to `batch_size` due jobs. Returns how many were
+        claimed.
+        """
+        jobs = self.claim()
+        if not jobs:
+            return 0
+
+        released = []
+        for job in jobs:
+            if self.stopped:
+                released.append(job.id)
+            elif self.start(job):
+                if self.run(job):
+                    Job.objects.filter(id=job.id).update(
+                        status=Job.Status.DONE, attempts=F('attempts') + 1,
+                        finished_at=timezone.now())
+                else:
+                    job.save(update_fields=['status', 'attempts', 'run_at',
+                        'last_error', 'finished_at'])
+
+        if released:
+            Job.objects.filter(id__in=released).update(
+                status=Job.Status.QUEUED, locked_by='', locked_at=None)
+
+        return len(jobs)
+
+    def start(self, job):
+        """
+        Renews the lock of a claimed job before it runs. Returns False if
+        the job is no longer this worker's: it was requeued as stale while
+        earlier jobs of the batch ran.
+        """
+        return Job.objects.filter(id=job.id, status=Job.Status.RUNNING,
+            locked_by=self.name).update(locked_at=timezone.now()) == 1
+
+    def run(self, job):
+        """
+        Runs one claimed job. Returns True if it succeeded; otherwise
+        updates (but does not save) its retry state.
+        """
+        try:
+            func = queue.get_task(job.task)
+            func(**job.kwargs)
+        except Exception as e:
+            logger.exception("Job %s (%s) failed", job.id, job.task)
+            job.attempts += 1
+            job.last_error = "{0}: {1}".format(type(e).__name__, e)
+            if isinstance(e, queue.UnknownTask) or \
+                    job.attempts >= job.max_attempts:
+                job.status = Job.Status.FAILED
+                job.finished_at = timezone.now()
+            else:
+                job.status = Job.Status.QUEUED
+                job.run_at = timezone.now() + retry_delay(job.attempts)
+            return False
+        return True
+
+    def requeue_stale(self):
+        """
+        Puts jobs whose worker stopped without finishing them back in the
+        queue, or fails them once they are out of attempts (a job that
+        kills its worker every time would otherwise be requeued forever).
+        Returns how many were requeued.
+        """
+        now = timezone.now()
+        stale = Job.objects.filter(status=Job.Status.RUNNING,
+            locked_at__lt=now - timedelta(
+                seconds=common.constants.JOB_LOCK_TIMEOUT))
+        stale.filter(attempts__gte=F('max_attempts') - 1).update(
+            status=Job.Status.FAILED, attempts=F('attempts') + 1,
+            last_error="Worker stopped while running the job.",
+            finished_at=now)
+        return stale.update(status=Job.Status.QUEUED,
+            attempts=F('attempts') + 1, run_at=now)
+
+    def drain(self):
+        """
+        Runs batches until nothing is due, or until stopped. Returns the
+        number of jobs claimed.
+        """
+        total = 0
+        while not self.stopped:
+            claimed = self.run_batch()
+            total += claimed
+            if not claimed:
+                break
+        return total
@@ -0,0 +1,47 @@
+from django.contrib import admin
+
+import medico.ledger.models
+
+
+class LedgerEntryInline(admin.TabularInline):
+    model = medico.ledger.models.LedgerEntry
+    fields = ["account", "amount", "currency"]
+    readonly_fields = fields
+    extra = 0
+    can_delete = False
+
+    def has_add_permission(self, request, obj=None):
+        return False
+
+
+@admin.register(medico.ledger.models.LedgerTransaction)
+class LedgerTransactionAdmin(admin.ModelAdmin):
+    # The ledger is append-only: it can be read here, never edited.
+    list_display = ["kind", "reference", "customer", "created"]
+    list_filter = ["kind"]
+    list_select_related = ["customer"]
+    readonly_fields = ["kind", "reference", "customer", "created"]
+    search_fields = ["=reference", "=customer__id"]
+    inlines = [LedgerEntryInline]
+    show_full_result_count = False
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
+
+
+@admin.register(medico.ledger.models.DailyBalance)
+class DailyBalanceAdmin(admin.ModelAdmin):
+    list_display = ["day", "account", "currency", "debits", "credits",
+        "balance"]
+    list_filter = ["account", "currency"]
+    readonly_fields = ["day", "account", "currency", "debits", "credits"]
+    date_hierarchy = "day"
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
@@ -0,0 +1,12 @@
+from django.apps import AppConfig
+
+
+class LedgerConfig(AppConfig):
+    name = "medico.ledger"
+    verbose_name = "Ledger"
+
+    def ready(self):
+        try:
+            import medico.ledger.signals  # noqa F401
+        except ImportError:
+            pass
@@ -0,0 +1,149 @@
+"""
+An append-only, double-entry ledger of the money moving through Stripe.
+
+Every charge, subscription, cancellation and refund is recorded as a
+transaction whose entries balance in each currency: a one-time charge of
+$50 debits cash and credits revenue by 5000 cents, a refund of it debits
+refunds and credits cash. Entries are never changed or removed; mistakes
+are corrected by recording another transaction.
+
+Balances are kept per customer and account, and per day and account, and
+are updated with `F()` expressions in the same database transaction as
+the entries, so that reading one is a lookup by key rather than a sum over
+the history, and never disagrees with the entries.
+
+Transactions are keyed by the Stripe object they come from, so recording
+the same object again, as syncs and retries do, changes nothing. Payments
+are keyed by their PaymentIntent: one that succeeds after the request that
+made it (e.g. once 3D Secure completes) is recorded from its webhook.
+"""
+import collections
+
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+from djstripe.enums import PaymentIntentStatus, RefundStatus
+
+from common.counters import increment
+from medico.ledger.models import (
+    Account,
+    CustomerBalance,
+    DailyBalance,
+    LedgerEntry,
+    LedgerError,
+    LedgerTransaction,
+)
+
+Kind = LedgerTransaction.Kind
+
+
+def record(kind, reference, postings, customer=None, created=None):
+    """
+    Records a transaction of `postings`, (account, amount, currency)
+    triples that must add up to zero in each currency, and updates the
+    balances. Returns the transaction, which is the one already recorded if
+    `kind` and `reference` were recorded before.
+    """
+    totals = collections.Counter()
+    for _, amount, currency in postings:
+        totals[currency] += amount
+    if any(totals.values()):
+        raise LedgerError("The entries of {0} {1} do not balance.".format(
+            Kind(kind).label, reference))
+
+    created = created or timezone.now()
+    day = timezone.localdate(created)
+    with transaction.atomic():
+        try:
+            with transaction.atomic():
+                ledger_transaction = LedgerTransaction.objects.create(
+                    kind=kind, reference=reference, customer=customer,
+                    created=created)
+        except IntegrityError:
+            return LedgerTransaction.objects.get(kind=kind,
+                reference=reference)
+
+        LedgerEntry.objects.bulk_create([
+            LedgerEntry(transaction=ledger_transaction, account=account,
+                        amount=amount, currency=currency)
+            for account, amount, currency in postings])
+        # Always in the same order, so that concurrent transactions lock the
+        # balance rows in the same order and cannot deadlock.
+        for account, amount, currency in sorted(postings):
+            if customer:
+                increment(CustomerBalance, {"customer": customer,
+                    "account": account, "currency": currency},
+                    balance=amount)
+            increment(DailyBalance, {"day": day, "account": account,
+                "currency": currency}, debits=max(amount, 0),
+                credits=max(-amount, 0))
+    return ledger_transaction
+
+
+def payment_postings(intent):
+    if intent is None or intent.status != PaymentIntentStatus.succeeded or \
+            not intent.amount_received:
+        return []
+    return [(Account.CASH, intent.amount_received, intent.currency),
+            (Account.REVENUE, -intent.amount_received, intent.currency)]
+
+
+def _record_payment(kind, intent):
+    postings = payment_postings(intent)
+    if postings:
+        return record(kind, intent.id, postings, intent.customer,
+            intent.created)
+
+
+def record_charge(intent):
+    """
+    Records a one-time payment, once it has succeeded.
+    """
+    return _record_payment(Kind.CHARGE, intent)
+
+
+def record_subscription(intent):
+    """
+    Records the payment of a subscription invoice by `intent`, once it has
+    succeeded: the first invoice as the subscription starts, and renewals.
+    Subscriptions that start with a trial pay nothing, so record nothing.
+    """
+    return _record_payment(Kind.SUBSCRIPTION, intent)
+
+
+def record_cancellation(subscription):
+    """
+    Records the cancellation of a subscription. Subscriptions are
+    cancelled without proration, so no money moves, but the ledger keeps
+    the trail of every change to what a customer pays.
+    """
+    return record(Kind.CANCELLATION, subscription.id, [],
+        subscription.customer,
+        subscription.ended_at or subscription.canceled_at)
+
+
+def refund_postings(amount, currency):
+    return [(Account.REFUNDS, amount, currency),
+            (Account.CASH, -amount, currency)]
+
+
+def record_refund(refund):
+    """
+    Records a refund, once it has succeeded.
+    """
+    if refund.status != RefundStatus.succeeded or not refund.amount:
+        return None
+    return record(Kind.REFUND, refund.id,
+        refund_postings(refund.amount, refund.currency),
+        refund.charge.customer if refund.charge_id else None,
+        refund.created)
+
+
+def customer_balance(customer, account, currency):
+    """
+    The balance of `account` for `customer`: for cash, what they paid net
+    of refunds.
+    """
+    balance = CustomerBalance.objects.filter(customer=customer,
+        account=account, currency=currency).values_list('balance',
+        flat=True).first()
+    return balance or 0
@@ -0,0 +1,77 @@
+# Generated by Django 3.0.12 on 2026-10-19 13:07
+
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+        ('djstripe', '0007_2_4'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CustomerBalance',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('account', models.CharField(choices=[('cash', 'Cash'), ('revenue', 'Revenue'), ('refunds', 'Refunds')], max_length=20)),
+                ('currency', models.CharField(max_length=3)),
+                ('balance', models.BigIntegerField(default=0)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='DailyBalance',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('account', models.CharField(choices=[('cash', 'Cash'), ('revenue', 'Revenue'), ('refunds', 'Refunds')], max_length=20)),
+                ('currency', models.CharField(max_length=3)),
+                ('debits', models.BigIntegerField(default=0)),
+                ('credits', models.BigIntegerField(default=0)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='LedgerTransaction',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.IntegerField(choices=[(0, 'Charge'), (1, 'Subscription'), (2, 'Cancellation'), (3, 'Refund')])),
+                ('reference', models.CharField(max_length=255)),
+                ('created', models.DateTimeField(default=django.utils.timezone.now)),
+                ('customer', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='ledger_transactions', to='djstripe.Customer')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='LedgerEntry',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('account', models.CharField(choices=[('cash', 'Cash'), ('revenue', 'Revenue'), ('refunds', 'Refunds')], max_length=20)),
+                ('amount', models.BigIntegerField()),
+                ('currency', models.CharField(max_length=3)),
+                ('transaction', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='entries', to='ledger.LedgerTransaction')),
+            ],
+            options={
+                'verbose_name_plural': 'ledger entries',
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='dailybalance',
+            constraint=models.UniqueConstraint(fields=('day', 'account', 'currency'), name='daily_balance_key'),
+        ),
+        migrations.AddField(
+            model_name='customerbalance',
+            name='customer',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='ledger_balances', to='djstripe.Customer'),
+        ),
+        migrations.AddConstraint(
+            model_name='ledgertransaction',
+            constraint=models.UniqueConstraint(fields=('kind', 'reference'), name='ledger_transaction_reference'),
+        ),
+        migrations.AddConstraint(
+            model_name='customerbalance',
+            constraint=models.UniqueConstraint(fields=('customer', 'account', 'currency'), name='customer_balance_key'),
+        ),
+    ]
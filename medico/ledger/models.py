@@ -0,0 +1,135 @@
+from django.db import models
+from django.utils import timezone
+
+
+class LedgerError(Exception):
+    pass
+
+
+class AppendOnlyQuerySet(models.QuerySet):
+    """
+    Refuses bulk updates and deletes, which would rewrite the ledger.
+    """
+    def update(self, **kwargs):
+        raise LedgerError("The ledger is append-only.")
+
+    def delete(self):
+        raise LedgerError("The ledger is append-only.")
+
+
+class AppendOnlyModel(models.Model):
+    objects = AppendOnlyQuerySet.as_manager()
+
+    class Meta:
+        abstract = True
+
+    def save(self, *args, **kwargs):
+        if not self._state.adding:
+            raise LedgerError("The ledger is append-only.")
+        super().save(*args, **kwargs)
+
+    def delete(self, *args, **kwargs):
+        raise LedgerError("The ledger is append-only.")
+
+
+class Account(models.TextChoices):
+    # Money received through Stripe.
+    CASH = "cash", "Cash"
+    REVENUE = "revenue", "Revenue"
+    # Revenue given back, kept apart from revenue itself.
+    REFUNDS = "refunds", "Refunds"
+
+
+class LedgerTransaction(AppendOnlyModel):
+    """
+    A movement of money, made of entries that balance in each currency. See
+    medico.ledger.journal.
+    """
+    class Kind(models.IntegerChoices):
+        CHARGE = 0, 'Charge'
+        SUBSCRIPTION = 1, 'Subscription'
+        CANCELLATION = 2, 'Cancellation'
+        REFUND = 3, 'Refund'
+
+    kind = models.IntegerField(choices=Kind.choices)
+    # The ID of the Stripe object behind the transaction. Unique per kind,
+    # so that recording the same object twice records it once.
+    reference = models.CharField(max_length=255)
+    customer = models.ForeignKey("djstripe.Customer", null=True, blank=True,
+        on_delete=models.PROTECT, related_name='ledger_transactions')
+    created = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['kind', 'reference'],
+                name='ledger_transaction_reference'),
+        ]
+
+    def __str__(self):
+        return "{0} {1}".format(self.get_kind_display(), self.reference)
+
+
+class LedgerEntry(AppendOnlyModel):
+    """
+    One side of a transaction. Amounts are in the smallest unit of the
+    currency: debits are positive and credits negative.
+    """
+    transaction = models.ForeignKey(LedgerTransaction,
+        on_delete=models.PROTECT, related_name='entries')
+    account = models.CharField(max_length=20, choices=Account.choices)
+    amount = models.BigIntegerField()
+    currency = models.CharField(max_length=3)
+
+    class Meta:
+        verbose_name_plural = "ledger entries"
+
+    def __str__(self):
+        return "{0} {1} {2}".format(self.account, self.amount, self.currency)
+
+
+class CustomerBalance(models.Model):
+    """
+    The balance of an account for one customer, updated in the same
+    database transaction as the entries it sums.
+    """
+    customer = models.ForeignKey("djstripe.Customer",
+        on_delete=models.PROTECT, related_name='ledger_balances')
+    account = models.CharField(max_length=20, choices=Account.choices)
+    currency = models.CharField(max_length=3)
+    balance = models.BigIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['customer', 'account', 'currency'],
+                name='customer_balance_key'),
+        ]
+
+    def __str__(self):
+        return "{0} {1}: {2} {3}".format(self.customer_id, self.account,
+            self.balance, self.currency)
+
+
+class DailyBalance(models.Model):
+    """
+    What went in and out of an account on a day, updated in the same
+    database transaction as the entries it sums.
+    """
+    day = models.DateField()
+    account = models.CharField(max_length=20, choices=Account.choices)
+    currency = models.CharField(max_length=3)
+    debits = models.BigIntegerField(default=0)
+    credits = models.BigIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['day', 'account', 'currency'],
+                name='daily_balance_key'),
+        ]
+
+    @property
+    def balance(self):
+        return self.debits - self.credits
+
+    def __str__(self):
+        return "{0} {1}: {2} {3}".format(self.day, self.account,
+            self.balance, self.currency)
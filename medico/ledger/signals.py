@@ -0,0 +1,38 @@
+from django.db.models.signals import post_save
+from django.dispatch import receiver
+from djstripe.models import Invoice, PaymentIntent, Refund
+from djstripe.signals import WEBHOOK_SIGNALS
+
+from medico.ledger import journal
+
+
+@receiver(post_save, sender=Refund)
+def refund_saved(sender, instance, raw=False, **kwargs):
+    # Refunds are synced from Stripe whoever issued them, and again as they
+    # change; only succeeded ones are recorded, and only once.
+    if not raw:
+        journal.record_refund(instance)
+
+
+@receiver(WEBHOOK_SIGNALS["payment_intent.succeeded"])
+def payment_intent_succeeded(sender, event, **kwargs):
+    # Sent once djstripe has synced the intent. Payments that succeeded
+    # during checkout are recorded already, and are only recorded once.
+    data = event.data["object"]
+    intent = PaymentIntent.objects.select_related('customer')\
+        .filter(id=data["id"]).first()
+    if intent is None:
+        return
+    if data.get("invoice"):
+        journal.record_subscription(intent)
+    else:
+        journal.record_charge(intent)
+
+
+@receiver(WEBHOOK_SIGNALS["invoice.payment_succeeded"])
+def invoice_paid(sender, event, **kwargs):
+    # Renewals are only paid through here.
+    invoice = Invoice.objects.select_related('payment_intent__customer')\
+        .filter(id=event.data["object"]["id"]).first()
+    if invoice is not None and invoice.payment_intent is not None:
+        journal.record_subscription(invoice.payment_intent)
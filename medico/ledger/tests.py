@@ -0,0 +1,180 @@
+import datetime
+import decimal
+
+import pytest
+from django.utils import timezone
+from djstripe.models import (
+    Charge,
+    Customer as StripeCustomer,
+    Event,
+    Invoice,
+    PaymentIntent,
+    Refund,
+    Subscription,
+)
+from djstripe.signals import WEBHOOK_SIGNALS
+
+from medico.ledger import journal
+from medico.ledger.models import (
+    Account,
+    DailyBalance,
+    LedgerEntry,
+    LedgerError,
+    LedgerTransaction,
+)
+
+pytestmark = pytest.mark.django_db
+
+
+@pytest.fixture
+def customer():
+    return StripeCustomer.objects.create(id="cus_test", livemode=False)
+
+
+def payment_intent(customer, id="pi_test", amount=5000, **kwargs):
+    return PaymentIntent.objects.create(**dict({"id": id, "amount": amount,
+        "amount_capturable": 0, "amount_received": amount,
+        "currency": "usd", "capture_method": "automatic",
+        "confirmation_method": "automatic", "payment_method_types": ["card"],
+        "status": "succeeded", "customer": customer, "livemode": False,
+        "created": timezone.make_aware(datetime.datetime(2021, 3, 1, 12))},
+        **kwargs))
+
+
+class TestJournal:
+
+    def test_charge(self, customer):
+        journal.record_charge(payment_intent(customer))
+        journal.record_charge(payment_intent(customer, id="pi_other",
+            amount=2500))
+
+        assert journal.customer_balance(customer, Account.CASH, "usd") == \
+            7500
+        assert journal.customer_balance(customer, Account.REVENUE,
+            "usd") == -7500
+        day = DailyBalance.objects.get(account=Account.CASH)
+        assert (day.day, day.debits, day.credits) == \
+            (datetime.date(2021, 3, 1), 7500, 0)
+
+    def test_recorded_once(self, customer):
+        intent = payment_intent(customer)
+
+        first = journal.record_charge(intent)
+        second = journal.record_charge(intent)
+
+        assert first == second
+        assert LedgerEntry.objects.count() == 2
+        assert journal.customer_balance(customer, Account.CASH, "usd") == \
+            5000
+
+    def test_not_succeeded(self, customer):
+        intent = payment_intent(customer, status="requires_action")
+
+        assert journal.record_charge(intent) is None
+        assert not LedgerTransaction.objects.exists()
+
+    def test_unbalanced(self, customer):
+        with pytest.raises(LedgerError):
+            journal.record(LedgerTransaction.Kind.CHARGE, "pi_test",
+                [(Account.CASH, 5000, "usd"), (Account.REVENUE, -4000, "usd")],
+                customer)
+
+        assert not LedgerTransaction.objects.exists()
+
+    def test_append_only(self, customer):
+        ledger_transaction = journal.record_charge(payment_intent(customer))
+
+        with pytest.raises(LedgerError):
+            ledger_transaction.save()
+        with pytest.raises(LedgerError):
+            ledger_transaction.delete()
+        with pytest.raises(LedgerError):
+            LedgerEntry.objects.update(amount=0)
+        with pytest.raises(LedgerError):
+            LedgerEntry.objects.all().delete()
+
+    def test_refund(self, customer):
+        journal.record_charge(payment_intent(customer))
+        charge = Charge.objects.create(id="ch_test", amount=50,
+            amount_refunded=20, captured=True, currency="usd",
+            customer=customer, paid=True, refunded=False,
+            status="succeeded", livemode=False)
+
+        # Recorded as it is synced, once it has succeeded.
+        refund = Refund.objects.create(id="re_test", amount=2000,
+            charge=charge, currency="usd", status="pending", livemode=False)
+        assert not LedgerTransaction.objects.filter(
+            kind=LedgerTransaction.Kind.REFUND).exists()
+        refund.status = "succeeded"
+        refund.save()
+        refund.save()
+
+        assert journal.customer_balance(customer, Account.CASH, "usd") == \
+            3000
+        assert journal.customer_balance(customer, Account.REFUNDS,
+            "usd") == 2000
+
+    def test_subscription(self, customer):
+        now = timezone.now()
+        subscription = Subscription.objects.create(id="sub_test",
+            customer=customer, status="active", livemode=False,
+            cancel_at_period_end=False, start_date=now,
+            current_period_start=now, current_period_end=now)
+
+        journal.record_subscription(payment_intent(customer, amount=2900))
+        journal.record_subscription(payment_intent(customer, id="pi_renewal",
+            amount=2900))
+        journal.record_cancellation(subscription)
+
+        assert list(LedgerTransaction.objects.order_by('id')
+            .values_list('kind', 'reference')) == [
+                (LedgerTransaction.Kind.SUBSCRIPTION, "pi_test"),
+                (LedgerTransaction.Kind.SUBSCRIPTION, "pi_renewal"),
+                (LedgerTransaction.Kind.CANCELLATION, "sub_test")]
+        assert journal.customer_balance(customer, Account.CASH, "usd") == \
+            5800
+
+
+class TestWebhooks:
+
+    def send(self, name, data):
+        WEBHOOK_SIGNALS[name].send(sender=None,
+            event=Event(data={"object": data}))
+
+    def test_payment_succeeded_after_checkout(self, customer):
+        intent = payment_intent(customer, status="requires_action")
+        assert journal.record_charge(intent) is None
+
+        # Synced by djstripe before the signal is sent.
+        intent.status = "succeeded"
+        intent.save()
+        self.send("payment_intent.succeeded", {"id": "pi_test",
+            "invoice": None})
+        self.send("payment_intent.succeeded", {"id": "pi_test",
+            "invoice": None})
+
+        assert list(LedgerTransaction.objects.values_list('kind',
+            'reference')) == [(LedgerTransaction.Kind.CHARGE, "pi_test")]
+        assert journal.customer_balance(customer, Account.CASH, "usd") == \
+            5000
+
+    def test_invoice_paid(self, customer):
+        intent = payment_intent(customer, amount=2900)
+        now = timezone.now()
+        Invoice.objects.create(id="in_test", customer=customer,
+            payment_intent=intent, amount_due=decimal.Decimal("29.00"),
+            amount_paid=decimal.Decimal("29.00"), attempt_count=1,
+            attempted=True, currency="usd", paid=True, status="paid",
+            period_start=now, period_end=now, starting_balance=0,
+            subtotal=decimal.Decimal("29.00"),
+            total=decimal.Decimal("29.00"), livemode=False)
+
+        self.send("invoice.payment_succeeded", {"id": "in_test"})
+        self.send("payment_intent.succeeded", {"id": "pi_test",
+            "invoice": "in_test"})
+
+        assert list(LedgerTransaction.objects.values_list('kind',
+            'reference')) == [(LedgerTransaction.Kind.SUBSCRIPTION,
+                               "pi_test")]
+        assert journal.customer_balance(customer, Account.CASH, "usd") == \
+            2900
@@ -0,0 +1,15 @@
+from django.contrib import admin
+
+import medico.outbox.models
+
+
+@admin.register(medico.outbox.models.OutboxEmail)
+class OutboxEmailAdmin(admin.ModelAdmin):
+
+    list_display = ["subject", "recipients", "status", "attempts", "created",
+        "sent_at"]
+    list_filter = ["status"]
+    readonly_fields = ["message", "subject", "recipients", "attempts",
+        "created", "sent_at", "last_error"]
+    search_fields = ["=recipients"]
+    show_full_result_count = False
@@ -0,0 +1,38 @@
+from django.core.mail.backends.base import BaseEmailBackend
+
+from medico.jobs.queue import enqueue
+from medico.outbox import messages
+from medico.outbox.models import OutboxEmail
+
+
+class OutboxBackend(BaseEmailBackend):
+    """
+    E-mail backend that stores messages in the outbox table instead of
+    sending them. The rows are part of the caller's transaction (with
+    ATOMIC_REQUESTS, the request's), so a rolled back request sends nothing,
+    and the request never waits on the mail relay.
+
+    Delivery is done by a background job (see `medico.jobs`), or by
+    `manage.py send_outbox`, through the backend named by the
+    OUTBOX_DELIVERY_BACKEND setting.
+    """
+    def send_messages(self, email_messages):
+        rows = []
+        for message in email_messages:
+            if not message.recipients():
+                continue
+            try:
+                data = messages.serialize(message)
+            except ValueError:
+                if not self.fail_silently:
+                    raise
+                continue
+            rows.append(OutboxEmail(message=data,
+                subject=message.subject[:255],
+                recipients=", ".join(message.recipients())))
+
+        OutboxEmail.objects.bulk_create(rows)
+        if rows:
+            # Part of the same transaction as the rows themselves.
+            enqueue("outbox.deliver")
+        return len(rows)
@@ -0,0 +1,34 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from medico.outbox.sender import OutboxSender
+
+
+class Command(BaseCommand):
+    help = ("Delivers pending outbox e-mails in batches over one connection "
+            "to OUTBOX_DELIVERY_BACKEND. With --loop, keeps polling for new "
+            "e-mails.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=None)
+        parser.add_argument('--loop', action='store_true',
+            help="Keep running, polling every --interval seconds when idle.")
+        parser.add_argument('--interval', type=float, default=2.0)
+
+    def handle(self, *args, **options):
+        sender = OutboxSender()
+        try:
+            while True:
+                claimed = sender.drain(options['batch_size'])
+                if claimed:
+                    self.stdout.write("Processed {0} e-mails.".format(claimed))
+                if not options['loop']:
+                    break
+                # Do not hold the mail server connection open while idle.
+                sender.close()
+                time.sleep(options['interval'])
+        except KeyboardInterrupt:
+            pass
+        finally:
+            sender.close()
@@ -0,0 +1,55 @@
+"""
+Conversion of Django e-mail messages to and from JSON-compatible data, so
+that they can be stored in the outbox table.
+"""
+import base64
+
+from django.core.mail import EmailMultiAlternatives
+
+
+def serialize(message):
+    attachments = []
+    for attachment in message.attachments:
+        if not isinstance(attachment, tuple):
+            raise ValueError("MIME attachments cannot be stored in the "
+                             "outbox; attach (filename, content, mimetype) "
+                             "tuples instead.")
+        filename, content, mimetype = attachment
+        if isinstance(content, str):
+            content = content.encode()
+        attachments.append([filename, base64.b64encode(content).decode(),
+            mimetype])
+
+    return {
+        "subject": message.subject,
+        "body": message.body,
+        "from_email": message.from_email,
+        "to": list(message.to),
+        "cc": list(message.cc),
+        "bcc": list(message.bcc),
+        "reply_to": list(message.reply_to),
+        "headers": dict(message.extra_headers),
+        "content_subtype": message.content_subtype,
+        "alternatives": [list(alternative) for alternative in
+                         getattr(message, 'alternatives', [])],
+        "attachments": attachments,
+    }
+
+
+def deserialize(data, connection=None):
+    message = EmailMultiAlternatives(
+        subject=data["subject"],
+        body=data["body"],
+        from_email=data["from_email"],
+        to=data["to"],
+        cc=data["cc"],
+        bcc=data["bcc"],
+        reply_to=data["reply_to"],
+        headers=data["headers"],
+        alternatives=[tuple(a) for a in data["alternatives"]],
+        connection=connection,
+    )
+    message.content_subtype = data["content_subtype"]
+    for filename, content, mimetype in data["attachments"]:
+        message.attach(filename, base64.b64decode(content), mimetype)
+    return message
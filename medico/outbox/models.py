@@ -0,0 +1,42 @@
+from django.db import models
+from django.utils import timezone
+from jsonfield import JSONField
+
+
+class OutboxEmail(models.Model):
+    """
+    An e-mail waiting to be delivered, or already delivered.
+
+    Rows are written by `medico.outbox.backends.OutboxBackend` inside the
+    transaction of whatever sent the e-mail, and delivered later by
+    `medico.outbox.sender`.
+    """
+    class Status(models.IntegerChoices):
+        PENDING = 0, 'Pending'
+        SENT = 1, 'Sent'
+        FAILED = 2, 'Failed'
+
+    # Serialized django.core.mail.EmailMessage, see `medico.outbox.messages`.
+    message = JSONField()
+    # Denormalized from `message` for the admin.
+    subject = models.CharField(max_length=255, blank=True)
+    recipients = models.TextField(blank=True)
+
+    status = models.IntegerField(choices=Status.choices,
+        default=Status.PENDING)
+    attempts = models.PositiveIntegerField(default=0)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    last_error = models.TextField(blank=True)
+    created = models.DateTimeField(auto_now_add=True)
+    sent_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            # The sender only ever looks for pending e-mails that are due.
+            models.Index(fields=['next_attempt_at', 'id'],
+                name='outbox_email_due_idx',
+                condition=models.Q(status=0)),
+        ]
+
+    def __str__(self):
+        return "E-mail to {0}: {1}".format(self.recipients, self.subject)
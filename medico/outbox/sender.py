@@ -0,0 +1,134 @@
+"""
+Delivery of outbox e-mails.
+"""
+import logging
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.mail import get_connection
+from django.db import connection, transaction
+from django.db.models import Min
+from django.utils import timezone
+
+import common.constants
+from medico.outbox import messages
+from medico.outbox.models import OutboxEmail
+
+logger = logging.getLogger(__name__)
+
+
+def retry_delay(attempts):
+    """
+    Exponential backoff: 1, 2, 4... minutes after the first, second, third
+    failed attempt, capped at OUTBOX_MAX_RETRY_DELAY.
+    """
+    delay = common.constants.OUTBOX_RETRY_DELAY * 2 ** (attempts - 1)
+    return timedelta(seconds=min(delay,
+        common.constants.OUTBOX_MAX_RETRY_DELAY))
+
+
+def next_attempt_at():
+    """
+    When the earliest pending e-mail is due, or None if none is pending.
+    """
+    return OutboxEmail.objects.filter(status=OutboxEmail.Status.PENDING)\
+        .aggregate(next_attempt_at=Min('next_attempt_at'))['next_attempt_at']
+
+
+class OutboxSender:
+    """
+    Drains the outbox in batches over a single connection to the delivery
+    backend, which is opened on first use and kept open between batches
+    until `close` is called.
+    """
+    def __init__(self, backend=None):
+        self.backend = backend or settings.OUTBOX_DELIVERY_BACKEND
+        self.connection = None
+
+    def open(self):
+        if self.connection is None:
+            connection = get_connection(self.backend, fail_silently=False)
+            connection.open()
+            self.connection = connection
+        return self.connection
+
+    def close(self):
+        if self.connection is not None:
+            try:
+                self.connection.close()
+            finally:
+                self.connection = None
+
+    def _claim(self, batch_size):
+        queryset = OutboxEmail.objects.filter(
+            status=OutboxEmail.Status.PENDING,
+            next_attempt_at__lte=timezone.now(),
+        ).order_by('next_attempt_at', 'id')
+        if connection.features.has_select_for_update_skip_locked:
+            # Several senders can run at once; each takes different rows.
+            queryset = queryset.select_for_update(skip_locked=True)
+        return list(queryset[:batch_size])
+
+    def send_batch(self, batch_size=None):
+        """
+        Delivers up to `batch_size` due e-mails and returns how many were
+        claimed. Failures are rescheduled with exponential backoff and
+        given up on after OUTBOX_MAX_ATTEMPTS.
+        """
+        batch_size = batch_size or common.constants.OUTBOX_BATCH_SIZE
+
+        with transaction.atomic():
+            emails = self._claim(batch_size)
+            if not emails:
+                return 0
+
+            for email in emails:
+                try:
+                    mail_connection = self.open()
+                except Exception as e:
+                    logger.warning("Could not connect to the mail server: %s",
+                        e)
+                    self._failed(email, e)
+                else:
+                    self._send(mail_connection, email)
+
+            OutboxEmail.objects.bulk_update(emails, ['status', 'attempts',
+                'next_attempt_at', 'last_error', 'sent_at'])
+
+        return len(emails)
+
+    def _send(self, mail_connection, email):
+        try:
+            messages.deserialize(email.message, mail_connection).send()
+        except Exception as e:
+            logger.warning("Could not send outbox e-mail %s: %s", email.id, e)
+            self._failed(email, e)
+            # The connection may be unusable after an error; the next
+            # message reconnects.
+            self.close()
+        else:
+            email.attempts += 1
+            email.status = OutboxEmail.Status.SENT
+            email.sent_at = timezone.now()
+            email.last_error = ''
+
+    def _failed(self, email, error):
+        email.attempts += 1
+        email.last_error = str(error)
+        if email.attempts >= common.constants.OUTBOX_MAX_ATTEMPTS:
+            email.status = OutboxEmail.Status.FAILED
+        else:
+            email.next_attempt_at = timezone.now() + \
+                retry_delay(email.attempts)
+
+    def drain(self, batch_size=None):
+        """
+        Sends batches until nothing is due. Returns the number of e-mails
+        claimed.
+        """
+        total = 0
+        while True:
+            claimed = self.send_batch(batch_size)
+            total += claimed
+            if not claimed:
+                return total
@@ -0,0 +1,24 @@
+from medico.jobs.models import Job
+from medico.jobs.queue import task
+from medico.outbox.sender import OutboxSender, next_attempt_at
+
+
+@task(name="outbox.deliver", priority=-10)
+def deliver():
+    """
+    Delivers everything due in the outbox. Queued by `OutboxBackend`
+    whenever it stores e-mails, so workers send them right away, and by
+    itself for the e-mails left to retry later, when the first of them is
+    due.
+    """
+    sender = OutboxSender()
+    try:
+        sender.drain()
+    finally:
+        sender.close()
+
+    run_at = next_attempt_at()
+    # One job is enough for every e-mail due from `run_at` on.
+    if run_at is not None and not Job.objects.filter(task=deliver.task_name,
+            status=Job.Status.QUEUED, run_at__lte=run_at).exists():
+        deliver.enqueue(run_at=run_at)
@@ -0,0 +1,129 @@
+from datetime import timedelta
+
+import pytest
+from django.core import mail
+from django.core.mail import EmailMultiAlternatives, send_mail
+from django.core.management import call_command
+from django.db import transaction
+from django.utils import timezone
+
+import common.constants
+from medico.outbox import messages
+from medico.outbox.models import OutboxEmail
+from medico.outbox.sender import OutboxSender, retry_delay
+
+pytestmark = pytest.mark.django_db
+
+
+@pytest.fixture
+def outbox_backend(settings):
+    # The test runner always swaps EMAIL_BACKEND for locmem.
+    settings.EMAIL_BACKEND = "medico.outbox.backends.OutboxBackend"
+    settings.OUTBOX_DELIVERY_BACKEND = \
+        "django.core.mail.backends.locmem.EmailBackend"
+
+
+class FailingBackend:
+    """
+    Delivery backend whose every send fails.
+    """
+    def __init__(self, **kwargs):
+        pass
+
+    def open(self):
+        pass
+
+    def close(self):
+        pass
+
+    def send_messages(self, email_messages):
+        raise OSError("Connection refused")
+
+
+class TestMessages:
+
+    def test_round_trip(self):
+        message = EmailMultiAlternatives("Subject", "Body",
+            "from@example.com", ["to@example.com"], cc=["cc@example.com"],
+            headers={"X-Tag": "receipt"})
+        message.attach_alternative("<p>Body</p>", "text/html")
+        message.attach("receipt.txt", "paid", "text/plain")
+
+        restored = messages.deserialize(messages.serialize(message))
+
+        assert restored.recipients() == ["to@example.com", "cc@example.com"]
+        assert restored.alternatives == [("<p>Body</p>", "text/html")]
+        assert restored.attachments == [("receipt.txt", "paid", "text/plain")]
+        assert restored.extra_headers == {"X-Tag": "receipt"}
+
+
+class TestOutbox:
+
+    def test_backend_stores_instead_of_sending(self, outbox_backend):
+        send_mail("Hello", "Body", "from@example.com", ["to@example.com"])
+
+        assert len(mail.outbox) == 0
+        email = OutboxEmail.objects.get()
+        assert email.status == OutboxEmail.Status.PENDING
+        assert email.recipients == "to@example.com"
+
+    def test_rolled_back_mail_is_not_queued(self, outbox_backend):
+        with pytest.raises(RuntimeError):
+            with transaction.atomic():
+                send_mail("Hello", "Body", "from@example.com",
+                    ["to@example.com"])
+                raise RuntimeError
+
+        assert not OutboxEmail.objects.exists()
+
+    def test_sender_delivers_in_batches(self, outbox_backend):
+        for i in range(5):
+            send_mail("Hello {0}".format(i), "Body", "from@example.com",
+                ["to{0}@example.com".format(i)])
+
+        sender = OutboxSender()
+        assert sender.send_batch(batch_size=2) == 2
+        assert sender.drain(batch_size=2) == 3
+        sender.close()
+
+        assert sorted(m.subject for m in mail.outbox) == \
+            ["Hello {0}".format(i) for i in range(5)]
+        assert not OutboxEmail.objects.exclude(
+            status=OutboxEmail.Status.SENT).exists()
+
+    def test_failures_are_retried_with_backoff(self, outbox_backend):
+        send_mail("Hello", "Body", "from@example.com", ["to@example.com"])
+
+        sender = OutboxSender("medico.outbox.tests.FailingBackend")
+        assert sender.drain() == 1
+
+        email = OutboxEmail.objects.get()
+        assert email.status == OutboxEmail.Status.PENDING
+        assert email.attempts == 1
+        assert email.last_error == "Connection refused"
+        assert email.next_attempt_at > timezone.now()
+        # Not due yet.
+        assert sender.send_batch() == 0
+
+    def test_gives_up_after_max_attempts(self, outbox_backend):
+        send_mail("Hello", "Body", "from@example.com", ["to@example.com"])
+        OutboxEmail.objects.update(
+            attempts=common.constants.OUTBOX_MAX_ATTEMPTS - 1)
+
+        OutboxSender("medico.outbox.tests.FailingBackend").send_batch()
+
+        assert OutboxEmail.objects.get().status == OutboxEmail.Status.FAILED
+
+    def test_retry_delay(self):
+        assert retry_delay(1) == timedelta(
+            seconds=common.constants.OUTBOX_RETRY_DELAY)
+        assert retry_delay(2) == 2 * retry_delay(1)
+        assert retry_delay(50) == timedelta(
+            seconds=common.constants.OUTBOX_MAX_RETRY_DELAY)
+
+    def test_send_outbox_command(self, outbox_backend):
+        send_mail("Hello", "Body", "from@example.com", ["to@example.com"])
+
+        call_command("send_outbox")
+
+        assert len(mail.outbox) == 1
@@ -1,5 +1,87 @@
-from django.contrib import admin
+from django.contrib import admin, messages
+from django.utils.translation import ngettext
+
+from common.admin import LargeTableAdminMixin
+from medico.payments import refunds, search, tasks
 
 import medico.payments.models
 
-admin.site.register(medico.payments.models.CheckoutInformation)
+
+@admin.register(medico.payments.models.CheckoutInformation)
+class CheckoutInformationAdmin(LargeTableAdminMixin, admin.ModelAdmin):
+
+    list_display = ["__str__", "state", "created"]
+    list_select_related = ["stripe_customer"]
+    raw_id_fields = ["stripe_payment_intent", "stripe_customer"]
+    search_fields = ["reason_for_visit"]
+    ordering = ["-created", "-id"]
+    actions = ["refund"]
+
+    def get_search_results(self, request, queryset, search_term):
+        # Full-text search instead of a LIKE scan over every reason.
+        if not search_term.strip():
+            return queryset, False
+        queryset = search.matching(queryset, search_term, ranked=False)
+        return queryset, False
+
+    def refund(self, request, queryset):
+        # Refunds can take minutes, so a job makes the Stripe calls; the
+        # batch can be followed in the checkout refunds list.
+        ids = list(queryset.values_list('id', flat=True))
+        batch = refunds.start(ids)
+        tasks.refund_batch.enqueue(batch=batch)
+        self.message_user(request, ngettext(
+            "%(count)d checkout is being refunded in batch %(batch)s.",
+            "%(count)d checkouts are being refunded in batch %(batch)s.",
+            len(ids)) % {"count": len(ids), "batch": batch},
+            messages.SUCCESS)
+    refund.short_description = "Refund selected checkouts"
+
+
+@admin.register(medico.payments.models.CheckoutRefund)
+class CheckoutRefundAdmin(LargeTableAdminMixin, admin.ModelAdmin):
+
+    list_display = ["__str__", "batch", "status", "amount", "attempts",
+        "updated"]
+    list_filter = ["status", "reason"]
+    raw_id_fields = ["checkout"]
+    search_fields = ["=batch", "=stripe_refund_id"]
+    ordering = ["-id"]
+    readonly_fields = ["checkout", "batch", "reason", "status",
+        "stripe_refund_id", "amount", "attempts", "last_error", "created",
+        "updated"]
+
+    def has_add_permission(self, request):
+        return False
+
+
+@admin.register(medico.payments.models.Receipt)
+class ReceiptAdmin(LargeTableAdminMixin, admin.ModelAdmin):
+
+    list_display = ["__str__", "customer", "payment_intent", "invoice",
+        "created"]
+    list_select_related = ["customer", "payment_intent", "invoice"]
+    raw_id_fields = ["customer", "payment_intent", "invoice"]
+    search_fields = ["=digest"]
+    ordering = ["-id"]
+    readonly_fields = ["payment_intent", "invoice", "customer", "digest",
+        "created"]
+
+    def has_add_permission(self, request):
+        return False
+
+    def view_on_site(self, obj):
+        return obj.get_absolute_url()
+
+
+@admin.register(medico.payments.models.PaymentRetry)
+class PaymentRetryAdmin(LargeTableAdminMixin, admin.ModelAdmin):
+
+    list_display = ["__str__", "status", "attempts", "next_attempt_at",
+        "finished_at"]
+    list_filter = ["status"]
+    raw_id_fields = ["invoice"]
+    search_fields = ["=invoice__id"]
+    ordering = ["next_attempt_at", "id"]
+    readonly_fields = ["invoice", "attempts", "last_error", "created",
+        "finished_at"]
@@ -4,3 +4,11 @@ from django.apps import AppConfig
 class PaymentsConfig(AppConfig):
     name = "medico.payments"
     verbose_name = "Payments"
+
+    def ready(self):
+        from medico.payments import stripe_client
+        stripe_client.install()
+        try:
+            import medico.payments.signals  # noqa F401
+        except ImportError:
+            pass
@@ -0,0 +1,245 @@
+"""
+Dunning: retrying subscription payments that failed, and telling customers
+how to fix them.
+
+When Stripe reports that an invoice could not be paid (the
+`invoice.payment_failed` webhook), `schedule` records a PaymentRetry due
+DUNNING_RETRY_DAYS[0] days later and e-mails the customer a link to change
+their payment method. Stripe's own automatic retries are expected to be
+off, so that customers hear from one schedule.
+
+`Scheduler` (run by `manage.py run_dunning`) claims due retries in batches,
+asks Stripe to pay their invoices from a pool of threads within a shared
+rate limit, and writes every outcome of a batch back at once: one bulk
+update of the retries and one insert of all the notices into the outbox.
+Claiming reads the retries with their invoices and customers in a single
+query, so a batch takes the same handful of queries however large it is.
+"""
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+import djstripe.settings
+import stripe
+from django.conf import settings
+from django.contrib.sites.models import Site
+from django.core.mail import send_mass_mail
+from django.db import connection, transaction
+from django.template.loader import render_to_string
+from django.urls import reverse
+from django.utils import timezone
+from djstripe.enums import InvoiceStatus
+
+import common.constants
+from common import rate_limit
+from common.circuit_breaker import CircuitOpen
+from medico.payments.models import PaymentRetry
+
+Status = PaymentRetry.Status
+
+
+def retry_at(attempts, now=None):
+    """
+    When to retry an invoice after `attempts` retries failed, or None once
+    there are no retries left.
+    """
+    days = common.constants.DUNNING_RETRY_DAYS
+    if attempts >= len(days):
+        return None
+    return (now or timezone.now()) + timedelta(days=days[attempts])
+
+
+def _notice(template_prefix, retry, site):
+    invoice = retry.invoice
+    customer = invoice.customer
+    user = customer.subscriber
+    email = customer.email or (user and user.email)
+    if not email:
+        return None
+    context = {
+        "name": (user and user.get_full_name()) or customer.name,
+        "amount": "{0:.2f} {1}".format(invoice.amount_due,
+                                       invoice.currency.upper()),
+        "next_attempt_at": (retry.status == Status.SCHEDULED and
+                            retry.next_attempt_at),
+        "url": "https://{0}{1}".format(site.domain,
+                                       reverse("users:subscription")),
+    }
+    subject = render_to_string(template_prefix + "_subject.txt", context)
+    message = render_to_string(template_prefix + "_message.txt", context)
+    return (' '.join(subject.split()), message, settings.DEFAULT_FROM_EMAIL,
+        [email])
+
+
+def schedule(invoice):
+    """
+    Schedules the retries of the subscription `invoice`, whose payment just
+    failed, and notifies the customer. Failures of the retries themselves
+    are reported by Stripe too, and change nothing.
+    """
+    if invoice.paid or not invoice.subscription_id:
+        return None
+    retry, created = PaymentRetry.objects.get_or_create(invoice=invoice,
+        defaults={"next_attempt_at": retry_at(0)})
+    if created:
+        notice = _notice("payments/email/payment_failed", retry,
+            Site.objects.get_current())
+        if notice:
+            send_mass_mail([notice], fail_silently=False)
+    return retry
+
+
+def recovered(invoice_id):
+    """
+    Stops retrying the invoice with the Stripe ID `invoice_id`, which got
+    paid some other way (by the customer, or by Stripe after they changed
+    their payment method).
+    """
+    return PaymentRetry.objects.filter(invoice__id=invoice_id,
+        status=Status.SCHEDULED).update(status=Status.RECOVERED,
+            finished_at=timezone.now())
+
+
+def pay(retry, rate):
+    """
+    Asks Stripe to pay the invoice of `retry`. Runs in the scheduler's
+    threads, so it must not use the database. Returns the Stripe invoice or
+    the error that prevented paying it.
+    """
+    rate_limit.wait("stripe:dunning", rate, 1)
+    try:
+        return stripe.Invoice.pay(retry.invoice.id,
+            api_key=djstripe.settings.STRIPE_SECRET_KEY,
+            # A retry replayed after a crash gets the same answer.
+            idempotency_key="dunning-{0}-{1}".format(retry.invoice.id,
+                retry.attempts))
+    except (stripe.error.StripeError, CircuitOpen) as e:
+        return e
+
+
+class Scheduler:
+    """
+    Retries due invoices in batches.
+
+    Retries are claimed by moving their next attempt DUNNING_LEASE seconds
+    ahead, with SELECT ... FOR UPDATE SKIP LOCKED where supported, so that
+    several schedulers never retry the same invoice, and the claim is
+    committed before Stripe is called. A retry whose scheduler died before
+    writing it back is due again once its lease runs out.
+    """
+    def __init__(self, batch_size=None, workers=None, rate=None):
+        self.batch_size = batch_size or common.constants.DUNNING_BATCH_SIZE
+        self.workers = workers or common.constants.DUNNING_WORKERS
+        self.rate = rate or common.constants.DUNNING_RATE_LIMIT
+
+    def claim(self):
+        now = timezone.now()
+        lease = now + timedelta(seconds=common.constants.DUNNING_LEASE)
+        queryset = PaymentRetry.objects.filter(status=Status.SCHEDULED,
+            next_attempt_at__lte=now).order_by('next_attempt_at', 'id')
+
+        with transaction.atomic():
+            if connection.features.has_select_for_update_skip_locked:
+                ids = list(queryset.select_for_update(skip_locked=True)
+                    .values_list('id', flat=True)[:self.batch_size])
+                PaymentRetry.objects.filter(id__in=ids)\
+                    .update(next_attempt_at=lease)
+            else:
+                ids = list(queryset.values_list('id', flat=True)
+                    [:self.batch_size])
+                PaymentRetry.objects.filter(id__in=ids,
+                    next_attempt_at__lte=now).update(next_attempt_at=lease)
+
+        # Another scheduler may have taken some of them in between.
+        return list(PaymentRetry.objects.filter(id__in=ids,
+            next_attempt_at=lease).select_related(
+                'invoice__customer__subscriber').order_by('id'))
+
+    def _apply(self, retry, result, now, notices, site):
+        """
+        Updates `retry` with the outcome of paying its invoice, adding the
+        notice to send, if any, to `notices`.
+        """
+        if isinstance(result, stripe.error.CardError):
+            self._failed(retry, str(result), now, notices, site)
+        elif isinstance(result, stripe.error.InvalidRequestError):
+            # The invoice cannot be paid any more, e.g. it was voided.
+            retry.status = Status.CLOSED
+            retry.last_error = str(result)
+            retry.finished_at = now
+        elif isinstance(result, Exception):
+            # Stripe could not be reached: tried again once the lease runs
+            # out, without counting as an attempt.
+            retry.last_error = str(result) or result.__class__.__name__
+        elif result["paid"]:
+            retry.status = Status.RECOVERED
+            retry.last_error = ""
+            retry.finished_at = now
+        else:
+            # Stripe answered without paying it, and would give the same
+            # answer to the same attempt again.
+            self._failed(retry, "The invoice is still {0}.".format(
+                result.get("status") or "unpaid"), now, notices, site)
+
+    def _failed(self, retry, error, now, notices, site):
+        retry.attempts += 1
+        retry.last_error = error
+        retry.next_attempt_at = retry_at(retry.attempts, now) or now
+        if retry.attempts >= len(common.constants.DUNNING_RETRY_DAYS):
+            retry.status = Status.EXHAUSTED
+            retry.finished_at = now
+            notices.append(_notice("payments/email/subscription_unpaid",
+                retry, site))
+        else:
+            notices.append(_notice("payments/email/payment_failed",
+                retry, site))
+
+    def run_batch(self, pool):
+        """
+        Retries up to `batch_size` due invoices and returns how many were
+        claimed, and whether Stripe's circuit breaker is open.
+        """
+        retries = self.claim()
+        if not retries:
+            return 0, False
+
+        calls = []
+        now = timezone.now()
+        for retry in retries:
+            invoice = retry.invoice
+            # Already settled, as far as the last sync from Stripe knows.
+            if invoice.paid:
+                retry.status = Status.RECOVERED
+                retry.finished_at = now
+            elif invoice.status in (InvoiceStatus.void,
+                                    InvoiceStatus.uncollectible):
+                retry.status = Status.CLOSED
+                retry.finished_at = now
+            else:
+                calls.append((retry, pool.submit(pay, retry, self.rate)))
+
+        notices, unavailable = [], False
+        site = Site.objects.get_current()
+        for retry, call in calls:
+            result = call.result()
+            unavailable = unavailable or isinstance(result, CircuitOpen)
+            self._apply(retry, result, now, notices, site)
+
+        with transaction.atomic():
+            PaymentRetry.objects.bulk_update(retries, ['status', 'attempts',
+                'next_attempt_at', 'last_error', 'finished_at'])
+            send_mass_mail([notice for notice in notices if notice],
+                fail_silently=False)
+        return len(retries), unavailable
+
+    def drain(self):
+        """
+        Runs batches until nothing is due, or until Stripe is unavailable.
+        Returns the number of retries claimed.
+        """
+        total = 0
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            while True:
+                claimed, unavailable = self.run_batch(pool)
+                total += claimed
+                if not claimed or unavailable:
+                    return total
@@ -0,0 +1,149 @@
+"""
+Checkout exports for finance, as CSV or JSON Lines.
+
+Rows come from a single query joining each checkout to its payment intent
+and Stripe customer, read with `QuerySet.iterator` so that only one chunk
+of rows is in memory at a time (a server-side cursor on PostgreSQL), and
+are written out chunk by chunk. Memory use does not depend on the number
+of rows exported.
+
+Reasons for visit are health information finance has no use for, and are
+left out.
+"""
+import csv
+import datetime
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import TextField, Value
+from django.db.models.functions import Coalesce, Concat, NullIf
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+
+import common.constants
+from medico.payments.models import CheckoutInformation
+
+# (column, field or expression) pairs, in export order. Amounts are in the
+# smallest unit of the currency, as Stripe reports them.
+COLUMNS = [
+    ("id", "id"),
+    ("created", "created"),
+    ("state", "state"),
+    ("customer_id", "stripe_customer__id"),
+    ("customer_name", Coalesce(NullIf("stripe_customer__name", Value("")),
+        NullIf(Concat("stripe_customer__subscriber__first_name", Value(" "),
+                      "stripe_customer__subscriber__last_name"), Value(" ")),
+        output_field=TextField())),
+    ("customer_email", "stripe_customer__email"),
+    ("payment_intent_id", "stripe_payment_intent__id"),
+    ("payment_status", "stripe_payment_intent__status"),
+    ("currency", "stripe_payment_intent__currency"),
+    ("amount", "stripe_payment_intent__amount"),
+    ("amount_received", "stripe_payment_intent__amount_received"),
+]
+
+HEADER = [name for name, _ in COLUMNS]
+
+FORMATS = {
+    "csv": "text/csv",
+    "jsonl": "application/x-ndjson",
+}
+
+# Spreadsheets run cells starting with these as formulas.
+FORMULA_PREFIXES = ("=", "+", "-", "@", "\t", "\r")
+
+
+class ExportError(ValueError):
+    pass
+
+
+def parse_format(params):
+    export_format = params.get("format") or "csv"
+    if export_format not in FORMATS:
+        raise ExportError("Invalid value for format.")
+    return export_format
+
+
+def parse_day(value, name):
+    if not value:
+        return None
+    try:
+        day = parse_date(value)
+    except ValueError:
+        day = None
+    if day is None:
+        raise ExportError("Invalid value for {0}.".format(name))
+    return day
+
+
+def queryset(since=None, until=None):
+    """
+    Export rows of the checkouts created from the start of day `since` to
+    the end of day `until` (both optional), as tuples in COLUMNS order.
+    """
+    checkouts = CheckoutInformation.objects.all()
+    if since:
+        checkouts = checkouts.filter(created__gte=timezone.make_aware(
+            datetime.datetime.combine(since, datetime.time.min)))
+    if until:
+        checkouts = checkouts.filter(created__lt=timezone.make_aware(
+            datetime.datetime.combine(until + datetime.timedelta(days=1),
+                                      datetime.time.min)))
+    return checkouts.order_by('id').values_list(
+        *[expression for _, expression in COLUMNS])
+
+
+def _chunks(rows, chunk_size):
+    chunk = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) == chunk_size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+class _Buffer:
+    """
+    Just enough of a file for csv.writer to hand back what it writes.
+    """
+    def write(self, value):
+        return value
+
+
+def _csv_cell(value):
+    if isinstance(value, str) and value.startswith(FORMULA_PREFIXES):
+        return "'" + value
+    if isinstance(value, datetime.datetime):
+        return value.isoformat()
+    return value
+
+
+def stream(rows, export_format, chunk_size=None):
+    """
+    Yields the export of `rows` as strings of up to `chunk_size` lines,
+    starting with the header for CSV.
+    """
+    chunk_size = chunk_size or common.constants.CHECKOUT_EXPORT_CHUNK_SIZE
+    if export_format == "csv":
+        writer = csv.writer(_Buffer())
+        yield writer.writerow(HEADER)
+        for chunk in _chunks(rows, chunk_size):
+            yield "".join(writer.writerow([_csv_cell(value)
+                                           for value in row])
+                          for row in chunk)
+    else:
+        encoder = DjangoJSONEncoder()
+        for chunk in _chunks(rows, chunk_size):
+            yield "".join(encoder.encode(dict(zip(HEADER, row))) + "\n"
+                          for row in chunk)
+
+
+def export(export_format, since=None, until=None, chunk_size=None):
+    """
+    Streams the export of the checkouts created between `since` and
+    `until` in `export_format`.
+    """
+    chunk_size = chunk_size or common.constants.CHECKOUT_EXPORT_CHUNK_SIZE
+    rows = queryset(since, until).iterator(chunk_size=chunk_size)
+    return stream(rows, export_format, chunk_size)
@@ -0,0 +1,166 @@
+"""
+A stand-in for the Stripe API, for benchmarks and tests that must not talk
+to Stripe. Install it with:
+
+    stripe.default_http_client = FakeStripeClient(latency=0.2)
+
+Every request sleeps for `latency` seconds, like a round trip to Stripe
+would, and is answered with a minimal object of the requested type that
+djstripe can sync. Only the endpoints used by checkout, refunds and
+dunning are supported. Requests with an idempotency key get the same answer
+as the first one with that key did. Invoices whose ID is in `declined`
+cannot be paid. Setting `down` makes every request fail like it would
+during an outage.
+"""
+import json
+import re
+import time
+import uuid
+from urllib.parse import parse_qs, urlsplit
+
+import stripe
+from stripe.http_client import HTTPClient
+
+
+def _new_id(prefix):
+    return "{0}_fake{1}".format(prefix, uuid.uuid4().hex[:16])
+
+
+def _base(object_name, id):
+    return {"id": id, "object": object_name, "created": int(time.time()),
+            "livemode": False, "metadata": {}}
+
+
+def account():
+    return dict(_base("account", "acct_fake"), type="standard",
+        business_profile={"name": "Fake"}, charges_enabled=True,
+        country="US", default_currency="usd", details_submitted=True,
+        email=None, payouts_enabled=True, settings={})
+
+
+def payment_method(id, customer=None):
+    return dict(_base("payment_method", id), type="card", customer=customer,
+        billing_details={"address": {}, "email": None, "name": None,
+                         "phone": None},
+        card={"brand": "visa", "country": "US", "exp_month": 12,
+              "exp_year": 2030, "fingerprint": "fake", "funding": "credit",
+              "last4": "4242"})
+
+
+def customer(id, params):
+    payment_method_id = params.get("payment_method")
+    return dict(_base("customer", id), email=params.get("email", ""),
+        name=params.get("name", ""), description=None, currency=None,
+        balance=0, delinquent=False, discount=None, default_source=None,
+        invoice_prefix="FAKE", invoice_settings={
+            "custom_fields": None, "footer": None,
+            "default_payment_method": payment_method_id},
+        address=None, phone=None, preferred_locales=[], shipping=None,
+        tax_exempt="none",
+        sources={"object": "list", "data": [], "has_more": False},
+        subscriptions={"object": "list", "data": [], "has_more": False})
+
+
+def payment_intent(id, params):
+    return dict(_base("payment_intent", id),
+        amount=int(params.get("amount", 0)),
+        amount_capturable=0,
+        amount_received=int(params.get("amount", 0)),
+        currency=params.get("currency", "usd"),
+        customer=params.get("customer"),
+        description=params.get("description"),
+        payment_method=params.get("payment_method"),
+        payment_method_types=["card"], status="succeeded",
+        capture_method="automatic", confirmation_method="automatic",
+        charges={"object": "list", "data": [], "has_more": False},
+        canceled_at=None, cancellation_reason=None, invoice=None,
+        last_payment_error=None, next_action=None, on_behalf_of=None,
+        receipt_email=None, setup_future_usage=None, shipping=None,
+        statement_descriptor=None, transfer_data=None, transfer_group=None)
+
+
+def refund(id, params):
+    return dict(_base("refund", id), amount=int(params["amount"]),
+        currency=params.get("currency", "usd"), charge=_new_id("ch"),
+        payment_intent=params.get("payment_intent"),
+        reason=params.get("reason"), status="succeeded",
+        balance_transaction=None, receipt_number=None)
+
+
+def invoice(id):
+    return dict(_base("invoice", id), paid=True, status="paid",
+        attempted=True)
+
+
+class FakeStripeClient(HTTPClient):
+    name = "fake"
+
+    def __init__(self, latency=0.0):
+        super().__init__()
+        self.latency = latency
+        self.down = False
+        self.requests = 0
+        # Amounts of the payment intents created, those refunded, and the
+        # answers given to each idempotency key.
+        self.payments = {}
+        self.refunded = set()
+        self.declined = set()
+        self.answers = {}
+
+    def request(self, method, url, headers, post_data=None):
+        time.sleep(self.latency)
+        self.requests += 1
+        if self.down:
+            raise stripe.error.APIConnectionError("Fake Stripe is down.")
+
+        key = headers.get("Idempotency-Key")
+        if method == 'post' and key in self.answers:
+            return self.answers[key]
+
+        path = urlsplit(url).path
+        params = {key: values[-1] for key, values in
+                  parse_qs(post_data or '').items()}
+        status, body = 200, None
+
+        match = re.match(r'^/v1/payment_methods/([^/]+)(/attach)?$', path)
+        paying = re.match(r'^/v1/invoices/([^/]+)/pay$', path)
+        if path == '/v1/account':
+            body = account()
+        elif match:
+            body = payment_method(match.group(1), params.get("customer"))
+        elif path == '/v1/customers' and method == 'post':
+            body = customer(_new_id("cus"), params)
+        elif path == '/v1/payment_intents' and method == 'post':
+            body = payment_intent(_new_id("pi"), params)
+            self.payments[body["id"]] = body["amount"]
+        elif paying and method == 'post':
+            if paying.group(1) in self.declined:
+                status, body = 402, {"error": {"type": "card_error",
+                    "code": "card_declined",
+                    "message": "Your card was declined."}}
+            else:
+                body = invoice(paying.group(1))
+        elif path == '/v1/refunds' and method == 'post':
+            intent = params.get("payment_intent")
+            if intent in self.refunded:
+                status, body = 400, {"error": {
+                    "type": "invalid_request_error",
+                    "code": "charge_already_refunded",
+                    "message": "Charge has already been refunded."}}
+            else:
+                self.refunded.add(intent)
+                body = refund(_new_id("re"), dict(params,
+                    amount=params.get("amount",
+                                      self.payments.get(intent, 0))))
+        else:
+            status, body = 404, {"error": {
+                "type": "invalid_request_error",
+                "message": "{0} {1} is not faked.".format(method, path)}}
+
+        answer = json.dumps(body), status, {}
+        if key:
+            self.answers[key] = answer
+        return answer
+
+    def close(self):
+        pass
@@ -0,0 +1,96 @@
+"""
+Consultation history for customers and medical professionals.
+
+Both timelines are ordered newest first by `(created, id)` and paginated by
+seeking past the last row of the previous page. Each is answered by a
+composite index that starts with the owner and continues with that
+ordering (`checkout_history_idx` and `assignment_history_idx`), so a page
+is an index range scan of `limit + 1` entries plus as many row lookups, no
+matter how large the table or how far back the page is.
+"""
+import common.constants
+import common.helpers
+from common.pagination import KeysetPaginator
+from medico.dispatch.models import Assignment
+from medico.payments.models import CheckoutInformation
+
+ORDERING = ("-created", "-id")
+
+
+class HistoryError(ValueError):
+    pass
+
+
+def parse_limit(params):
+    return common.helpers.parse_limit(params,
+        common.constants.CONSULTATION_HISTORY_PAGE_SIZE,
+        common.constants.CONSULTATION_HISTORY_MAX_PAGE_SIZE, HistoryError)
+
+
+def _receipt_url(intent):
+    receipt = intent and getattr(intent, 'receipt', None)
+    return receipt and receipt.get_absolute_url()
+
+
+def checkout_serialize(checkout):
+    intent = checkout.stripe_payment_intent
+    assignment = getattr(checkout, 'assignment', None)
+    medical_pro = assignment and assignment.medical_pro
+    return {
+        "id": checkout.id,
+        "created": checkout.created,
+        "reason_for_visit": checkout.reason_for_visit,
+        "state": checkout.state,
+        "amount": intent and intent.amount,
+        "currency": intent and intent.currency,
+        "status": assignment and assignment.get_status_display(),
+        "medical_pro": medical_pro and medical_pro.name_with_title,
+        "receipt_url": _receipt_url(intent),
+    }
+
+
+def assignment_serialize(assignment):
+    return {
+        "id": assignment.id,
+        "created": assignment.created,
+        "reason_for_visit": assignment.checkout.reason_for_visit,
+        "state": assignment.state,
+        "status": assignment.get_status_display(),
+        "priority": assignment.get_priority_display(),
+        "assigned_at": assignment.assigned_at,
+        "completed_at": assignment.completed_at,
+    }
+
+
+def customer_page(user, cursor=None, limit=None):
+    """
+    A page of the consultations `user` paid for. Raises InvalidCursor for
+    a cursor not produced by this function.
+    """
+    queryset = CheckoutInformation.objects.filter(
+        stripe_customer__in=list(user.djstripe_customers.values_list(
+            'djstripe_id', flat=True)))\
+        .select_related('stripe_payment_intent__receipt',
+            'assignment__medical_pro__user')
+    page = KeysetPaginator(queryset, ORDERING,
+        limit or common.constants.CONSULTATION_HISTORY_PAGE_SIZE).page(cursor)
+    return {
+        "results": [checkout_serialize(checkout)
+                    for checkout in page.object_list],
+        "next_cursor": page.next_cursor,
+    }
+
+
+def provider_page(medical_pro, cursor=None, limit=None):
+    """
+    A page of the consultations assigned to `medical_pro`.
+    """
+    queryset = Assignment.objects.filter(medical_pro=medical_pro)\
+        .select_related('checkout')
+    page = KeysetPaginator(queryset, ORDERING,
+        limit or common.constants.CONSULTATION_HISTORY_PAGE_SIZE).page(cursor)
+    return {
+        "results": [assignment_serialize(assignment)
+                    for assignment in page.object_list],
+        "next_cursor": page.next_cursor,
+    }
@@ -0,0 +1,40 @@
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import django
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from medico.payments import receipts
+
+
+class Command(BaseCommand):
+    help = ("Renders the receipts of every paid payment and invoice that "
+            "has none yet, in a pool of processes. Receipts are recorded "
+            "after every chunk, so an interrupted backfill can simply be "
+            "run again.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=os.cpu_count(),
+            help="Processes rendering receipts.")
+        parser.add_argument('--chunk-size', type=int)
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        recorded = 0
+
+        # Forked workers must not share the parent's database connections;
+        # they only render and store files, and never use one.
+        for connection in connections.all():
+            if not connection.in_atomic_block:
+                connection.close()
+        with ProcessPoolExecutor(max_workers=options['workers'],
+                initializer=django.setup) as pool:
+            for recorded in receipts.backfill(pool, options['chunk_size']):
+                self.stdout.write("{0} receipts ({1:.1f}/s)".format(recorded,
+                    recorded / (time.perf_counter() - started)))
+
+        self.stdout.write(self.style.SUCCESS(
+            "Rendered {0} receipts in {1:.1f}s.".format(recorded,
+                time.perf_counter() - started)))
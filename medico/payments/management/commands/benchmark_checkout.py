@@ -0,0 +1,205 @@
+import asyncio
+import io
+import json
+import statistics
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import djstripe
+from django.conf import settings
+from django.contrib.sessions.backends.db import SessionStore
+from django.core.asgi import get_asgi_application
+from django.core.management.base import BaseCommand, CommandError
+from django.core.wsgi import get_wsgi_application
+from django.db import connection, connections
+from django.utils.crypto import get_random_string
+from djstripe.models import Price, Product
+
+import common.constants
+from medico.payments import stripe_client
+from medico.payments.fake_stripe import FakeStripeClient
+from medico.users.models import Customer, MedicalProfessional, User
+
+USERNAME_PREFIX = "benchmark-checkout-"
+HOST = "localhost"
+
+
+def summarize(label, count, elapsed, latencies, failures):
+    latencies = sorted(latencies)
+    return ("{0}: {1:.1f} checkouts/s, p50 {2:.0f}ms, p99 {3:.0f}ms, "
+            "{4} failed".format(label, count / elapsed,
+                statistics.median(latencies) * 1000,
+                latencies[int(len(latencies) * 0.99)] * 1000, failures))
+
+
+class Command(BaseCommand):
+    help = ("Compares how many concurrent checkouts one worker process "
+            "serves under WSGI (sync and threaded workers) and ASGI, "
+            "against a fake Stripe that adds --latency ms to every API "
+            "call. Runs in a throwaway test database, like the test suite. "
+            "Use PostgreSQL: SQLite serializes the checkout transactions.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--checkouts', type=int, default=50)
+        parser.add_argument('--latency', type=float, default=200,
+            help="Milliseconds added to every Stripe API call.")
+        parser.add_argument('--threads', type=int, default=10,
+            help="Threads of the threaded WSGI worker and of the ASGI "
+                 "thread pool (ASGI_THREADS).")
+
+    def handle(self, *args, **options):
+        if not djstripe.settings.STRIPE_SECRET_KEY.startswith("sk_test_"):
+            raise CommandError("Refusing to run without a Stripe test key.")
+
+        stripe_client.install(FakeStripeClient(options['latency'] / 1000))
+        # Checkouts write to the ledger, which is append-only, and to tables
+        # other checkouts read (rollups, dispatch queues), so they cannot be
+        # undone afterwards. The request threads each have a connection of
+        # their own, so a rolled back transaction cannot hold them either.
+        database_name = connection.creation.create_test_db(verbosity=0,
+            autoclobber=True, serialize=False)
+        try:
+            self._create_price()
+            count = options['checkouts']
+            self.stdout.write(self._run_wsgi(self._sessions(count), 1,
+                "WSGI, sync worker"))
+            self.stdout.write(self._run_wsgi(self._sessions(count),
+                options['threads'], "WSGI, {0} threads".format(
+                    options['threads'])))
+            self.stdout.write(self._run_asgi(self._sessions(count),
+                options['threads'], "ASGI, {0} threads".format(
+                    options['threads'])))
+        finally:
+            connections.close_all()
+            connection.creation.destroy_test_db(database_name, verbosity=0)
+
+    def _create_price(self):
+        product = Product.objects.create(
+            id=common.constants.ONE_TIME_PRODUCT_ID, name="Consultation",
+            type="service", description="Benchmark", livemode=False)
+        Price.objects.create(id="price_fake_benchmark", product=product,
+            currency="usd", unit_amount=5000, active=True, type="one_time",
+            livemode=False)
+
+    def _sessions(self, count):
+        """
+        Creates `count` customers and returns a logged in session cookie,
+        CSRF token and client IP address for each.
+        """
+        sessions = []
+        for n in range(count):
+            suffix = get_random_string(12).lower()
+            user = User.objects.create_user(
+                username=USERNAME_PREFIX + suffix,
+                email="{0}@example.com".format(suffix),
+                first_name="Benchmark", last_name="Customer")
+            Customer.objects.create(user=user)
+
+            session = SessionStore()
+            session['_auth_user_id'] = str(user.pk)
+            session['_auth_user_backend'] = settings.AUTHENTICATION_BACKENDS[0]
+            session['_auth_user_hash'] = user.get_session_auth_hash()
+            session.create()
+            csrf_token = get_random_string(64)
+            # Customers do not share an address, nor its rate limit.
+            address = "10.0.{0}.{1}".format(n // 256, n % 256)
+            sessions.append(("{0}={1}; {2}={3}".format(
+                settings.SESSION_COOKIE_NAME, session.session_key,
+                settings.CSRF_COOKIE_NAME, csrf_token), csrf_token, address))
+        return sessions
+
+    def _body(self):
+        return json.dumps({"payment_method": "pm_fake_card",
+            "reason_for_visit": "Benchmark", "plan_id": "", "state": "NY",
+            "doctor_specialty":
+                MedicalProfessional.DoctorMedicalSpecialty.values[0]})\
+            .encode()
+
+    def _run_wsgi(self, sessions, threads, label):
+        application = get_wsgi_application()
+        path = "/consult/checkout/"
+
+        def checkout(session):
+            cookie, csrf_token, address = session
+            body = self._body()
+            environ = {
+                "REQUEST_METHOD": "POST", "PATH_INFO": path,
+                "SCRIPT_NAME": "", "QUERY_STRING": "",
+                "SERVER_NAME": HOST, "SERVER_PORT": "443", "HTTP_HOST": HOST,
+                "CONTENT_TYPE": "application/json",
+                "CONTENT_LENGTH": str(len(body)),
+                "HTTP_COOKIE": cookie, "HTTP_X_CSRFTOKEN": csrf_token,
+                "HTTP_REFERER": "https://{0}/".format(HOST),
+                "REMOTE_ADDR": address,
+                "wsgi.input": io.BytesIO(body), "wsgi.url_scheme": "https",
+                "wsgi.errors": io.StringIO(),
+            }
+            status = []
+            started = time.perf_counter()
+            response = application(environ,
+                lambda s, headers: status.append(s))
+            b"".join(response)
+            response.close()
+            return time.perf_counter() - started, status[0].startswith("200")
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=threads) as pool:
+            results = list(pool.map(checkout, sessions))
+        elapsed = time.perf_counter() - started
+        return summarize(label, len(sessions), elapsed,
+            [latency for latency, _ in results],
+            sum(1 for _, ok in results if not ok))
+
+    def _run_asgi(self, sessions, threads, label):
+        application = get_asgi_application()
+
+        async def checkout(session):
+            cookie, csrf_token, address = session
+            body = self._body()
+            scope = {
+                "type": "http", "asgi": {"version": "3.0"},
+                "http_version": "1.1", "method": "POST", "scheme": "https",
+                "path": "/consult/checkout/", "root_path": "",
+                "query_string": b"", "server": (HOST, 443),
+                "client": (address, 0),
+                "headers": [
+                    (b"host", HOST.encode()),
+                    (b"content-type", b"application/json"),
+                    (b"content-length", str(len(body)).encode()),
+                    (b"cookie", cookie.encode()),
+                    (b"x-csrftoken", csrf_token.encode()),
+                    (b"referer", "https://{0}/".format(HOST).encode()),
+                ],
+            }
+            messages = [{"type": "http.request", "body": body,
+                         "more_body": False}]
+            status = []
+
+            async def receive():
+                if messages:
+                    return messages.pop()
+                # The request is complete; wait like a server would until
+                # the client goes away.
+                await asyncio.Event().wait()
+
+            async def send(message):
+                if message["type"] == "http.response.start":
+                    status.append(message["status"])
+
+            started = time.perf_counter()
+            await application(scope, receive, send)
+            return time.perf_counter() - started, status[0] == 200
+
+        async def run():
+            # What ASGI_THREADS configures for an ASGI server.
+            asyncio.get_running_loop().set_default_executor(
+                ThreadPoolExecutor(max_workers=threads))
+            return await asyncio.gather(*[checkout(session)
+                                          for session in sessions])
+
+        started = time.perf_counter()
+        results = asyncio.run(run())
+        elapsed = time.perf_counter() - started
+        return summarize(label, len(sessions), elapsed,
+            [latency for latency, _ in results],
+            sum(1 for _, ok in results if not ok))
@@ -0,0 +1,103 @@
+import datetime
+import statistics
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+from djstripe.models import Customer as StripeCustomer
+
+from common.pagination import encode_cursor
+from medico.payments import history
+from medico.payments.models import CheckoutInformation
+from medico.users.models import User
+
+BATCH_SIZE = 500
+
+
+class Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = ("Grows one customer's consultation history through --sizes "
+            "checkouts, among --others times as many checkouts of other "
+            "customers, and times the first and the last page of the "
+            "history at each size, against the last page fetched with "
+            "OFFSET. Everything is rolled back afterwards.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', default="10,1000,100000",
+            help="Comma separated history sizes, in increasing order.")
+        parser.add_argument('--others', type=int, default=9)
+        parser.add_argument('--limit', type=int, default=20)
+        parser.add_argument('--repeat', type=int, default=50)
+
+    def handle(self, *args, **options):
+        try:
+            with transaction.atomic():
+                self._run(options)
+                raise Rollback
+        except Rollback:
+            pass
+
+    def _grow(self, customers, count, start):
+        # Spread over the past year so that timestamps interleave.
+        now = timezone.now()
+        CheckoutInformation.objects.bulk_create([
+            CheckoutInformation(reason_for_visit="Benchmark", state="CA",
+                stripe_customer=customers[n % len(customers)],
+                created=now - datetime.timedelta(seconds=(start + n) * 7 %
+                    31536000, microseconds=n % 1000))
+            for n in range(count)], batch_size=BATCH_SIZE)
+
+    def _time(self, function, repeat):
+        latencies = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            function()
+            latencies.append((time.perf_counter() - started) * 1000)
+        return statistics.median(latencies)
+
+    def _run(self, options):
+        user = User.objects.create(username="history-benchmark")
+        customer = StripeCustomer.objects.create(id="cus_history_benchmark",
+            subscriber=user, livemode=False)
+        others = [StripeCustomer.objects.create(
+                      id="cus_history_benchmark_{0}".format(n),
+                      livemode=False)
+                  for n in range(max(options['others'], 1))]
+        limit = options['limit']
+
+        size = 0
+        for target in [int(s) for s in options['sizes'].split(',')]:
+            self._grow([customer], target - size, size)
+            self._grow(others, (target - size) * options['others'],
+                size * (options['others'] + 1))
+            size = target
+            if transaction.get_connection().vendor == 'postgresql':
+                with transaction.get_connection().cursor() as cursor:
+                    cursor.execute("ANALYZE payments_checkoutinformation")
+
+            queryset = CheckoutInformation.objects.filter(
+                stripe_customer=customer).order_by(*history.ORDERING)\
+                .select_related('stripe_payment_intent',
+                    'assignment__medical_pro__user')
+            depth = max(size - limit - 1, 0)
+            last = queryset[depth]
+            cursor = encode_cursor([last.created, last.id])
+
+            first_page = self._time(
+                lambda: history.customer_page(user, None, limit),
+                options['repeat'])
+            last_page = self._time(
+                lambda: history.customer_page(user, cursor, limit),
+                options['repeat'])
+            offset_page = self._time(
+                lambda: list(queryset[depth + 1:depth + 1 + limit]),
+                options['repeat'])
+            self.stdout.write("{0} checkouts ({1} in the table): first "
+                "page {2:.2f}ms, last page {3:.2f}ms, last page with "
+                "OFFSET {4:.2f}ms".format(size,
+                    size * (options['others'] + 1), first_page, last_page,
+                    offset_page))
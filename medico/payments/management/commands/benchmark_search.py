@@ -0,0 +1,115 @@
+import random
+import statistics
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+
+from medico.payments import search
+from medico.payments.models import CheckoutInformation
+
+BATCH_SIZE = 500
+
+# Roughly in order of how often patients mention them; picked with Zipf
+# weights so that the first terms match a large share of the table and
+# the last ones a handful of rows.
+SYMPTOMS = [
+    "pain", "fever", "cough", "headache", "fatigue", "nausea", "rash",
+    "sore throat", "back pain", "chest pain", "dizziness", "anxiety",
+    "insomnia", "diarrhea", "shortness of breath", "joint pain", "itching",
+    "vomiting", "ear ache", "congestion", "heartburn", "palpitations",
+    "blurred vision", "numbness", "swelling", "wheezing", "migraine",
+    "constipation", "nosebleed", "tremor", "hives", "fainting",
+    "hoarseness", "jaundice", "tinnitus", "vertigo",
+]
+
+FILLER = [
+    "for {0} days", "since last week", "getting worse", "on and off",
+    "mostly at night", "after eating", "after exercise", "since {0} weeks",
+    "no other symptoms", "tried ibuprofen", "worse in the morning",
+]
+
+QUERIES = [
+    ("common term", "pain"),
+    ("rare term", "tinnitus"),
+    ("two terms", "fever cough"),
+    ("phrase", '"shortness of breath"'),
+    ("exclusion", "headache -nausea"),
+]
+
+
+class Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = ("Fills the checkout table with --rows synthetic reasons for "
+            "visit and measures full-text search latency: the first page "
+            "and a later page of a few queries, ranked and newest first. "
+            "Everything is rolled back afterwards.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=2000000)
+        parser.add_argument('--limit', type=int, default=20)
+        parser.add_argument('--pages', type=int, default=5,
+            help="Which page to time after the first one.")
+        parser.add_argument('--repeat', type=int, default=10)
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        random.seed(options['seed'])
+        try:
+            with transaction.atomic():
+                self._run(options)
+                raise Rollback
+        except Rollback:
+            pass
+
+    def _reason(self, weights):
+        words = random.choices(SYMPTOMS, weights, k=random.randint(1, 3))
+        return ", ".join(words + [random.choice(FILLER).format(
+            random.randint(2, 9))]).capitalize()
+
+    def _create(self, rows):
+        weights = [1 / (n + 1) for n in range(len(SYMPTOMS))]
+        started = time.perf_counter()
+        for start in range(0, rows, BATCH_SIZE):
+            CheckoutInformation.objects.bulk_create([
+                CheckoutInformation(state="CA",
+                    reason_for_visit=self._reason(weights))
+                for _ in range(min(BATCH_SIZE, rows - start))])
+        if connection.vendor == 'postgresql':
+            with connection.cursor() as cursor:
+                cursor.execute("ANALYZE payments_checkoutinformation")
+        self.stdout.write("Inserted {0} rows in {1:.0f}s".format(rows,
+            time.perf_counter() - started))
+
+    def _time(self, function, repeat):
+        latencies = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            function()
+            latencies.append((time.perf_counter() - started) * 1000)
+        return statistics.median(latencies)
+
+    def _run(self, options):
+        self._create(options['rows'])
+        limit = options['limit']
+
+        for label, query in QUERIES:
+            matches = search.matching(CheckoutInformation.objects.all(),
+                query).count()
+            for order in search.ORDERINGS:
+                cursor = None
+                for _ in range(options['pages'] - 1):
+                    cursor = search.search_page(query, order, cursor,
+                        limit)["next_cursor"]
+                first = self._time(
+                    lambda: search.search_page(query, order, None, limit),
+                    options['repeat'])
+                later = self._time(
+                    lambda: search.search_page(query, order, cursor, limit),
+                    options['repeat']) if cursor else float('nan')
+                self.stdout.write("{0} ({1}), {2} matches, by {3}: first "
+                    "page {4:.1f}ms, page {5} {6:.1f}ms".format(label, query,
+                        matches, order, first, options['pages'], later))
@@ -0,0 +1,37 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from medico.payments import export
+
+
+class Command(BaseCommand):
+    help = ("Writes every checkout with its payment and customer, for "
+            "finance, as CSV or JSON Lines. Rows are streamed from the "
+            "database in chunks, so exports of any size run in constant "
+            "memory.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--format', choices=sorted(export.FORMATS),
+            default="csv")
+        parser.add_argument('--since', help="First day, as YYYY-MM-DD.")
+        parser.add_argument('--until', help="Last day, as YYYY-MM-DD.")
+        parser.add_argument('--output', default="-",
+            help="File to write to; standard output by default.")
+        parser.add_argument('--chunk-size', type=int)
+
+    def handle(self, *args, **options):
+        try:
+            since = export.parse_day(options['since'], 'since')
+            until = export.parse_day(options['until'], 'until')
+        except export.ExportError as e:
+            raise CommandError(str(e))
+
+        chunks = export.export(options['format'], since, until,
+            options['chunk_size'])
+        if options['output'] == "-":
+            for chunk in chunks:
+                self.stdout.write(chunk, ending='')
+            return
+
+        with open(options['output'], 'w', newline='', encoding='utf-8') as f:
+            for chunk in chunks:
+                f.write(chunk)
@@ -0,0 +1,65 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from medico.payments import refunds
+from medico.payments.models import CheckoutRefund
+
+
+class Command(BaseCommand):
+    help = ("Refunds checkouts in full through Stripe, a bounded number of "
+            "calls at a time and within the refund rate limit. Progress is "
+            "saved after every chunk: an interrupted batch is resumed with "
+            "--resume and the batch ID printed when it started.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('checkouts', nargs='*',
+            help="Checkout IDs, separated by spaces or commas.")
+        parser.add_argument('--file',
+            help="File of checkout IDs, one or more per line.")
+        parser.add_argument('--reason',
+            default=CheckoutRefund.Reason.REQUESTED_BY_CUSTOMER,
+            choices=CheckoutRefund.Reason.values)
+        parser.add_argument('--resume', metavar='BATCH',
+            help="Refunds what is still pending in BATCH.")
+        parser.add_argument('--workers', type=int,
+            help="Stripe calls in flight at once.")
+        parser.add_argument('--rate', type=float,
+            help="Stripe calls per second, across every process.")
+        parser.add_argument('--chunk-size', type=int)
+
+    def handle(self, *args, **options):
+        try:
+            if options['resume']:
+                if options['checkouts'] or options['file']:
+                    raise refunds.RefundError("Either resume a batch or give "
+                        "checkouts to refund, not both.")
+                batch = options['resume']
+                if not CheckoutRefund.objects.filter(batch=batch).exists():
+                    raise refunds.RefundError("No batch {0}.".format(batch))
+            else:
+                values = list(options['checkouts'])
+                if options['file']:
+                    with open(options['file'], encoding='utf-8') as f:
+                        values.extend(f)
+                batch = refunds.start(refunds.parse_ids(values),
+                    options['reason'])
+                self.stdout.write("Started batch {0}.".format(batch))
+
+            started = time.perf_counter()
+            for refunded, failed, retrying in refunds.run(batch,
+                    options['workers'], options['chunk_size'],
+                    options['rate']):
+                self.stdout.write("{0} refunded, {1} failed, {2} to retry "
+                    "({3:.1f} refunds/s)".format(refunded, failed, retrying,
+                        refunded / (time.perf_counter() - started)))
+        except (refunds.RefundError, OSError) as e:
+            raise CommandError(str(e))
+
+        counts = refunds.summary(batch)
+        self.stdout.write(self.style.SUCCESS(
+            "Batch {0}: {1} refunded, {2} failed, {3} pending.".format(batch,
+                counts["refunded"], counts["failed"], counts["pending"])))
+        if counts["pending"]:
+            self.stdout.write("Run again with --resume {0} to retry the "
+                "pending refunds.".format(batch))
@@ -0,0 +1,33 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from medico.payments.dunning import Scheduler
+
+
+class Command(BaseCommand):
+    help = ("Retries the subscription payments that failed and are due, in "
+            "batches, and notifies their customers. With --loop, keeps "
+            "polling for due retries.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=None)
+        parser.add_argument('--workers', type=int, default=None,
+            help="Stripe calls in flight at once.")
+        parser.add_argument('--loop', action='store_true',
+            help="Keep running, polling every --interval seconds when idle.")
+        parser.add_argument('--interval', type=float, default=60.0)
+
+    def handle(self, *args, **options):
+        scheduler = Scheduler(options['batch_size'], options['workers'])
+        try:
+            while True:
+                claimed = scheduler.drain()
+                if claimed:
+                    self.stdout.write("Processed {0} payment retries."
+                        .format(claimed))
+                if not options['loop']:
+                    break
+                time.sleep(options['interval'])
+        except KeyboardInterrupt:
+            pass
@@ -0,0 +1,26 @@
+# Generated by Django 3.0.12 on 2026-10-19 09:12
+
+from django.db import migrations, models
+import localflavor.us.models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('payments', '0002_auto_20210315_0656'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='checkoutinformation',
+            name='doctor_specialty',
+            field=models.IntegerField(blank=True, choices=[(0, 'Family Medicine'), (1, 'Internal Medicine'), (2, 'Emergency Medicine'), (3, 'Pediatrics')], null=True),
+        ),
+        # Earlier checkouts did not ask; they are never dispatched.
+        migrations.AddField(
+            model_name='checkoutinformation',
+            name='state',
+            field=localflavor.us.models.USStateField(default='CA', max_length=2),
+            preserve_default=False,
+        ),
+    ]
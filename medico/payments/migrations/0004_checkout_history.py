@@ -0,0 +1,40 @@
+# Generated by Django 3.0.12 on 2026-10-19 11:52
+
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery
+import django.utils.timezone
+
+
+def backfill_created(apps, schema_editor):
+    # Paid checkouts have a payment intent, which records when it was
+    # created; the rest keep the time of the migration.
+    CheckoutInformation = apps.get_model('payments', 'CheckoutInformation')
+    PaymentIntent = apps.get_model('djstripe', 'PaymentIntent')
+    CheckoutInformation.objects.filter(stripe_payment_intent__isnull=False)\
+        .update(created=Subquery(PaymentIntent.objects.filter(
+            djstripe_id=OuterRef('stripe_payment_intent_id'))
+            .values('created')[:1]))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('djstripe', '0007_2_4'),
+        ('payments', '0003_checkout_state'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='checkoutinformation',
+            name='created',
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+        migrations.AddField(
+            model_name='checkoutinformation',
+            name='updated',
+            field=models.DateTimeField(auto_now=True),
+        ),
+        migrations.RunPython(backfill_created, migrations.RunPython.noop),
+        # checkout_history_idx is built concurrently, by
+        # 0012_checkout_history_idx.
+    ]
@@ -0,0 +1,35 @@
+from django.db import migrations
+
+from common.migrations import RunPostgresSQL
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('payments', '0004_checkout_history'),
+    ]
+
+    operations = [
+        # The text search document of reason_for_visit, kept up to date by
+        # the database so that bulk inserts and updates are covered too. It
+        # is not a model field: only medico.payments.search reads it. On
+        # SQLite, search falls back to an FTS5 table instead (see
+        # medico.payments.search.install_sqlite_fallback).
+        RunPostgresSQL(
+            sql=[
+                'ALTER TABLE payments_checkoutinformation'
+                ' ADD COLUMN search_vector tsvector',
+                'CREATE TRIGGER checkout_search_vector'
+                ' BEFORE INSERT OR UPDATE OF reason_for_visit'
+                ' ON payments_checkoutinformation FOR EACH ROW'
+                ' EXECUTE PROCEDURE tsvector_update_trigger(search_vector,'
+                " 'pg_catalog.english', reason_for_visit)",
+            ],
+            reverse_sql=[
+                'DROP TRIGGER checkout_search_vector'
+                ' ON payments_checkoutinformation',
+                'ALTER TABLE payments_checkoutinformation'
+                ' DROP COLUMN search_vector',
+            ],
+        ),
+    ]
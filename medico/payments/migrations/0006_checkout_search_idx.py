@@ -0,0 +1,44 @@
+from django.db import migrations
+
+from common.migrations import RunPostgresSQL
+
+BACKFILL_BATCH_SIZE = 10000
+
+
+def backfill_search_vector(apps, schema_editor):
+    # In batches of IDs, each committed on its own, so that filling in a
+    # large table does not hold its row locks until the end.
+    connection = schema_editor.connection
+    if connection.vendor != 'postgresql':
+        return
+
+    with connection.cursor() as cursor:
+        cursor.execute('SELECT max(id) FROM payments_checkoutinformation')
+        last_id = cursor.fetchone()[0] or 0
+        for start in range(0, last_id, BACKFILL_BATCH_SIZE):
+            cursor.execute(
+                'UPDATE payments_checkoutinformation SET search_vector ='
+                " to_tsvector('pg_catalog.english', reason_for_visit)"
+                ' WHERE id > %s AND id <= %s AND search_vector IS NULL',
+                [start, start + BACKFILL_BATCH_SIZE])
+
+
+class Migration(migrations.Migration):
+
+    # CREATE INDEX CONCURRENTLY cannot run inside a transaction, and avoids
+    # locking the checkout table against writes while the index builds.
+    atomic = False
+
+    dependencies = [
+        ('payments', '0005_checkout_search'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_search_vector,
+            migrations.RunPython.noop),
+        RunPostgresSQL(
+            'CREATE INDEX CONCURRENTLY IF NOT EXISTS "checkout_search_idx" '
+            'ON "payments_checkoutinformation" USING gin ("search_vector")',
+            'DROP INDEX CONCURRENTLY IF EXISTS "checkout_search_idx"',
+        ),
+    ]
@@ -0,0 +1,21 @@
+from django.db import migrations, models
+
+from common.migrations import AddIndexConcurrently
+
+
+class Migration(migrations.Migration):
+
+    # CREATE INDEX CONCURRENTLY cannot run inside a transaction, and avoids
+    # locking the checkout table against writes while the index builds.
+    atomic = False
+
+    dependencies = [
+        ('payments', '0006_checkout_search_idx'),
+    ]
+
+    operations = [
+        AddIndexConcurrently(
+            model_name='checkoutinformation',
+            index=models.Index(fields=['updated', 'id'], name='checkout_updated_idx'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 3.0.12 on 2026-10-19 15:02
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('payments', '0007_checkout_updated_idx'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='checkoutinformation',
+            name='plan',
+            field=models.CharField(blank=True, max_length=255),
+        ),
+    ]
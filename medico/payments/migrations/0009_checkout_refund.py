@@ -0,0 +1,35 @@
+# Generated by Django 3.0.12 on 2026-10-19 13:12
+
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('payments', '0008_checkout_plan'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CheckoutRefund',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('batch', models.CharField(max_length=32)),
+                ('reason', models.CharField(choices=[('requested_by_customer', 'Requested by customer'), ('duplicate', 'Duplicate'), ('fraudulent', 'Fraudulent')], default='requested_by_customer', max_length=30)),
+                ('status', models.IntegerField(choices=[(0, 'Pending'), (1, 'Refunded'), (2, 'Failed')], default=0)),
+                ('stripe_refund_id', models.CharField(blank=True, max_length=255)),
+                ('amount', models.BigIntegerField(blank=True, null=True)),
+                ('attempts', models.PositiveIntegerField(default=0)),
+                ('last_error', models.TextField(blank=True)),
+                ('created', models.DateTimeField(default=django.utils.timezone.now)),
+                ('updated', models.DateTimeField(auto_now=True)),
+                ('checkout', models.OneToOneField(on_delete=django.db.models.deletion.PROTECT, related_name='refund', to='payments.CheckoutInformation')),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='checkoutrefund',
+            index=models.Index(condition=models.Q(status=0), fields=['batch', 'id'], name='refund_pending_idx'),
+        ),
+    ]
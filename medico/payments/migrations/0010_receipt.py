@@ -0,0 +1,31 @@
+# Generated by Django 3.0.12 on 2026-10-19 13:17
+
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('djstripe', '0007_2_4'),
+        ('payments', '0009_checkout_refund'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Receipt',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('digest', models.CharField(db_index=True, max_length=64)),
+                ('created', models.DateTimeField(default=django.utils.timezone.now)),
+                ('customer', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='receipts', to='djstripe.Customer')),
+                ('invoice', models.OneToOneField(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='receipt', to='djstripe.Invoice')),
+                ('payment_intent', models.OneToOneField(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='receipt', to='djstripe.PaymentIntent')),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='receipt',
+            constraint=models.CheckConstraint(check=models.Q(models.Q(('invoice__isnull', True), ('payment_intent__isnull', False)), models.Q(('invoice__isnull', False), ('payment_intent__isnull', True)), _connector='OR'), name='receipt_source'),
+        ),
+    ]
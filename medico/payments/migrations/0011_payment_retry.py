@@ -0,0 +1,36 @@
+# Generated by Django 3.0.12 on 2026-10-19 13:21
+
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('djstripe', '0007_2_4'),
+        ('payments', '0010_receipt'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PaymentRetry',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('status', models.IntegerField(choices=[(0, 'Scheduled'), (1, 'Recovered'), (2, 'Exhausted'), (3, 'Closed')], default=0)),
+                ('attempts', models.PositiveIntegerField(default=0)),
+                ('next_attempt_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('last_error', models.TextField(blank=True)),
+                ('created', models.DateTimeField(auto_now_add=True)),
+                ('finished_at', models.DateTimeField(blank=True, null=True)),
+                ('invoice', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='payment_retry', to='djstripe.Invoice')),
+            ],
+            options={
+                'verbose_name_plural': 'payment retries',
+            },
+        ),
+        migrations.AddIndex(
+            model_name='paymentretry',
+            index=models.Index(condition=models.Q(status=0), fields=['next_attempt_at', 'id'], name='payment_retry_due_idx'),
+        ),
+    ]
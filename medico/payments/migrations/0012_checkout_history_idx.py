@@ -0,0 +1,30 @@
+import django.db.models.deletion
+from django.db import migrations, models
+
+from common.migrations import AddIndexConcurrently
+
+
+class Migration(migrations.Migration):
+
+    # CREATE INDEX CONCURRENTLY cannot run inside a transaction, and avoids
+    # locking the checkout table against writes while the index builds.
+    atomic = False
+
+    dependencies = [
+        ('djstripe', '0007_2_4'),
+        ('payments', '0011_payment_retry'),
+    ]
+
+    operations = [
+        AddIndexConcurrently(
+            model_name='checkoutinformation',
+            index=models.Index(fields=['stripe_customer', '-created', '-id'], name='checkout_history_idx'),
+        ),
+        # checkout_history_idx starts with stripe_customer, so the foreign
+        # key's own index is redundant.
+        migrations.AlterField(
+            model_name='checkoutinformation',
+            name='stripe_customer',
+            field=models.ForeignKey(blank=True, db_index=False, null=True, on_delete=django.db.models.deletion.CASCADE, to='djstripe.Customer'),
+        ),
+    ]
@@ -1,7 +1,11 @@
+import localflavor.us.models
 from django.db import models
+from django.urls import reverse
+from django.utils import timezone
 
 import medico.payments.validators as validators
 import common.constants
+from medico.users.models import MedicalProfessional
 
 
 class CheckoutInformation(models.Model):
@@ -12,14 +16,152 @@ class CheckoutInformation(models.Model):
     reason_for_visit = models.TextField(blank=True,
         max_length=common.constants.TEXTFIELD_MAX_LENGTH,
         validators=[validators.validate_max_length])
+    # Where the patient is, which decides who may treat them, and the
+    # specialty they asked for, if any. See medico.dispatch.
+    state = localflavor.us.models.USStateField()
+    doctor_specialty = models.IntegerField(null=True, blank=True,
+        choices=MedicalProfessional.DoctorMedicalSpecialty.choices)
     stripe_payment_intent = models.OneToOneField("djstripe.PaymentIntent",
         on_delete=models.SET_NULL, null=True, blank=True)
+    # The Stripe price of the subscription the checkout started, blank for
+    # one-time checkouts.
+    plan = models.CharField(max_length=255, blank=True)
+    # Indexed by checkout_history_idx.
     stripe_customer = models.ForeignKey("djstripe.Customer", null=True,
-        on_delete=models.CASCADE, blank=True)
+        on_delete=models.CASCADE, blank=True, db_index=False)
+    created = models.DateTimeField(default=timezone.now)
+    updated = models.DateTimeField(auto_now=True)
 
     class Meta:
         verbose_name_plural = "checkout information objects"
+        indexes = [
+            # A customer's history, newest first; see medico.payments.history.
+            models.Index(fields=['stripe_customer', '-created', '-id'],
+                name='checkout_history_idx'),
+            # Changes picked up by analytics snapshots.
+            models.Index(fields=['updated', 'id'],
+                name='checkout_updated_idx'),
+        ]
 
     def __str__(self):
         return "Checkout information for customer {0}"\
             .format(self.stripe_customer.name)
+
+
+class CheckoutRefund(models.Model):
+    """
+    The refund of a checkout's payment, issued in bulk (see
+    medico.payments.refunds). Rows are created pending and updated once
+    Stripe answered, so they are the checkpoint an interrupted batch
+    resumes from. A checkout is refunded at most once.
+    """
+    class Status(models.IntegerChoices):
+        PENDING = 0, 'Pending'
+        REFUNDED = 1, 'Refunded'
+        FAILED = 2, 'Failed'
+
+    class Reason(models.TextChoices):
+        # Stripe's reasons for a refund.
+        REQUESTED_BY_CUSTOMER = "requested_by_customer", \
+            "Requested by customer"
+        DUPLICATE = "duplicate", "Duplicate"
+        FRAUDULENT = "fraudulent", "Fraudulent"
+
+    checkout = models.OneToOneField(CheckoutInformation,
+        on_delete=models.PROTECT, related_name='refund')
+    batch = models.CharField(max_length=32)
+    reason = models.CharField(max_length=30, choices=Reason.choices,
+        default=Reason.REQUESTED_BY_CUSTOMER)
+    status = models.IntegerField(choices=Status.choices,
+        default=Status.PENDING)
+    # The Stripe refund, and the amount refunded in cents.
+    stripe_refund_id = models.CharField(max_length=255, blank=True)
+    amount = models.BigIntegerField(null=True, blank=True)
+    attempts = models.PositiveIntegerField(default=0)
+    last_error = models.TextField(blank=True)
+    created = models.DateTimeField(default=timezone.now)
+    updated = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            # The rows of a batch still to refund, in the order they are.
+            models.Index(fields=['batch', 'id'], name='refund_pending_idx',
+                condition=models.Q(status=0)),
+        ]
+
+    def __str__(self):
+        return "Refund of checkout {0}".format(self.checkout_id)
+
+
+class Receipt(models.Model):
+    """
+    The PDF receipt of a one-time payment or of a paid subscription
+    invoice, rendered by medico.payments.receipts. The file is stored under
+    its SHA-256 `digest`, so its URL changes whenever its content does.
+    """
+    payment_intent = models.OneToOneField("djstripe.PaymentIntent",
+        on_delete=models.CASCADE, null=True, blank=True,
+        related_name='receipt')
+    invoice = models.OneToOneField("djstripe.Invoice",
+        on_delete=models.CASCADE, null=True, blank=True,
+        related_name='receipt')
+    customer = models.ForeignKey("djstripe.Customer", null=True, blank=True,
+        on_delete=models.CASCADE, related_name='receipts')
+    digest = models.CharField(max_length=64, db_index=True)
+    created = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        constraints = [
+            models.CheckConstraint(name='receipt_source',
+                check=models.Q(payment_intent__isnull=False,
+                               invoice__isnull=True) |
+                models.Q(payment_intent__isnull=True,
+                         invoice__isnull=False)),
+        ]
+
+    def __str__(self):
+        return "Receipt {0}".format(self.digest[:12])
+
+    @property
+    def file_name(self):
+        return "receipts/{0}/{1}.pdf".format(self.digest[:2], self.digest)
+
+    def get_absolute_url(self):
+        return reverse("payments:receipt", kwargs={"digest": self.digest})
+
+
+class PaymentRetry(models.Model):
+    """
+    A subscription invoice whose payment failed, retried on a schedule by
+    medico.payments.dunning until it is paid or the retries run out.
+    """
+    class Status(models.IntegerChoices):
+        SCHEDULED = 0, 'Scheduled'
+        RECOVERED = 1, 'Recovered'
+        EXHAUSTED = 2, 'Exhausted'
+        # Voided or otherwise no longer payable.
+        CLOSED = 3, 'Closed'
+
+    invoice = models.OneToOneField("djstripe.Invoice",
+        on_delete=models.CASCADE, related_name='payment_retry')
+    status = models.IntegerField(choices=Status.choices,
+        default=Status.SCHEDULED)
+    # Retries made so far, not counting Stripe's own first attempt.
+    attempts = models.PositiveIntegerField(default=0)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    last_error = models.TextField(blank=True)
+    created = models.DateTimeField(auto_now_add=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        verbose_name_plural = "payment retries"
+        indexes = [
+            # The scheduler only ever looks for scheduled retries that are
+            # due.
+            models.Index(fields=['next_attempt_at', 'id'],
+                name='payment_retry_due_idx',
+                condition=models.Q(status=0)),
+        ]
+
+    def __str__(self):
+        return "Retry of invoice {0}".format(self.invoice_id)
@@ -0,0 +1,260 @@
+"""
+PDF receipts of one-time payments and paid subscription invoices.
+
+Rendering happens away from the request workers: a job is queued when a
+checkout is paid (or when Stripe reports a paid invoice or payment), and the
+`backfill_receipts` command renders historical receipts in a pool of
+processes. The database is only read to build each receipt's `data`, a
+plain dictionary, so the rendering itself (`store`) can run in any process.
+
+Receipts are written as small single-page PDFs in the standard Helvetica
+font, without timestamps, so the same receipt always renders to the same
+bytes. Files are stored under the SHA-256 digest of their content: storing
+a receipt twice writes it once, and the digest in its URL lets browsers
+cache it forever.
+"""
+import hashlib
+import zlib
+
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+from djstripe.enums import PaymentIntentStatus
+from djstripe.models import Invoice, PaymentIntent
+
+import common.constants
+from medico.payments.models import Receipt
+
+ISSUER = "Medico"
+
+# US Letter, in points, and where the amounts column starts.
+PAGE_WIDTH, PAGE_HEIGHT = 612, 792
+MARGIN = 72
+AMOUNTS = PAGE_WIDTH - MARGIN - 120
+
+
+def _money(cents, currency):
+    return "{0}{1}.{2:02d} {3}".format("-" if cents < 0 else "",
+        abs(cents) // 100, abs(cents) % 100, currency.upper())
+
+
+def _day(moment):
+    return "{0:%B} {0.day}, {0.year}".format(timezone.localtime(moment))
+
+
+def _customer_lines(customer):
+    if customer is None:
+        return []
+    user = customer.subscriber
+    name = (user and user.get_full_name()) or customer.name
+    email = customer.email or (user and user.email)
+    return [line for line in (name, email) if line]
+
+
+def payment_data(intent):
+    """
+    What the receipt of the one-time payment `intent` shows.
+    """
+    amount = _money(intent.amount_received, intent.currency)
+    return {
+        "number": intent.id,
+        "date": _day(intent.created),
+        "billed_to": _customer_lines(intent.customer),
+        "items": [[intent.description or "Consultation", amount]],
+        "total": amount,
+    }
+
+
+def invoice_data(invoice):
+    """
+    What the receipt of the paid subscription `invoice` shows, for the
+    period it paid.
+    """
+    # Invoice amounts are in currency units.
+    amount = _money(int(round(invoice.amount_paid * 100)), invoice.currency)
+    description = "Subscription"
+    if invoice.period_start and invoice.period_end:
+        description += ", {0} to {1}".format(_day(invoice.period_start),
+            _day(invoice.period_end))
+    return {
+        "number": invoice.number or invoice.id,
+        "date": _day(invoice.created),
+        "billed_to": _customer_lines(invoice.customer),
+        "items": [[description, amount]],
+        "total": amount,
+    }
+
+
+def _text(value):
+    # Helvetica is only available in a single-byte encoding.
+    value = value.encode('latin-1', 'replace').decode('latin-1')
+    return "({0})".format(value.replace('\\', '\\\\').replace('(', '\\(')
+                          .replace(')', '\\)'))
+
+
+def render(data):
+    """
+    Renders the receipt `data` as the bytes of a PDF.
+    """
+    commands = []
+
+    def show(x, y, text, font="F1", size=11):
+        commands.append("BT /{0} {1} Tf {2} {3} Td {4} Tj ET".format(
+            font, size, x, y, _text(text)))
+
+    y = PAGE_HEIGHT - MARGIN
+    show(MARGIN, y, ISSUER, "F2", 20)
+    show(AMOUNTS, y, "Receipt", "F2", 20)
+    y -= 40
+    show(MARGIN, y, "Receipt number: {0}".format(data["number"]))
+    y -= 16
+    show(MARGIN, y, "Date paid: {0}".format(data["date"]))
+    if data["billed_to"]:
+        y -= 32
+        show(MARGIN, y, "Billed to", "F2")
+        for line in data["billed_to"]:
+            y -= 16
+            show(MARGIN, y, line)
+    y -= 40
+    show(MARGIN, y, "Description", "F2")
+    show(AMOUNTS, y, "Amount", "F2")
+    y -= 8
+    commands.append("{0} {1} m {2} {1} l S".format(MARGIN, y,
+        PAGE_WIDTH - MARGIN))
+    for description, amount in data["items"]:
+        y -= 18
+        show(MARGIN, y, description)
+        show(AMOUNTS, y, amount)
+    y -= 26
+    show(MARGIN, y, "Total paid", "F2")
+    show(AMOUNTS, y, data["total"], "F2")
+
+    stream = zlib.compress("\n".join(commands).encode('latin-1'), 9)
+    objects = [
+        b"<< /Type /Catalog /Pages 2 0 R >>",
+        b"<< /Type /Pages /Kids [3 0 R] /Count 1 >>",
+        "<< /Type /Page /Parent 2 0 R /MediaBox [0 0 {0} {1}] /Resources "
+        "<< /Font << /F1 4 0 R /F2 5 0 R >> >> /Contents 6 0 R >>".format(
+            PAGE_WIDTH, PAGE_HEIGHT).encode(),
+        b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica "
+        b"/Encoding /WinAnsiEncoding >>",
+        b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica-Bold "
+        b"/Encoding /WinAnsiEncoding >>",
+        "<< /Length {0} /Filter /FlateDecode >>\nstream\n".format(
+            len(stream)).encode() + stream + b"\nendstream",
+    ]
+
+    pdf = bytearray(b"%PDF-1.4\n%\xe2\xe3\xcf\xd3\n")
+    offsets = []
+    for number, body in enumerate(objects, 1):
+        offsets.append(len(pdf))
+        pdf += "{0} 0 obj\n".format(number).encode() + body + b"\nendobj\n"
+    xref = len(pdf)
+    pdf += "xref\n0 {0}\n0000000000 65535 f \n".format(
+        len(objects) + 1).encode()
+    for offset in offsets:
+        pdf += "{0:010d} 00000 n \n".format(offset).encode()
+    pdf += "trailer\n<< /Size {0} /Root 1 0 R >>\nstartxref\n{1}\n%%EOF\n"\
+        .format(len(objects) + 1, xref).encode()
+    return bytes(pdf)
+
+
+def store(data):
+    """
+    Renders the receipt `data` and stores it under the digest of its
+    content, unless a receipt with that content is stored already. Returns
+    the digest. Safe to call from worker processes.
+    """
+    pdf = render(data)
+    digest = hashlib.sha256(pdf).hexdigest()
+    name = Receipt(digest=digest).file_name
+    if not default_storage.exists(name):
+        saved = default_storage.save(name, ContentFile(pdf))
+        if saved != name:
+            # Stored concurrently by another process, under its name.
+            default_storage.delete(saved)
+    return digest
+
+
+def _receipt(source, digest):
+    if isinstance(source, Invoice):
+        return Receipt(invoice=source, customer=source.customer,
+            digest=digest)
+    return Receipt(payment_intent=source, customer=source.customer,
+        digest=digest)
+
+
+def generate(payment_intent=None, invoice=None):
+    """
+    Renders and records the receipt of the PaymentIntent or Invoice with
+    the Stripe ID `payment_intent` or `invoice`, once it is paid. Returns
+    the receipt, or None if there is nothing to give a receipt for yet.
+    """
+    if payment_intent:
+        field = "payment_intent"
+        source = PaymentIntent.objects.select_related('customer__subscriber')\
+            .get(id=payment_intent)
+        if source.status != PaymentIntentStatus.succeeded:
+            return None
+    else:
+        field = "invoice"
+        source = Invoice.objects.select_related('customer__subscriber')\
+            .get(id=invoice)
+        if not source.paid:
+            return None
+
+    existing = Receipt.objects.filter(**{field: source}).first()
+    if existing:
+        return existing
+    receipt = _receipt(source, store(payment_data(source) if payment_intent
+                                     else invoice_data(source)))
+    try:
+        with transaction.atomic():
+            receipt.save()
+    except IntegrityError:
+        # Generated concurrently, from the same data.
+        receipt = Receipt.objects.get(**{field: source})
+    return receipt
+
+
+def missing(chunk_size=None):
+    """
+    Yields chunks of the paid PaymentIntents and Invoices that have no
+    receipt yet, with the data of their receipts.
+    """
+    chunk_size = chunk_size or common.constants.RECEIPT_BACKFILL_CHUNK_SIZE
+    sources = [
+        # Intents that pay an invoice get the receipt of their invoice.
+        (PaymentIntent.objects.filter(status=PaymentIntentStatus.succeeded,
+            receipt__isnull=True, invoice__isnull=True), payment_data),
+        (Invoice.objects.filter(paid=True, receipt__isnull=True),
+            invoice_data),
+    ]
+    for queryset, build in sources:
+        queryset = queryset.select_related('customer__subscriber')\
+            .order_by('djstripe_id')
+        last_id = 0
+        while True:
+            chunk = list(queryset.filter(djstripe_id__gt=last_id)
+                [:chunk_size])
+            if not chunk:
+                break
+            last_id = chunk[-1].djstripe_id
+            yield [(source, build(source)) for source in chunk]
+
+
+def backfill(pool, chunk_size=None):
+    """
+    Renders the receipts of everything paid that has none yet, in the
+    worker processes of `pool`, and yields how many were recorded after
+    each chunk.
+    """
+    recorded = 0
+    for chunk in missing(chunk_size):
+        digests = pool.map(store, [data for _, data in chunk])
+        Receipt.objects.bulk_create([_receipt(source, digest)
+            for (source, _), digest in zip(chunk, digests)],
+            ignore_conflicts=True)
+        recorded += len(chunk)
+        yield recorded
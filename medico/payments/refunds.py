@@ -0,0 +1,228 @@
+"""
+Refunds of checkouts in bulk, for example after a provider outage.
+
+`start` records a pending CheckoutRefund per checkout under a new batch ID,
+and `run` refunds the pending rows of a batch a chunk at a time: Stripe is
+called from a pool of `workers` threads, each call waiting for a token from
+a bucket shared by every process (see `common.rate_limit`) so that bulk
+refunds never use up the Stripe rate limit checkout needs. The threads only
+talk to Stripe; the results of a chunk are written back by the calling
+thread in one transaction, with a bulk update of the rows and the refunds
+recorded in the ledger.
+
+Every refund is created with an idempotency key derived from its checkout
+and batch, so a refund issued by a run that died before writing its result
+back is returned again, rather than issued twice, when the batch is
+resumed. Rows are only left pending when Stripe could not be reached;
+running the batch again picks them up.
+"""
+import random
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+import djstripe.settings
+import stripe
+from django.db import transaction
+from django.db.models import Count
+from django.utils import timezone
+from djstripe.enums import RefundStatus
+from djstripe.utils import convert_tstamp
+
+import common.constants
+from common import rate_limit
+from common.circuit_breaker import CircuitOpen
+from medico.ledger import journal
+from medico.ledger.models import LedgerTransaction
+from medico.payments.models import CheckoutInformation, CheckoutRefund
+
+Status = CheckoutRefund.Status
+
+
+class RefundError(ValueError):
+    pass
+
+
+def parse_ids(values):
+    """
+    Checkout IDs from `values`, strings that may each hold several IDs
+    separated by commas or whitespace.
+    """
+    ids = []
+    for value in values:
+        for part in value.replace(',', ' ').split():
+            try:
+                ids.append(int(part))
+            except ValueError:
+                raise RefundError("Invalid checkout ID: {0}.".format(part))
+    if not ids:
+        raise RefundError("No checkouts to refund.")
+    return list(dict.fromkeys(ids))
+
+
+def parse_reason(reason):
+    if reason not in CheckoutRefund.Reason.values:
+        raise RefundError("Invalid value for reason.")
+    return reason
+
+
+def start(checkout_ids, reason=CheckoutRefund.Reason.REQUESTED_BY_CUSTOMER):
+    """
+    Starts a batch refunding the checkouts `checkout_ids`, and returns its
+    ID. Checkouts already refunded are left out; those pending or failed in
+    an earlier batch move to this one.
+    """
+    checkout_ids = set(checkout_ids)
+    found = set(CheckoutInformation.objects.filter(id__in=checkout_ids)
+        .values_list('id', flat=True))
+    if found != checkout_ids:
+        raise RefundError("No checkouts with IDs {0}.".format(", ".join(
+            str(id) for id in sorted(checkout_ids - found))))
+
+    batch = uuid.uuid4().hex
+    with transaction.atomic():
+        existing = CheckoutRefund.objects.select_for_update()\
+            .filter(checkout_id__in=checkout_ids)
+        existing.exclude(status=Status.REFUNDED).update(batch=batch,
+            reason=reason, status=Status.PENDING)
+        known = set(existing.values_list('checkout_id', flat=True))
+        CheckoutRefund.objects.bulk_create([
+            CheckoutRefund(checkout_id=id, batch=batch, reason=reason)
+            for id in sorted(checkout_ids - known)])
+    return batch
+
+
+def summary(batch):
+    """
+    The number of rows of `batch` in each status, by status label.
+    """
+    counts = dict(CheckoutRefund.objects.filter(batch=batch)
+        .values_list('status').annotate(Count('id')).order_by())
+    return {status.label.lower(): counts.get(status, 0)
+            for status in Status}
+
+
+def idempotency_key(refund):
+    # Resuming a batch replays its refunds. A later batch gets new keys, and
+    # Stripe refuses to refund a payment already refunded in full.
+    return "checkout-refund-{0}-{1}".format(refund.checkout_id,
+        refund.batch)
+
+
+def issue(refund, payment_intent_id, rate):
+    """
+    Asks Stripe to refund `payment_intent_id` in full. Runs in the worker
+    threads, so it must not use the database. Returns the Stripe refund or
+    the error that prevented it.
+    """
+    for attempt in range(common.constants.REFUND_MAX_RETRIES + 1):
+        rate_limit.wait("stripe:refunds", rate, 1)
+        try:
+            return stripe.Refund.create(
+                api_key=djstripe.settings.STRIPE_SECRET_KEY,
+                idempotency_key=idempotency_key(refund),
+                payment_intent=payment_intent_id, reason=refund.reason,
+                metadata={"checkout": refund.checkout_id,
+                          "batch": refund.batch})
+        except stripe.error.RateLimitError as e:
+            if attempt == common.constants.REFUND_MAX_RETRIES:
+                return e
+            # Back off with jitter, so the workers do not retry in step.
+            time.sleep((2 ** attempt) * (0.5 + random.random() / 2))
+        except (stripe.error.StripeError, CircuitOpen) as e:
+            return e
+
+
+def _apply(refund, result):
+    refund.attempts += 1
+    if isinstance(result, (stripe.error.InvalidRequestError,
+                           stripe.error.CardError)):
+        # Stripe refused this refund, e.g. the charge was disputed; trying
+        # again will not change its answer.
+        refund.status = Status.FAILED
+        refund.last_error = str(result)
+    elif isinstance(result, Exception):
+        # Stripe could not be reached or failed: left pending, to be tried
+        # again when the batch is resumed.
+        refund.last_error = str(result) or result.__class__.__name__
+    else:
+        refund.status = Status.REFUNDED
+        refund.stripe_refund_id = result["id"]
+        refund.amount = result["amount"]
+        refund.last_error = ""
+
+
+def _save(done):
+    now = timezone.now()
+    for refund, _ in done:
+        # bulk_update() leaves auto_now fields alone.
+        refund.updated = now
+    with transaction.atomic():
+        CheckoutRefund.objects.bulk_update([refund for refund, _ in done],
+            ['status', 'stripe_refund_id', 'amount', 'attempts',
+             'last_error', 'updated'])
+        for refund, result in done:
+            # Refunds still pending at Stripe are recorded when djstripe
+            # syncs them, once they succeed.
+            if refund.status == Status.REFUNDED and \
+                    result["status"] == RefundStatus.succeeded:
+                journal.record(LedgerTransaction.Kind.REFUND, result["id"],
+                    journal.refund_postings(result["amount"],
+                                            result["currency"]),
+                    refund.checkout.stripe_customer,
+                    convert_tstamp(result["created"]))
+
+
+def run(batch, workers=None, chunk_size=None, rate=None):
+    """
+    Refunds the pending rows of `batch`, yielding the number of rows
+    refunded, failed and left pending so far after each chunk. Checkouts
+    without a payment (subscriptions) fail without calling Stripe.
+
+    Raises RefundError if Stripe's circuit breaker opened; the rows not
+    refunded yet stay pending.
+    """
+    workers = workers or common.constants.REFUND_WORKERS
+    chunk_size = chunk_size or common.constants.REFUND_CHUNK_SIZE
+    rate = rate or common.constants.REFUND_RATE_LIMIT
+    pending = CheckoutRefund.objects.filter(batch=batch,
+        status=Status.PENDING).select_related(
+            'checkout__stripe_payment_intent', 'checkout__stripe_customer')\
+        .order_by('id')
+
+    refunded = failed = retrying = 0
+    last_id = 0
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        while True:
+            chunk = list(pending.filter(id__gt=last_id)[:chunk_size])
+            if not chunk:
+                return
+            last_id = chunk[-1].id
+
+            done, calls = [], []
+            for refund in chunk:
+                intent = refund.checkout.stripe_payment_intent
+                if intent is None:
+                    refund.attempts += 1
+                    refund.status = Status.FAILED
+                    refund.last_error = "No payment to refund."
+                    done.append((refund, None))
+                    continue
+                calls.append((refund, pool.submit(issue, refund, intent.id,
+                                                  rate)))
+            for refund, call in calls:
+                result = call.result()
+                _apply(refund, result)
+                done.append((refund, result))
+            _save(done)
+
+            refunded += sum(refund.status == Status.REFUNDED
+                            for refund, _ in done)
+            failed += sum(refund.status == Status.FAILED
+                          for refund, _ in done)
+            retrying += sum(refund.status == Status.PENDING
+                            for refund, _ in done)
+            if any(isinstance(result, CircuitOpen) for _, result in done):
+                raise RefundError("Stripe is unavailable; run the batch "
+                    "again to resume it.")
+            yield refunded, failed, retrying
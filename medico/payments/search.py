@@ -0,0 +1,244 @@
+"""
+Full-text search over the reasons patients give for their visits, for
+clinical triage.
+
+On PostgreSQL, `reason_for_visit` is indexed as a `tsvector` column that a
+trigger keeps up to date, with a GIN index on it (payments migrations 0005
+and 0006). Queries use web search syntax: words are ANDed, "quoted phrases"
+must appear in order, `or` separates alternatives and `-word` excludes.
+
+SQLite has no `tsvector`, so local runs use an FTS5 table with the same
+contents instead, which understands the same syntax once translated by
+`fts5_query`. See `install_sqlite_fallback`.
+
+Ranking has to score every matching row before the best ones are known,
+so broad terms cost more than narrow ones whatever the page; ordering by
+`recent` avoids the scoring.
+"""
+import re
+
+from django.db import connection
+from django.db.models import BooleanField, FloatField, TextField
+from django.db.models.expressions import RawSQL
+from django.utils.html import escape
+
+import common.constants
+import common.helpers
+from common.pagination import KeysetPaginator
+from medico.payments.models import CheckoutInformation
+
+TABLE = CheckoutInformation._meta.db_table
+
+# Must match the configuration the trigger indexes with.
+CONFIG = "pg_catalog.english"
+
+TSQUERY = "websearch_to_tsquery('{0}', %s)".format(CONFIG)
+
+FTS_TABLE = "payments_checkout_fts"
+
+# Wrapped around matches by the database, and replaced by <mark> tags once
+# the rest of the text has been escaped.
+MARK_START = "\x02"
+MARK_STOP = "\x03"
+
+HEADLINE_OPTIONS = ('StartSel="{0}", StopSel="{1}", MaxWords=24, '
+    'MinWords=8, MaxFragments=2, FragmentDelimiter=" ... "'.format(
+        MARK_START, MARK_STOP))
+
+ORDERINGS = {
+    "rank": ("-rank", "-id"),
+    "recent": ("-created", "-id"),
+}
+
+# Created, or re-created, by `install_sqlite_fallback`. SQLite drops a
+# table's triggers whenever a migration rebuilds the table, which Django
+# does for most schema changes.
+SQLITE_FALLBACK = [
+    "CREATE VIRTUAL TABLE IF NOT EXISTS {fts} USING fts5(reason_for_visit,"
+    " content='{table}', content_rowid='id',"
+    " tokenize='porter unicode61')",
+    "CREATE TRIGGER IF NOT EXISTS {fts}_ai AFTER INSERT ON {table} BEGIN"
+    " INSERT INTO {fts}(rowid, reason_for_visit)"
+    " VALUES (new.id, new.reason_for_visit); END",
+    "CREATE TRIGGER IF NOT EXISTS {fts}_ad AFTER DELETE ON {table} BEGIN"
+    " INSERT INTO {fts}({fts}, rowid, reason_for_visit)"
+    " VALUES ('delete', old.id, old.reason_for_visit); END",
+    "CREATE TRIGGER IF NOT EXISTS {fts}_au"
+    " AFTER UPDATE OF reason_for_visit ON {table} BEGIN"
+    " INSERT INTO {fts}({fts}, rowid, reason_for_visit)"
+    " VALUES ('delete', old.id, old.reason_for_visit);"
+    " INSERT INTO {fts}(rowid, reason_for_visit)"
+    " VALUES (new.id, new.reason_for_visit); END",
+]
+
+SQLITE_FALLBACK_NAMES = {FTS_TABLE, FTS_TABLE + "_ai", FTS_TABLE + "_ad",
+                         FTS_TABLE + "_au"}
+
+
+class SearchError(ValueError):
+    pass
+
+
+def install_sqlite_fallback(using_connection):
+    """
+    Creates the FTS5 table and the triggers that keep it in sync with the
+    checkout table if any of them is missing, and then rebuilds the index.
+    Does nothing on other databases.
+    """
+    if using_connection.vendor != 'sqlite':
+        return
+    if TABLE not in using_connection.introspection.table_names():
+        return
+
+    with using_connection.cursor() as cursor:
+        cursor.execute("SELECT name FROM sqlite_master"
+            " WHERE type IN ('table', 'trigger') AND name LIKE %s",
+            [FTS_TABLE + "%"])
+        if SQLITE_FALLBACK_NAMES <= {row[0] for row in cursor.fetchall()}:
+            return
+        for sql in SQLITE_FALLBACK:
+            cursor.execute(sql.format(fts=FTS_TABLE, table=TABLE))
+        cursor.execute("INSERT INTO {0}({0}) VALUES ('rebuild')".format(
+            FTS_TABLE))
+
+
+def fts5_query(query):
+    """
+    Translates a web search style query into an FTS5 query, quoting every
+    term so that nothing typed is taken for FTS5 syntax. Returns None when
+    nothing is left to search for.
+    """
+    groups, excluded = [[]], []
+    for negate, phrase, word in re.findall(r'(-?)(?:"([^"]*)"?|(\S+))',
+                                           query):
+        if not negate and word.lower() == "or":
+            groups.append([])
+            continue
+        words = re.findall(r'\w+', phrase or word)
+        if not words:
+            continue
+        term = '"{0}"'.format(' '.join(words))
+        (excluded if negate else groups[-1]).append(term)
+
+    groups = ["({0})".format(" AND ".join(group))
+              for group in groups if group]
+    if not groups:
+        return None
+    return "({0})".format(" OR ".join(groups)) + \
+        "".join(" NOT " + term for term in excluded)
+
+
+def parse_query(params):
+    query = params.get("q", "").strip()
+    if not re.search(r'\w', query):
+        raise SearchError("Please provide a search query.")
+    if len(query) > common.constants.CONSULTATION_SEARCH_MAX_QUERY_LENGTH:
+        raise SearchError("The search query is too long.")
+    return query
+
+
+def parse_order(params):
+    order = params.get("order") or "rank"
+    if order not in ORDERINGS:
+        raise SearchError("Invalid value for order.")
+    return order
+
+
+def parse_limit(params):
+    return common.helpers.parse_limit(params,
+        common.constants.CONSULTATION_SEARCH_PAGE_SIZE,
+        common.constants.CONSULTATION_SEARCH_MAX_PAGE_SIZE, SearchError)
+
+
+def matching(queryset, query, ranked=True):
+    """
+    Filters a CheckoutInformation queryset down to the checkouts matching
+    `query` and, if `ranked`, annotates them with their `rank`, higher is
+    better.
+    """
+    if connection.vendor == 'postgresql':
+        queryset = queryset.filter(RawSQL('"{0}"."search_vector" @@ {1}'
+            .format(TABLE, TSQUERY), [query], output_field=BooleanField()))
+        rank = RawSQL('ts_rank_cd("{0}"."search_vector", {1})::float8'
+            .format(TABLE, TSQUERY), [query], output_field=FloatField())
+    else:
+        match = fts5_query(query)
+        if match is None:
+            return queryset.none()
+        queryset = queryset.filter(id__in=RawSQL(
+            'SELECT rowid FROM {0} WHERE {0} MATCH %s'.format(FTS_TABLE),
+            [match]))
+        # bm25() is lower for better matches.
+        rank = sqlite_match(match, '-bm25({0})'.format(FTS_TABLE), [],
+            FloatField())
+
+    return queryset.annotate(rank=rank) if ranked else queryset
+
+
+def sqlite_match(match, expression, params, output_field):
+    """
+    The FTS5 auxiliary function call `expression` (bm25(), snippet()...) for
+    the checkout of the outer query, which must match `match`. FTS5 looks
+    the row up by rowid within the matches rather than searching again.
+    """
+    return RawSQL('(SELECT {0} FROM {1} WHERE {1} MATCH %s AND '
+        '{1}.rowid = "{2}"."id")'.format(expression, FTS_TABLE, TABLE),
+        [*params, match], output_field=output_field)
+
+
+def highlight(text):
+    return escape(text).replace(MARK_START, "<mark>")\
+        .replace(MARK_STOP, "</mark>")
+
+
+def headlines(ids, query):
+    """
+    Returns the passages of the checkouts `ids` that match `query`, as HTML
+    with the matches in <mark> tags. Only run for the rows of a page: it
+    has to re-read and re-parse the text.
+    """
+    queryset = CheckoutInformation.objects.filter(id__in=ids)
+    if connection.vendor == 'postgresql':
+        headline = RawSQL("ts_headline('{0}', \"{1}\".\"reason_for_visit\","
+            " {2}, %s)".format(CONFIG, TABLE, TSQUERY),
+            [query, HEADLINE_OPTIONS])
+    else:
+        headline = sqlite_match(fts5_query(query),
+            "snippet({0}, 0, %s, %s, ' ... ', 24)".format(FTS_TABLE),
+            [MARK_START, MARK_STOP], TextField())
+
+    return {checkout_id: highlight(text or "")
+            for checkout_id, text in queryset.annotate(headline=headline)
+            .values_list('id', 'headline')}
+
+
+def checkout_serialize(checkout, headline):
+    assignment = getattr(checkout, 'assignment', None)
+    return {
+        "id": checkout.id,
+        "created": checkout.created,
+        "state": checkout.state,
+        "customer": (checkout.stripe_customer_id and
+                     checkout.stripe_customer.id),
+        "status": assignment and assignment.get_status_display(),
+        "rank": getattr(checkout, 'rank', None),
+        "headline": headline,
+    }
+
+
+def search_page(query, order="rank", cursor=None, limit=None):
+    """
+    A page of the checkouts matching `query`, best matches first or, with
+    `order="recent"`, newest first and without a rank. Raises InvalidCursor
+    for a cursor not produced by this function with the same order.
+    """
+    queryset = matching(CheckoutInformation.objects.select_related(
+        'stripe_customer', 'assignment'), query, ranked=order == "rank")
+    page = KeysetPaginator(queryset, ORDERINGS[order],
+        limit or common.constants.CONSULTATION_SEARCH_PAGE_SIZE).page(cursor)
+    marked = headlines([checkout.id for checkout in page.object_list], query)
+    return {
+        "results": [checkout_serialize(checkout, marked.get(checkout.id, ""))
+                    for checkout in page.object_list],
+        "next_cursor": page.next_cursor,
+    }
@@ -0,0 +1,40 @@
+from django.db import connections
+from django.db.models.signals import post_migrate
+from django.dispatch import receiver
+from djstripe.models import Invoice
+from djstripe.signals import WEBHOOK_SIGNALS
+
+from medico.payments import dunning, search, tasks
+
+
+@receiver(post_migrate)
+def install_search_fallback(sender, using, **kwargs):
+    if sender.name == "medico.payments":
+        search.install_sqlite_fallback(connections[using])
+
+
+@receiver(WEBHOOK_SIGNALS["invoice.payment_succeeded"])
+def invoice_paid(sender, event, **kwargs):
+    # Sent once djstripe has synced the invoice: first payments of new
+    # subscriptions and every renewal.
+    invoice_id = event.data["object"]["id"]
+    tasks.render_receipt.enqueue(invoice=invoice_id)
+    dunning.recovered(invoice_id)
+
+
+@receiver(WEBHOOK_SIGNALS["payment_intent.succeeded"])
+def payment_intent_succeeded(sender, event, **kwargs):
+    # Sent once djstripe has synced the intent, including intents that only
+    # succeed after the checkout request (e.g. once 3D Secure completes).
+    # Subscription payments get the receipt of their invoice instead.
+    intent = event.data["object"]
+    if not intent.get("invoice"):
+        tasks.render_receipt.enqueue(payment_intent=intent["id"])
+
+
+@receiver(WEBHOOK_SIGNALS["invoice.payment_failed"])
+def invoice_payment_failed(sender, event, **kwargs):
+    invoice = Invoice.objects.select_related('customer__subscriber')\
+        .filter(id=event.data["object"]["id"]).first()
+    if invoice is not None:
+        dunning.schedule(invoice)
@@ -0,0 +1,72 @@
+"""
+The HTTP client every Stripe API call (ours and djstripe's) goes through.
+"""
+import time
+
+import stripe
+from stripe.http_client import HTTPClient
+
+import common.constants
+from common.circuit_breaker import CircuitBreaker
+
+breaker = CircuitBreaker("stripe",
+    failure_threshold=common.constants.STRIPE_BREAKER_FAILURE_THRESHOLD,
+    window=common.constants.STRIPE_BREAKER_WINDOW,
+    slow_call=common.constants.STRIPE_BREAKER_SLOW_CALL,
+    recovery_timeout=common.constants.STRIPE_BREAKER_RECOVERY_TIMEOUT)
+
+
+class BreakerHTTPClient(HTTPClient):
+    """
+    Wraps a Stripe HTTP client with the `breaker` circuit breaker. While
+    Stripe is down or slow, calls raise `CircuitOpen` immediately.
+
+    Connection errors, 5xx and 429 responses and slow calls count as
+    failures. Other errors (declined cards, invalid requests) are answers
+    from a healthy Stripe and do not.
+    """
+    def __init__(self, client, breaker=breaker):
+        super().__init__()
+        self.client = client
+        self.breaker = breaker
+        self.name = client.name
+
+    def _call(self, request, *args):
+        probe = self.breaker.guard()
+        started = time.monotonic()
+        try:
+            response = request(*args)
+        except stripe.error.APIConnectionError:
+            self.breaker.record(False, time.monotonic() - started, probe)
+            raise
+        status = response[1]
+        self.breaker.record(status < 500 and status != 429,
+            time.monotonic() - started, probe)
+        return response
+
+    def request_with_retries(self, method, url, headers, post_data=None):
+        return self._call(self.client.request_with_retries, method, url,
+            headers, post_data)
+
+    def request_stream_with_retries(self, method, url, headers,
+                                    post_data=None):
+        return self._call(self.client.request_stream_with_retries, method,
+            url, headers, post_data)
+
+    def close(self):
+        self.client.close()
+
+
+def install(client=None):
+    """
+    Makes the Stripe library use `client` (by default a client with a
+    bounded timeout), guarded by the circuit breaker.
+    """
+    if client is None:
+        # The default client waits up to 80 seconds for Stripe, holding one
+        # of the server's threads all along. It keeps a session per thread,
+        # so connections to Stripe are reused across requests.
+        client = stripe.http_client.new_default_http_client(
+            verify_ssl_certs=stripe.verify_ssl_certs, proxy=stripe.proxy,
+            timeout=common.constants.STRIPE_TIMEOUT)
+    stripe.default_http_client = BreakerHTTPClient(client)
@@ -0,0 +1,21 @@
+from medico.jobs.queue import task
+from medico.payments import receipts, refunds
+
+
+@task(name="payments.refund_batch")
+def refund_batch(batch):
+    """
+    Refunds the pending checkouts of `batch`. Queued by the checkout admin;
+    if Stripe is unavailable the job fails and its retry resumes the batch.
+    """
+    for _ in refunds.run(batch):
+        pass
+
+
+@task(name="payments.render_receipt")
+def render_receipt(payment_intent=None, invoice=None):
+    """
+    Renders the receipt of a payment or paid invoice, given its Stripe ID.
+    Queued once it is paid, so that request workers never render PDFs.
+    """
+    receipts.generate(payment_intent, invoice)
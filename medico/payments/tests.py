@@ -1,3 +1,918 @@
-from django.test import TestCase
+import csv
+import datetime
+import decimal
+import io
+import json
+import time
+import zlib
+from concurrent.futures import ThreadPoolExecutor
 
-# Create your tests here.
+import djstripe
+import pytest
+import stripe
+from django.contrib.auth.models import AnonymousUser
+from django.core.cache import cache
+from django.core.files.storage import default_storage
+from django.core.management import call_command
+from django.db import connection
+from django.urls import reverse
+from django.utils import timezone
+from djstripe.models import (
+    Customer as StripeCustomer,
+    Event,
+    Invoice,
+    PaymentIntent,
+    Price,
+    Product,
+    Subscription,
+)
+from djstripe.signals import WEBHOOK_SIGNALS
+
+import common.constants
+import common.decorators
+import common.rate_limit
+from common.circuit_breaker import CLOSED, HALF_OPEN, OPEN, CircuitOpen
+from medico.dispatch.models import Assignment
+from medico.jobs.models import Job
+from medico.jobs.worker import Worker
+from medico.ledger import journal
+from medico.ledger.models import Account
+from medico.payments import (
+    dunning,
+    receipts,
+    refunds,
+    search,
+    stripe_client,
+)
+from medico.payments.dunning import Scheduler
+from medico.payments.fake_stripe import FakeStripeClient
+from medico.payments.models import (
+    CheckoutInformation,
+    CheckoutRefund,
+    PaymentRetry,
+    Receipt,
+)
+from medico.users.models import Customer
+from medico.users.tests.factories import UserFactory
+
+pytestmark = pytest.mark.django_db
+
+
+@pytest.fixture
+def fake_stripe(monkeypatch):
+    client = FakeStripeClient()
+    monkeypatch.setattr(stripe, "default_http_client",
+        stripe_client.BreakerHTTPClient(client))
+    monkeypatch.setattr(djstripe.settings, "STRIPE_SECRET_KEY",
+        "sk_test_" + "x" * 24)
+    return client
+
+
+@pytest.fixture(autouse=True)
+def clear_cache():
+    # Circuit breaker state and rate limit counters live in the cache.
+    cache.clear()
+
+
+@pytest.fixture
+def one_time_price():
+    product = Product.objects.create(id=common.constants.ONE_TIME_PRODUCT_ID,
+        name="Consultation", type="service", description="Consultation",
+        livemode=False)
+    return Price.objects.create(id="price_test", product=product,
+        currency="usd", unit_amount=5000, active=True, type="one_time",
+        livemode=False)
+
+
+class TestCheckout:
+
+    def test_one_time_checkout(self, client, user, fake_stripe,
+                               one_time_price):
+        Customer.objects.create(user=user)
+        client.force_login(user)
+
+        response = client.post(reverse("payments:checkout"), json.dumps({
+            "payment_method": "pm_test",
+            "reason_for_visit": "Headache",
+            "plan_id": "",
+            "state": "CA",
+        }), content_type="application/json")
+
+        assert response.status_code == 200
+        assert response.json()["intent_status"] == "succeeded"
+        info = CheckoutInformation.objects.get()
+        assert info.reason_for_visit == "Headache"
+        assert info.assignment.status == Assignment.Status.WAITING
+        assert info.stripe_payment_intent.amount == one_time_price.unit_amount
+        assert journal.customer_balance(info.stripe_customer, Account.CASH,
+            "usd") == one_time_price.unit_amount
+        assert fake_stripe.requests > 0
+
+    def test_state_required(self, client, user, fake_stripe,
+                            one_time_price):
+        Customer.objects.create(user=user)
+        client.force_login(user)
+
+        response = client.post(reverse("payments:checkout"), json.dumps({
+            "payment_method": "pm_test",
+            "reason_for_visit": "Headache",
+            "plan_id": "",
+        }), content_type="application/json")
+
+        assert response.status_code == 400
+        assert response.json()["error"]["type"] == "FormError"
+        assert not CheckoutInformation.objects.exists()
+        # Rejected before calling Stripe.
+        assert fake_stripe.requests == 0
+
+    def test_stripe_outage(self, client, user, fake_stripe,
+                           one_time_price):
+        Customer.objects.create(user=user)
+        client.force_login(user)
+        fake_stripe.down = True
+        url = reverse("payments:checkout")
+        data = json.dumps({"payment_method": "pm_test",
+            "reason_for_visit": "Headache", "plan_id": "", "state": "CA"})
+
+        response = client.post(url, data, content_type="application/json")
+        assert response.status_code == 500
+        for _ in range(common.constants.STRIPE_BREAKER_FAILURE_THRESHOLD):
+            stripe_client.breaker.record(False, 0.1)
+        requests = fake_stripe.requests
+
+        response = client.post(url, data, content_type="application/json")
+
+        assert response.status_code == 503
+        assert response.json()["error"]["type"] == "ServiceUnavailableError"
+        assert response["Retry-After"]
+        # Failed fast, without calling Stripe.
+        assert fake_stripe.requests == requests
+
+
+class TestHistory:
+
+    def test_pages_newest_first(self, client, user):
+        Customer.objects.create(user=user)
+        stripe_customer = StripeCustomer.objects.create(id="cus_test",
+            subscriber=user, livemode=False)
+        other = StripeCustomer.objects.create(id="cus_other",
+            livemode=False)
+        now = timezone.now().replace(microsecond=500)
+        # Several checkouts in the same millisecond must not be skipped.
+        created = [now - datetime.timedelta(microseconds=n)
+                   for n in range(7)]
+        for when in created:
+            CheckoutInformation.objects.create(state="CA", created=when,
+                stripe_customer=stripe_customer)
+        CheckoutInformation.objects.create(state="CA",
+            stripe_customer=other)
+        client.force_login(user)
+
+        seen, cursor = [], None
+        while True:
+            data = {"limit": 3}
+            if cursor:
+                data["cursor"] = cursor
+            page = client.get(reverse("payments:history"), data).json()
+            seen += [row["id"] for row in page["results"]]
+            cursor = page["next_cursor"]
+            if not cursor:
+                break
+
+        assert seen == list(CheckoutInformation.objects.filter(
+            stripe_customer=stripe_customer)
+            .order_by('-created', '-id').values_list('id', flat=True))
+        assert len(seen) == 7
+
+    def test_invalid_cursor(self, client, user):
+        Customer.objects.create(user=user)
+        client.force_login(user)
+
+        response = client.get(reverse("payments:history"),
+            {"cursor": "nonsense"})
+
+        assert response.status_code == 400
+
+
+class TestExport:
+
+    @pytest.fixture
+    def checkouts(self, user):
+        user.first_name, user.last_name = "Ada", "Lovelace"
+        user.save()
+        named = StripeCustomer.objects.create(id="cus_named",
+            name="=HYPERLINK(\"http://example.com\")", livemode=False)
+        subscriber = StripeCustomer.objects.create(id="cus_user",
+            subscriber=user, livemode=False)
+        intent = PaymentIntent.objects.create(id="pi_test", amount=5000,
+            amount_capturable=0, amount_received=5000, currency="usd",
+            capture_method="automatic", confirmation_method="automatic",
+            payment_method_types=["card"], status="succeeded",
+            livemode=False)
+        return [
+            CheckoutInformation.objects.create(state="CA",
+                stripe_customer=subscriber, stripe_payment_intent=intent,
+                created=timezone.make_aware(datetime.datetime(2021, 3, 1))),
+            CheckoutInformation.objects.create(state="NY",
+                stripe_customer=named,
+                created=timezone.make_aware(datetime.datetime(2021, 3, 2))),
+        ]
+
+    def content(self, response):
+        return b"".join(response.streaming_content).decode()
+
+    def test_csv(self, admin_client, checkouts, django_assert_num_queries):
+        response = admin_client.get(reverse("payments:export"))
+
+        assert response["Content-Type"] == "text/csv"
+        # One query for every row, however many there are.
+        with django_assert_num_queries(1):
+            rows = list(csv.DictReader(io.StringIO(self.content(response))))
+        assert [row["id"] for row in rows] == \
+            [str(checkout.id) for checkout in checkouts]
+        assert rows[0]["customer_name"] == "Ada Lovelace"
+        assert (rows[0]["amount"], rows[0]["currency"]) == ("5000", "usd")
+        # Not a formula when opened in a spreadsheet.
+        assert rows[1]["customer_name"] == \
+            "'=HYPERLINK(\"http://example.com\")"
+        assert rows[1]["amount"] == ""
+
+    def test_jsonl_between_days(self, admin_client, checkouts):
+        response = admin_client.get(reverse("payments:export"),
+            {"format": "jsonl", "since": "2021-03-02",
+             "until": "2021-03-02"})
+
+        rows = [json.loads(line)
+                for line in self.content(response).splitlines()]
+        assert [row["id"] for row in rows] == [checkouts[1].id]
+        assert rows[0]["customer_id"] == "cus_named"
+
+    def test_staff_only(self, client, user):
+        client.force_login(user)
+
+        response = client.get(reverse("payments:export"))
+
+        assert response.status_code == 403
+
+    def test_command(self, checkouts, tmp_path):
+        path = tmp_path / "checkouts.jsonl"
+
+        call_command("export_checkouts", format="jsonl", output=str(path),
+            chunk_size=1)
+
+        assert len(path.read_text().splitlines()) == len(checkouts)
+
+
+class TestSearch:
+
+    @pytest.fixture
+    def staff(self, client, user):
+        user.is_staff = True
+        user.save()
+        client.force_login(user)
+        return user
+
+    def search(self, client, **params):
+        return client.get(reverse("payments:search"), params).json()
+
+    def test_ranked_and_highlighted(self, client, staff):
+        chest = CheckoutInformation.objects.create(state="CA",
+            reason_for_visit="Chest pain, then chest pain again <b>")
+        cold = CheckoutInformation.objects.create(state="CA",
+            reason_for_visit="Chest cold, then pain in legs")
+        CheckoutInformation.objects.create(state="CA",
+            reason_for_visit="Headache and pain in my back")
+
+        results = self.search(client, q="chest pains")["results"]
+
+        assert [result["id"] for result in results] == [chest.id, cold.id]
+        assert "<mark>Chest</mark> <mark>pain</mark>" in \
+            results[0]["headline"]
+        assert "&lt;b&gt;" in results[0]["headline"]
+        assert results[0]["rank"] > results[1]["rank"]
+
+    def test_query_syntax(self, client, staff):
+        fever = CheckoutInformation.objects.create(state="CA",
+            reason_for_visit="Fever and a dry cough")
+        cough = CheckoutInformation.objects.create(state="CA",
+            reason_for_visit="Coughing at night")
+        rash = CheckoutInformation.objects.create(state="CA",
+            reason_for_visit="Rash with fever")
+
+        def ids(q):
+            return {result["id"] for result in
+                    self.search(client, q=q, order="recent")["results"]}
+
+        assert ids("cough") == {fever.id, cough.id}
+        assert ids("cough -fever") == {cough.id}
+        assert ids('"dry cough" or rash') == {fever.id, rash.id}
+        assert ids('"cough dry"') == set()
+
+    def test_follows_updates_and_deletes(self, client, staff):
+        checkout = CheckoutInformation.objects.create(state="CA",
+            reason_for_visit="Sore throat")
+        checkout.reason_for_visit = "Sprained ankle"
+        checkout.save()
+
+        assert self.search(client, q="throat")["results"] == []
+        assert len(self.search(client, q="ankle")["results"]) == 1
+
+        checkout.delete()
+
+        assert self.search(client, q="ankle")["results"] == []
+
+    @pytest.mark.parametrize("order", ["rank", "recent"])
+    def test_pages(self, client, staff, order):
+        for n in range(7):
+            CheckoutInformation.objects.create(state="CA",
+                reason_for_visit="Back pain" + " pain" * n)
+
+        seen, cursor = [], None
+        while True:
+            params = {"q": "pain", "order": order, "limit": 3}
+            if cursor:
+                params["cursor"] = cursor
+            page = self.search(client, **params)
+            seen += [result["id"] for result in page["results"]]
+            cursor = page["next_cursor"]
+            if not cursor:
+                break
+
+        assert len(seen) == len(set(seen)) == 7
+        if order == "rank":
+            assert seen == sorted(seen, reverse=True)
+
+    @pytest.mark.skipif(connection.vendor != 'sqlite',
+        reason="Tests the SQLite fallback.")
+    def test_fallback_reinstalled(self, client, staff):
+        # As after a migration that rebuilt the table.
+        with connection.cursor() as cursor:
+            cursor.execute("DROP TRIGGER payments_checkout_fts_ai")
+        CheckoutInformation.objects.create(state="CA",
+            reason_for_visit="Blurred vision")
+
+        assert self.search(client, q="vision")["results"] == []
+
+        search.install_sqlite_fallback(connection)
+
+        assert len(self.search(client, q="vision")["results"]) == 1
+
+    def test_staff_only(self, client, user):
+        client.force_login(user)
+
+        response = client.get(reverse("payments:search"), {"q": "pain"})
+
+        assert response.status_code == 403
+
+    def test_admin_search(self, admin_client):
+        stripe_customer = StripeCustomer.objects.create(id="cus_test",
+            livemode=False)
+        checkout = CheckoutInformation.objects.create(state="CA",
+            reason_for_visit="Swollen knee", stripe_customer=stripe_customer)
+
+        response = admin_client.get(reverse(
+            "admin:payments_checkoutinformation_changelist"), {"q": "knee"})
+
+        assert response.status_code == 200
+        assert list(response.context["cl"].result_list) == [checkout]
+
+    def test_invalid_query(self, client, staff):
+        response = client.get(reverse("payments:search"), {"q": " -- "})
+
+        assert response.status_code == 400
+
+
+class TestCircuitBreaker:
+
+    @pytest.fixture
+    def breaker(self):
+        return stripe_client.breaker
+
+    def trip(self, breaker):
+        for _ in range(breaker.failure_threshold):
+            breaker.guard()
+            breaker.record(False, 0.1)
+
+    def test_trips_on_errors(self, breaker):
+        self.trip(breaker)
+
+        assert breaker.state == OPEN
+        with pytest.raises(CircuitOpen):
+            breaker.guard()
+        assert breaker.metrics()["opened"] == 1
+        assert breaker.metrics()["rejected"] == 1
+
+    def test_trips_on_slow_calls(self, breaker):
+        for _ in range(breaker.failure_threshold):
+            breaker.record(True, breaker.slow_call + 1)
+
+        assert breaker.state == OPEN
+
+    def test_half_open_probe(self, breaker, monkeypatch):
+        self.trip(breaker)
+        now = time.time()
+        monkeypatch.setattr(time, "time",
+            lambda: now + breaker.recovery_timeout)
+
+        assert breaker.state == HALF_OPEN
+        assert breaker.guard() is True
+        # Only one probe at a time.
+        with pytest.raises(CircuitOpen):
+            breaker.guard()
+
+        breaker.record(True, 0.1, probe=True)
+
+        assert breaker.state == CLOSED
+        assert breaker.guard() is False
+        assert breaker.metrics()["closed"] == 1
+
+    def test_failed_probe_reopens(self, breaker, monkeypatch):
+        self.trip(breaker)
+        now = time.time()
+        monkeypatch.setattr(time, "time",
+            lambda: now + breaker.recovery_timeout)
+        probe = breaker.guard()
+
+        breaker.record(False, 0.1, probe=probe)
+
+        assert breaker.state == OPEN
+        assert breaker.metrics()["opened"] == 2
+
+
+class TestRateLimit:
+
+    def test_rejects_bursts_per_user(self, client, user, settings):
+        settings.STRIPE_TEST_PUBLIC_KEY = "pk_test_key"
+        Customer.objects.create(user=user)
+        client.force_login(user)
+        url = reverse("payments:modify-payment-method")
+        requests, period = common.constants.PAYMENT_RATE_LIMIT_PER_USER
+
+        for _ in range(requests):
+            # No subscription, but the requests still count.
+            assert client.post(url).status_code == 404
+        response = client.post(url)
+
+        assert response.status_code == 429
+        assert response.json()["error"]["type"] == "RateLimitError"
+        assert 0 < int(response["Retry-After"]) <= period / requests
+        assert common.rate_limit.rejections("payments") == 1
+        # Page views are not limited.
+        assert client.get(reverse("payments:checkout")).status_code == 200
+
+    def test_client_ip(self, rf, settings):
+        request = rf.post("/", REMOTE_ADDR="10.0.0.1",
+            HTTP_X_FORWARDED_FOR="1.1.1.1, 203.0.113.7, 10.0.0.2")
+
+        assert common.decorators.client_ip(request) == "10.0.0.1"
+        settings.TRUSTED_PROXY_HOPS = 1
+        assert common.decorators.client_ip(request) == "10.0.0.2"
+        settings.TRUSTED_PROXY_HOPS = 2
+        assert common.decorators.client_ip(request) == "203.0.113.7"
+        settings.TRUSTED_PROXY_HOPS = 4
+        assert common.decorators.client_ip(request) == "10.0.0.1"
+
+    def test_limits_addresses(self, rf, user, settings):
+        settings.TRUSTED_PROXY_HOPS = 1
+        view = common.decorators.rate_limit("test", per_user=(5, 60),
+            per_ip=(1, 60), per_user_ip=(2, 60))(lambda request: None)
+
+        def post(address, as_user=None):
+            request = rf.post("/", REMOTE_ADDR="10.0.0.1",
+                HTTP_X_FORWARDED_FOR=address)
+            request.user = as_user or AnonymousUser()
+            return view(request)
+
+        # Anonymous clients behind the same proxy have their own buckets.
+        assert post("203.0.113.1") is None
+        assert post("203.0.113.2") is None
+        assert post("203.0.113.1").status_code == 429
+        # Signed in users get more room per address.
+        assert post("203.0.113.1", user) is None
+        assert post("203.0.113.1", user) is None
+        assert post("203.0.113.1", user).status_code == 429
+
+    def test_buckets_refill(self, monkeypatch):
+        now = time.monotonic()
+        monkeypatch.setattr(time, "monotonic", lambda: now)
+        buckets = common.rate_limit.LocalBuckets()
+
+        assert buckets.take("key", rate=1, capacity=2) == (True, 0)
+        assert buckets.take("key", rate=1, capacity=2) == (True, 0)
+        assert buckets.take("key", rate=1, capacity=2) == (False, 1)
+
+        now += 1
+        assert buckets.take("key", rate=1, capacity=2) == (True, 0)
+
+
+class TestRefunds:
+
+    @pytest.fixture
+    def checkouts(self, fake_stripe):
+        customer = StripeCustomer.objects.create(id="cus_test",
+            livemode=False)
+        checkouts = []
+        for n in range(5):
+            intent = PaymentIntent.objects.create(id="pi_test{0}".format(n),
+                amount=5000, amount_capturable=0, amount_received=5000,
+                currency="usd", capture_method="automatic",
+                confirmation_method="automatic",
+                payment_method_types=["card"], status="succeeded",
+                customer=customer, livemode=False)
+            fake_stripe.payments[intent.id] = intent.amount
+            checkouts.append(CheckoutInformation.objects.create(state="CA",
+                stripe_customer=customer, stripe_payment_intent=intent))
+        # A subscription, which has no payment to refund.
+        checkouts.append(CheckoutInformation.objects.create(state="CA",
+            stripe_customer=customer, plan="price_monthly"))
+        return checkouts
+
+    def test_command(self, checkouts, fake_stripe):
+        out = io.StringIO()
+
+        call_command("refund_checkouts",
+            ",".join(str(checkout.id) for checkout in checkouts),
+            "--chunk-size", "2", "--workers", "3", stdout=out)
+
+        assert "5 refunded, 1 failed, 0 pending" in out.getvalue()
+        refunds_by_checkout = {refund.checkout_id: refund
+                               for refund in CheckoutRefund.objects.all()}
+        assert refunds_by_checkout[checkouts[0].id].amount == 5000
+        assert refunds_by_checkout[checkouts[0].id].stripe_refund_id
+        assert refunds_by_checkout[checkouts[-1].id].status == \
+            CheckoutRefund.Status.FAILED
+        assert len(fake_stripe.refunded) == 5
+        assert journal.customer_balance(checkouts[0].stripe_customer,
+            Account.REFUNDS, "usd") == 25000
+
+    def test_resume_after_outage(self, checkouts, fake_stripe):
+        ids = [checkout.id for checkout in checkouts[:5]]
+        batch = refunds.start(ids)
+        calls = refunds.run(batch, workers=2, chunk_size=2)
+        assert next(calls) == (2, 0, 0)
+        fake_stripe.down = True
+        assert list(calls) == [(2, 0, 2), (2, 0, 3)]
+
+        fake_stripe.down = False
+        # The first chunk was written back; replaying it would be harmless,
+        # as its idempotency keys return the same refunds.
+        assert list(refunds.run(batch, workers=2, chunk_size=2)) == \
+            [(2, 0, 0), (3, 0, 0)]
+        assert refunds.summary(batch) == {"pending": 0, "refunded": 5,
+            "failed": 0}
+        assert CheckoutRefund.objects.filter(attempts=2).count() == 3
+
+    def test_idempotent(self, checkouts, fake_stripe):
+        batch = refunds.start([checkouts[0].id])
+        refund = CheckoutRefund.objects.get()
+
+        first = refunds.issue(refund, "pi_test0", rate=100)
+        # Died before the result was saved: the retry gets the same refund.
+        second = refunds.issue(refund, "pi_test0", rate=100)
+
+        assert first["id"] == second["id"]
+        assert len(fake_stripe.refunded) == 1
+        assert list(refunds.run(batch)) == [(1, 0, 0)]
+        assert CheckoutRefund.objects.get().stripe_refund_id == first["id"]
+
+    def test_refunded_once(self, checkouts, fake_stripe):
+        ids = [checkouts[0].id]
+        list(refunds.run(refunds.start(ids)))
+
+        batch = refunds.start(ids)
+
+        assert list(refunds.run(batch)) == []
+        assert CheckoutRefund.objects.get().batch != batch
+
+    def test_unknown_checkouts(self, checkouts):
+        with pytest.raises(refunds.RefundError):
+            refunds.start([checkouts[0].id, 0])
+        with pytest.raises(refunds.RefundError):
+            refunds.parse_ids(["1,x"])
+        assert refunds.parse_ids(["1, 2", "3\n", "2"]) == [1, 2, 3]
+
+    def test_rate_limited(self, checkouts, fake_stripe, monkeypatch):
+        now, sleeps = [time.monotonic()], []
+
+        def sleep(seconds):
+            sleeps.append(seconds)
+            now[0] += seconds
+        monkeypatch.setattr(time, "monotonic", lambda: now[0])
+        monkeypatch.setattr(time, "sleep", sleep)
+        batch = refunds.start([checkout.id for checkout in checkouts[:5]])
+
+        list(refunds.run(batch, workers=1, rate=2))
+
+        # A burst of two, then one every half second (fake Stripe sleeps
+        # for no time on every call).
+        assert [s for s in sleeps if s] == pytest.approx([0.5] * 3)
+        assert refunds.summary(batch)["refunded"] == 5
+
+    def test_admin_action(self, admin_client, checkouts):
+        response = admin_client.post(reverse(
+            "admin:payments_checkoutinformation_changelist"), {
+                "action": "refund",
+                "_selected_action": [checkouts[0].id, checkouts[1].id]})
+
+        assert response.status_code == 302
+        job = Job.objects.get()
+        assert job.task == "payments.refund_batch"
+        assert CheckoutRefund.objects.filter(batch=job.kwargs["batch"],
+            status=CheckoutRefund.Status.PENDING).count() == 2
+
+
+class TestReceipts:
+
+    @pytest.fixture
+    def intents(self, user):
+        user.first_name, user.last_name = "Ada", "Lovelace"
+        user.save()
+        customer = StripeCustomer.objects.create(id="cus_test",
+            subscriber=user, email="ada@example.com", livemode=False)
+        return [PaymentIntent.objects.create(id="pi_test{0}".format(n),
+            amount=5000, amount_capturable=0, amount_received=5000,
+            currency="usd", capture_method="automatic",
+            confirmation_method="automatic", payment_method_types=["card"],
+            status="succeeded", customer=customer, livemode=False,
+            created=timezone.make_aware(datetime.datetime(2021, 3, 1)))
+            for n in range(3)]
+
+    def test_render(self, intents):
+        data = receipts.payment_data(intents[0])
+
+        pdf = receipts.render(data)
+
+        assert data["billed_to"] == ["Ada Lovelace", "ada@example.com"]
+        assert data["total"] == "50.00 USD"
+        assert pdf.startswith(b"%PDF-1.4") and pdf.endswith(b"%%EOF\n")
+        # No timestamps: the same receipt is always the same file.
+        assert receipts.render(data) == pdf
+        stream = pdf[pdf.index(b"stream\n") + 7:pdf.index(b"\nendstream")]
+        assert b"(Receipt number: pi_test0)" in zlib.decompress(stream)
+
+    def test_invoice_data(self):
+        invoice = Invoice(id="in_test", number="ABCD-0001",
+            customer=StripeCustomer(id="cus_test", name="Ada Lovelace"),
+            amount_paid=decimal.Decimal("29.00"), currency="usd",
+            created=timezone.make_aware(datetime.datetime(2021, 4, 1)),
+            period_start=timezone.make_aware(datetime.datetime(2021, 4, 1)),
+            period_end=timezone.make_aware(datetime.datetime(2021, 5, 1)))
+
+        data = receipts.invoice_data(invoice)
+
+        assert data["number"] == "ABCD-0001"
+        assert data["billed_to"] == ["Ada Lovelace"]
+        assert data["items"] == [["Subscription, April 1, 2021 to May 1, "
+                                  "2021", "29.00 USD"]]
+
+    def test_rendered_after_checkout(self, client, user, fake_stripe,
+                                     one_time_price):
+        Customer.objects.create(user=user)
+        client.force_login(user)
+        client.post(reverse("payments:checkout"), json.dumps({
+            "payment_method": "pm_test", "reason_for_visit": "Headache",
+            "plan_id": "", "state": "CA"}), content_type="application/json")
+
+        # Rendered by a job, not by the request.
+        assert not Receipt.objects.exists()
+        Worker().drain()
+
+        receipt = Receipt.objects.get()
+        info = CheckoutInformation.objects.get()
+        assert receipt.payment_intent == info.stripe_payment_intent
+        page = client.get(reverse("payments:history")).json()
+        assert page["results"][0]["receipt_url"] == \
+            receipt.get_absolute_url()
+
+    def test_invoice_paid_webhook(self):
+        WEBHOOK_SIGNALS["invoice.payment_succeeded"].send(sender=None,
+            event=Event(data={"object": {"id": "in_test"}}))
+
+        job = Job.objects.get()
+        assert (job.task, job.kwargs) == \
+            ("payments.render_receipt", {"invoice": "in_test"})
+
+    def test_payment_intent_succeeded_webhook(self):
+        WEBHOOK_SIGNALS["payment_intent.succeeded"].send(sender=None,
+            event=Event(data={"object": {"id": "pi_test", "invoice": None}}))
+        # Paid by an invoice, which gets its own receipt.
+        WEBHOOK_SIGNALS["payment_intent.succeeded"].send(sender=None,
+            event=Event(data={"object": {"id": "pi_sub",
+                                         "invoice": "in_test"}}))
+
+        job = Job.objects.get()
+        assert (job.task, job.kwargs) == \
+            ("payments.render_receipt", {"payment_intent": "pi_test"})
+
+    def test_content_addressed(self, intents):
+        first = receipts.generate(payment_intent="pi_test0")
+
+        assert receipts.generate(payment_intent="pi_test0") == first
+        assert default_storage.exists(first.file_name)
+        data = receipts.payment_data(intents[0])
+        assert receipts.store(data) == first.digest
+        assert default_storage.listdir("receipts/" + first.digest[:2])[1] \
+            == [first.digest + ".pdf"]
+
+    def test_served_immutable(self, client, user, intents):
+        receipt = receipts.generate(payment_intent="pi_test0")
+        client.force_login(user)
+
+        response = client.get(receipt.get_absolute_url())
+
+        assert response.status_code == 200
+        assert response["Content-Type"] == "application/pdf"
+        assert b"".join(response.streaming_content).startswith(b"%PDF")
+        assert "immutable" in response["Cache-Control"]
+        assert "private" in response["Cache-Control"]
+        assert client.get(receipt.get_absolute_url(),
+            HTTP_IF_NONE_MATCH=response["ETag"]).status_code == 304
+
+    def test_served_to_owner_only(self, client, intents):
+        receipt = receipts.generate(payment_intent="pi_test0")
+        client.force_login(UserFactory())
+
+        response = client.get(receipt.get_absolute_url())
+
+        assert response.status_code == 404
+
+    def test_backfill(self, intents):
+        receipts.generate(payment_intent="pi_test0")
+        out = io.StringIO()
+
+        call_command("backfill_receipts", "--workers", "2",
+            "--chunk-size", "1", stdout=out)
+
+        assert "Rendered 2 receipts" in out.getvalue()
+        assert Receipt.objects.count() == 3
+        for receipt in Receipt.objects.all():
+            assert default_storage.exists(receipt.file_name)
+
+    def test_backfill_invoice_payments(self, intents):
+        now = timezone.now()
+        invoice = Invoice.objects.create(id="in_test",
+            customer=intents[1].customer, payment_intent=intents[1],
+            amount_due=decimal.Decimal("50.00"),
+            amount_paid=decimal.Decimal("50.00"), attempt_count=1,
+            attempted=True, currency="usd", paid=True, status="paid",
+            period_start=now, period_end=now, starting_balance=0,
+            subtotal=decimal.Decimal("50.00"),
+            total=decimal.Decimal("50.00"), livemode=False)
+
+        call_command("backfill_receipts", "--workers", "2",
+            stdout=io.StringIO())
+
+        assert set(Receipt.objects.values_list('payment_intent__id',
+            'invoice__id')) == {(intents[0].id, None), (intents[2].id, None),
+                                (None, invoice.id)}
+
+
+class TestDunning:
+
+    @pytest.fixture
+    def subscription(self, user):
+        user.first_name, user.last_name = "Ada", "Lovelace"
+        user.save()
+        customer = StripeCustomer.objects.create(id="cus_test",
+            subscriber=user, email="ada@example.com", livemode=False)
+        now = timezone.now()
+        return Subscription.objects.create(id="sub_test", customer=customer,
+            status="past_due", livemode=False, cancel_at_period_end=False,
+            start_date=now, current_period_start=now,
+            current_period_end=now)
+
+    def invoices(self, subscription, count):
+        now = timezone.now()
+        return [Invoice.objects.create(id="in_test{0}".format(n),
+            customer=subscription.customer, subscription=subscription,
+            amount_due=decimal.Decimal("29.00"), amount_paid=0,
+            attempt_count=1, attempted=True, currency="usd", paid=False,
+            status="open", period_start=now, period_end=now,
+            starting_balance=0, subtotal=decimal.Decimal("29.00"),
+            total=decimal.Decimal("29.00"), livemode=False)
+            for n in range(count)]
+
+    def failed(self, invoice):
+        WEBHOOK_SIGNALS["invoice.payment_failed"].send(sender=None,
+            event=Event(data={"object": {"id": invoice.id}}))
+
+    def make_due(self):
+        PaymentRetry.objects.update(next_attempt_at=timezone.now())
+
+    def test_payment_failed(self, subscription, mailoutbox):
+        invoice, = self.invoices(subscription, 1)
+
+        self.failed(invoice)
+        # Failed retries are reported again; nothing changes.
+        self.failed(invoice)
+
+        retry = PaymentRetry.objects.get()
+        assert retry.invoice == invoice
+        assert retry.next_attempt_at.date() == (timezone.now() +
+            datetime.timedelta(days=common.constants.DUNNING_RETRY_DAYS[0]))\
+            .date()
+        assert len(mailoutbox) == 1
+        assert mailoutbox[0].to == ["ada@example.com"]
+        assert "29.00 USD" in mailoutbox[0].body
+        assert reverse("users:subscription") in mailoutbox[0].body
+
+    def test_retries(self, subscription, fake_stripe, mailoutbox):
+        invoices = self.invoices(subscription, 4)
+        for invoice in invoices:
+            self.failed(invoice)
+        mailoutbox.clear()
+        fake_stripe.declined.add(invoices[0].id)
+        Invoice.objects.filter(id=invoices[1].id).update(paid=True)
+        Invoice.objects.filter(id=invoices[2].id).update(status="void")
+        self.make_due()
+
+        assert Scheduler(batch_size=3).drain() == 4
+
+        statuses = dict(PaymentRetry.objects.values_list('invoice__id',
+            'status'))
+        assert statuses == {
+            invoices[0].id: PaymentRetry.Status.SCHEDULED,
+            invoices[1].id: PaymentRetry.Status.RECOVERED,
+            invoices[2].id: PaymentRetry.Status.CLOSED,
+            invoices[3].id: PaymentRetry.Status.RECOVERED,
+        }
+        declined = PaymentRetry.objects.get(invoice=invoices[0])
+        assert declined.attempts == 1
+        assert declined.next_attempt_at > timezone.now()
+        # Only paid invoices that were still open were sent to Stripe.
+        assert fake_stripe.requests == 2
+        assert len(mailoutbox) == 1
+
+    def test_retries_run_out(self, subscription, fake_stripe, mailoutbox):
+        invoice, = self.invoices(subscription, 1)
+        self.failed(invoice)
+        fake_stripe.declined.add(invoice.id)
+
+        for _ in common.constants.DUNNING_RETRY_DAYS:
+            self.make_due()
+            Scheduler().drain()
+
+        retry = PaymentRetry.objects.get()
+        assert retry.status == PaymentRetry.Status.EXHAUSTED
+        assert retry.attempts == len(common.constants.DUNNING_RETRY_DAYS)
+        assert mailoutbox[-1].subject == "Your subscription is unpaid"
+        assert len(mailoutbox) == 1 + len(common.constants.DUNNING_RETRY_DAYS)
+
+    def test_still_unpaid(self, subscription, monkeypatch, mailoutbox):
+        invoice, = self.invoices(subscription, 1)
+        self.failed(invoice)
+        mailoutbox.clear()
+        self.make_due()
+        monkeypatch.setattr(dunning, "pay",
+            lambda retry, rate: {"paid": False, "status": "open"})
+
+        assert Scheduler().drain() == 1
+
+        # Counted as a failed attempt, and retried on the schedule rather
+        # than every time the lease runs out.
+        retry = PaymentRetry.objects.get()
+        assert retry.status == PaymentRetry.Status.SCHEDULED
+        assert retry.attempts == 1
+        assert retry.last_error == "The invoice is still open."
+        assert retry.next_attempt_at > timezone.now() + datetime.timedelta(
+            seconds=common.constants.DUNNING_LEASE)
+        assert len(mailoutbox) == 1
+
+    def test_stripe_unavailable(self, subscription, fake_stripe):
+        invoice, = self.invoices(subscription, 1)
+        self.failed(invoice)
+        self.make_due()
+        fake_stripe.down = True
+
+        assert Scheduler().drain() == 1
+
+        retry = PaymentRetry.objects.get()
+        # Not counted as an attempt, and due again after the lease.
+        assert retry.status == PaymentRetry.Status.SCHEDULED
+        assert retry.attempts == 0
+        assert retry.last_error
+        assert retry.next_attempt_at > timezone.now()
+
+    def test_paid_meanwhile(self, subscription):
+        invoice, = self.invoices(subscription, 1)
+        self.failed(invoice)
+
+        WEBHOOK_SIGNALS["invoice.payment_succeeded"].send(sender=None,
+            event=Event(data={"object": {"id": invoice.id}}))
+
+        assert PaymentRetry.objects.get().status == \
+            PaymentRetry.Status.RECOVERED
+
+    def test_queries_per_batch(self, subscription, fake_stripe,
+                               django_assert_max_num_queries):
+        # The same handful of queries for a batch, whatever its size.
+        invoices = self.invoices(subscription, 30)
+        for invoice in invoices:
+            self.failed(invoice)
+        self.make_due()
+        fake_stripe.declined.update(invoice.id for invoice in invoices)
+        scheduler = Scheduler(batch_size=30)
+
+        with django_assert_max_num_queries(8):
+            with ThreadPoolExecutor(max_workers=4) as pool:
+                assert scheduler.run_batch(pool) == (30, False)
@@ -1,11 +1,23 @@
 from django.urls import path
 
-from medico.payments.views import checkout, consultation, modify_payment_method
+from medico.payments.views import (
+    checkout,
+    consultation,
+    consultation_history,
+    export_checkouts,
+    modify_payment_method,
+    receipt,
+    search_consultations,
+)
 
 app_name = "payments"
 urlpatterns = [
     path("checkout/", view=checkout, name="checkout"),
     path("consultation/", view=consultation, name="consultation"),
+    path("history/", view=consultation_history, name="history"),
+    path("search/", view=search_consultations, name="search"),
+    path("export/", view=export_checkouts, name="export"),
+    path("receipts/<str:digest>.pdf", view=receipt, name="receipt"),
     path("modify-payment-method/", view=modify_payment_method,
         name="modify-payment-method"),
 ]
@@ -2,24 +2,55 @@ import json
 import stripe
 import djstripe
 from djstripe.models import Product, Price
+from localflavor.us.us_states import STATE_CHOICES
 
-from .models import CheckoutInformation
+from .models import CheckoutInformation, Receipt
 
 from django.core.exceptions import ValidationError
+from django.core.files.storage import default_storage
 from django.conf import settings
 from django.contrib import messages
 from django.contrib.auth.decorators import login_required
-from django.http import HttpResponse, JsonResponse
+from django.http import (
+    FileResponse,
+    HttpResponse,
+    HttpResponseNotModified,
+    JsonResponse,
+    StreamingHttpResponse,
+)
 from django.shortcuts import render
 from django.urls import reverse
+from django.utils.cache import patch_cache_control
 
 import common.constants
 import common.decorators
+from common.circuit_breaker import CircuitOpen
+from common.pagination import InvalidCursor
+from medico.dispatch import dispatcher
+from medico.dispatch.models import Assignment
+from medico.payments import export, history, search, tasks
+from medico.users.models import MedicalProfessional
 
 common_error = 'Something went wrong. Please refresh the page or try again'\
     ' later.'
 
 
+def payments_unavailable():
+    """
+    Response for requests that need Stripe while its circuit breaker is
+    open.
+    """
+    response = JsonResponse({
+        "error": {
+            'message': 'Payments are temporarily unavailable. Please try '
+                       'again in a few minutes.',
+            'type': 'ServiceUnavailableError'
+        }
+    }, status=503)
+    response['Retry-After'] = common.constants.STRIPE_BREAKER_RECOVERY_TIMEOUT
+    return response
+
+
 @login_required
 @common.decorators.customer_only
 def consultation(request):
@@ -27,11 +58,157 @@ def consultation(request):
             request.session["checkout_success"]:
         del request.session["checkout_success"]
         messages.success(request, "Your card payment was successful.")
-    return render(request, "payments/consultation.html")
+
+    assignment = Assignment.objects.filter(customer=request.user.customer)\
+        .select_related('medical_pro__user').order_by('-created').first()
+    return render(request, "payments/consultation.html", {
+        "assignment": assignment,
+        "patients_ahead": (assignment and
+                           assignment.status == Assignment.Status.WAITING and
+                           dispatcher.queue_position(assignment)),
+    })
 
 
 @login_required
 @common.decorators.customer_only
+def consultation_history(request):
+    """
+    JSON timeline of the customer's past consultations, newest first. Takes
+    a `limit` and the `cursor` returned as `next_cursor` by the previous
+    page.
+    """
+    if request.method != 'GET':
+        return HttpResponse('Method not allowed')
+
+    try:
+        data = history.customer_page(request.user,
+            request.GET.get('cursor'), history.parse_limit(request.GET))
+    except (history.HistoryError, InvalidCursor) as e:
+        return JsonResponse({
+            "error": {
+                'message': str(e),
+                'type': 'RequestError'
+            }
+        }, status=400)
+
+    return JsonResponse(data)
+
+
+@login_required
+def search_consultations(request):
+    """
+    Full-text search over the reasons for visit, for staff triaging
+    consultations. Takes the query as `q`, an `order` of `rank` (the
+    default) or `recent`, a `limit`, and the `cursor` returned as
+    `next_cursor` by the previous page.
+    """
+    if request.method != 'GET':
+        return HttpResponse('Method not allowed')
+
+    if not request.user.is_staff:
+        return JsonResponse({
+            "error": {
+                'message': 'Only staff may search consultations.',
+                'type': 'PermissionError'
+            }
+        }, status=403)
+
+    try:
+        data = search.search_page(search.parse_query(request.GET),
+            search.parse_order(request.GET), request.GET.get('cursor'),
+            search.parse_limit(request.GET))
+    except (search.SearchError, InvalidCursor) as e:
+        return JsonResponse({
+            "error": {
+                'message': str(e),
+                'type': 'RequestError'
+            }
+        }, status=400)
+
+    return JsonResponse(data)
+
+
+@login_required
+def export_checkouts(request):
+    """
+    Streams every checkout with its payment and customer, for finance, as
+    CSV or JSON Lines (`format=csv` or `format=jsonl`). `since` and `until`
+    (YYYY-MM-DD, inclusive) restrict it to checkouts created on those days.
+    Staff only.
+    """
+    if request.method != 'GET':
+        return HttpResponse('Method not allowed')
+
+    if not request.user.is_staff:
+        return JsonResponse({
+            "error": {
+                'message': 'Only staff may export checkouts.',
+                'type': 'PermissionError'
+            }
+        }, status=403)
+
+    try:
+        export_format = export.parse_format(request.GET)
+        since = export.parse_day(request.GET.get('since'), 'since')
+        until = export.parse_day(request.GET.get('until'), 'until')
+    except export.ExportError as e:
+        return JsonResponse({
+            "error": {
+                'message': str(e),
+                'type': 'RequestError'
+            }
+        }, status=400)
+
+    response = StreamingHttpResponse(
+        export.export(export_format, since, until),
+        content_type=export.FORMATS[export_format])
+    response['Content-Disposition'] = \
+        'attachment; filename="checkouts.{0}"'.format(export_format)
+    return response
+
+
+@login_required
+def receipt(request, digest):
+    """
+    The PDF receipt stored under `digest`, for the customer it belongs to
+    and for staff. Its content never changes, so browsers may keep it for
+    good.
+    """
+    if request.method != 'GET':
+        return HttpResponse('Method not allowed')
+
+    receipts = Receipt.objects.filter(digest=digest)
+    if not request.user.is_staff:
+        receipts = receipts.filter(customer__subscriber=request.user)
+    receipt = receipts.first()
+    if receipt is None:
+        return JsonResponse({
+            "error": {
+                'message': 'No receipt was found.',
+                'type': 'NotFoundError'
+            }
+        }, status=404)
+
+    etag = '"{0}"'.format(digest)
+    if request.META.get('HTTP_IF_NONE_MATCH') == etag:
+        response = HttpResponseNotModified()
+    else:
+        response = FileResponse(default_storage.open(receipt.file_name),
+            content_type='application/pdf',
+            filename="receipt-{0}.pdf".format(digest[:12]))
+    response['ETag'] = etag
+    # Private: receipts hold personal details shared caches must not keep.
+    patch_cache_control(response, private=True, immutable=True,
+        max_age=common.constants.RECEIPT_CACHE_MAX_AGE)
+    return response
+
+
+@login_required
+@common.decorators.customer_only
+@common.decorators.rate_limit("payments",
+    per_user=common.constants.PAYMENT_RATE_LIMIT_PER_USER,
+    per_ip=common.constants.PAYMENT_RATE_LIMIT_PER_IP,
+    per_user_ip=common.constants.PAYMENT_RATE_LIMIT_PER_USER_IP)
 def checkout(request):
     if request.method not in ['GET', 'POST']:
         return HttpResponse('Method not allowed')
@@ -48,6 +225,8 @@ def checkout(request):
         return render(request, "payments/checkout.html", {
             "products": products,
             "price": one_time_price,
+            "states": STATE_CHOICES,
+            "specialties": MedicalProfessional.DoctorMedicalSpecialty.choices,
             # XXX: Change if production
             "STRIPE_PUBLISHABLE_KEY": settings.STRIPE_TEST_PUBLIC_KEY
         })
@@ -59,11 +238,15 @@ def checkout(request):
             payment_method = data['payment_method']
             reason_for_visit = data['reason_for_visit']
             plan_id = data['plan_id']
+            # Missing, it fails validation below with the other fields.
+            state = data.get('state', '')
+            doctor_specialty = data.get('doctor_specialty') or None
             stripe.api_key = djstripe.settings.STRIPE_SECRET_KEY
 
             # Before making any Stripe calls, make sure that our checkout
             # information "checks out" (heh).
-            cf_info = CheckoutInformation(reason_for_visit=reason_for_visit)
+            cf_info = CheckoutInformation(reason_for_visit=reason_for_visit,
+                state=state, doctor_specialty=doctor_specialty)
             cf_info.clean_fields()
 
             payment_method_obj = stripe.PaymentMethod.retrieve(payment_method)
@@ -77,20 +260,25 @@ def checkout(request):
                 # that particular plan.
                 djstripe_sub = request.user.customer\
                     .subscribe_stripe_customer(plan_id, djstripe_customer)
+                cf_info.plan = plan_id
             else:
                 # Otherwise we're doing a one-time checkout.
                 djstripe_intent = request.user.customer\
                     .charge_stripe_customer(payment_method, djstripe_customer)
                 cf_info.stripe_payment_intent = djstripe_intent
+                tasks.render_receipt.enqueue(
+                    payment_intent=djstripe_intent.id)
 
             cf_info.stripe_customer = djstripe_customer
             cf_info.save()
+            assignment = dispatcher.submit(cf_info, request.user.customer)
 
             request.session["checkout_success"] = True
             return JsonResponse({
                 "next_url": reverse('payments:consultation'),
                 "customer_id": djstripe_customer.id,
-                "intent_status": "succeeded"
+                "intent_status": "succeeded",
+                "urgent": assignment.priority == Assignment.Priority.URGENT
             })
 
         except ValidationError as e:
@@ -110,11 +298,13 @@ def checkout(request):
                     'type': 'RequestError'
                 }
             }, status=400)
+        except CircuitOpen:
+            return payments_unavailable()
         except stripe.error.StripeError as e:
             # XXX: When logging is added, log `e` instances.
             return JsonResponse({
                 "error":{
-                    'message': e.error.message,
+                    'message': e.user_message,
                     'type': 'StripeError'
                 }
             }, status=500)
@@ -130,6 +320,10 @@ def checkout(request):
 
 @login_required
 @common.decorators.customer_only
+@common.decorators.rate_limit("payments",
+    per_user=common.constants.PAYMENT_RATE_LIMIT_PER_USER,
+    per_ip=common.constants.PAYMENT_RATE_LIMIT_PER_IP,
+    per_user_ip=common.constants.PAYMENT_RATE_LIMIT_PER_USER_IP)
 def modify_payment_method(request):
     if request.method != 'POST':
         return HttpResponse('Method not allowed')
@@ -175,11 +369,13 @@ def modify_payment_method(request):
                 'type': 'RequestError'
             }
         }, status=400)
+    except CircuitOpen:
+        return payments_unavailable()
     except stripe.error.StripeError as e:
         # XXX: When logging is added, log `e` instances.
         return JsonResponse({
             "error":{
-                'message': e.error.message,
+                'message': e.user_message,
                 'type': 'StripeError'
             }
         }, status=500)
@@ -191,8 +387,3 @@ def modify_payment_method(request):
                 'type': 'ServerError'
             }
         }, status=500)
-
-
-# XXX: Add a webhook to handle subscription invoicing failure (recurring
-# payment failure) and fire an email off to the user offering them to
-# change their payment method.
@@ -0,0 +1,23 @@
+from django.contrib import admin
+
+import medico.scheduling.models
+from common.admin import LargeTableAdminMixin
+
+
+@admin.register(medico.scheduling.models.AvailabilityWindow)
+class AvailabilityWindowAdmin(admin.ModelAdmin):
+
+    list_display = ["medical_pro", "weekday", "start_time", "end_time"]
+    list_select_related = ["medical_pro__user"]
+    raw_id_fields = ["medical_pro"]
+
+
+@admin.register(medico.scheduling.models.Booking)
+class BookingAdmin(LargeTableAdminMixin, admin.ModelAdmin):
+
+    list_display = ["medical_pro", "customer", "start", "status"]
+    list_filter = ["status"]
+    list_select_related = ["medical_pro__user", "customer__user"]
+    raw_id_fields = ["medical_pro", "customer", "checkout"]
+    # Changing a booking here would not update the slot bitmaps.
+    readonly_fields = ["medical_pro", "customer", "start", "end", "status"]
@@ -0,0 +1,12 @@
+from django.apps import AppConfig
+
+
+class SchedulingConfig(AppConfig):
+    name = "medico.scheduling"
+    verbose_name = "Scheduling"
+
+    def ready(self):
+        try:
+            import medico.scheduling.signals  # noqa F401
+        except ImportError:
+            pass
@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+
+from medico.scheduling import slots
+
+
+class Command(BaseCommand):
+    help = ("Drops past days from the slot bitmaps and extends them to the "
+            "end of the booking horizon. Run daily, after midnight.")
+
+    def handle(self, *args, **options):
+        count = slots.roll_calendar()
+        self.stdout.write(self.style.SUCCESS(
+            "Updated the slot calendar of {0} providers.".format(count)))
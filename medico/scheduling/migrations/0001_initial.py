@@ -0,0 +1,70 @@
+# Generated by Django 3.0.12 on 2026-10-19 11:33
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+        ('users', '0009_provider_review_queue'),
+        ('payments', '0002_auto_20210315_0656'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SlotDay',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('open_slots', models.BigIntegerField(default=0)),
+                ('free_slots', models.BigIntegerField(default=0)),
+                ('first_free', models.SmallIntegerField(default=0)),
+                ('medical_pro', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='slot_days', to='users.MedicalProfessional')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='Booking',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('start', models.DateTimeField()),
+                ('end', models.DateTimeField()),
+                ('status', models.IntegerField(choices=[(0, 'Confirmed'), (1, 'Cancelled')], default=0)),
+                ('created', models.DateTimeField(auto_now_add=True)),
+                ('checkout', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to='payments.CheckoutInformation')),
+                ('customer', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='bookings', to='users.Customer')),
+                ('medical_pro', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='bookings', to='users.MedicalProfessional')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='AvailabilityWindow',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('weekday', models.IntegerField(choices=[(0, 'Monday'), (1, 'Tuesday'), (2, 'Wednesday'), (3, 'Thursday'), (4, 'Friday'), (5, 'Saturday'), (6, 'Sunday')])),
+                ('start_time', models.TimeField()),
+                ('end_time', models.TimeField()),
+                ('medical_pro', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='availability_windows', to='users.MedicalProfessional')),
+            ],
+            options={
+                'ordering': ['weekday', 'start_time'],
+            },
+        ),
+        migrations.AddIndex(
+            model_name='slotday',
+            index=models.Index(condition=models.Q(free_slots__gt=0), fields=['date', 'first_free', 'medical_pro'], name='slot_day_free_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='slotday',
+            constraint=models.UniqueConstraint(fields=('medical_pro', 'date'), name='slot_day_unique'),
+        ),
+        migrations.AddIndex(
+            model_name='booking',
+            index=models.Index(fields=['medical_pro', 'start'], name='booking_provider_start_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='booking',
+            index=models.Index(fields=['customer', 'start'], name='booking_customer_start_idx'),
+        ),
+    ]
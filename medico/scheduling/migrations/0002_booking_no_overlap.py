@@ -0,0 +1,27 @@
+from django.contrib.postgres.operations import BtreeGistExtension
+from django.db import migrations
+
+from common.migrations import RunPostgresSQL
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('scheduling', '0001_initial'),
+    ]
+
+    operations = [
+        # Needed to mix the `=` on medical_pro_id with the range overlap in
+        # one GiST index. A no-op on other databases.
+        BtreeGistExtension(),
+        # Confirmed bookings of a medical professional may not overlap. The
+        # GiST index behind the constraint also serves overlap queries.
+        RunPostgresSQL(
+            sql='ALTER TABLE scheduling_booking'
+                ' ADD CONSTRAINT booking_no_overlap EXCLUDE USING gist'
+                ' (medical_pro_id WITH =, tstzrange(start, "end") WITH &&)'
+                ' WHERE (status = 0)',
+            reverse_sql='ALTER TABLE scheduling_booking'
+                        ' DROP CONSTRAINT booking_no_overlap',
+        ),
+    ]
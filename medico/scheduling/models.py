@@ -0,0 +1,114 @@
+from django.core.exceptions import ValidationError
+from django.db import models
+
+import common.constants
+
+
+class AvailabilityWindow(models.Model):
+    """
+    A weekly recurring period during which a medical professional takes
+    consultations, in the site's time zone.
+    """
+    class Weekday(models.IntegerChoices):
+        MONDAY = 0, 'Monday'
+        TUESDAY = 1, 'Tuesday'
+        WEDNESDAY = 2, 'Wednesday'
+        THURSDAY = 3, 'Thursday'
+        FRIDAY = 4, 'Friday'
+        SATURDAY = 5, 'Saturday'
+        SUNDAY = 6, 'Sunday'
+
+    medical_pro = models.ForeignKey("users.MedicalProfessional",
+        on_delete=models.CASCADE, related_name="availability_windows")
+    weekday = models.IntegerField(choices=Weekday.choices)
+    start_time = models.TimeField()
+    end_time = models.TimeField()
+
+    class Meta:
+        ordering = ["weekday", "start_time"]
+
+    def __str__(self):
+        return "{0} {1}-{2}".format(self.get_weekday_display(),
+            self.start_time.strftime("%H:%M"),
+            self.end_time.strftime("%H:%M"))
+
+    def clean(self):
+        slot = common.constants.SCHEDULING_SLOT_MINUTES
+        for value in (self.start_time, self.end_time):
+            if value and (value.minute % slot or value.second or
+                          value.microsecond):
+                raise ValidationError("Windows must start and end on a "
+                    "multiple of {0} minutes.".format(slot))
+        if self.start_time and self.end_time and \
+                self.start_time >= self.end_time:
+            raise ValidationError("A window must end after it starts.")
+
+
+class SlotDay(models.Model):
+    """
+    Precomputed slot bitmaps of one medical professional on one day. Bit
+    `i` stands for the slot starting `i * SCHEDULING_SLOT_MINUTES` minutes
+    after midnight; `open_slots` has the slots covered by availability
+    windows, `free_slots` those of them that are not booked.
+
+    Maintained by `medico.scheduling.slots`, for the next
+    SCHEDULING_HORIZON_DAYS days.
+    """
+    medical_pro = models.ForeignKey("users.MedicalProfessional",
+        on_delete=models.CASCADE, related_name="slot_days")
+    date = models.DateField()
+    open_slots = models.BigIntegerField(default=0)
+    free_slots = models.BigIntegerField(default=0)
+    # Index of the lowest bit set in `free_slots`.
+    first_free = models.SmallIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['medical_pro', 'date'],
+                name='slot_day_unique'),
+        ]
+        indexes = [
+            # Free slot search reads days with free slots in this order,
+            # and stops as soon as no later row can have earlier slots.
+            models.Index(fields=['date', 'first_free', 'medical_pro'],
+                name='slot_day_free_idx',
+                condition=models.Q(free_slots__gt=0)),
+        ]
+
+    def __str__(self):
+        return "Slots of {0} on {1}".format(self.medical_pro, self.date)
+
+
+class Booking(models.Model):
+    """
+    A consultation slot booked by a customer.
+
+    On PostgreSQL an exclusion constraint guarantees that confirmed
+    bookings of a medical professional never overlap.
+    """
+    class Status(models.IntegerChoices):
+        CONFIRMED = 0, 'Confirmed'
+        CANCELLED = 1, 'Cancelled'
+
+    medical_pro = models.ForeignKey("users.MedicalProfessional",
+        on_delete=models.CASCADE, related_name="bookings")
+    customer = models.ForeignKey("users.Customer", on_delete=models.CASCADE,
+        related_name="bookings")
+    checkout = models.ForeignKey("payments.CheckoutInformation",
+        on_delete=models.SET_NULL, null=True, blank=True)
+    start = models.DateTimeField()
+    end = models.DateTimeField()
+    status = models.IntegerField(choices=Status.choices,
+        default=Status.CONFIRMED)
+    created = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['medical_pro', 'start'],
+                name='booking_provider_start_idx'),
+            models.Index(fields=['customer', 'start'],
+                name='booking_customer_start_idx'),
+        ]
+
+    def __str__(self):
+        return "Booking with {0} at {1}".format(self.medical_pro, self.start)
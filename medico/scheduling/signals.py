@@ -0,0 +1,33 @@
+import threading
+from contextlib import contextmanager
+
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from medico.scheduling import slots
+from medico.scheduling.models import AvailabilityWindow
+
+_local = threading.local()
+
+
+@contextmanager
+def rebuilds_suppressed():
+    """
+    Stops changes to availability windows inside the block from each
+    queueing a rebuild, for bulk changes that queue a single one themselves.
+    """
+    suppressed = getattr(_local, 'suppressed', False)
+    _local.suppressed = True
+    try:
+        yield
+    finally:
+        _local.suppressed = suppressed
+
+
+@receiver([post_save, post_delete], sender=AvailabilityWindow)
+def availability_window_changed(sender, instance, **kwargs):
+    if getattr(_local, 'suppressed', False):
+        return
+    medical_pro_id = instance.medical_pro_id
+    transaction.on_commit(lambda: slots.rebuild([medical_pro_id]))
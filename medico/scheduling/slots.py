@@ -0,0 +1,259 @@
+"""
+Slot bitmaps, booking and free slot search.
+
+A medical professional's availability is kept as one `SlotDay` row per day
+over the next SCHEDULING_HORIZON_DAYS days, holding a bitmap of open and
+free slots. Finding the next free slots is then a scan of an index over
+rows with free slots, in date order, reading set bits; bookings flip a
+single bit.
+"""
+import datetime
+import heapq
+from collections import defaultdict
+
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+
+import common.constants
+from medico.scheduling.models import AvailabilityWindow, Booking, SlotDay
+from medico.users.models import MedicalProfessional
+
+SLOT = datetime.timedelta(minutes=common.constants.SCHEDULING_SLOT_MINUTES)
+SLOTS_PER_DAY = datetime.timedelta(days=1) // SLOT
+
+# Bitmaps are stored in signed 64-bit columns.
+assert SLOTS_PER_DAY < 64
+
+BATCH_SIZE = 500
+
+
+class SlotUnavailable(Exception):
+    pass
+
+
+def iter_bits(mask):
+    """
+    Yields the indexes of the bits set in `mask`, lowest first.
+    """
+    while mask:
+        low = mask & -mask
+        yield low.bit_length() - 1
+        mask ^= low
+
+
+def first_bit(mask):
+    """
+    Index of the lowest bit set in `mask`, or SLOTS_PER_DAY if none is.
+    """
+    return (mask & -mask).bit_length() - 1 if mask else SLOTS_PER_DAY
+
+
+def window_mask(start_time, end_time):
+    first = (start_time.hour * 60 + start_time.minute) // \
+        common.constants.SCHEDULING_SLOT_MINUTES
+    last = (end_time.hour * 60 + end_time.minute) // \
+        common.constants.SCHEDULING_SLOT_MINUTES
+    return ((1 << last) - 1) & ~((1 << first) - 1)
+
+
+def slot_start(date, index):
+    """
+    Returns the aware datetime at which slot `index` of `date` starts.
+    """
+    return timezone.make_aware(
+        datetime.datetime.combine(date, datetime.time()) + index * SLOT)
+
+
+def slot_position(start):
+    """
+    Returns `(date, slot index)` for a slot start time. Raises ValueError
+    if `start` is not the start of a slot.
+    """
+    local = timezone.localtime(start)
+    midnight = local.replace(hour=0, minute=0, second=0, microsecond=0)
+    offset = local - midnight
+    if offset % SLOT:
+        raise ValueError("Not the start of a slot.")
+    return local.date(), offset // SLOT
+
+
+def _past_mask(now):
+    """
+    Mask of today's slots that have already started.
+    """
+    local = timezone.localtime(now)
+    midnight = local.replace(hour=0, minute=0, second=0, microsecond=0)
+    started = -(-(local - midnight) // SLOT)
+    return (1 << started) - 1
+
+
+def rebuild(medical_pro_ids, start=None, days=None):
+    """
+    Recomputes the slot bitmaps of the given medical professionals from
+    their availability windows and bookings, from `start` (today) for
+    `days` days (the horizon).
+    """
+    start = start or timezone.localdate()
+    days = days or common.constants.SCHEDULING_HORIZON_DAYS
+    end = start + datetime.timedelta(days=days)
+    medical_pro_ids = list(medical_pro_ids)
+
+    with transaction.atomic():
+        # Lock out bookings of these providers until the new bitmaps are in.
+        list(SlotDay.objects.select_for_update()
+            .filter(medical_pro_id__in=medical_pro_ids, date__gte=start,
+                    date__lt=end)
+            .values_list('id', flat=True))
+
+        weekly = defaultdict(lambda: [0] * 7)
+        for medical_pro_id, weekday, start_time, end_time in \
+                AvailabilityWindow.objects.filter(
+                    medical_pro_id__in=medical_pro_ids)\
+                .values_list('medical_pro_id', 'weekday', 'start_time',
+                    'end_time'):
+            weekly[medical_pro_id][weekday] |= window_mask(start_time,
+                end_time)
+
+        booked = defaultdict(int)
+        for medical_pro_id, booking_start in Booking.objects.filter(
+                medical_pro_id__in=medical_pro_ids,
+                status=Booking.Status.CONFIRMED,
+                start__gte=slot_start(start, 0),
+                start__lt=slot_start(end, 0))\
+                .values_list('medical_pro_id', 'start'):
+            date, index = slot_position(booking_start)
+            booked[(medical_pro_id, date)] |= 1 << index
+
+        rows = []
+        for medical_pro_id, masks in weekly.items():
+            for offset in range(days):
+                date = start + datetime.timedelta(days=offset)
+                open_slots = masks[date.weekday()]
+                if open_slots:
+                    free_slots = open_slots & ~booked[(medical_pro_id, date)]
+                    rows.append(SlotDay(medical_pro_id=medical_pro_id,
+                        date=date, open_slots=open_slots,
+                        free_slots=free_slots,
+                        first_free=first_bit(free_slots)))
+
+        SlotDay.objects.filter(medical_pro_id__in=medical_pro_ids,
+            date__gte=start, date__lt=end).delete()
+        for i in range(0, len(rows), BATCH_SIZE):
+            SlotDay.objects.bulk_create(rows[i:i + BATCH_SIZE])
+
+
+def roll_calendar(today=None):
+    """
+    Drops past days and extends every provider's bitmaps to the end of the
+    horizon. Meant to run daily. Returns the number of providers updated.
+    """
+    today = today or timezone.localdate()
+    SlotDay.objects.filter(date__lt=today).delete()
+
+    medical_pro_ids = list(AvailabilityWindow.objects
+        .values_list('medical_pro_id', flat=True).distinct().order_by())
+    for i in range(0, len(medical_pro_ids), BATCH_SIZE):
+        rebuild(medical_pro_ids[i:i + BATCH_SIZE], start=today)
+    return len(medical_pro_ids)
+
+
+def next_free_slots(filters, limit, now=None):
+    """
+    Returns the `limit` earliest free slots, as `(start, medical pro id)`
+    pairs, among the medical professionals matching `filters` (as built by
+    `medico.users.directory.parse_filters`).
+
+    Days are read in `(date, first_free)` order, keeping the best `limit`
+    slots seen so far; once the first free slot of a row is no earlier
+    than all of those, no later row can do better.
+    """
+    now = now or timezone.now()
+    today = timezone.localdate(now)
+    past = _past_mask(now)
+
+    days = SlotDay.objects.filter(free_slots__gt=0, date__gte=today,
+            medical_pro__in=MedicalProfessional.objects.filter(**filters))\
+        .order_by('date', 'first_free', 'medical_pro_id')\
+        .values_list('date', 'first_free', 'medical_pro_id', 'free_slots')
+
+    # Max-heap (through negated keys) of the best slots so far.
+    best = []
+    for date, first_free, medical_pro_id, free_slots in \
+            days.iterator(chunk_size=limit * 4):
+        day = date.toordinal()
+        if date == today:
+            free_slots &= ~past
+            first_free = max(first_free, past.bit_length())
+        # Ties with the worst slot kept are not worth reading on for.
+        if len(best) == limit and (day, first_free) >= \
+                (-best[0][0], -best[0][1]):
+            break
+        for index in iter_bits(free_slots):
+            key = (-day, -index, -medical_pro_id)
+            if len(best) < limit:
+                heapq.heappush(best, key)
+            elif key > best[0]:
+                heapq.heapreplace(best, key)
+            else:
+                # The remaining slots of this day are later still.
+                break
+
+    return [(slot_start(datetime.date.fromordinal(-day), -index),
+             -medical_pro_id)
+            for day, index, medical_pro_id in sorted(best, reverse=True)]
+
+
+def book(customer, medical_pro_id, start, checkout=None):
+    """
+    Books the slot starting at `start` for `customer`. Raises
+    `SlotUnavailable` if it is not free (or was just taken).
+
+    The provider's SlotDay row is locked while booking, so concurrent
+    bookings of the same day are serialized; the conditional update and,
+    on PostgreSQL, the exclusion constraint on Booking also catch the race
+    on databases without row locks.
+    """
+    try:
+        date, index = slot_position(start)
+    except ValueError:
+        raise SlotUnavailable("Not the start of a slot.")
+    if start <= timezone.now():
+        raise SlotUnavailable("This slot has already started.")
+    bit = 1 << index
+
+    try:
+        with transaction.atomic():
+            day = SlotDay.objects.select_for_update()\
+                .filter(medical_pro_id=medical_pro_id, date=date).first()
+            if day is None or not day.free_slots & bit:
+                raise SlotUnavailable("This slot is not available.")
+
+            free_slots = day.free_slots & ~bit
+            updated = SlotDay.objects.filter(id=day.id,
+                free_slots=day.free_slots).update(free_slots=free_slots,
+                    first_free=first_bit(free_slots))
+            if not updated:
+                raise SlotUnavailable("This slot was just booked.")
+
+            return Booking.objects.create(medical_pro_id=medical_pro_id,
+                customer=customer, checkout=checkout, start=start,
+                end=start + SLOT)
+    except IntegrityError:
+        raise SlotUnavailable("This slot was just booked.")
+
+
+def cancel(booking):
+    """
+    Cancels a booking and frees its slot again.
+    """
+    date, index = slot_position(booking.start)
+    with transaction.atomic():
+        day = SlotDay.objects.select_for_update()\
+            .filter(medical_pro_id=booking.medical_pro_id, date=date).first()
+        booking.status = Booking.Status.CANCELLED
+        booking.save(update_fields=['status'])
+        if day is not None:
+            # Only if the provider still offers that slot.
+            day.free_slots |= (1 << index) & day.open_slots
+            day.first_free = first_bit(day.free_slots)
+            day.save(update_fields=['free_slots', 'first_free'])
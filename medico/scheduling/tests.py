@@ -0,0 +1,190 @@
+import datetime
+import json
+
+import pytest
+from django.urls import reverse
+from django.utils import timezone
+
+from medico.scheduling import slots
+from medico.scheduling.models import AvailabilityWindow, Booking, SlotDay
+from medico.users.models import Customer
+from medico.users.tests.factories import MedicalProfessionalFactory
+
+pytestmark = pytest.mark.django_db(transaction=True)
+
+
+def next_monday():
+    today = timezone.localdate()
+    return today + datetime.timedelta(days=7 - today.weekday())
+
+
+def window(medical_pro, weekday, start, end):
+    return AvailabilityWindow.objects.create(medical_pro=medical_pro,
+        weekday=weekday, start_time=datetime.time(*start),
+        end_time=datetime.time(*end))
+
+
+@pytest.fixture
+def customer(user):
+    return Customer.objects.create(user=user)
+
+
+class TestSlots:
+
+    def test_window_mask(self):
+        mask = slots.window_mask(datetime.time(9), datetime.time(10, 30))
+        assert list(slots.iter_bits(mask)) == [18, 19, 20]
+
+    def test_windows_build_bitmaps(self):
+        medical_pro = MedicalProfessionalFactory()
+        window(medical_pro, 0, (9,), (10,))
+        window(medical_pro, 0, (14,), (15,))
+
+        monday = next_monday()
+        day = SlotDay.objects.get(medical_pro=medical_pro, date=monday)
+
+        assert list(slots.iter_bits(day.free_slots)) == [18, 19, 28, 29]
+        assert day.open_slots == day.free_slots
+        # Nothing on other weekdays.
+        assert not SlotDay.objects.filter(
+            date=monday + datetime.timedelta(days=1)).exists()
+
+    def test_next_free_slots(self):
+        monday = next_monday()
+        early, late = MedicalProfessionalFactory(), MedicalProfessionalFactory()
+        other = MedicalProfessionalFactory(state_of_license="NY")
+        window(early, 0, (9,), (10,))
+        window(late, 0, (9, 30), (11,))
+        window(other, 0, (8,), (9,))
+
+        free = slots.next_free_slots({"is_verified": True,
+            "state_of_license": "CA"}, limit=3,
+            now=slots.slot_start(monday, 0))
+
+        assert free == [
+            (slots.slot_start(monday, 18), early.id),
+            (slots.slot_start(monday, 19), early.id),
+            (slots.slot_start(monday, 19), late.id),
+        ]
+
+    def test_past_slots_are_skipped(self):
+        monday = next_monday()
+        medical_pro = MedicalProfessionalFactory()
+        window(medical_pro, 0, (9,), (10,))
+
+        free = slots.next_free_slots({"is_verified": True}, limit=5,
+            now=slots.slot_start(monday, 18) + datetime.timedelta(minutes=1))
+
+        # The following Mondays come after.
+        assert [start for start, _ in free] == [slots.slot_start(monday, 19),
+            slots.slot_start(monday + datetime.timedelta(days=7), 18),
+            slots.slot_start(monday + datetime.timedelta(days=7), 19),
+            slots.slot_start(monday + datetime.timedelta(days=14), 18),
+            slots.slot_start(monday + datetime.timedelta(days=14), 19)]
+
+
+class TestBooking:
+
+    def test_book_and_cancel(self, customer):
+        monday = next_monday()
+        medical_pro = MedicalProfessionalFactory()
+        window(medical_pro, 0, (9,), (10,))
+        start = slots.slot_start(monday, 18)
+
+        booking = slots.book(customer, medical_pro.id, start)
+
+        assert booking.end == start + slots.SLOT
+        day = SlotDay.objects.get(medical_pro=medical_pro, date=monday)
+        assert list(slots.iter_bits(day.free_slots)) == [19]
+        with pytest.raises(slots.SlotUnavailable):
+            slots.book(customer, medical_pro.id, start)
+
+        slots.cancel(booking)
+
+        day.refresh_from_db()
+        assert day.free_slots == day.open_slots
+        assert Booking.objects.get().status == Booking.Status.CANCELLED
+
+    def test_rebuild_keeps_bookings(self, customer):
+        monday = next_monday()
+        medical_pro = MedicalProfessionalFactory()
+        window(medical_pro, 0, (9,), (10,))
+        slots.book(customer, medical_pro.id, slots.slot_start(monday, 18))
+
+        # Adding a window rebuilds the bitmaps.
+        window(medical_pro, 0, (11,), (12,))
+
+        day = SlotDay.objects.get(medical_pro=medical_pro, date=monday)
+        assert list(slots.iter_bits(day.free_slots)) == [19, 22, 23]
+
+    def test_unaligned_and_closed_slots(self, customer):
+        monday = next_monday()
+        medical_pro = MedicalProfessionalFactory()
+        window(medical_pro, 0, (9,), (10,))
+
+        with pytest.raises(slots.SlotUnavailable):
+            slots.book(customer, medical_pro.id,
+                slots.slot_start(monday, 18) + datetime.timedelta(minutes=5))
+        with pytest.raises(slots.SlotUnavailable):
+            slots.book(customer, medical_pro.id, slots.slot_start(monday, 2))
+
+
+class TestViews:
+
+    def test_publish_and_book(self, client, customer):
+        medical_pro = MedicalProfessionalFactory()
+        client.force_login(medical_pro.user)
+        response = client.post(reverse("scheduling:availability"),
+            json.dumps([{"weekday": 0, "start_time": "09:00",
+                         "end_time": "10:00"}]),
+            content_type="application/json")
+        assert response.status_code == 200
+        assert len(response.json()["windows"]) == 1
+
+        client.force_login(customer.user)
+        response = client.get(reverse("scheduling:slots"), {"limit": 1})
+        assert response.status_code == 200
+        slot = response.json()["results"][0]
+        assert slot["medical_pro"]["id"] == medical_pro.id
+
+        data = json.dumps({"medical_pro_id": medical_pro.id,
+                           "start": slot["start"]})
+        response = client.post(reverse("scheduling:book"), data,
+            content_type="application/json")
+        assert response.status_code == 201
+
+        response = client.post(reverse("scheduling:book"), data,
+            content_type="application/json")
+        assert response.status_code == 409
+        assert response.json()["error"]["type"] == "ConflictError"
+
+    def test_invalid_window(self, client):
+        medical_pro = MedicalProfessionalFactory()
+        client.force_login(medical_pro.user)
+
+        response = client.post(reverse("scheduling:availability"),
+            json.dumps([{"weekday": 0, "start_time": "09:10",
+                         "end_time": "10:00"}]),
+            content_type="application/json")
+
+        assert response.status_code == 400
+        assert response.json()["error"]["type"] == "FormError"
+        assert not AvailabilityWindow.objects.exists()
+
+    def test_replacing_windows_rebuilds_once(self, client, monkeypatch):
+        medical_pro = MedicalProfessionalFactory()
+        window(medical_pro, 0, (9,), (10,))
+        window(medical_pro, 1, (9,), (10,))
+        rebuilt = []
+        monkeypatch.setattr(slots, "rebuild", rebuilt.append)
+        client.force_login(medical_pro.user)
+
+        response = client.post(reverse("scheduling:availability"),
+            json.dumps([{"weekday": 2, "start_time": "09:00",
+                         "end_time": "10:00"}]),
+            content_type="application/json")
+
+        assert response.status_code == 200
+        assert list(AvailabilityWindow.objects.values_list('weekday',
+            flat=True)) == [2]
+        assert rebuilt == [[medical_pro.id]]
@@ -0,0 +1,17 @@
+from django.urls import path
+
+from medico.scheduling.views import (
+    availability,
+    available_slots,
+    book_slot,
+    cancel_booking,
+)
+
+app_name = "scheduling"
+urlpatterns = [
+    path("availability/", view=availability, name="availability"),
+    path("slots/", view=available_slots, name="slots"),
+    path("bookings/", view=book_slot, name="book"),
+    path("bookings/<int:booking_id>/cancel/", view=cancel_booking,
+        name="cancel-booking"),
+]
@@ -0,0 +1,166 @@
+import json
+
+from django.contrib.auth.decorators import login_required
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from django.http import HttpResponse, JsonResponse
+from django.utils.dateparse import parse_datetime, parse_time
+
+import common.constants
+import common.decorators
+import common.helpers
+from medico.scheduling import signals, slots
+from medico.scheduling.models import AvailabilityWindow, Booking
+from medico.users import directory
+from medico.users.models import MedicalProfessional
+
+
+def request_error(message, status=400, type='RequestError'):
+    return JsonResponse({
+        "error": {
+            'message': message,
+            'type': type
+        }
+    }, status=status)
+
+
+def booking_serialize(booking):
+    return {
+        "id": booking.id,
+        "medical_pro_id": booking.medical_pro_id,
+        "start": booking.start,
+        "end": booking.end,
+        "status": booking.get_status_display(),
+    }
+
+
+@login_required
+@common.decorators.customer_only
+def available_slots(request):
+    """
+    The earliest free consultation slots among the medical professionals
+    matching the doctor directory filters. Takes an optional `limit`.
+    """
+    if request.method != 'GET':
+        return HttpResponse('Method not allowed')
+
+    try:
+        filters = directory.parse_filters(request.GET)
+        limit = int(request.GET.get('limit',
+            common.constants.SCHEDULING_NEXT_SLOTS_LIMIT))
+    except (directory.DirectoryError, ValueError) as e:
+        return request_error(str(e))
+    if not 0 < limit <= common.constants.SCHEDULING_NEXT_SLOTS_MAX_LIMIT:
+        return request_error('Invalid value for limit.')
+
+    free = slots.next_free_slots(filters, limit)
+    medical_pros = MedicalProfessional.objects.select_related('user')\
+        .in_bulk({medical_pro_id for _, medical_pro_id in free})
+
+    return JsonResponse({
+        "results": [{
+            "start": start,
+            "medical_pro":
+                common.helpers.medical_pro_serialize(
+                    medical_pros[medical_pro_id]),
+        } for start, medical_pro_id in free]
+    })
+
+
+@login_required
+@common.decorators.customer_only
+def book_slot(request):
+    """
+    Books a slot. Expects a JSON body with `medical_pro_id` and the `start`
+    of the slot, as returned by `available_slots`.
+    """
+    if request.method != 'POST':
+        return HttpResponse('Method not allowed')
+
+    try:
+        data = json.loads(request.body)
+        medical_pro_id = int(data['medical_pro_id'])
+        start = parse_datetime(data['start'])
+        if start is None:
+            raise ValueError
+    except (KeyError, TypeError, ValueError):
+        return request_error('Please provide medical_pro_id and start.')
+
+    if not MedicalProfessional.objects.filter(id=medical_pro_id,
+            is_verified=True).exists():
+        return request_error('No such medical professional.', 404,
+            'NotFoundError')
+
+    try:
+        booking = slots.book(request.user.customer, medical_pro_id, start)
+    except slots.SlotUnavailable as e:
+        return request_error(str(e), 409, 'ConflictError')
+
+    return JsonResponse({"booking": booking_serialize(booking)}, status=201)
+
+
+@login_required
+@common.decorators.customer_only
+def cancel_booking(request, booking_id):
+    if request.method != 'POST':
+        return HttpResponse('Method not allowed')
+
+    booking = Booking.objects.filter(id=booking_id,
+        customer=request.user.customer,
+        status=Booking.Status.CONFIRMED).first()
+    if booking is None:
+        return request_error('No such booking.', 404, 'NotFoundError')
+
+    slots.cancel(booking)
+    return JsonResponse({"booking": booking_serialize(booking)})
+
+
+@login_required
+@common.decorators.medical_pro_only
+def availability(request):
+    """
+    A medical professional's weekly availability windows. POST replaces
+    them with the JSON list in the body, e.g.
+    `[{"weekday": 0, "start_time": "09:00", "end_time": "12:30"}]`.
+    """
+    medical_pro = request.user.medical_pro
+
+    if request.method == 'POST':
+        try:
+            windows = [AvailabilityWindow(medical_pro=medical_pro,
+                           weekday=int(window['weekday']),
+                           start_time=parse_time(window['start_time']),
+                           end_time=parse_time(window['end_time']))
+                       for window in json.loads(request.body)]
+            for window in windows:
+                window.full_clean()
+        except ValidationError as e:
+            return JsonResponse({
+                "error": {
+                    'message': "Please correct the availability windows.",
+                    'messages': e.messages,
+                    'type': 'FormError'
+                }
+            }, status=400)
+        except (KeyError, TypeError, ValueError):
+            return request_error('Please provide a list of windows with '
+                'weekday, start_time and end_time.')
+
+        with transaction.atomic():
+            # Deleting every window would otherwise queue a rebuild per
+            # window, and bulk_create sends no signals: rebuild once.
+            with signals.rebuilds_suppressed():
+                medical_pro.availability_windows.all().delete()
+            AvailabilityWindow.objects.bulk_create(windows)
+            transaction.on_commit(lambda: slots.rebuild([medical_pro.id]))
+
+    elif request.method != 'GET':
+        return HttpResponse('Method not allowed')
+
+    return JsonResponse({
+        "windows": [{
+            "weekday": window.weekday,
+            "start_time": window.start_time.strftime("%H:%M"),
+            "end_time": window.end_time.strftime("%H:%M"),
+        } for window in medical_pro.availability_windows.all()]
+    })
@@ -1,17 +1,21 @@
 from django.contrib import admin
 from django.contrib.auth import admin as auth_admin
 from django.contrib.auth import get_user_model
-from django.utils.translation import gettext_lazy as _
+from django.utils.html import format_html
+from django.utils.translation import gettext_lazy as _, ngettext
 
+from common.admin import LargeTableAdminMixin
+from medico.users import verification
 from medico.users.forms import UserChangeForm, UserCreationForm
 
+import common.constants
 import medico.users.models
 
 User = get_user_model()
 
 
 @admin.register(User)
-class UserAdmin(auth_admin.UserAdmin):
+class UserAdmin(LargeTableAdminMixin, auth_admin.UserAdmin):
 
     form = UserChangeForm
     add_form = UserCreationForm
@@ -36,5 +40,76 @@ class UserAdmin(auth_admin.UserAdmin):
     search_fields = ["first_name", "last_name", "email", "username"]
 
 
-admin.site.register(medico.users.models.Customer)
-admin.site.register(medico.users.models.MedicalProfessional)
+@admin.register(medico.users.models.Customer)
+class CustomerAdmin(LargeTableAdminMixin, admin.ModelAdmin):
+
+    list_display = ["__str__", "dob"]
+    list_select_related = ["user"]
+    raw_id_fields = ["user"]
+    search_fields = ["user__first_name", "user__last_name", "user__email",
+        "user__username"]
+
+
+@admin.register(medico.users.models.MedicalProfessional)
+class MedicalProfessionalAdmin(LargeTableAdminMixin, admin.ModelAdmin):
+
+    list_display = ["__str__", "staff_type", "state_of_license",
+        "is_verified"]
+    list_filter = ["is_verified", "staff_type", "state_of_license"]
+    list_select_related = ["user"]
+    raw_id_fields = ["user"]
+    search_fields = ["user__first_name", "user__last_name", "user__email",
+        "user__username"]
+
+
+@admin.register(medico.users.models.PendingMedicalProfessional)
+class ProviderReviewQueueAdmin(admin.ModelAdmin):
+    """
+    Queue of unverified medical professionals, oldest first. Profiles are
+    approved or rejected in bulk; the full-size picture and license are only
+    loaded when a reviewer opens them.
+    """
+    actions = ["approve", "reject"]
+    list_display = ["thumbnail", "__str__", "email", "staff_type",
+        "state_of_license", "license_preview"]
+    list_display_links = ["__str__"]
+    list_select_related = ["user"]
+    ordering = ["id"]
+    raw_id_fields = ["user"]
+    search_fields = ["user__first_name", "user__last_name", "user__email"]
+    show_full_result_count = False
+
+    def has_add_permission(self, request):
+        return False
+
+    def thumbnail(self, obj):
+        if not obj.profile_picture:
+            return "-"
+        return format_html('<img src="{0}" width="{1}" height="{2}" alt="">',
+            obj.profile_thumbnail.url, common.constants.PICTURE_WIDTH,
+            common.constants.PICTURE_HEIGHT)
+
+    def email(self, obj):
+        return obj.user.email
+
+    def license_preview(self, obj):
+        if not obj.medical_license:
+            return "-"
+        return format_html('<a href="{0}" target="_blank" rel="noopener">{1}'
+            '</a>', obj.medical_license.url,
+            obj.medical_license.name.rsplit('/', 1)[-1])
+    license_preview.short_description = "Medical license"
+
+    def _report(self, request, count, verb):
+        self.message_user(request, ngettext(
+            "%(count)d profile was %(verb)s.",
+            "%(count)d profiles were %(verb)s.", count) % {
+                "count": count, "verb": verb})
+
+    def approve(self, request, queryset):
+        self._report(request, verification.approve(queryset), "approved")
+    approve.short_description = "Approve selected profiles"
+
+    def reject(self, request, queryset):
+        self._report(request, verification.reject(queryset), "rejected")
+    reject.short_description = "Reject selected profiles"
@@ -0,0 +1,114 @@
+"""
+Query and caching logic for the doctor directory, which customers use to
+browse medical professionals.
+"""
+import hashlib
+
+from django.core.cache import cache
+from localflavor.us.us_states import STATE_CHOICES
+
+import common.cache
+import common.constants
+import common.helpers
+from common.pagination import KeysetPaginator
+from medico.users.models import MedicalProfessional
+
+CACHE_VERSION_KEY = "doctor-directory:version"
+
+# Integer filters and the choices they are validated against.
+INTEGER_FILTERS = {
+    "staff_type": MedicalProfessional.StaffType,
+    "doctor_specialty": MedicalProfessional.DoctorMedicalSpecialty,
+    "other_specialty": MedicalProfessional.OtherMedicalSpecialty,
+}
+
+
+class DirectoryError(ValueError):
+    """
+    Raised for directory query parameters that cannot be served.
+    """
+
+
+def parse_filters(params, allow_unverified=False):
+    """
+    Validates the directory query parameters and returns a dictionary that
+    can be passed straight to `QuerySet.filter`.
+
+    Only staff may browse unverified professionals; everyone else always
+    gets `is_verified=True`.
+    """
+    filters = {"is_verified": True}
+
+    if allow_unverified and params.get("is_verified") in ("false", "0"):
+        filters["is_verified"] = False
+
+    for name, choices in INTEGER_FILTERS.items():
+        value = params.get(name)
+        if value in (None, ""):
+            continue
+        try:
+            value = int(value)
+        except ValueError:
+            raise DirectoryError("Invalid value for {0}.".format(name))
+        if value not in choices.values:
+            raise DirectoryError("Invalid value for {0}.".format(name))
+        filters[name] = value
+
+    state = params.get("state_of_license")
+    if state:
+        state = state.upper()
+        if state not in dict(STATE_CHOICES):
+            raise DirectoryError("Invalid value for state_of_license.")
+        filters["state_of_license"] = state
+
+    return filters
+
+
+def parse_limit(params):
+    return common.helpers.parse_limit(params,
+        common.constants.DOCTOR_DIRECTORY_PAGE_SIZE,
+        common.constants.DOCTOR_DIRECTORY_MAX_PAGE_SIZE, DirectoryError)
+
+
+def invalidate_cache():
+    """
+    Makes every cached directory page stale by bumping the version that is
+    part of each cache key. Old entries simply expire.
+    """
+    common.cache.bump_version(CACHE_VERSION_KEY)
+
+
+def cache_key(filters, cursor, limit):
+    raw = repr((sorted(filters.items()), cursor, limit))
+    return "doctor-directory:{0}:{1}".format(
+        common.cache.get_version(CACHE_VERSION_KEY),
+        hashlib.md5(raw.encode()).hexdigest())
+
+
+def get_page(filters, cursor=None, limit=None):
+    """
+    Returns a serialized page of the directory for the given filters,
+    served from the cache when possible.
+
+    Rows are ordered by ID so that every filter combination is answered by
+    one of the composite `(is_verified, <filter>, id)` indexes on
+    MedicalProfessional, and pages are fetched by seeking past the last ID
+    rather than with OFFSET.
+    """
+    limit = limit or common.constants.DOCTOR_DIRECTORY_PAGE_SIZE
+    key = cache_key(filters, cursor, limit)
+    data = cache.get(key)
+    if data is not None:
+        return data
+
+    queryset = MedicalProfessional.objects.filter(**filters)\
+        .select_related('user')
+    page = KeysetPaginator(queryset, ("id",), limit).page(cursor)
+
+    data = {
+        "results": [common.helpers.medical_pro_serialize(medical_pro)
+                    for medical_pro in page.object_list],
+        "next_cursor": page.next_cursor
+    }
+    cache.set(key, data, common.constants.DOCTOR_DIRECTORY_CACHE_TIMEOUT)
+    return data
@@ -0,0 +1,29 @@
+# Generated by Django 3.0.12 on 2026-10-19 11:01
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0005_auto_20210315_1833'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='medicalprofessional',
+            index=models.Index(fields=['is_verified', 'state_of_license', 'staff_type', 'id'], name='medical_pro_state_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='medicalprofessional',
+            index=models.Index(fields=['is_verified', 'staff_type', 'id'], name='medical_pro_staff_type_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='medicalprofessional',
+            index=models.Index(fields=['is_verified', 'doctor_specialty', 'id'], name='medical_pro_doctor_spec_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='medicalprofessional',
+            index=models.Index(fields=['is_verified', 'other_specialty', 'id'], name='medical_pro_other_spec_idx'),
+        ),
+    ]
@@ -0,0 +1,14 @@
+from django.contrib.postgres.operations import TrigramExtension
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0006_medicalprofessional_directory_indexes'),
+    ]
+
+    operations = [
+        # Used for fuzzy provider name matching. A no-op on other databases.
+        TrigramExtension(),
+    ]
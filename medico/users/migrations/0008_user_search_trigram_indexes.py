@@ -0,0 +1,32 @@
+from django.db import migrations
+
+from common.migrations import RunPostgresSQL
+
+# The admin searches with `icontains`, which PostgreSQL runs as
+# `UPPER(column::text) LIKE UPPER('%term%')`. Indexing the same expression
+# with gin_trgm_ops lets those searches use the index instead of scanning
+# the whole table.
+SEARCH_FIELDS = ["first_name", "last_name", "email", "username"]
+
+
+def create_index(field):
+    return RunPostgresSQL(
+        'CREATE INDEX CONCURRENTLY IF NOT EXISTS "users_user_{0}_trgm" '
+        'ON "users_user" USING gin ((UPPER("{0}"::text)) gin_trgm_ops)'
+        .format(field),
+        'DROP INDEX CONCURRENTLY IF EXISTS "users_user_{0}_trgm"'
+        .format(field),
+    )
+
+
+class Migration(migrations.Migration):
+
+    # CREATE INDEX CONCURRENTLY cannot run inside a transaction, and avoids
+    # locking the user table against writes while the indexes build.
+    atomic = False
+
+    dependencies = [
+        ('users', '0007_trigram_extension'),
+    ]
+
+    operations = [create_index(field) for field in SEARCH_FIELDS]
@@ -0,0 +1,35 @@
+# Generated by Django 3.0.12 on 2026-10-19 11:09
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0008_user_search_trigram_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PendingMedicalProfessional',
+            fields=[
+            ],
+            options={
+                'verbose_name': 'provider awaiting review',
+                'verbose_name_plural': 'provider review queue',
+                'proxy': True,
+                'indexes': [],
+                'constraints': [],
+            },
+            bases=('users.medicalprofessional',),
+        ),
+        migrations.AddField(
+            model_name='medicalprofessional',
+            name='is_rejected',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.AddIndex(
+            model_name='medicalprofessional',
+            index=models.Index(condition=models.Q(is_rejected=False), fields=['is_verified', 'id'], name='medical_pro_review_idx'),
+        ),
+    ]
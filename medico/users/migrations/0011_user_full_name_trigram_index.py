@@ -0,0 +1,25 @@
+from django.db import migrations
+
+from common.migrations import RunPostgresSQL
+
+
+class Migration(migrations.Migration):
+
+    # CREATE INDEX CONCURRENTLY cannot run inside a transaction, and avoids
+    # locking the user table against writes while the index builds.
+    atomic = False
+
+    dependencies = [
+        ('users', '0010_updated'),
+    ]
+
+    operations = [
+        # Serves the typeahead's fuzzy matches, which filter on
+        # `typeahead.FullName` with pg_trgm's `%` operator.
+        RunPostgresSQL(
+            'CREATE INDEX CONCURRENTLY IF NOT EXISTS "users_user_full_name_trgm" '
+            'ON "users_user" USING gin '
+            '(("first_name" || \' \' || "last_name") gin_trgm_ops)',
+            'DROP INDEX CONCURRENTLY IF EXISTS "users_user_full_name_trgm"',
+        ),
+    ]
@@ -0,0 +1,30 @@
+from django.db import migrations, models
+
+from common.migrations import AddIndexConcurrently
+
+
+class Migration(migrations.Migration):
+
+    # CREATE INDEX CONCURRENTLY cannot run inside a transaction, and avoids
+    # locking the user, customer and medical professional tables against
+    # writes while the indexes build.
+    atomic = False
+
+    dependencies = [
+        ('users', '0011_user_full_name_trigram_index'),
+    ]
+
+    operations = [
+        AddIndexConcurrently(
+            model_name='user',
+            index=models.Index(fields=['updated', 'id'], name='user_updated_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='customer',
+            index=models.Index(fields=['updated', 'id'], name='customer_updated_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='medicalprofessional',
+            index=models.Index(fields=['updated', 'id'], name='medical_pro_updated_idx'),
+        ),
+    ]
@@ -13,6 +13,7 @@ from django.db import models
 from django.urls import reverse
 
 import common.constants
+from medico.ledger import journal
 
 
 class User(AbstractUser):
@@ -42,6 +43,14 @@ class User(AbstractUser):
     gender = models.IntegerField(choices=GENDER, default=MALE)
     phone_number = models.CharField(validators=[phone_regex], max_length=17,
         default="")
+    # When the row last changed, which analytics snapshots pick changes up
+    # by; see medico.analytics.snapshots.
+    updated = models.DateTimeField(auto_now=True)
+
+    class Meta(AbstractUser.Meta):
+        indexes = [
+            models.Index(fields=['updated', 'id'], name='user_updated_idx'),
+        ]
 
     def get_absolute_url(self):
         """Get url for user's detail view.
@@ -60,6 +69,16 @@ class Customer(models.Model):
     user = models.OneToOneField(settings.AUTH_USER_MODEL,
         on_delete=models.CASCADE, related_name='customer')
     dob = models.DateField(default=date.today)
+    updated = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['updated', 'id'],
+                name='customer_updated_idx'),
+        ]
+
+    def __str__(self):
+        return self.name_with_title
 
     @property
     def name_with_title(self):
@@ -95,8 +114,10 @@ class Customer(models.Model):
             description=price.product.description,
             payment_method=payment_method
         )
-        return djstripe.models.PaymentIntent\
+        djstripe_intent = djstripe.models.PaymentIntent\
             .sync_from_stripe_data(payment_intent)
+        journal.record_charge(djstripe_intent)
+        return djstripe_intent
 
     def get_or_create_stripe_customer(self, payment_method):
         """
@@ -163,7 +184,18 @@ class Customer(models.Model):
             expand=["latest_invoice.payment_intent"]
         )
 
-        return djstripe.models.Subscription.sync_from_stripe_data(subscription)
+        djstripe_sub = djstripe.models.Subscription\
+            .sync_from_stripe_data(subscription)
+        # The first invoice is paid as the subscription is created, unless
+        # the payment needs further action; then it is recorded from its
+        # webhook once it succeeds.
+        invoice = subscription.get("latest_invoice")
+        payment_intent = isinstance(invoice, dict) and \
+            invoice.get("payment_intent")
+        if payment_intent:
+            journal.record_subscription(djstripe.models.PaymentIntent
+                .sync_from_stripe_data(payment_intent))
+        return djstripe_sub
 
 
 class MedicalProfessional(models.Model):
@@ -196,6 +228,9 @@ class MedicalProfessional(models.Model):
         default=StaffType.DOCTOR)
     state_of_license = localflavor.us.models.USStateField(default="CA")
     is_verified = models.BooleanField(default=False)
+    # Set when staff turn down the profile, which takes it out of the
+    # review queue.
+    is_rejected = models.BooleanField(default=False)
 
     # Specifically for doctors
     doctor_specialty = models.IntegerField(null=True,
@@ -207,14 +242,43 @@ class MedicalProfessional(models.Model):
         default=OtherMedicalSpecialty.REGISTERED_NURSE)
 
     profile_picture = models.ImageField(upload_to='profile_pictures')
-    # Store a thumbnail to show to customers on the doctor selection page
+    # Store a thumbnail to show to customers on the doctor selection page.
+    # It is generated when the picture is saved, so that pages listing many
+    # professionals neither generate thumbnails nor check the storage for
+    # them.
     profile_thumbnail = ImageSpecField(source='profile_picture',
         processors=[ResizeToFill(common.constants.PICTURE_WIDTH,
                                  common.constants.PICTURE_HEIGHT)],
         format=common.constants.PICTURE_FORMAT,
-        options={'quality': common.constants.PICTURE_QUALITY})
+        options={'quality': common.constants.PICTURE_QUALITY},
+        cachefile_strategy='imagekit.cachefiles.strategies.Optimistic')
 
     medical_license = models.FileField(upload_to='medical_licenses')
+    updated = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        # Composite indexes backing the doctor directory filters. Each one
+        # ends with `id` so that keyset pagination can seek within it.
+        indexes = [
+            models.Index(fields=['is_verified', 'state_of_license',
+                'staff_type', 'id'], name='medical_pro_state_idx'),
+            models.Index(fields=['is_verified', 'staff_type', 'id'],
+                name='medical_pro_staff_type_idx'),
+            models.Index(fields=['is_verified', 'doctor_specialty', 'id'],
+                name='medical_pro_doctor_spec_idx'),
+            models.Index(fields=['is_verified', 'other_specialty', 'id'],
+                name='medical_pro_other_spec_idx'),
+            # The review queue, which only holds unrejected profiles.
+            models.Index(fields=['is_verified', 'id'],
+                name='medical_pro_review_idx',
+                condition=models.Q(is_rejected=False)),
+            # Changes picked up by analytics snapshots.
+            models.Index(fields=['updated', 'id'],
+                name='medical_pro_updated_idx'),
+        ]
+
+    def __str__(self):
+        return self.name_with_title
 
     @property
     def name_with_title(self):
@@ -227,3 +291,21 @@ class MedicalProfessional(models.Model):
             return titled.format(title="Mr.", name=full_name)
         else:
             return titled.format(title="Ms.", name=full_name)
+
+
+class PendingMedicalProfessional(MedicalProfessional):
+    """
+    Medical professionals waiting for staff to review their profile. Used
+    for the review queue in the admin.
+    """
+    class Meta:
+        proxy = True
+        verbose_name = "provider awaiting review"
+        verbose_name_plural = "provider review queue"
+
+    class Manager(models.Manager):
+        def get_queryset(self):
+            return super().get_queryset()\
+                .filter(is_verified=False, is_rejected=False)
+
+    objects = Manager()
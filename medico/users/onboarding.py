@@ -0,0 +1,145 @@
+"""
+Helpers for bulk onboarding of medical professionals from a partner
+manifest. See the `import_providers` management command.
+"""
+import csv
+import io
+import json
+import os
+
+import django
+from django.contrib.auth.hashers import make_password
+from django.core.exceptions import ValidationError
+from django.core.files import File
+from django.core.files.storage import default_storage
+from PIL import Image
+
+from medico.users.models import MedicalProfessional, User
+
+# Manifest columns. `password`, `gender`, `phone_number`, the specialties and
+# `is_verified` are optional.
+REQUIRED_COLUMNS = ["username", "email", "first_name", "last_name",
+    "staff_type", "state_of_license", "profile_picture", "medical_license"]
+
+INTEGER_COLUMNS = ["gender", "staff_type", "doctor_specialty",
+    "other_specialty"]
+
+
+class ManifestError(ValueError):
+    pass
+
+
+def read_manifest(path):
+    """
+    Yields one dictionary per provider from a CSV (with a header row) or
+    JSON Lines manifest, chosen by the file extension.
+    """
+    with open(path, newline='', encoding='utf-8') as manifest:
+        if path.endswith('.jsonl'):
+            for line_number, line in enumerate(manifest, 1):
+                if not line.strip():
+                    continue
+                try:
+                    row = json.loads(line)
+                except ValueError:
+                    raise ManifestError("Line {0} is not valid JSON."
+                        .format(line_number))
+                yield {key: '' if value is None else str(value)
+                       for key, value in row.items()}
+        else:
+            yield from csv.DictReader(manifest)
+
+
+def build_instances(row):
+    """
+    Validates a manifest row and returns unsaved `(User, MedicalProfessional)`
+    instances for it. Uniqueness is checked by the caller, per chunk.
+    """
+    missing = [column for column in REQUIRED_COLUMNS if not row.get(column)]
+    if missing:
+        raise ManifestError("Missing {0}.".format(", ".join(missing)))
+
+    values = {}
+    for column in INTEGER_COLUMNS:
+        value = (row.get(column) or '').strip()
+        try:
+            values[column] = int(value) if value else None
+        except ValueError:
+            raise ManifestError("{0} must be a number.".format(column))
+
+    user = User(username=row["username"].strip(),
+        email=row["email"].strip(),
+        first_name=row["first_name"].strip(),
+        last_name=row["last_name"].strip(),
+        gender=values["gender"] if values["gender"] is not None else User.MALE,
+        phone_number=(row.get("phone_number") or '').strip())
+    medical_pro = MedicalProfessional(
+        staff_type=values["staff_type"],
+        state_of_license=row["state_of_license"].strip().upper(),
+        doctor_specialty=values["doctor_specialty"],
+        other_specialty=values["other_specialty"],
+        is_verified=(row.get("is_verified") or '').strip().lower() in (
+            "1", "true", "yes"))
+
+    # Same rule as MedicalProSignupForm: doctors need a board certified
+    # specialty, everyone else a nursing/other specialty.
+    if medical_pro.staff_type == MedicalProfessional.StaffType.DOCTOR:
+        required, unused = "doctor_specialty", "other_specialty"
+    else:
+        required, unused = "other_specialty", "doctor_specialty"
+    if getattr(medical_pro, required) is None:
+        raise ManifestError("Missing {0}.".format(required))
+    setattr(medical_pro, unused, None)
+
+    try:
+        # Signups do not record a phone number either, so it is optional.
+        user.clean_fields(exclude=["password"] +
+            ([] if user.phone_number else ["phone_number"]))
+        medical_pro.clean_fields(exclude=["user", "profile_picture",
+            "medical_license", unused])
+    except ValidationError as e:
+        raise ManifestError("; ".join(
+            "{0}: {1}".format(field, " ".join(errors))
+            for field, errors in e.message_dict.items()))
+
+    return user, medical_pro
+
+
+def init_worker():
+    # Needed when worker processes are spawned rather than forked.
+    django.setup()
+
+
+def _store(path, upload_to):
+    with open(path, 'rb') as source:
+        name = os.path.join(upload_to, os.path.basename(path))
+        return default_storage.save(name, File(source))
+
+
+def prepare_files(password, picture_path, license_path):
+    """
+    The CPU and I/O heavy part of onboarding a provider, run in a worker
+    process: hashes the password, checks that the picture is an image,
+    copies both files into media storage and renders the profile thumbnail.
+
+    Returns `(password hash, stored picture name, stored license name)`.
+    """
+    with open(picture_path, 'rb') as picture:
+        try:
+            Image.open(io.BytesIO(picture.read())).verify()
+        except Exception:
+            raise ManifestError("{0} is not a valid image."
+                .format(os.path.basename(picture_path)))
+
+    password_hash = make_password(password or None)
+    picture_name = _store(picture_path,
+        MedicalProfessional._meta.get_field('profile_picture').upload_to)
+    license_name = _store(license_path,
+        MedicalProfessional._meta.get_field('medical_license').upload_to)
+
+    # Bulk inserts do not send the signals imagekit relies on to generate
+    # thumbnails, so generate them here.
+    MedicalProfessional(profile_picture=picture_name)\
+        .profile_thumbnail.generate()
+
+    return password_hash, picture_name, license_name
@@ -0,0 +1,42 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from medico.users import directory, typeahead
+from medico.users.models import MedicalProfessional, User
+
+
+@receiver(post_save, sender=MedicalProfessional)
+@receiver(post_delete, sender=MedicalProfessional)
+def medical_pro_changed(sender, instance, **kwargs):
+    directory.invalidate_cache()
+
+
+@receiver(post_save, sender=MedicalProfessional)
+def medical_pro_saved(sender, instance, **kwargs):
+    # Only index what actually got committed.
+    transaction.on_commit(lambda: typeahead.provider_saved(instance))
+
+
+@receiver(post_delete, sender=MedicalProfessional)
+def medical_pro_deleted(sender, instance, **kwargs):
+    medical_pro_id = instance.id
+    transaction.on_commit(lambda: typeahead.provider_deleted(medical_pro_id))
+
+
+# The fields of User that directory entries and name suggestions show.
+LISTED_USER_FIELDS = {'first_name', 'last_name', 'gender'}
+
+
+@receiver(post_save, sender=User)
+def user_changed(sender, instance, created, update_fields, **kwargs):
+    # Directory entries and name suggestions show the user's name, so a
+    # rename must be visible. New users cannot be listed yet, and saves of
+    # other fields only (e.g. `last_login` on every login) change nothing.
+    if update_fields is not None and \
+            not LISTED_USER_FIELDS.intersection(update_fields):
+        return
+    if not created and hasattr(instance, 'medical_pro'):
+        directory.invalidate_cache()
+        medical_pro = instance.medical_pro
+        transaction.on_commit(lambda: typeahead.provider_saved(medical_pro))
@@ -1,15 +1,18 @@
 from typing import Any, Sequence
 
 from django.contrib.auth import get_user_model
-from factory import Faker, post_generation
+from factory import Faker, SubFactory, post_generation
 from factory.django import DjangoModelFactory
 
+from medico.users.models import MedicalProfessional
+
 
 class UserFactory(DjangoModelFactory):
 
     username = Faker("user_name")
     email = Faker("email")
-    name = Faker("name")
+    first_name = Faker("first_name")
+    last_name = Faker("last_name")
 
     @post_generation
     def password(self, create: bool, extracted: Sequence[Any], **kwargs):
@@ -30,3 +33,13 @@ class UserFactory(DjangoModelFactory):
     class Meta:
         model = get_user_model()
         django_get_or_create = ["username"]
+
+
+class MedicalProfessionalFactory(DjangoModelFactory):
+
+    user = SubFactory(UserFactory)
+    state_of_license = "CA"
+    is_verified = True
+
+    class Meta:
+        model = MedicalProfessional
@@ -1,7 +1,9 @@
 import pytest
 from django.urls import reverse
+from django.utils import timezone
 
-from medico.users.models import User
+from medico.users.models import MedicalProfessional, User
+from medico.users.tests.factories import MedicalProfessionalFactory
 
 pytestmark = pytest.mark.django_db
 
@@ -38,3 +40,80 @@ class TestUserAdmin:
         url = reverse("admin:users_user_change", kwargs={"object_id": user.pk})
         response = admin_client.get(url)
         assert response.status_code == 200
+
+
+class TestMedicalProfessionalAdmin:
+    def test_changelist(self, admin_client):
+        MedicalProfessionalFactory(user__first_name="Gregory")
+        url = reverse("admin:users_medicalprofessional_changelist")
+        response = admin_client.get(url)
+        assert response.status_code == 200
+        assert b"Dr. Gregory" in response.content
+
+    def test_short_terms_match_prefixes(self, admin_client):
+        medical_pro = MedicalProfessionalFactory(user__first_name="Gregory",
+            user__last_name="House")
+        # The factory's random username and e-mail could start with "gr".
+        MedicalProfessionalFactory(user__first_name="Ingrid",
+            user__last_name="Smith", user__username="ismith",
+            user__email="ismith@example.com")
+        url = reverse("admin:users_medicalprofessional_changelist")
+
+        response = admin_client.get(url, data={"q": "gr"})
+
+        assert list(response.context["cl"].result_list) == [medical_pro]
+
+    def test_long_terms_match_substrings(self, admin_client):
+        medical_pro = MedicalProfessionalFactory(user__first_name="Ingrid")
+        url = reverse("admin:users_medicalprofessional_changelist")
+
+        response = admin_client.get(url, data={"q": "grid"})
+
+        assert list(response.context["cl"].result_list) == [medical_pro]
+
+
+class TestCustomerAdmin:
+    def test_changelist(self, admin_client):
+        url = reverse("admin:users_customer_changelist")
+        response = admin_client.get(url, data={"q": "a"})
+        assert response.status_code == 200
+
+
+@pytest.mark.django_db(transaction=True)
+class TestProviderReviewQueueAdmin:
+    url = reverse("admin:users_pendingmedicalprofessional_changelist")
+
+    def test_lists_only_pending(self, admin_client):
+        pending = MedicalProfessionalFactory(is_verified=False)
+        MedicalProfessionalFactory(is_verified=False, is_rejected=True)
+        MedicalProfessionalFactory()
+
+        response = admin_client.get(self.url)
+
+        assert list(response.context["cl"].result_list) == [pending]
+
+    @pytest.mark.parametrize("action, is_verified, is_rejected", [
+        ("approve", True, False),
+        ("reject", False, True),
+    ])
+    def test_bulk_actions(self, admin_client, mailoutbox, action,
+                          is_verified, is_rejected):
+        selected = [MedicalProfessionalFactory(is_verified=False)
+                    for _ in range(3)]
+        untouched = MedicalProfessionalFactory(is_verified=False)
+        started = timezone.now()
+
+        response = admin_client.post(self.url, data={
+            "action": action,
+            "_selected_action": [medical_pro.pk for medical_pro in selected],
+        })
+
+        assert response.status_code == 302
+        assert MedicalProfessional.objects.filter(is_verified=is_verified,
+            is_rejected=is_rejected).count() == 3
+        assert MedicalProfessional.objects.filter(updated__gte=started)\
+            .count() == 3
+        untouched.refresh_from_db()
+        assert not (untouched.is_verified or untouched.is_rejected)
+        assert sorted(m.to[0] for m in mailoutbox) == \
+            sorted(medical_pro.user.email for medical_pro in selected)
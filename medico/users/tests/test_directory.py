@@ -0,0 +1,69 @@
+import pytest
+from django.urls import reverse
+
+from medico.users.models import MedicalProfessional, User
+from medico.users.tests.factories import MedicalProfessionalFactory
+
+pytestmark = pytest.mark.django_db
+
+
+class TestDoctorDirectory:
+    url = reverse("users:doctor-directory")
+
+    def test_only_verified_for_customers(self, client, user: User):
+        MedicalProfessionalFactory(is_verified=False)
+        verified = MedicalProfessionalFactory()
+        client.force_login(user)
+
+        response = client.get(self.url)
+
+        assert response.status_code == 200
+        assert [r["id"] for r in response.json()["results"]] == [verified.id]
+
+    def test_filters(self, client, user: User):
+        MedicalProfessionalFactory(state_of_license="NY")
+        nurse = MedicalProfessionalFactory(
+            staff_type=MedicalProfessional.StaffType.NURSE)
+        client.force_login(user)
+
+        response = client.get(self.url, data={
+            "state_of_license": "ca",
+            "staff_type": MedicalProfessional.StaffType.NURSE,
+        })
+
+        assert [r["id"] for r in response.json()["results"]] == [nurse.id]
+
+    def test_invalid_filter(self, client, user: User):
+        client.force_login(user)
+
+        response = client.get(self.url, data={"staff_type": "99"})
+
+        assert response.status_code == 400
+        assert response.json()["error"]["type"] == "RequestError"
+
+    def test_keyset_pagination(self, client, user: User):
+        ids = [MedicalProfessionalFactory().id for _ in range(5)]
+        client.force_login(user)
+
+        seen, cursor = [], None
+        while True:
+            data = {"limit": 2}
+            if cursor:
+                data["cursor"] = cursor
+            page = client.get(self.url, data=data).json()
+            seen += [r["id"] for r in page["results"]]
+            cursor = page["next_cursor"]
+            if not cursor:
+                break
+
+        assert seen == sorted(ids)
+
+    def test_cache_invalidated_on_save(self, client, user: User):
+        medical_pro = MedicalProfessionalFactory()
+        client.force_login(user)
+        assert len(client.get(self.url).json()["results"]) == 1
+
+        medical_pro.is_verified = False
+        medical_pro.save()
+
+        assert client.get(self.url).json()["results"] == []
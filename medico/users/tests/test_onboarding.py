@@ -0,0 +1,68 @@
+import csv
+
+import pytest
+from allauth.account.models import EmailAddress
+from django.core.management import call_command
+from PIL import Image
+
+from medico.users.models import MedicalProfessional, User
+
+pytestmark = pytest.mark.django_db
+
+COLUMNS = ["username", "email", "first_name", "last_name", "password",
+    "staff_type", "state_of_license", "doctor_specialty", "other_specialty",
+    "profile_picture", "medical_license"]
+
+
+@pytest.fixture
+def files_dir(tmpdir):
+    Image.new("RGB", (300, 200), "white").save(str(tmpdir / "house.jpg"))
+    (tmpdir / "house-license.pdf").write_binary(b"%PDF-1.4")
+    (tmpdir / "not-an-image.jpg").write_binary(b"nope")
+    return tmpdir
+
+
+def write_manifest(path, rows):
+    with open(str(path), "w", newline="") as manifest:
+        writer = csv.DictWriter(manifest, fieldnames=COLUMNS)
+        writer.writeheader()
+        writer.writerows(rows)
+
+
+def provider_row(username, **overrides):
+    row = {"username": username, "email": username + "@example.com",
+        "first_name": "Gregory", "last_name": "House", "password": "vicodin",
+        "staff_type": "0", "state_of_license": "nj", "doctor_specialty": "1",
+        "other_specialty": "", "profile_picture": "house.jpg",
+        "medical_license": "house-license.pdf"}
+    row.update(overrides)
+    return row
+
+
+def test_import_is_resumable(files_dir):
+    manifest = files_dir / "manifest.csv"
+    write_manifest(manifest, [
+        provider_row("house"),
+        provider_row("wilson", doctor_specialty=""),
+        provider_row("chase", profile_picture="not-an-image.jpg"),
+    ])
+
+    call_command("import_providers", str(manifest), files_dir=str(files_dir),
+        workers=2, chunk_size=2)
+
+    medical_pro = MedicalProfessional.objects.select_related('user').get()
+    assert medical_pro.user.username == "house"
+    assert medical_pro.user.check_password("vicodin")
+    assert medical_pro.state_of_license == "NJ"
+    assert medical_pro.other_specialty is None
+    assert medical_pro.profile_picture.name.startswith("profile_pictures/")
+    assert EmailAddress.objects.get(user=medical_pro.user).verified
+
+    write_manifest(manifest, [provider_row("house"), provider_row("cameron",
+        staff_type="1", doctor_specialty="", other_specialty="2")])
+    call_command("import_providers", str(manifest), files_dir=str(files_dir),
+        workers=2)
+
+    assert sorted(User.objects.values_list('username', flat=True)) == \
+        ["cameron", "house"]
+    assert MedicalProfessional.objects.count() == 2
@@ -0,0 +1,90 @@
+import pytest
+from django.urls import reverse
+
+from medico.users import typeahead
+from medico.users.models import User
+from medico.users.tests.factories import MedicalProfessionalFactory
+from medico.users.typeahead import NameIndex, normalize
+
+
+def test_normalize():
+    assert normalize("  José  DE la Cruz ") == "jose de la cruz"
+
+
+class TestNameIndex:
+    def test_prefix_search(self):
+        index = NameIndex()
+        index.load([
+            (1, "Gregory", "House", "Dr. Gregory House"),
+            (2, "James", "Wilson", "Dr. James Wilson"),
+            (3, "Greta", "Hansen", "Ms. Greta Hansen"),
+        ])
+
+        assert index.search("gre") == [(1, "Dr. Gregory House"),
+                                       (3, "Ms. Greta Hansen")]
+        assert index.search("wil") == [(2, "Dr. James Wilson")]
+        assert index.search("james w") == [(2, "Dr. James Wilson")]
+        assert index.search("gret", limit=1) == [(3, "Ms. Greta Hansen")]
+        assert index.search("x") == []
+        assert index.search("") == []
+
+    def test_incremental_updates(self):
+        index = NameIndex()
+        index.add(1, "Gregory", "House", "Dr. Gregory House")
+        index.add(1, "Lisa", "Cuddy", "Dr. Lisa Cuddy")
+
+        assert index.search("gre") == []
+        assert index.search("cud") == [(1, "Dr. Lisa Cuddy")]
+
+        index.remove(1)
+        assert index.search("lisa") == []
+        assert len(index) == 0
+
+
+@pytest.mark.django_db(transaction=True)
+def test_autocomplete_view(client):
+    typeahead.replica.rebuild()
+    medical_pro = MedicalProfessionalFactory(user__first_name="Meredith",
+        user__last_name="Grey")
+    MedicalProfessionalFactory(is_verified=False, user__first_name="Merlin")
+    client.force_login(User.objects.create(username="patient"))
+    url = reverse("users:doctor-autocomplete")
+
+    response = client.get(url, data={"q": "mer"})
+    assert response.json()["results"] == [
+        {"id": medical_pro.id, "name": medical_pro.name_with_title}]
+
+    medical_pro.user.last_name = "Shepherd"
+    medical_pro.user.save()
+    response = client.get(url, data={"q": "shep"})
+    assert [r["id"] for r in response.json()["results"]] == [medical_pro.id]
+
+    assert client.get(url, data={"limit": "0"}).status_code == 400
+
+
+@pytest.mark.django_db
+def test_fuzzy_fallback(monkeypatch):
+    MedicalProfessionalFactory(user__first_name="Meredith",
+        user__last_name="Grey")
+    typeahead.replica.rebuild()
+    fuzzy = []
+    monkeypatch.setattr(typeahead, "fuzzy_search",
+        lambda query, limit: fuzzy.append(query) or [])
+
+    assert len(typeahead.search("mered")) == 1
+    assert typeahead.search("mredith") == []
+    # Only queries no name starts with are worth a trigram search.
+    assert fuzzy == ["mredith"]
+
+
+@pytest.mark.django_db(transaction=True)
+def test_login_keeps_index(monkeypatch):
+    medical_pro = MedicalProfessionalFactory()
+    saved = []
+    monkeypatch.setattr(typeahead, "provider_saved", saved.append)
+
+    medical_pro.user.save(update_fields=['last_login'])
+    assert saved == []
+
+    medical_pro.user.save(update_fields=['last_name'])
+    assert saved == [medical_pro]
@@ -6,9 +6,13 @@ from django.contrib.messages.middleware import MessageMiddleware
 from django.contrib.sessions.middleware import SessionMiddleware
 from django.test import RequestFactory
 from django.urls import reverse
+from django.utils import timezone
+from djstripe.models import Customer as StripeCustomer, Subscription
 
+import common.constants
+from common.circuit_breaker import CircuitOpen
 from medico.users.forms import UserChangeForm
-from medico.users.models import User
+from medico.users.models import Customer, User
 from medico.users.tests.factories import UserFactory
 from medico.users.views import (
     UserRedirectView,
@@ -95,3 +99,35 @@ class TestUserDetailView:
 
         assert response.status_code == 302
         assert response.url == f"{login_url}?next=/fake-url/"
+
+
+class TestCancelSubscription:
+    def test_stripe_unavailable(self, client, user: User, monkeypatch):
+        Customer.objects.create(user=user)
+        now = timezone.now()
+        Subscription.objects.create(id="sub_test", customer=StripeCustomer
+            .objects.create(id="cus_test", subscriber=user, livemode=False),
+            status="active", livemode=False, cancel_at_period_end=False,
+            start_date=now, current_period_start=now, current_period_end=now)
+
+        def cancel(self, at_period_end):
+            raise CircuitOpen("stripe")
+
+        monkeypatch.setattr(Subscription, "cancel", cancel)
+        client.force_login(user)
+
+        response = client.post(reverse("users:cancel-subscription"))
+
+        assert response.status_code == 503
+        assert response.json()["error"]["type"] == "ServiceUnavailableError"
+
+    def test_rate_limited(self, client, user: User):
+        Customer.objects.create(user=user)
+        client.force_login(user)
+        url = reverse("users:cancel-subscription")
+        requests, _ = common.constants.PAYMENT_RATE_LIMIT_PER_USER
+
+        for _ in range(requests):
+            assert client.post(url).status_code == 404
+
+        assert client.post(url).status_code == 429
@@ -0,0 +1,185 @@
+"""
+Name autocomplete for medical professionals.
+
+Names are kept in a sorted array of `(key, provider id)` pairs, where the
+keys are the normalized first name, last name and full name of every
+verified provider. A prefix lookup is a binary search followed by a short
+forward scan, so it does not depend on the number of providers.
+"""
+import bisect
+import threading
+import unicodedata
+
+from django.contrib.postgres.search import TrigramSimilarity
+from django.db import connection
+from django.db.models import CharField, Func, Value
+
+import common.cache
+from medico.users.models import MedicalProfessional
+
+CACHE_VERSION_KEY = "provider-typeahead:version"
+
+
+def normalize(text):
+    """
+    Case-folds `text` and strips accents and surrounding whitespace, so that
+    "José" is found by typing "jose".
+    """
+    decomposed = unicodedata.normalize('NFKD', text)
+    stripped = ''.join(c for c in decomposed if not unicodedata.combining(c))
+    return ' '.join(stripped.casefold().split())
+
+
+def name_keys(first_name, last_name):
+    keys = {normalize(first_name), normalize(last_name),
+            normalize("{0} {1}".format(first_name, last_name))}
+    keys.discard('')
+    return keys
+
+
+class NameIndex:
+    """
+    Sorted-array prefix index over provider names.
+    """
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._entries = []
+        self._keys = {}
+        self.names = {}
+
+    def __len__(self):
+        return len(self.names)
+
+    def load(self, rows):
+        """
+        Replaces the contents of the index with `rows`, an iterable of
+        `(provider id, first name, last name, display name)` tuples.
+        """
+        entries, keys, names = [], {}, {}
+        for provider_id, first_name, last_name, display_name in rows:
+            keys[provider_id] = name_keys(first_name, last_name)
+            names[provider_id] = display_name
+            entries.extend((key, provider_id) for key in keys[provider_id])
+        entries.sort()
+
+        with self._lock:
+            self._entries, self._keys, self.names = entries, keys, names
+
+    def add(self, provider_id, first_name, last_name, display_name):
+        with self._lock:
+            self.remove(provider_id)
+            self._keys[provider_id] = name_keys(first_name, last_name)
+            self.names[provider_id] = display_name
+            for key in self._keys[provider_id]:
+                bisect.insort(self._entries, (key, provider_id))
+
+    def remove(self, provider_id):
+        with self._lock:
+            for key in self._keys.pop(provider_id, ()):
+                i = bisect.bisect_left(self._entries, (key, provider_id))
+                if i < len(self._entries) and \
+                        self._entries[i] == (key, provider_id):
+                    del self._entries[i]
+            self.names.pop(provider_id, None)
+
+    def search(self, prefix, limit=10):
+        """
+        Returns up to `limit` `(provider id, display name)` pairs whose first
+        name, last name or full name starts with `prefix`, in name order.
+        """
+        prefix = normalize(prefix)
+        if not prefix:
+            return []
+
+        with self._lock:
+            results, seen = [], set()
+            i = bisect.bisect_left(self._entries, (prefix,))
+            while i < len(self._entries) and len(results) < limit:
+                key, provider_id = self._entries[i]
+                if not key.startswith(prefix):
+                    break
+                if provider_id not in seen:
+                    seen.add(provider_id)
+                    results.append((provider_id, self.names[provider_id]))
+                i += 1
+            return results
+
+
+def _rows(queryset):
+    for medical_pro in queryset:
+        yield (medical_pro.id, medical_pro.user.first_name,
+            medical_pro.user.last_name, medical_pro.name_with_title)
+
+
+def _load():
+    index = NameIndex()
+    index.load(_rows(MedicalProfessional.objects.filter(is_verified=True)
+        .select_related('user').only('id', 'staff_type', 'user__first_name',
+            'user__last_name', 'user__gender').iterator(chunk_size=5000)))
+    return index
+
+
+replica = common.cache.LocalReplica(CACHE_VERSION_KEY, _load)
+
+
+def provider_saved(medical_pro):
+    """
+    Applies a saved MedicalProfessional (or a rename of its user) to the
+    index of this process and tells the other processes to reload theirs.
+    """
+    def change(index):
+        if medical_pro.is_verified:
+            index.add(*next(_rows([medical_pro])))
+        else:
+            index.remove(medical_pro.id)
+
+    replica.apply(change)
+
+
+def provider_deleted(medical_pro_id):
+    replica.apply(lambda index: index.remove(medical_pro_id))
+
+
+class FullName(Func):
+    """
+    `first_name || ' ' || last_name`, the expression the users_user_full_name
+    trigram index covers. CONCAT() cannot be indexed, as it is not immutable.
+    """
+    template = "(%(expressions)s)"
+    arg_joiner = " || "
+    output_field = CharField()
+
+    def __init__(self, first_name, last_name):
+        super().__init__(first_name, Value(' '), last_name)
+
+
+def fuzzy_search(query, limit=10):
+    """
+    Falls back to pg_trgm similarity over full names, which tolerates typos
+    the prefix index cannot. Returns nothing on other databases.
+    """
+    if connection.vendor != 'postgresql':
+        return []
+
+    # `trigram_similar` (pg_trgm's `%`, with its default similarity
+    # threshold of 0.3) can use the trigram index; similarity() alone cannot.
+    queryset = MedicalProfessional.objects.filter(is_verified=True)\
+        .annotate(full_name=FullName('user__first_name', 'user__last_name'))\
+        .filter(full_name__trigram_similar=query)\
+        .annotate(similarity=TrigramSimilarity('full_name', query))\
+        .order_by('-similarity')\
+        .select_related('user')[:limit]
+    return [(medical_pro.id, medical_pro.name_with_title)
+            for medical_pro in queryset]
+
+
+def search(query, limit=10):
+    """
+    Returns up to `limit` `(provider id, display name)` pairs for an
+    autocomplete query: prefix matches, or fuzzy ones when no name starts
+    with `query`, which is most likely a typo.
+    """
+    results = replica.get().search(query, limit)
+    if not results and len(normalize(query)) >= 3:
+        results = fuzzy_search(query, limit)
+    return results
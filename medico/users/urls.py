@@ -7,6 +7,8 @@ from medico.users.views import (
     user_redirect_view,
     user_update_view,
     cancel_subscription,
+    doctor_autocomplete,
+    doctor_directory,
     manage_subscription
 )
 
@@ -17,6 +19,9 @@ urlpatterns = [
     path("subscription/", view=manage_subscription, name="subscription"),
     path("cancel-subscription/", view=cancel_subscription,
         name="cancel-subscription"),
+    path("doctors/", view=doctor_directory, name="doctor-directory"),
+    path("doctors/autocomplete/", view=doctor_autocomplete,
+        name="doctor-autocomplete"),
     path("customer-signup/", view=customer_signup_view, name="customer-signup"),
     path("medical-signup/", view=medical_signup_view, name="medical-signup"),
     # Note: The user detail view should be at the last, otherwise any
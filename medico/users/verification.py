@@ -0,0 +1,72 @@
+"""
+Bulk approval and rejection of medical professional profiles.
+"""
+from django.conf import settings
+from django.core.mail import send_mass_mail
+from django.db import transaction
+from django.template.loader import render_to_string
+from django.utils import timezone
+
+from medico.users import directory, typeahead
+from medico.users.models import MedicalProfessional
+
+
+def _notification(template_prefix, medical_pro):
+    context = {"medical_pro": medical_pro}
+    subject = render_to_string(template_prefix + "_subject.txt", context)
+    message = render_to_string(template_prefix + "_message.txt", context)
+    return (' '.join(subject.split()), message, settings.DEFAULT_FROM_EMAIL,
+        [medical_pro.user.email])
+
+
+def _review(queryset, template_prefix, **changes):
+    """
+    Applies `changes` to every profile in `queryset` with a single UPDATE
+    and queues a notification for each owner. The notifications go to the
+    outbox in the same transaction, so they are only sent if it commits.
+
+    `QuerySet.update` does not send `post_save`, so the caches and
+    in-memory indexes that normally follow saves are refreshed here.
+    """
+    medical_pros = list(queryset.select_related('user'))
+    if not medical_pros:
+        return 0
+
+    ids = [medical_pro.id for medical_pro in medical_pros]
+    # `auto_now` only applies on save, and analytics snapshots pick changed
+    # profiles up by `updated`.
+    changes['updated'] = timezone.now()
+    updated = MedicalProfessional.objects.filter(id__in=ids).update(**changes)
+
+    for medical_pro in medical_pros:
+        for name, value in changes.items():
+            setattr(medical_pro, name, value)
+    messages = [_notification(template_prefix, medical_pro)
+                for medical_pro in medical_pros if medical_pro.user.email]
+
+    def after_commit():
+        directory.invalidate_cache()
+        for medical_pro in medical_pros:
+            typeahead.provider_saved(medical_pro)
+
+    send_mass_mail(messages, fail_silently=False)
+    transaction.on_commit(after_commit)
+    return updated
+
+
+def approve(queryset):
+    """
+    Marks the given profiles as verified and notifies their owners. Returns
+    the number of profiles updated.
+    """
+    return _review(queryset, "users/email/provider_approved",
+        is_verified=True, is_rejected=False)
+
+
+def reject(queryset):
+    """
+    Takes the given profiles out of the review queue and notifies their
+    owners. Returns the number of profiles updated.
+    """
+    return _review(queryset, "users/email/provider_rejected",
+        is_verified=False, is_rejected=True)
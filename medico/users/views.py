@@ -12,8 +12,14 @@ from django.urls import reverse
 from django.utils.translation import gettext_lazy as _
 from django.views.generic import DetailView, RedirectView, UpdateView
 
+import common.constants
 import common.decorators
 import common.helpers
+from common.circuit_breaker import CircuitOpen
+from common.pagination import InvalidCursor
+from medico.ledger import journal
+from medico.payments.views import payments_unavailable
+from . import directory, typeahead
 from .forms import CustomerSignupForm, MedicalProSignupForm
 
 User = get_user_model()
@@ -80,6 +86,10 @@ user_redirect_view = UserRedirectView.as_view()
 
 @login_required
 @common.decorators.customer_only
+@common.decorators.rate_limit("payments",
+    per_user=common.constants.PAYMENT_RATE_LIMIT_PER_USER,
+    per_ip=common.constants.PAYMENT_RATE_LIMIT_PER_IP,
+    per_user_ip=common.constants.PAYMENT_RATE_LIMIT_PER_USER_IP)
 def cancel_subscription(request):
     if request.method != 'POST':
         return HttpResponse('Method not allowed')
@@ -97,11 +107,15 @@ def cancel_subscription(request):
     sub_id = djstripe_customer.subscription.id
     try:
         # Terminate immediately by setting at_period_end False
-        djstripe_customer.subscription.cancel(at_period_end=False)
+        subscription = djstripe_customer.subscription\
+            .cancel(at_period_end=False)
+        journal.record_cancellation(subscription)
+    except CircuitOpen:
+        return payments_unavailable()
     except stripe.error.StripeError as e:
         return JsonResponse({
             "error": {
-                'message': e.error.message,
+                'message': e.user_message,
                 'type': 'StripeError'
             }
         })
@@ -128,3 +142,59 @@ def manage_subscription(request):
             common.helpers.payment_method_serialize(subscription) or None,
         "STRIPE_PUBLISHABLE_KEY": settings.STRIPE_TEST_PUBLIC_KEY
     })
+
+
+@login_required
+def doctor_directory(request):
+    """
+    JSON listing of medical professionals for the doctor selection page.
+    Accepts the `staff_type`, `state_of_license`, `doctor_specialty` and
+    `other_specialty` filters (plus `is_verified` for staff), a `limit`, and
+    the `cursor` returned as `next_cursor` by the previous page.
+    """
+    if request.method != 'GET':
+        return HttpResponse('Method not allowed')
+
+    try:
+        filters = directory.parse_filters(request.GET,
+            allow_unverified=request.user.is_staff)
+        limit = directory.parse_limit(request.GET)
+        data = directory.get_page(filters, request.GET.get('cursor'), limit)
+    except (directory.DirectoryError, InvalidCursor) as e:
+        return JsonResponse({
+            "error": {
+                'message': str(e),
+                'type': 'RequestError'
+            }
+        }, status=400)
+
+    return JsonResponse(data)
+
+
+@login_required
+def doctor_autocomplete(request):
+    """
+    Name suggestions for the doctor search box. Takes the typed text as `q`
+    and an optional `limit`.
+    """
+    if request.method != 'GET':
+        return HttpResponse('Method not allowed')
+
+    try:
+        limit = int(request.GET.get('limit',
+            common.constants.PROVIDER_AUTOCOMPLETE_LIMIT))
+    except ValueError:
+        limit = 0
+    if not 0 < limit <= common.constants.PROVIDER_AUTOCOMPLETE_MAX_LIMIT:
+        return JsonResponse({
+            "error": {
+                'message': 'Invalid value for limit.',
+                'type': 'RequestError'
+            }
+        }, status=400)
+
+    results = typeahead.search(request.GET.get('q', ''), limit)
+    return JsonResponse({
+        "results": [{"id": provider_id, "name": name}
+                    for provider_id, name in results]
+    })